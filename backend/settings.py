@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 from dotenv import load_dotenv
 
@@ -50,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ghl_integration.metrics.MetricsMiddleware',  # Primero: mide también el resto de middlewares
+    'ghl_integration.profiling.ServerTimingMiddleware',  # Header Server-Timing y perfilado por muestreo
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -158,3 +161,127 @@ GHL_PRIVATE_TOKEN = os.getenv('GHL_PRIVATE_TOKEN')
 GHL_DEFAULT_LOCATION_ID = os.getenv('GHL_DEFAULT_LOCATION_ID')
 # Modo mock: si está en True, el servicio devolverá datos simulados para permitir avanzar sin GHL real
 GHL_MOCK = os.getenv('GHL_MOCK', 'False').lower() in ['true','1','yes']
+
+# Tenants: locations con su propio Private Integration Token, pool de conexiones y rate limiter
+# (JSON {"locationId": "token"} o {"locationId": {"token": ..., "name": ..., "rate_limit_capacity": ..., "pool_maxsize": ...}};
+# también se pueden dar de alta en el admin, modelo GHLTenant)
+GHL_TENANTS = json.loads(os.getenv('GHL_TENANTS') or '{}')
+GHL_TENANT_CACHE_TTL = float(os.getenv('GHL_TENANT_CACHE_TTL', '60'))  # Segundos que se cachean los tenants de la base de datos
+GHL_TENANT_POOL_MAXSIZE = int(os.getenv('GHL_TENANT_POOL_MAXSIZE', '5'))  # Conexiones máximas por tenant
+GHL_TENANT_POOL_BLOCK = os.getenv('GHL_TENANT_POOL_BLOCK', 'True').lower() in ['true','1','yes']  # Esperar conexión libre del tenant en vez de abrir extra
+
+# Pool de conexiones HTTP hacia GHL (keep-alive, compartido por proceso)
+GHL_POOL_CONNECTIONS = int(os.getenv('GHL_POOL_CONNECTIONS', '10'))  # Número de hosts distintos en caché
+GHL_POOL_MAXSIZE = int(os.getenv('GHL_POOL_MAXSIZE', '20'))  # Conexiones máximas por host
+GHL_POOL_BLOCK = os.getenv('GHL_POOL_BLOCK', 'False').lower() in ['true','1','yes']  # Esperar conexión libre en vez de abrir extra
+GHL_CONNECT_TIMEOUT = float(os.getenv('GHL_CONNECT_TIMEOUT', '5'))
+GHL_READ_TIMEOUT = float(os.getenv('GHL_READ_TIMEOUT', '30'))
+GHL_KEEPALIVE = os.getenv('GHL_KEEPALIVE', 'True').lower() in ['true','1','yes']
+GHL_ASYNC_MAX_CONNECTIONS = int(os.getenv('GHL_ASYNC_MAX_CONNECTIONS', '200'))  # Peticiones en vuelo del cliente asyncio
+
+# Caché de Django (usada por la caché de respuestas de GHL). LocMemCache es memoria de cada proceso:
+# con varios workers la invalidación de la caché de GHL no se comparte (se avisa al arrancar con
+# DEBUG=False); en producción conviene un backend compartido (Redis, Memcached) para GHL_CACHE_ALIAS
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ghl-default',
+    }
+}
+
+# Caché de respuestas de GHL (calendarios y ubicaciones)
+GHL_CACHE_ALIAS = os.getenv('GHL_CACHE_ALIAS', 'default')
+GHL_CACHE_TTLS = {
+    'calendars': int(os.getenv('GHL_CACHE_TTL_CALENDARS', '300')),  # 0 desactiva la caché del endpoint
+    'locations': int(os.getenv('GHL_CACHE_TTL_LOCATIONS', '900')),
+    'free_slots': int(os.getenv('GHL_CACHE_TTL_FREE_SLOTS', '60')),  # Se invalida al crear citas
+}
+GHL_CACHE_MAX_ENTRIES = int(os.getenv('GHL_CACHE_MAX_ENTRIES', '512'))
+GHL_CACHE_MAX_BYTES = int(os.getenv('GHL_CACHE_MAX_BYTES', str(5 * 1024 * 1024)))
+
+# Rate limiter local (token bucket ajustado con los headers x-ratelimit-* de GHL)
+GHL_RATE_LIMIT_ENABLED = os.getenv('GHL_RATE_LIMIT_ENABLED', 'True').lower() in ['true','1','yes']
+GHL_RATE_LIMIT_MODE = os.getenv('GHL_RATE_LIMIT_MODE', 'block')  # 'block' espera cupo, 'fail_fast' devuelve 429
+GHL_RATE_LIMIT_CAPACITY = int(os.getenv('GHL_RATE_LIMIT_CAPACITY', '100'))  # Valor inicial hasta leer x-ratelimit-max
+GHL_RATE_LIMIT_INTERVAL = float(os.getenv('GHL_RATE_LIMIT_INTERVAL', '10'))  # Segundos, hasta leer x-ratelimit-interval-milliseconds
+GHL_RATE_LIMIT_SAFETY_MARGIN = int(os.getenv('GHL_RATE_LIMIT_SAFETY_MARGIN', '5'))  # Peticiones que se dejan sin usar por ventana
+GHL_RATE_LIMIT_MAX_WAIT = float(os.getenv('GHL_RATE_LIMIT_MAX_WAIT', '30'))  # Espera máxima en modo 'block'
+GHL_RATE_LIMIT_HISTORY_SIZE = int(os.getenv('GHL_RATE_LIMIT_HISTORY_SIZE', '120'))  # Muestras en la telemetría de /rate-limit/
+GHL_RATE_LIMIT_TELEMETRY_SHARED = os.getenv('GHL_RATE_LIMIT_TELEMETRY_SHARED', 'False').lower() in ['true','1','yes']  # Compartir entre workers vía GHL_CACHE_ALIAS
+GHL_RATE_LIMIT_TELEMETRY_FLUSH_INTERVAL = float(os.getenv('GHL_RATE_LIMIT_TELEMETRY_FLUSH_INTERVAL', '1'))  # Segundos entre envíos de muestras a la caché compartida
+
+# Reintentos con backoff exponencial + jitter (respetan Retry-After y el reset de x-ratelimit-*)
+GHL_RETRY_ENABLED = os.getenv('GHL_RETRY_ENABLED', 'True').lower() in ['true','1','yes']
+GHL_RETRY_MAX_ATTEMPTS = int(os.getenv('GHL_RETRY_MAX_ATTEMPTS', '3'))  # Intentos totales por petición
+GHL_RETRY_BASE_DELAY = float(os.getenv('GHL_RETRY_BASE_DELAY', '0.5'))  # Segundos, se duplica en cada intento
+GHL_RETRY_MAX_DELAY = float(os.getenv('GHL_RETRY_MAX_DELAY', '10'))  # Espera máxima entre intentos
+GHL_RETRY_NON_IDEMPOTENT = os.getenv('GHL_RETRY_NON_IDEMPOTENT', 'False').lower() in ['true','1','yes']  # Reintentar POST ante 5xx/errores de red
+
+# Circuit breaker por endpoint: tras N fallos seguidos (5xx/red) se falla rápido durante un tiempo
+GHL_CIRCUIT_BREAKER_ENABLED = os.getenv('GHL_CIRCUIT_BREAKER_ENABLED', 'True').lower() in ['true','1','yes']
+GHL_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('GHL_CIRCUIT_FAILURE_THRESHOLD', '5'))
+GHL_CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv('GHL_CIRCUIT_RECOVERY_TIMEOUT', '30'))  # Segundos con el circuito abierto
+
+# Single-flight: GETs idénticos y concurrentes comparten una sola petición a GHL
+GHL_SINGLEFLIGHT_ENABLED = os.getenv('GHL_SINGLEFLIGHT_ENABLED', 'True').lower() in ['true','1','yes']
+
+# Operaciones en lote (p.ej. /appointments/bulk/)
+GHL_BULK_MAX_ITEMS = int(os.getenv('GHL_BULK_MAX_ITEMS', '1000'))
+GHL_BULK_MAX_CONCURRENCY = int(os.getenv('GHL_BULK_MAX_CONCURRENCY', '10'))
+
+# Varias locations por petición (?locationIds=a,b,c en /calendars/ y /appointments/)
+GHL_FANOUT_MAX_LOCATIONS = int(os.getenv('GHL_FANOUT_MAX_LOCATIONS', '100'))
+GHL_FANOUT_MAX_CONCURRENCY = int(os.getenv('GHL_FANOUT_MAX_CONCURRENCY', '10'))  # Locations consultadas a la vez
+
+# Cola de escrituras en base de datos (?async=1 en los create; la procesa manage.py ghl_worker)
+GHL_JOBS_WORKER_CONCURRENCY = int(os.getenv('GHL_JOBS_WORKER_CONCURRENCY', '4'))  # Trabajos en vuelo por worker
+GHL_JOBS_POLL_INTERVAL = float(os.getenv('GHL_JOBS_POLL_INTERVAL', '1'))  # Segundos entre consultas con la cola vacía
+GHL_JOBS_MAX_ATTEMPTS = int(os.getenv('GHL_JOBS_MAX_ATTEMPTS', '5'))
+GHL_JOBS_RETRY_DELAY = float(os.getenv('GHL_JOBS_RETRY_DELAY', '5'))  # Segundos, se duplica en cada intento
+GHL_JOBS_RETRY_MAX_DELAY = float(os.getenv('GHL_JOBS_RETRY_MAX_DELAY', '300'))
+GHL_JOBS_LEASE_SECONDS = int(os.getenv('GHL_JOBS_LEASE_SECONDS', '300'))  # Tras esto un trabajo 'running' se da por abandonado
+GHL_JOBS_RETENTION_DAYS = int(os.getenv('GHL_JOBS_RETENTION_DAYS', '7'))  # Días que se guardan los trabajos terminados
+
+# Header Idempotency-Key en los endpoints de creación de citas y contactos
+GHL_IDEMPOTENCY_TTL = int(os.getenv('GHL_IDEMPOTENCY_TTL', '86400'))  # Segundos que se guarda la respuesta de cada clave
+GHL_IDEMPOTENCY_WAIT = float(os.getenv('GHL_IDEMPOTENCY_WAIT', '30'))  # Espera máxima de un duplicado a la petición en curso
+GHL_IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('GHL_IDEMPOTENCY_LOCK_SECONDS', '120'))  # Tras esto sin prórroga (proceso muerto) una clave 'en curso' se libera
+
+# Espejo local de GHL (manage.py ghl_sync): ventana de citas a sincronizar
+GHL_SYNC_PAST_DAYS = int(os.getenv('GHL_SYNC_PAST_DAYS', '30'))
+GHL_SYNC_FUTURE_DAYS = int(os.getenv('GHL_SYNC_FUTURE_DAYS', '90'))
+
+# Webhooks de GHL: firma RSA (clave pública PEM de GHL) o HMAC con secreto compartido
+GHL_WEBHOOK_PUBLIC_KEY = os.getenv('GHL_WEBHOOK_PUBLIC_KEY', '').replace('\\n', '\n') or None
+GHL_WEBHOOK_SECRET = os.getenv('GHL_WEBHOOK_SECRET') or None
+GHL_WEBHOOK_ALLOW_UNSIGNED = os.getenv('GHL_WEBHOOK_ALLOW_UNSIGNED', 'False').lower() in ['true','1','yes']  # Solo desarrollo
+GHL_WEBHOOK_BATCH_SIZE = int(os.getenv('GHL_WEBHOOK_BATCH_SIZE', '200'))  # Eventos por transacción
+GHL_WEBHOOK_FLUSH_INTERVAL = float(os.getenv('GHL_WEBHOOK_FLUSH_INTERVAL', '1'))  # Segundos máximos en el buffer
+
+# Horarios libres (/calendars/<id>/free-slots/): horario laboral por defecto
+GHL_AVAILABILITY_TIMEZONE = os.getenv('GHL_AVAILABILITY_TIMEZONE', TIME_ZONE)
+GHL_AVAILABILITY_DAY_START = os.getenv('GHL_AVAILABILITY_DAY_START', '09:00')
+GHL_AVAILABILITY_DAY_END = os.getenv('GHL_AVAILABILITY_DAY_END', '18:00')
+GHL_AVAILABILITY_WEEKDAYS = os.getenv('GHL_AVAILABILITY_WEEKDAYS', '0,1,2,3,4')  # 0 = lunes
+GHL_AVAILABILITY_MAX_DAYS = int(os.getenv('GHL_AVAILABILITY_MAX_DAYS', '62'))  # Rango máximo por consulta
+
+# Pre-flight de citas: rechaza solapes con un índice en memoria (cargado del espejo local) antes de llamar a GHL
+GHL_PREFLIGHT_CONFLICTS = os.getenv('GHL_PREFLIGHT_CONFLICTS', 'True').lower() in ['true','1','yes']
+GHL_PREFLIGHT_INDEX_TTL = float(os.getenv('GHL_PREFLIGHT_INDEX_TTL', '300'))  # Segundos antes de recargar un calendario
+
+# Importación masiva de contactos (/contacts/import/ y manage.py ghl_import_contacts)
+GHL_IMPORT_DIR = os.getenv('GHL_IMPORT_DIR', str(BASE_DIR / 'imports'))  # Checkpoints y archivos de resultados
+GHL_IMPORT_CONCURRENCY = int(os.getenv('GHL_IMPORT_CONCURRENCY', '5'))
+
+# Métricas de Prometheus (/api/ghl/metrics/)
+GHL_METRICS_ENABLED = os.getenv('GHL_METRICS_ENABLED', 'True').lower() in ['true','1','yes']
+GHL_METRICS_DIR = os.getenv('GHL_METRICS_DIR') or None  # Con varios workers: directorio compartido donde cada proceso vuelca sus métricas
+GHL_METRICS_FLUSH_INTERVAL = float(os.getenv('GHL_METRICS_FLUSH_INTERVAL', '5'))  # Segundos entre volcados de cada worker
+GHL_METRICS_FILE_TTL = float(os.getenv('GHL_METRICS_FILE_TTL', '3600'))  # Segundos sin actualizarse tras los que se borra el volcado de un worker
+
+# Desglose de tiempos (header Server-Timing) y perfilado por muestreo
+GHL_SERVER_TIMING = os.getenv('GHL_SERVER_TIMING', 'True').lower() in ['true','1','yes']
+GHL_PROFILE_SAMPLE_RATE = int(os.getenv('GHL_PROFILE_SAMPLE_RATE', '0'))  # N: perfila 1 de cada N peticiones (0 desactiva)
+GHL_PROFILER = os.getenv('GHL_PROFILER', 'cprofile')  # 'cprofile' (.prof) o 'pyinstrument' (.html, requiere el paquete)
+GHL_PROFILE_DIR = os.getenv('GHL_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+GHL_PROFILE_MAX_FILES = int(os.getenv('GHL_PROFILE_MAX_FILES', '200'))  # Se borran los más antiguos
@@ -40,13 +40,15 @@ const CalendarsList = ({ onCalendarSelect }) => {
   const [selectedCalendarId, setSelectedCalendarId] = useState(null);
   const { callApiWithRateLimit } = useApiWithRateLimit();
 
-  const fetchCalendars = async () => {
+  // fresh=true (botón de actualizar) salta la caché del backend; el montaje usa la versión cacheada
+  const fetchCalendars = async (fresh = false) => {
     setLoading(true);
     setError(null);
 
     try {
+      const endpoint = fresh ? `${API_ENDPOINTS.CALENDARS}?fresh=1` : API_ENDPOINTS.CALENDARS;
       const data = await callApiWithRateLimit(() =>
-        apiCall(API_ENDPOINTS.CALENDARS)
+        apiCall(endpoint)
       );
 
       if (data.success) {
@@ -109,7 +111,7 @@ const CalendarsList = ({ onCalendarSelect }) => {
           
           <Box sx={{ display: 'flex', gap: 1 }}>
             <Tooltip title="Actualizar calendarios">
-              <IconButton onClick={fetchCalendars} disabled={loading}>
+              <IconButton onClick={() => fetchCalendars(true)} disabled={loading}>
                 <Refresh />
               </IconButton>
             </Tooltip>
@@ -45,13 +45,15 @@ const CalendarsListImproved = ({ onCalendarSelect }) => {
   const [selectedCalendarId, setSelectedCalendarId] = useState(null);
   const { callApiWithRateLimit } = useApiWithRateLimit();
 
-  const fetchCalendars = async () => {
+  // fresh=true (botón de actualizar) salta la caché del backend; el montaje usa la versión cacheada
+  const fetchCalendars = async (fresh = false) => {
     setLoading(true);
     setError(null);
 
     try {
+      const endpoint = fresh ? `${API_ENDPOINTS.CALENDARS}?fresh=1` : API_ENDPOINTS.CALENDARS;
       const data = await callApiWithRateLimit(() =>
-        apiCall(API_ENDPOINTS.CALENDARS)
+        apiCall(endpoint)
       );
 
       if (data.success) {
@@ -185,7 +187,7 @@ const CalendarsListImproved = ({ onCalendarSelect }) => {
               />
               <Tooltip title="Actualizar calendarios">
                 <IconButton 
-                  onClick={fetchCalendars} 
+                  onClick={() => fetchCalendars(true)} 
                   disabled={loading}
                   sx={{ 
                     bgcolor: 'primary.main',
@@ -1,3 +1,58 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import GHLAppointment, GHLCalendar, GHLContact, GHLIdempotencyKey, GHLJob, GHLSyncState, GHLTenant, GHLWebhookEvent
+
+
+@admin.register(GHLCalendar)
+class GHLCalendarAdmin(admin.ModelAdmin):
+    list_display = ('name', 'ghl_id', 'location_id', 'synced_at')
+    list_filter = ('location_id',)
+    search_fields = ('name', 'ghl_id')
+
+
+@admin.register(GHLContact)
+class GHLContactAdmin(admin.ModelAdmin):
+    list_display = ('first_name', 'last_name', 'email', 'phone', 'location_id', 'ghl_updated_at')
+    list_filter = ('location_id',)
+    search_fields = ('first_name', 'last_name', 'email', 'phone', 'ghl_id')
+
+
+@admin.register(GHLAppointment)
+class GHLAppointmentAdmin(admin.ModelAdmin):
+    list_display = ('title', 'calendar_id', 'contact_id', 'start_time', 'end_time', 'status')
+    list_filter = ('location_id', 'calendar_id', 'status')
+    search_fields = ('title', 'ghl_id', 'contact_id')
+    date_hierarchy = 'start_time'
+
+
+@admin.register(GHLSyncState)
+class GHLSyncStateAdmin(admin.ModelAdmin):
+    list_display = ('resource', 'location_id', 'cursor', 'last_full_sync_at', 'last_run_at', 'last_run_items')
+
+
+@admin.register(GHLWebhookEvent)
+class GHLWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event_type', 'object_id', 'location_id', 'occurred_at', 'received_at', 'processed_at', 'error')
+    list_filter = ('event_type', 'location_id')
+    search_fields = ('event_id', 'object_id')
+
+
+@admin.register(GHLTenant)
+class GHLTenantAdmin(admin.ModelAdmin):
+    list_display = ('name', 'location_id', 'active', 'rate_limit_capacity', 'pool_maxsize', 'updated_at')
+    list_filter = ('active',)
+    search_fields = ('name', 'location_id')
+
+
+@admin.register(GHLJob)
+class GHLJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'location_id', 'attempts', 'status_code', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('id', 'location_id')
+    date_hierarchy = 'created_at'
+
+
+@admin.register(GHLIdempotencyKey)
+class GHLIdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key_hash', 'status_code', 'created_at', 'expires_at')
+    list_filter = ('status_code',)
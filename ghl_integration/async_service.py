@@ -0,0 +1,261 @@
+"""
+Cliente asyncio para la API de GoHighLevel (GHL), usado por las vistas async (ASGI)
+"""
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlencode
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .cache import get_response_cache
+from .ghl_service import GHLRequestError, GHLService, get_ghl_service, get_tenant_service
+from .http_pool import get_async_client
+from .metrics import track_upstream
+from .profiling import timed
+from .rate_limiter import RateLimitExceeded
+from .resilience import CircuitOpenError, circuit_key, get_circuit_breaker
+from .singleflight import singleflight
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncGHLService(GHLService):
+    """
+    Misma superficie que GHLService pero con métodos `async`: mientras espera a GHL no ocupa
+    un hilo, así un solo worker ASGI puede tener cientos de llamadas en vuelo.
+    Reutiliza la configuración, el modo mock, la caché y el rate limiter de GHLService.
+
+    Todo método heredado que llama a _make_request está redefinido aquí como corrutina (o, en
+    iter_contacts/iter_appointments, devuelve un iterador async para `async for`); lo que no
+    hace I/O (armar endpoints y dar forma a los resultados) se comparte con GHLService.
+    """
+
+    async def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None,
+                            block: Optional[bool] = None) -> Dict:
+        """Equivalente async de GHLService._make_request"""
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+
+        # Si está activado el modo mock, devolvemos datos simulados según el endpoint
+        if self.mock:
+            return self._mock_request(method, endpoint, data)
+
+        key = self._coalesce_key(method, endpoint)
+        with timed('ghl_call'):
+            if key is not None:
+                return await singleflight.do_async(key, lambda: self._send_request(method, url, endpoint, data, block))
+            return await self._send_request(method, url, endpoint, data, block)
+
+    async def _send_request(self, method: str, url: str, endpoint: str, data: Optional[Dict],
+                            block: Optional[bool]) -> Dict:
+        """Equivalente async de GHLService._send_request (reintentos sin bloquear el event loop)"""
+        attempt = 1
+        result = await self._attempt_request(method, url, endpoint, data, block)
+        while self.retry_policy is not None and self.retry_policy.should_retry(method, result, attempt):
+            delay = self.retry_policy.delay(attempt, result)
+            self._log_retry(method, endpoint, result, attempt, delay)
+            await self.retry_policy.async_sleep(delay)
+            attempt += 1
+            result = await self._attempt_request(method, url, endpoint, data, block)
+        return self._with_attempts(result, attempt)
+
+    async def _attempt_request(self, method: str, url: str, endpoint: str, data: Optional[Dict],
+                               block: Optional[bool]) -> Dict:
+        breaker = get_circuit_breaker()
+        circuit = circuit_key(self.cache_namespace, endpoint)
+        if breaker is not None:
+            try:
+                breaker.before_request(circuit)
+            except CircuitOpenError as e:
+                return self._circuit_open_result(method, endpoint, e)
+
+        recorded = False
+        try:
+            if self.rate_limiter is not None:
+                try:
+                    await self.rate_limiter.acquire_async(block=self._should_block(block),
+                                                          timeout=getattr(settings, 'GHL_RATE_LIMIT_MAX_WAIT', 30.0))
+                except RateLimitExceeded as e:
+                    return self._local_rate_limit_result(method, endpoint, e)
+
+            self._log_request(method, url, data)
+            response = None
+            with track_upstream(method, endpoint) as call, timed('ghl'):
+                try:
+                    response = await get_async_client(self.tenant).request(
+                        method,
+                        url,
+                        headers=self.headers,
+                        json=data,
+                    )
+                    call.status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    timeout = isinstance(e, httpx.TimeoutException)
+                    call.status = 'timeout' if timeout else 'error'
+                    result = self._connection_error_result(e, timeout=timeout)
+            if response is not None:
+                result = self._process_response(response, endpoint)
+
+            if breaker is not None:
+                breaker.record(circuit, result)
+                recorded = True
+            return result
+        finally:
+            # También con CancelledError: sin resultado, la prueba half-open queda libre
+            if breaker is not None and not recorded:
+                breaker.release(circuit)
+
+    async def test_connection(self) -> Dict:
+        """Ejercicio 3 (async): /locations/search y, si falla, calendarios del locationId por defecto"""
+        locations_try = await self._make_request('GET', '/locations/search')
+        if locations_try['success']:
+            return self._connection_from_locations(locations_try)
+
+        if self.default_location_id:
+            calendars_try = await self._make_request('GET', f'/calendars/?locationId={self.default_location_id}')
+            if calendars_try['success']:
+                return self._connection_from_calendars(calendars_try, locations_try)
+
+        return self._connection_failed(locations_try)
+
+    async def get_locations(self, fresh: bool = False) -> Dict:
+        return await get_response_cache().aget_or_fetch(
+            'locations', None, self._fetch_locations,
+            namespace=self.cache_namespace, fresh=fresh,
+        )
+
+    async def _fetch_locations(self) -> Dict:
+        return self._locations_result(await self._make_request('GET', '/locations/search'))
+
+    async def get_calendars(self, location_id: Optional[str] = None, fresh: bool = False) -> Dict:
+        """Ejercicio 4 (async): calendarios de una location, cacheados por locationId"""
+        effective_location_id = location_id or self.default_location_id
+        if not effective_location_id:
+            return self._location_required_error()
+
+        return await get_response_cache().aget_or_fetch(
+            'calendars', effective_location_id,
+            lambda: self._fetch_calendars(effective_location_id),
+            namespace=self.cache_namespace, fresh=fresh,
+        )
+
+    async def _fetch_calendars(self, effective_location_id: str) -> Dict:
+        result = await self._make_request('GET', f'/calendars/?locationId={effective_location_id}')
+        return self._calendars_result(result, effective_location_id)
+
+    async def create_appointment(self, appointment_data: Dict, block: Optional[bool] = None) -> Dict:
+        """
+        Ejercicio 5 (async): crea una cita en GHL, con el mismo pre-flight que la versión síncrona
+        
+        Args:
+            block: Modo del rate limiter para esta llamada (ver GHLService._make_request)
+        """
+        from .preflight import check_appointment
+        # El pre-flight puede cargar el calendario desde la base de datos (ORM síncrono)
+        appointment_data, error, finish = await sync_to_async(check_appointment)(appointment_data)
+        if error:
+            return error
+        result = {'success': False}
+        try:
+            result = await self._make_request('POST', '/calendars/events/appointments', appointment_data, block=block)
+        finally:
+            if finish is not None:
+                finish(result)
+        if result['success'] and appointment_data.get('calendarId'):
+            await get_response_cache().ainvalidate('free_slots', appointment_data['calendarId'])
+        return self._appointment_result(result)
+
+    async def create_contact(self, contact_data: Dict, block: Optional[bool] = None) -> Dict:
+        """Crea un contacto en GHL (async); block como en create_appointment"""
+        result = await self._make_request('POST', '/contacts/', contact_data, block=block)
+        return self._contact_result(result)
+
+    async def get_appointments(self, location_id: Optional[str] = None, calendar_id: Optional[str] = None,
+                               start_time: Optional[str] = None, end_time: Optional[str] = None) -> Dict:
+        """Citas (eventos) de una location, opcionalmente de un calendario y un rango (async)"""
+        effective_location_id = location_id or self.default_location_id
+        if not effective_location_id:
+            return self._location_required_error()
+        result = await self._make_request('GET', self._appointments_endpoint(effective_location_id, calendar_id,
+                                                                             start_time, end_time))
+        return self._appointments_result(result, effective_location_id)
+
+    async def fan_out(self, location_ids: List[str], fetch: Callable[[str], Awaitable[Dict]], items_key: str,
+                      concurrency: Optional[int] = None) -> Dict:
+        """Equivalente async de GHLService.fan_out: `fetch` es una corrutina y el tope un semáforo"""
+        concurrency = concurrency or getattr(settings, 'GHL_FANOUT_MAX_CONCURRENCY', 10)
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def timed_fetch(location_id: str) -> Dict:
+            async with semaphore:
+                call_started = time.perf_counter()
+                result = await fetch(location_id)
+            return {**result, 'elapsed_ms': round((time.perf_counter() - call_started) * 1000, 2)}
+
+        results = await asyncio.gather(*(timed_fetch(location_id) for location_id in location_ids))
+        return self._fan_out_result(location_ids, dict(enumerate(results)), items_key, started)
+
+    async def _aservices_for_locations(self, location_ids: List[str]) -> Dict[str, 'AsyncGHLService']:
+        # Resolver los tenants consulta la base de datos (ORM síncrono)
+        return await sync_to_async(self._services_for_locations)(location_ids)
+
+    async def get_calendars_for_locations(self, location_ids: List[str], fresh: bool = False,
+                                          concurrency: Optional[int] = None) -> Dict:
+        """Calendarios de varias locations en paralelo (async, ver fan_out)"""
+        services = await self._aservices_for_locations(location_ids)
+        return await self.fan_out(location_ids,
+                                  lambda location_id: services[location_id].get_calendars(location_id, fresh=fresh),
+                                  'calendars', concurrency)
+
+    async def get_appointments_for_locations(self, location_ids: List[str], calendar_id: Optional[str] = None,
+                                             start_time: Optional[str] = None, end_time: Optional[str] = None,
+                                             concurrency: Optional[int] = None) -> Dict:
+        """Citas de varias locations en paralelo (async, ver fan_out)"""
+        services = await self._aservices_for_locations(location_ids)
+        return await self.fan_out(
+            location_ids,
+            lambda location_id: services[location_id].get_appointments(location_id, calendar_id, start_time, end_time),
+            'appointments', concurrency,
+        )
+
+    async def _paginate(self, endpoint: str, params: Dict, items_key: str,
+                        page_size: Optional[int] = None) -> AsyncIterator[Dict]:
+        """Equivalente async de GHLService._paginate; iter_contacts/iter_appointments lo devuelven tal cual"""
+        params = self._page_params(params, page_size)
+        while True:
+            result = await self._make_request('GET', f"{endpoint}?{urlencode(params)}")
+            if not result['success']:
+                raise GHLRequestError(result)
+
+            body = result['data'] or {}
+            items = body.get(items_key) or []
+            for item in items:
+                yield item
+            if not self._next_page(params, body, items, page_size):
+                break
+
+
+def get_async_ghl_service() -> AsyncGHLService:
+    """Instancia async del proceso para la configuración actual (comparte rate limiter con la síncrona)"""
+    return get_ghl_service(AsyncGHLService)
+
+
+async def get_async_ghl_service_for(location_id: Optional[str]) -> AsyncGHLService:
+    """
+    Como get_async_ghl_service, pero con el servicio del tenant de la location si tiene token
+    propio (ver tenants.py). Si el tenant no está en la caché del registro, la consulta a la base
+    de datos se hace en un hilo para no bloquear el event loop.
+    """
+    if location_id:
+        from .tenants import get_tenant_registry
+        registry = get_tenant_registry()
+        found, tenant = registry.peek(location_id)
+        if not found:
+            tenant = await sync_to_async(registry.get)(location_id)
+        if tenant is not None:
+            return get_tenant_service(tenant, AsyncGHLService)
+    return get_async_ghl_service()
@@ -0,0 +1,172 @@
+"""
+Versiones async de las vistas principales. DRF no soporta vistas async, así que son vistas
+Django nativas que devuelven JsonResponse con el mismo payload y códigos que las de views.py.
+Pensadas para servirse con un servidor ASGI (backend/asgi.py), p.ej.:
+
+    uvicorn backend.asgi:application --workers 2
+"""
+import json
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .async_service import get_async_ghl_service, get_async_ghl_service_for
+from .contact_index import find_existing_contact, index_contact, reused_contact_result
+from .idempotency import MAX_KEY_LENGTH, get_idempotency_store
+from .jobs import enqueue_job
+from .validation import (
+    APPOINTMENT_REQUIRED_FIELDS,
+    CONTACT_REQUIRED_FIELDS,
+    apply_default_location,
+    missing_fields_error,
+)
+
+
+def _wants_fresh(request) -> bool:
+    return request.GET.get('fresh', '').lower() in ['1', 'true', 'yes']
+
+
+def _json_body(request):
+    """Parsea el body JSON; devuelve (datos, payload_de_error)"""
+    try:
+        data = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return None, {'success': False, 'message': 'El body debe ser JSON válido'}
+    if not isinstance(data, dict):
+        return None, {'success': False, 'message': 'El body debe ser un objeto JSON'}
+    return data, None
+
+
+def _result_response(result, success_status=200):
+    return JsonResponse(result, status=success_status if result.get('success') else 400)
+
+
+def _wants_upsert(request) -> bool:
+    return request.GET.get('upsert', '').lower() in ['1', 'true', 'yes']
+
+
+def _wants_job(request) -> bool:
+    return (request.GET.get('async', '').lower() in ['1', 'true', 'yes']
+            or 'respond-async' in request.headers.get('Prefer', ''))
+
+
+async def _job_accepted(request, kind, data, location_id):
+    """Igual que en views.py: encola el trabajo y responde 202 con su URL de estado"""
+    job = await sync_to_async(enqueue_job)(kind, data, location_id)
+    status_url = request.build_absolute_uri(reverse('ghl_job_status', args=[job.id]))
+    response = JsonResponse({
+        'success': True,
+        'message': 'Petición encolada; consulta el resultado en status_url',
+        'job_id': str(job.id),
+        'status': job.status,
+        'status_url': status_url,
+    }, status=202)
+    response['Location'] = status_url
+    return response
+
+
+async def _idempotent(request, scope, data, handler):
+    """Igual que en views.py, con IdempotencyStore.arun: handler se ejecuta en el event loop"""
+    key = request.headers.get('Idempotency-Key')
+    if key is None:
+        return await handler()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return JsonResponse({'success': False, 'error': {
+            'message': f'Idempotency-Key debe tener entre 1 y {MAX_KEY_LENGTH} caracteres'}}, status=400)
+
+    async def run():
+        response = await handler()
+        return response.status_code, json.loads(response.content)
+
+    status_code, body, replayed = await get_idempotency_store().arun(scope, key, data, run)
+    response = JsonResponse(body, status=status_code)
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    if status_code == 202 and body.get('status_url'):
+        response['Location'] = body['status_url']
+    return response
+
+
+@require_GET
+async def ghl_ping(request):
+    """Ejercicio 3 (async): igual que views.ghl_ping"""
+    q_location_id = request.GET.get('locationId')
+    service = await get_async_ghl_service_for(q_location_id)
+    if q_location_id:
+        return _result_response(await service.get_calendars(q_location_id, fresh=_wants_fresh(request)))
+    return _result_response(await service.test_connection())
+
+
+@require_GET
+async def ghl_calendars(request):
+    """Ejercicio 4 (async): igual que views.ghl_calendars"""
+    location_id = request.GET.get('locationId')
+    service = await get_async_ghl_service_for(location_id)
+    result = await service.get_calendars(location_id, fresh=_wants_fresh(request))
+    return _result_response(result)
+
+
+@require_GET
+async def ghl_locations(request):
+    service = get_async_ghl_service()
+    return _result_response(await service.get_locations(fresh=_wants_fresh(request)))
+
+
+@csrf_exempt
+@require_POST
+async def create_appointment(request):
+    """Ejercicio 5 (async): igual que views.create_appointment"""
+    data, error = _json_body(request)
+    if error:
+        return JsonResponse(error, status=400)
+    return await _idempotent(request, 'create_appointment', data, partial(_create_appointment, request, data))
+
+
+async def _create_appointment(request, data):
+    error = missing_fields_error(data, APPOINTMENT_REQUIRED_FIELDS)
+    if error:
+        return JsonResponse(error, status=400)
+    if _wants_job(request):
+        return await _job_accepted(request, 'create_appointment', data, data.get('locationId'))
+
+    service = await get_async_ghl_service_for(data.get('locationId'))
+    result = await service.create_appointment(data)
+    if result.get('preflight'):
+        return JsonResponse(result, status=result['status_code'])
+    return _result_response(result)
+
+
+@csrf_exempt
+@require_POST
+async def create_contact(request):
+    """Crear contacto (async): igual que views.create_contact"""
+    data, error = _json_body(request)
+    if error:
+        return JsonResponse(error, status=400)
+    return await _idempotent(request, 'create_contact', data, partial(_create_contact, request, data))
+
+
+async def _create_contact(request, data):
+    error = missing_fields_error(data, CONTACT_REQUIRED_FIELDS)
+    if error:
+        return JsonResponse(error, status=400)
+
+    service = await get_async_ghl_service_for(data.get('locationId'))
+    error = apply_default_location(data, service)
+    if error:
+        return JsonResponse(error, status=400)
+    if _wants_upsert(request):
+        existing = await sync_to_async(find_existing_contact)(data, data['locationId'])
+        if existing is not None:
+            return JsonResponse(reused_contact_result(existing))
+    if _wants_job(request):
+        return await _job_accepted(request, 'create_contact', data, data['locationId'])
+
+    result = await service.create_contact(data)
+    if result.get('success') and not service.mock:
+        await sync_to_async(index_contact)(result.get('contact'), data['locationId'])
+    return _result_response(result, success_status=201)
@@ -0,0 +1,171 @@
+"""
+Motor de disponibilidad: calcula horarios libres de un calendario a partir de sus citas.
+
+Trabaja con intervalos [inicio, fin) en segundos epoch: las citas se ordenan y fusionan una
+vez (O(n log n)) y los huecos se recorren en una sola pasada junto con las ventanas de horario
+laboral, así semanas de citas se resuelven en milisegundos.
+"""
+import time
+from datetime import datetime, time as dt_time, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from .sync import parse_ghl_datetime
+
+Interval = Tuple[int, int]
+
+# Estados de cita que no ocupan el calendario
+FREE_STATUSES = ('cancelled', 'canceled', 'invalid', 'noshow_released')
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Ordena y fusiona intervalos solapados o contiguos"""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def busy_intervals(appointments: Iterable[Dict]) -> List[Interval]:
+    """Intervalos ocupados (fusionados) de una lista de citas de GHL"""
+    intervals = []
+    for appointment in appointments:
+        status = (appointment.get('appointmentStatus') or appointment.get('status') or '').lower()
+        if status in FREE_STATUSES:
+            continue
+        start = parse_ghl_datetime(appointment.get('startTime'))
+        end = parse_ghl_datetime(appointment.get('endTime'))
+        if start and end:
+            intervals.append((int(start.timestamp()), int(end.timestamp())))
+    return merge_intervals(intervals)
+
+
+def working_windows(start: int, end: int, tz: ZoneInfo, day_start: dt_time, day_end: dt_time,
+                    weekdays: Sequence[int]) -> Iterator[Interval]:
+    """Ventanas de horario laboral (en la zona `tz`) recortadas a [start, end)"""
+    day = datetime.fromtimestamp(start, tz).date()
+    last_day = datetime.fromtimestamp(end, tz).date()
+    while day <= last_day:
+        if day.weekday() in weekdays:
+            window_start = int(datetime.combine(day, day_start, tz).timestamp())
+            window_end = int(datetime.combine(day, day_end, tz).timestamp())
+            window_start, window_end = max(window_start, start), min(window_end, end)
+            if window_start < window_end:
+                yield window_start, window_end
+        day += timedelta(days=1)
+
+
+def free_slots(busy: Sequence[Interval], windows: Iterable[Interval], duration: int,
+               step: Optional[int] = None) -> List[Interval]:
+    """
+    Huecos de `duration` segundos dentro de `windows` que no pisan ningún intervalo de `busy`.
+
+    Args:
+        busy: Intervalos ocupados ordenados y fusionados (merge_intervals)
+        windows: Ventanas disponibles ordenadas (p.ej. working_windows)
+        duration: Duración de cada hueco en segundos
+        step: Separación entre inicios posibles, alineados al inicio de cada ventana (por defecto `duration`)
+    """
+    step = step or duration
+    slots: List[Interval] = []
+    index = 0
+    for window_start, window_end in windows:
+        # Citas que terminan antes de la ventana ya no afectan (ventanas y citas están ordenadas)
+        while index < len(busy) and busy[index][1] <= window_start:
+            index += 1
+        cursor = window_start
+        position = index
+        while cursor + duration <= window_end:
+            while position < len(busy) and busy[position][1] <= cursor:
+                position += 1
+            if position < len(busy) and busy[position][0] < cursor + duration:
+                # Salta al primer inicio alineado después de la cita que bloquea
+                blocked_until = busy[position][1]
+                cursor = window_start + -(-(blocked_until - window_start) // step) * step
+                continue
+            slots.append((cursor, cursor + duration))
+            cursor += step
+    return slots
+
+
+def parse_day_time(value: str) -> dt_time:
+    """'HH:MM' -> time"""
+    hours, minutes = value.split(':')
+    return dt_time(int(hours), int(minutes))
+
+
+def format_slots(slots: Iterable[Interval], tz: ZoneInfo) -> List[Dict]:
+    return [
+        {
+            'startTime': datetime.fromtimestamp(start, tz).isoformat(),
+            'endTime': datetime.fromtimestamp(end, tz).isoformat(),
+        }
+        for start, end in slots
+    ]
+
+
+def get_free_slots(service, calendar_id: str, start: datetime, end: datetime, duration_minutes: int,
+                   step_minutes: Optional[int], tz: ZoneInfo, day_start: dt_time, day_end: dt_time,
+                   weekdays: Sequence[int], location_id: Optional[str] = None, local: bool = False,
+                   fresh: bool = False) -> Dict:
+    """
+    Horarios libres de un calendario, cacheados por calendario (se invalidan al crear citas).
+
+    Las citas se leen de GHL (paginadas) o, con `local=True`, del espejo local. `service` es un
+    GHLService síncrono (la paginación de AsyncGHLService es un iterador async).
+    """
+    from .cache import get_response_cache
+    from .ghl_service import GHLRequestError
+    from .models import GHLAppointment
+
+    start_ts, end_ts = int(start.timestamp()), int(end.timestamp())
+
+    def compute() -> Dict:
+        started = time.perf_counter()
+        if local:
+            appointments = (GHLAppointment.objects
+                            .filter(calendar_id=calendar_id, start_time__lt=end, end_time__gt=start)
+                            .values_list('raw', flat=True).iterator())
+        else:
+            appointments = service.iter_appointments(
+                location_id, calendar_id=calendar_id,
+                start_time=str(start_ts * 1000), end_time=str(end_ts * 1000),
+            )
+        try:
+            appointments = list(appointments)
+        except GHLRequestError as e:
+            return e.result
+        fetched = time.perf_counter()
+        busy = busy_intervals(appointments)
+        windows = working_windows(start_ts, end_ts, tz, day_start, day_end, weekdays)
+        slots = free_slots(busy, windows, duration_minutes * 60, (step_minutes or duration_minutes) * 60)
+        return {
+            'success': True,
+            'calendar_id': calendar_id,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'duration': duration_minutes,
+            'timezone': str(tz),
+            'slots': format_slots(slots, tz),
+            'total_slots': len(slots),
+            'appointments': len(appointments),
+            'busy_intervals': len(busy),
+            'source': 'local' if local else 'ghl',
+            'fetch_ms': round((fetched - started) * 1000, 2),
+            'compute_ms': round((time.perf_counter() - fetched) * 1000, 2),
+        }
+
+    variant = '|'.join(str(part) for part in (
+        start_ts, end_ts, duration_minutes, step_minutes, tz, day_start, day_end,
+        ''.join(map(str, weekdays)), location_id, local,
+    ))
+    return get_response_cache().get_or_fetch(
+        'free_slots', calendar_id, compute,
+        namespace=service.cache_namespace, fresh=fresh, variant=variant,
+    )
@@ -0,0 +1,303 @@
+"""
+Benchmarks de los endpoints de ghl_integration/urls.py, en proceso (django.test.Client) contra
+el stub local de GHL (stub_server.py). Mide la distribución de latencias, la memoria asignada y
+las llamadas a GHL por petición de cada endpoint, guarda baselines en JSON y detecta regresiones.
+La usa `manage.py ghl_bench`.
+"""
+import asyncio
+import io
+import json
+import math
+import platform
+import statistics
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.test import AsyncClient, Client
+from django.urls import URLPattern, get_resolver, resolve, reverse
+
+from .stub_server import STUB_LOCATION_ID
+
+BENCHMARK_VERSION = 1
+
+# Inicio de los horarios de las citas creadas por los benchmarks (cada iteración usa uno distinto)
+_SLOT_BASE = datetime(2030, 1, 7, 0, 0, tzinfo=dt_timezone.utc)
+
+
+class BenchClients:
+    """
+    Clientes de prueba: las vistas síncronas van por Client (WSGI) y las async por AsyncClient en un
+    único event loop persistente, como en un worker ASGI (así el cliente httpx y su pool se reutilizan).
+    """
+
+    def __init__(self):
+        self.client = Client()
+        self.async_client = AsyncClient()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='ghl-bench-loop', daemon=True)
+        self._thread.start()
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+class BenchCase:
+    """
+    Un escenario de benchmark: petición a un endpoint por nombre de URL.
+    `data` puede ser una función del número de iteración para generar cuerpos únicos.
+    """
+
+    def __init__(self, name: str, url_name: str, method: str = 'GET', query: str = '',
+                 data=None, kwargs: Optional[Dict] = None, content_type: str = 'application/json'):
+        self.name = name
+        self.url_name = url_name
+        self.method = method
+        self.query = query
+        self.data = data
+        self.kwargs = kwargs or {}
+        self.content_type = content_type
+
+    @property
+    def path(self) -> str:
+        path = reverse(self.url_name, kwargs=self.kwargs)
+        return f'{path}?{self.query}' if self.query else path
+
+    @property
+    def is_async(self) -> bool:
+        return asyncio.iscoroutinefunction(resolve(reverse(self.url_name, kwargs=self.kwargs)).func)
+
+    def request(self, clients: BenchClients, iteration: int):
+        data = self.data(iteration) if callable(self.data) else self.data
+        if self.is_async:
+            return clients.run(self._arequest(clients.async_client, data))
+        client = clients.client
+        if self.method == 'GET':
+            response = client.get(self.path)
+        elif self.content_type == 'multipart':
+            response = client.post(self.path, data)
+        else:
+            response = client.generic(self.method, self.path, json.dumps(data), content_type=self.content_type)
+        if response.streaming:
+            # El tiempo de una respuesta en streaming incluye generarla entera
+            b''.join(response.streaming_content)
+        return response
+
+    async def _arequest(self, client: AsyncClient, data):
+        if self.method == 'GET':
+            return await client.get(self.path)
+        return await client.generic(self.method, self.path, json.dumps(data), content_type=self.content_type)
+
+
+def _slot(calendar: int, iteration: int, offset: int = 0) -> Dict:
+    start = _SLOT_BASE + timedelta(days=calendar * 400, minutes=30 * (iteration * 20 + offset))
+    return {
+        'calendarId': f'cal_bench_{calendar}',
+        'contactId': 'contact_stub_00001',
+        'locationId': STUB_LOCATION_ID,
+        'startTime': start.isoformat(),
+        'endTime': (start + timedelta(minutes=30)).isoformat(),
+        'title': 'Benchmark',
+    }
+
+
+def _contact(iteration: int) -> Dict:
+    return {'firstName': 'Bench', 'lastName': str(iteration), 'email': f'bench{iteration}@stub.example',
+            'locationId': STUB_LOCATION_ID}
+
+
+def _import_file(iteration: int) -> Dict:
+    rows = '\n'.join(f'Bench,{iteration}-{i},import{iteration}-{i}@stub.example' for i in range(20))
+    upload = io.BytesIO(f'firstName,lastName,email\n{rows}\n'.encode())
+    upload.name = 'contacts.csv'
+    return {'file': upload, 'locationId': STUB_LOCATION_ID, 'importId': f'bench-{uuid.uuid4().hex[:12]}'}
+
+
+def _webhook(iteration: int) -> Dict:
+    return {
+        'type': 'ContactUpdate',
+        'webhookId': f'bench-{uuid.uuid4().hex}',
+        'locationId': STUB_LOCATION_ID,
+        'id': f'contact_stub_{iteration % 250 + 1:05d}',
+        'firstName': 'Webhook',
+        'email': f'contacto{iteration % 250 + 1}@stub.example',
+    }
+
+
+def _free_slots_query() -> str:
+    start = datetime.now(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return f'from={start.isoformat()}&to={(start + timedelta(days=14)).isoformat()}'.replace('+', '%2B')
+
+
+def default_cases() -> List[BenchCase]:
+    free_slots_query = _free_slots_query()
+    return [
+        BenchCase('debug', 'debug_config'),
+        BenchCase('rate_limit', 'rate_limit_status'),
+        BenchCase('stats', 'ghl_stats'),
+        BenchCase('cache', 'response_cache'),
+        BenchCase('metrics', 'ghl_metrics'),
+        BenchCase('ping', 'ghl_ping'),
+        BenchCase('locations', 'ghl_locations'),
+        BenchCase('locations[fresh]', 'ghl_locations', query='fresh=1'),
+        BenchCase('calendars', 'ghl_calendars'),
+        BenchCase('calendars[fresh]', 'ghl_calendars', query='fresh=1'),
+        BenchCase('calendars[local]', 'ghl_calendars', query='source=local'),
+        BenchCase('free_slots', 'calendar_free_slots', kwargs={'calendar_id': 'cal_stub_001'}, query=free_slots_query),
+        BenchCase('free_slots[fresh]', 'calendar_free_slots', kwargs={'calendar_id': 'cal_stub_001'},
+                  query=f'{free_slots_query}&fresh=1'),
+        BenchCase('appointments', 'get_appointments', query='calendarId=cal_stub_001'),
+        BenchCase('appointments[stream]', 'get_appointments', query='calendarId=cal_stub_001&stream=ndjson'),
+        BenchCase('appointments[local]', 'get_appointments', query='source=local&calendarId=cal_stub_001'),
+        BenchCase('appointments[fanout]', 'get_appointments',
+                  query=f'locationIds={STUB_LOCATION_ID}&calendarId=cal_stub_001'),
+        BenchCase('calendars[fanout]', 'ghl_calendars', query=f'locationIds={STUB_LOCATION_ID}'),
+        BenchCase('create_appointment', 'create_appointment', 'POST', data=lambda i: _slot(1, i)),
+        BenchCase('create_appointment[invalid]', 'create_appointment', 'POST',
+                  data=lambda i: {**_slot(1, i), 'startTime': 'no-es-una-fecha'}),
+        BenchCase('bulk_appointments[10]', 'bulk_create_appointments', 'POST',
+                  data=lambda i: {'appointments': [_slot(2, i, offset) for offset in range(10)]}),
+        BenchCase('contacts', 'get_contacts'),
+        BenchCase('contacts[stream]', 'get_contacts', query='stream=ndjson'),
+        BenchCase('contacts[local]', 'get_contacts', query='source=local'),
+        BenchCase('create_contact', 'create_contact', 'POST', data=_contact),
+        BenchCase('import_contacts[20]', 'import_contacts', 'POST', data=_import_file, content_type='multipart'),
+        BenchCase('webhook', 'ghl_webhook', 'POST', data=_webhook),
+        BenchCase('async_ping', 'async_ghl_ping'),
+        BenchCase('async_locations', 'async_ghl_locations'),
+        BenchCase('async_calendars', 'async_ghl_calendars'),
+        BenchCase('async_create_appointment', 'async_create_appointment', 'POST', data=lambda i: _slot(3, i)),
+        BenchCase('async_create_contact', 'async_create_contact', 'POST', data=_contact),
+    ]
+
+
+def uncovered_url_names(cases: Iterable[BenchCase]) -> List[str]:
+    """Nombres de URL de ghl_integration sin ningún escenario (para no olvidar endpoints nuevos)"""
+    covered = {case.url_name for case in cases}
+    names = []
+    for pattern in get_resolver().url_patterns:
+        for sub in getattr(pattern, 'url_patterns', [pattern]):
+            if isinstance(sub, URLPattern) and sub.name and sub.callback.__module__.startswith('ghl_integration.'):
+                names.append(sub.name)
+    return sorted(set(names) - covered)
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Percentil por rango más cercano"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def summarize(values: List[float], digits: int = 3) -> Dict:
+    return {
+        'min': round(min(values), digits),
+        'p50': round(statistics.median(values), digits),
+        'mean': round(statistics.fmean(values), digits),
+        'p95': round(percentile(values, 95), digits),
+        'p99': round(percentile(values, 99), digits),
+        'max': round(max(values), digits),
+        'stdev': round(statistics.pstdev(values), digits),
+    }
+
+
+def run_case(case: BenchCase, clients: BenchClients, upstream_calls: Callable[[], int], iterations: int = 100,
+             warmup: int = 5, alloc_iterations: int = 20) -> Dict:
+    """
+    Ejecuta un escenario: `warmup` peticiones sin medir, `iterations` cronometradas y
+    `alloc_iterations` bajo tracemalloc (aparte, porque tracemalloc ralentiza). La memoria es el
+    pico asignado durante la petición en todo el proceso, stub incluido.
+    """
+    counter = 0
+    for _ in range(warmup):
+        case.request(clients, counter)
+        counter += 1
+
+    latencies, status_codes = [], {}
+    calls_before = upstream_calls()
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = case.request(clients, counter)
+        latencies.append((time.perf_counter() - started) * 1000)
+        status_codes[str(response.status_code)] = status_codes.get(str(response.status_code), 0) + 1
+        counter += 1
+    calls = upstream_calls() - calls_before
+
+    allocations = []
+    if alloc_iterations:
+        tracemalloc.start()
+        try:
+            for _ in range(alloc_iterations):
+                baseline = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                case.request(clients, counter)
+                allocations.append((tracemalloc.get_traced_memory()[1] - baseline) / 1024)
+                counter += 1
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'url_name': case.url_name,
+        'method': case.method,
+        'path': case.path,
+        'iterations': iterations,
+        'status_codes': status_codes,
+        'latency_ms': summarize(latencies),
+        'alloc_kib': summarize(allocations, 1) if allocations else None,
+        'upstream_calls_per_request': round(calls / iterations, 3),
+    }
+
+
+def run_benchmarks(cases: List[BenchCase], upstream_calls: Callable[[], int], iterations: int = 100,
+                   warmup: int = 5, alloc_iterations: int = 20,
+                   progress: Optional[Callable[[str, Dict], None]] = None) -> Dict:
+    clients = BenchClients()
+    results = {}
+    try:
+        for case in cases:
+            results[case.name] = run_case(case, clients, upstream_calls, iterations, warmup, alloc_iterations)
+            if progress:
+                progress(case.name, results[case.name])
+    finally:
+        clients.close()
+    return {
+        'version': BENCHMARK_VERSION,
+        'created_at': datetime.now(dt_timezone.utc).isoformat(),
+        'environment': {'python': platform.python_version(), 'machine': platform.machine(),
+                        'system': platform.system()},
+        'config': {'iterations': iterations, 'warmup': warmup, 'alloc_iterations': alloc_iterations},
+        'results': results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = 0.25, min_delta_ms: float = 0.5,
+            min_delta_kib: float = 16.0) -> List[Dict]:
+    """
+    Regresiones respecto a una baseline: p50 de latencia o de memoria por encima de
+    `threshold` (fracción) y de un mínimo absoluto para no saltar por ruido, o más llamadas a GHL
+    por petición (p.ej. una caché que deja de funcionar).
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        checks = [('latency_ms.p50', result['latency_ms']['p50'], base['latency_ms']['p50'], min_delta_ms)]
+        if result.get('alloc_kib') and base.get('alloc_kib'):
+            checks.append(('alloc_kib.p50', result['alloc_kib']['p50'], base['alloc_kib']['p50'], min_delta_kib))
+        for metric, value, reference, min_delta in checks:
+            if value > reference * (1 + threshold) and value - reference > min_delta:
+                regressions.append({'case': name, 'metric': metric, 'baseline': reference, 'current': value,
+                                    'change': round(value / reference - 1, 3) if reference else None})
+        calls, base_calls = result['upstream_calls_per_request'], base['upstream_calls_per_request']
+        if calls > base_calls + 0.01:
+            regressions.append({'case': name, 'metric': 'upstream_calls_per_request', 'baseline': base_calls,
+                                'current': calls, 'change': round(calls - base_calls, 3)})
+    return regressions
@@ -0,0 +1,49 @@
+"""
+Ejecución concurrente acotada para operaciones masivas contra GHL (citas, contactos, locations)
+"""
+import contextvars
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def run_concurrently(items: Iterable, fn: Callable[[Any], Dict], concurrency: int) -> Iterator[Tuple[int, Any, Dict]]:
+    """
+    Aplica `fn` a cada elemento con como máximo `concurrency` llamadas en vuelo y va
+    devolviendo (índice, elemento, resultado) a medida que terminan.
+
+    Los elementos se consumen de forma perezosa (nunca hay más de `concurrency` pendientes),
+    así que `items` puede ser un generador sobre un archivo grande. Una excepción en `fn`
+    se convierte en un resultado {'success': False, ...} para no cortar el lote.
+    """
+    concurrency = max(1, concurrency)
+    iterator = enumerate(items)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ghl-bulk') as executor:
+        pending = {}
+
+        def submit_next() -> bool:
+            try:
+                index, item = next(iterator)
+            except StopIteration:
+                return False
+            # Con el contexto de la petición: el tiempo de GHL de cada hilo cuenta en Server-Timing
+            pending[executor.submit(contextvars.copy_context().run, fn, item)] = (index, item)
+            return True
+
+        while len(pending) < concurrency and submit_next():
+            pass
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, item = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.exception(f"Error inesperado procesando el elemento {index} del lote")
+                    result = {'success': False, 'error': {'message': str(e)}}
+                yield index, item, result
+                submit_next()
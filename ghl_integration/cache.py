@@ -0,0 +1,346 @@
+"""
+Caché de lectura (read-through) para respuestas de GHL que casi nunca cambian
+(calendarios, ubicaciones), montada sobre el framework de caché de Django.
+"""
+import pickle
+import threading
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.test.signals import setting_changed
+from django.dispatch import receiver
+
+from .metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# TTL por defecto (segundos) de cada endpoint cacheado
+DEFAULT_TTLS = {
+    'calendars': 300,
+    'locations': 900,
+    'free_slots': 60,
+}
+
+
+class GHLResponseCache:
+    """
+    Caché read-through con TTL por endpoint, desalojo LRU y tope de memoria.
+
+    Los valores viven en el backend de caché de Django (alias configurable); este objeto
+    mantiene un índice LRU en memoria del proceso con el tamaño aproximado de cada entrada
+    para aplicar los límites de entradas y bytes, y lleva los contadores de hit/miss.
+
+    La invalidación funciona entre los procesos que comparten el backend (con LocMemCache, el de
+    settings por defecto, solo dentro del proceso): cada entrada guarda las generaciones (global, del
+    endpoint y del endpoint+location) con las que se leyó, y invalidate() incrementa la que toca en
+    el backend compartido. La entrada y sus generaciones se leen juntas con un solo get_many.
+    """
+
+    def __init__(self, alias: str = 'default', ttls: Optional[Dict[str, int]] = None,
+                 max_entries: int = 512, max_bytes: int = 5 * 1024 * 1024, key_prefix: str = 'ghl'):
+        self.alias = alias
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.key_prefix = key_prefix
+
+        self._lock = threading.Lock()
+        # clave -> (endpoint, location_id, tamaño en bytes)
+        self._index: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._bypasses = 0
+        self._evictions = 0
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def _key(self, namespace: str, endpoint: str, location_id: Optional[str], variant: Optional[str] = None) -> str:
+        key = f"{self.key_prefix}:{namespace}:{endpoint}:{location_id or '-'}"
+        return f"{key}:{variant}" if variant else key
+
+    def _generation_keys(self, endpoint: Optional[str] = None, location_id: Optional[str] = None) -> List[str]:
+        """Claves de generación que afectan a una entrada: global, del endpoint y del endpoint+location"""
+        keys = [f"{self.key_prefix}:gen"]
+        if endpoint is not None:
+            keys.append(f"{self.key_prefix}:gen:{endpoint}")
+            keys.append(f"{self.key_prefix}:gen:{endpoint}:{location_id or '-'}")
+        return keys
+
+    @staticmethod
+    def _initial_generation() -> int:
+        # Si el backend desaloja una generación no vuelve a un valor ya usado por entradas viejas
+        return time.time_ns()
+
+    def _generations(self, found: Dict, gen_keys: List[str]) -> tuple:
+        """Generaciones vigentes; crea las que no existen (primera vez o desalojadas)"""
+        for key in gen_keys:
+            if key not in found:
+                # add no pisa la que otro proceso haya creado a la vez; se relee la que quedó
+                self.backend.add(key, self._initial_generation(), None)
+                found[key] = self.backend.get(key)
+        return tuple(found.get(key) for key in gen_keys)
+
+    async def _agenerations(self, found: Dict, gen_keys: List[str]) -> tuple:
+        for key in gen_keys:
+            if key not in found:
+                await self.backend.aadd(key, self._initial_generation(), None)
+                found[key] = await self.backend.aget(key)
+        return tuple(found.get(key) for key in gen_keys)
+
+    def _bump(self, key: str):
+        """Incrementa una generación en el backend compartido (la crea si no existe)"""
+        try:
+            self.backend.incr(key)
+        except ValueError:
+            if not self.backend.add(key, self._initial_generation(), None):
+                self.backend.incr(key)
+
+    async def _abump(self, key: str):
+        try:
+            await self.backend.aincr(key)
+        except ValueError:
+            if not await self.backend.aadd(key, self._initial_generation(), None):
+                await self.backend.aincr(key)
+
+    @staticmethod
+    def _unwrap(entry, generations: tuple) -> Optional[Dict]:
+        """Respuesta guardada, o None si no existe o se invalidó después de guardarla"""
+        if isinstance(entry, dict) and entry.get('generations') == generations:
+            return entry['result']
+        return None
+
+    def get_or_fetch(self, endpoint: str, location_id: Optional[str], fetch: Callable[[], Dict],
+                     namespace: str = 'default', fresh: bool = False, variant: Optional[str] = None) -> Dict:
+        """
+        Devuelve la respuesta cacheada o llama a `fetch()` y guarda el resultado si fue exitoso.
+
+        Args:
+            endpoint: Nombre lógico del endpoint ('calendars', 'locations'), define el TTL
+            location_id: locationId al que pertenece la respuesta
+            fetch: Función que obtiene la respuesta de GHL
+            namespace: Separa cuentas/tokens distintos que compartan backend de caché
+            fresh: Si es True se ignora la entrada cacheada y se refresca (equivale a ?fresh=1)
+            variant: Distingue respuestas del mismo location_id (p.ej. parámetros de la consulta);
+                     invalidate(endpoint, location_id) borra todas sus variantes
+        """
+        ttl = self.ttls.get(endpoint, 0)
+        if ttl <= 0:
+            return fetch()
+
+        key = self._key(namespace, endpoint, location_id, variant)
+        gen_keys = self._generation_keys(endpoint, location_id)
+        bypass = self._count_bypass(endpoint, fresh)
+        found = self.backend.get_many(gen_keys if bypass else [key, *gen_keys])
+        # Se toman antes de llamar a GHL: si se invalida durante el fetch, lo guardado ya nace viejo
+        generations = self._generations(found, gen_keys)
+        if not bypass:
+            cached = self._count_lookup(endpoint, key, self._unwrap(found.get(key), generations))
+            if cached is not None:
+                return cached
+
+        result = fetch()
+        if result.get('success'):
+            evicted = self._index_entry(key, endpoint, location_id, result)
+            if evicted is not None:
+                self.backend.set(key, {'generations': generations, 'result': result}, ttl)
+                if evicted:
+                    self.backend.delete_many(evicted)
+        return {**result, 'cached': False}
+
+    async def aget_or_fetch(self, endpoint: str, location_id: Optional[str], fetch: Callable[[], Awaitable[Dict]],
+                            namespace: str = 'default', fresh: bool = False) -> Dict:
+        """Versión asyncio de get_or_fetch(): `fetch` es una corrutina y se usa la API async de la caché"""
+        ttl = self.ttls.get(endpoint, 0)
+        if ttl <= 0:
+            return await fetch()
+
+        key = self._key(namespace, endpoint, location_id)
+        gen_keys = self._generation_keys(endpoint, location_id)
+        bypass = self._count_bypass(endpoint, fresh)
+        found = await self.backend.aget_many(gen_keys if bypass else [key, *gen_keys])
+        generations = await self._agenerations(found, gen_keys)
+        if not bypass:
+            cached = self._count_lookup(endpoint, key, self._unwrap(found.get(key), generations))
+            if cached is not None:
+                return cached
+
+        result = await fetch()
+        if result.get('success'):
+            evicted = self._index_entry(key, endpoint, location_id, result)
+            if evicted is not None:
+                await self.backend.aset(key, {'generations': generations, 'result': result}, ttl)
+                if evicted:
+                    await self.backend.adelete_many(evicted)
+        return {**result, 'cached': False}
+
+    def _count_bypass(self, endpoint: str, fresh: bool) -> bool:
+        if fresh:
+            with self._lock:
+                self._bypasses += 1
+            record_cache_lookup(endpoint, 'bypass')
+        return fresh
+
+    def _count_lookup(self, endpoint: str, key: str, cached: Optional[Dict]) -> Optional[Dict]:
+        """Actualiza contadores y orden LRU tras leer del backend; devuelve la respuesta marcada como cacheada"""
+        record_cache_lookup(endpoint, 'hit' if cached is not None else 'miss')
+        with self._lock:
+            if cached is not None:
+                self._hits += 1
+                if key in self._index:
+                    self._index.move_to_end(key)
+            else:
+                self._misses += 1
+                # La entrada expiró o la desalojó el backend: sacarla del índice
+                self._forget(key)
+        return {**cached, 'cached': True} if cached is not None else None
+
+    def _index_entry(self, key: str, endpoint: str, location_id: Optional[str], value: Dict) -> Optional[List[str]]:
+        """
+        Registra la entrada en el índice LRU y aplica los límites.
+
+        Returns:
+            Claves desalojadas que hay que borrar del backend, o None si la entrada no debe cachearse
+        """
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            logger.warning(f"Respuesta de {endpoint} ({size} bytes) supera GHL_CACHE_MAX_BYTES, no se cachea")
+            return None
+
+        evicted = []
+        with self._lock:
+            self._forget(key)
+            self._index[key] = (endpoint, location_id, size)
+            self._bytes += size
+            while len(self._index) > self.max_entries or self._bytes > self.max_bytes:
+                old_key, (_, _, old_size) = self._index.popitem(last=False)
+                self._bytes -= old_size
+                self._evictions += 1
+                evicted.append(old_key)
+        return evicted
+
+    def _forget(self, key: str):
+        # Debe llamarse con self._lock tomado
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def invalidate(self, endpoint: Optional[str] = None, location_id: Optional[str] = None) -> int:
+        """
+        Invalida las entradas que coincidan con endpoint y/o location_id (sin filtros: todas) en
+        todos los procesos que compartan el backend, incrementando su generación. Las entradas
+        conocidas por este proceso se borran además del backend para liberar espacio.
+
+        Returns:
+            int: Número de entradas de este proceso invalidadas
+        """
+        for key in self._invalidated_generations(endpoint, location_id):
+            self._bump(key)
+        keys = self._forget_matching(endpoint, location_id)
+        if keys:
+            self.backend.delete_many(keys)
+        logger.info(f"Caché GHL invalidada: {len(keys)} entradas (endpoint={endpoint}, locationId={location_id})")
+        return len(keys)
+
+    async def ainvalidate(self, endpoint: Optional[str] = None, location_id: Optional[str] = None) -> int:
+        """Versión asyncio de invalidate() con la API async de la caché"""
+        for key in self._invalidated_generations(endpoint, location_id):
+            await self._abump(key)
+        keys = self._forget_matching(endpoint, location_id)
+        if keys:
+            await self.backend.adelete_many(keys)
+        logger.info(f"Caché GHL invalidada: {len(keys)} entradas (endpoint={endpoint}, locationId={location_id})")
+        return len(keys)
+
+    def _invalidated_generations(self, endpoint: Optional[str], location_id: Optional[str]) -> List[str]:
+        """Generaciones que hay que incrementar para invalidar endpoint y/o location_id"""
+        if endpoint is None and location_id is None:
+            return [self._generation_keys()[0]]
+        if location_id is None:
+            return [self._generation_keys(endpoint)[1]]
+        return [self._generation_keys(entry_endpoint, location_id)[2]
+                for entry_endpoint in ([endpoint] if endpoint is not None else list(self.ttls))]
+
+    def _forget_matching(self, endpoint: Optional[str], location_id: Optional[str]) -> List[str]:
+        """Saca del índice local las entradas que coinciden; devuelve sus claves"""
+        with self._lock:
+            keys = [
+                key for key, (entry_endpoint, entry_location, _) in self._index.items()
+                if (endpoint is None or entry_endpoint == endpoint)
+                and (location_id is None or entry_location == location_id)
+            ]
+            for key in keys:
+                self._forget(key)
+        return keys
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'backend': self.alias,
+                'ttls': dict(self.ttls),
+                'entries': len(self._index),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'bypasses': self._bypasses,
+                'evictions': self._evictions,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else None,
+            }
+
+
+_response_cache: Optional[GHLResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> GHLResponseCache:
+    """Devuelve la caché de respuestas del proceso, creada a partir de settings"""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = GHLResponseCache(
+                    alias=getattr(settings, 'GHL_CACHE_ALIAS', 'default'),
+                    ttls=getattr(settings, 'GHL_CACHE_TTLS', None),
+                    max_entries=getattr(settings, 'GHL_CACHE_MAX_ENTRIES', 512),
+                    max_bytes=getattr(settings, 'GHL_CACHE_MAX_BYTES', 5 * 1024 * 1024),
+                )
+                _warn_if_process_local(_response_cache.alias)
+    return _response_cache
+
+
+def _warn_if_process_local(alias: str):
+    """
+    Con LocMemCache cada worker tiene su propia caché y sus propias generaciones: invalidate() en un
+    worker no llega a los demás, que siguen sirviendo su copia hasta el TTL. En desarrollo (DEBUG,
+    un solo proceso) da igual; en producción se avisa al crear la caché.
+    """
+    if not settings.DEBUG and isinstance(caches[alias], LocMemCache):
+        logger.warning(
+            f"GHL_CACHE_ALIAS='{alias}' usa LocMemCache (memoria del proceso): con varios workers la "
+            f"invalidación no se comparte. Configura un backend compartido (Redis, Memcached) en CACHES."
+        )
+
+
+def reset_response_cache():
+    """Vacía la caché y descarta la instancia; se recrea con la configuración vigente"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is not None:
+            _response_cache.invalidate()
+        _response_cache = None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    if setting.startswith('GHL_CACHE_') or setting == 'CACHES':
+        reset_response_cache()
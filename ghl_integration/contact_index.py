@@ -0,0 +1,146 @@
+"""
+Índice local de contactos para saber si un paciente ya existe sin pedir a GHL la lista completa.
+
+Vive en el espejo (GHLContact) con claves normalizadas: email en minúsculas, teléfono solo con
+dígitos (guardado al revés para buscar por sufijo, así '600 12 34 56' encuentra '+34600123456')
+y nombre sin tildes ni mayúsculas, en orden "nombre apellido" y "apellido nombre". Lo alimentan
+`manage.py ghl_sync`, los webhooks y las respuestas de create_contact (vista, cola e importación).
+"""
+import logging
+import re
+from typing import Dict, Optional, Tuple
+
+from django.db import DatabaseError, connection
+from django.db.models import Q
+
+from .models import GHLContact
+from .sync import GHLSync, contact_fields, normalize_email, normalize_name, normalize_phone, parse_ghl_datetime
+
+logger = logging.getLogger(__name__)
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+MIN_QUERY_LENGTH = 2
+# Un teléfono se compara por sus últimos dígitos (con o sin prefijo de país)
+PHONE_MATCH_DIGITS = 9
+MIN_PHONE_DIGITS = 4
+
+_PHONE_QUERY = re.compile(r'^[\d\s()+.\-]+$')
+
+
+def _starts_with(field: str, prefix: str) -> Q:
+    """
+    "Empieza por" que aprovecha el índice. En SQLite LIKE no distingue mayúsculas y no usa
+    índices sobre columnas BINARY, así que ahí es un rango (las claves ya están normalizadas);
+    en Postgres LIKE 'x%' usa los índices varchar_pattern_ops.
+    """
+    if connection.vendor == 'sqlite':
+        return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '\U0010ffff'})
+    return Q(**{f'{field}__startswith': prefix})
+
+
+def _phone_suffix(value) -> str:
+    """Clave de búsqueda de un teléfono: sus últimos PHONE_MATCH_DIGITS dígitos, al revés"""
+    return normalize_phone(value)[-PHONE_MATCH_DIGITS:][::-1]
+
+
+def classify_query(query: str) -> Tuple[Optional[str], str]:
+    """
+    Decide cómo buscar: ('email', prefijo), ('phone', sufijo al revés) o ('name', prefijo).
+    Devuelve (None, mensaje) si la consulta es demasiado corta.
+    """
+    query = (query or '').strip()
+    if '@' in query:
+        return 'email', normalize_email(query)
+    if _PHONE_QUERY.match(query) and any(ch.isdigit() for ch in query):
+        if len(normalize_phone(query)) < MIN_PHONE_DIGITS:
+            return None, f'Un teléfono necesita al menos {MIN_PHONE_DIGITS} dígitos'
+        return 'phone', _phone_suffix(query)
+    name = normalize_name(query)
+    if len(name) < MIN_QUERY_LENGTH:
+        return None, f'q debe tener al menos {MIN_QUERY_LENGTH} caracteres'
+    return 'name', name
+
+
+def search_contact_index(query: str, location_id: str, limit: int = SEARCH_DEFAULT_LIMIT) -> Dict:
+    """Contactos de la location que coinciden con `query` (email, teléfono o nombre), del espejo local"""
+    match, key = classify_query(query)
+    if match is None:
+        return {'success': False, 'message': key, 'status_code': 400}
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    contacts = GHLContact.objects.filter(location_id=location_id)
+
+    if match == 'email':
+        rows = list(contacts.filter(_starts_with('email', key)).order_by('email')
+                    .values_list('ghl_id', 'raw')[:limit])
+    elif match == 'phone':
+        rows = list(contacts.filter(_starts_with('phone_key', key)).order_by('phone_key')
+                    .values_list('ghl_id', 'raw')[:limit])
+    else:
+        # Primero los que empiezan por el nombre y después por el apellido, sin repetir
+        rows = list(contacts.filter(_starts_with('name_key', key)).order_by('name_key')
+                    .values_list('ghl_id', 'raw')[:limit])
+        if len(rows) < limit:
+            seen = {ghl_id for ghl_id, _ in rows}
+            by_surname = (contacts.filter(_starts_with('surname_key', key)).order_by('surname_key')
+                          .values_list('ghl_id', 'raw')[:limit])
+            rows.extend(row for row in by_surname if row[0] not in seen)
+            rows = rows[:limit]
+
+    found = [raw for _, raw in rows]
+    return {
+        'success': True,
+        'query': query,
+        'match': match,
+        'contacts': found,
+        'total_contacts': len(found),
+        'source': 'local',
+    }
+
+
+def find_existing_contact(data: Dict, location_id: str) -> Optional[Dict]:
+    """
+    Contacto ya indexado con el mismo email en la location (modo upsert de create_contact).
+    Solo por email: un teléfono compartido (p.ej. el de los padres) no identifica al paciente.
+    """
+    email = normalize_email(data.get('email'))
+    if not email:
+        return None
+    return (GHLContact.objects.filter(location_id=location_id, email=email)
+            .order_by('id').values_list('raw', flat=True).first())
+
+
+def index_contact(contact: Optional[Dict], location_id: str) -> bool:
+    """
+    Guarda en el espejo el contacto que devolvió GHL al crearlo (acepta la respuesta completa
+    {'contact': {...}} o el objeto). Devuelve False si no trae id.
+    """
+    contact = contact or {}
+    contact = contact.get('contact', contact)
+    if not isinstance(contact, dict) or not contact.get('id'):
+        return False
+    location_id = contact.get('locationId') or location_id
+    try:
+        GHLSync._write(GHLContact, [GHLContact(
+            ghl_id=contact['id'],
+            location_id=location_id,
+            raw=contact,
+            ghl_updated_at=parse_ghl_datetime(contact.get('dateUpdated') or contact.get('dateAdded')),
+            **contact_fields(contact, location_id),
+        )])
+    except DatabaseError:
+        # El contacto ya existe en GHL: no fallar la respuesta, lo recogerá el próximo ghl_sync
+        logger.exception(f"No se pudo indexar el contacto {contact['id']}")
+        return False
+    return True
+
+
+def reused_contact_result(contact: Dict) -> Dict:
+    """Misma forma que la respuesta de create_contact, para que el frontend no distinga el caso"""
+    return {
+        'success': True,
+        'message': 'Contacto existente reutilizado (índice local)',
+        'contact': {'contact': contact},
+        'reused': True,
+    }
+
@@ -3,23 +3,70 @@ Servicio para interactuar con la API de GoHighLevel (GHL)
 """
 import requests
 from django.conf import settings
-from typing import Dict, List, Optional
+from django.test.signals import setting_changed
+from django.dispatch import receiver
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode
+import hashlib
 import logging
+import threading
+import time
 from datetime import datetime
+from .bulk import run_concurrently
+from .http_pool import get_connection_pool
+from .cache import get_response_cache
+from .rate_limiter import TokenBucket, RateLimitExceeded, FAIL_FAST
+from .singleflight import singleflight
+from .telemetry import get_rate_limit_telemetry
+from .metrics import track_upstream
+from .profiling import timed
+from .resilience import CircuitOpenError, RetryPolicy, circuit_key, get_circuit_breaker
 
 logger = logging.getLogger(__name__)
 
+# Datos simulados de listados (modo mock)
+MOCK_CONTACTS = [
+    {'id': 'contact_mock_001', 'firstName': 'Juan', 'lastName': 'Pérez', 'email': 'juan@demo.com', 'phone': '+1234567890'},
+    {'id': 'contact_mock_002', 'firstName': 'María', 'lastName': 'García', 'email': 'maria@demo.com', 'phone': '+1234567891'},
+]
+
+# Tamaño de página máximo que acepta GHL en /contacts/
+GHL_MAX_PAGE_SIZE = 100
+
+
+class GHLRequestError(Exception):
+    """Una petición a GHL falló en medio de un recorrido paginado; `result` es el dict de _make_request"""
+
+    def __init__(self, result: Dict):
+        self.result = result
+        error = result.get('error') or {}
+        super().__init__(error.get('message') if isinstance(error, dict) else str(error))
+
+
+# Métodos idempotentes que se pueden coalescer (single-flight) cuando hay llamadas idénticas en vuelo
+COALESCIBLE_METHODS = ('GET', 'HEAD')
+
 
 class GHLService:
     """
     Servicio para manejar todas las interacciones con la API de GHL
     """
     
-    def __init__(self):
-        self.base_url = settings.GHL_BASE_URL
-        self.private_token = settings.GHL_PRIVATE_TOKEN
-        self.default_location_id = getattr(settings, 'GHL_DEFAULT_LOCATION_ID', None)
-        self.mock = getattr(settings, 'GHL_MOCK', False)
+    def __init__(self, base_url: Optional[str] = None, private_token: Optional[str] = None,
+                 default_location_id: Optional[str] = None, mock: Optional[bool] = None,
+                 rate_limit_mode: Optional[str] = None, rate_limiter: Optional[TokenBucket] = None,
+                 retry_policy: Optional[RetryPolicy] = None, tenant=None):
+        # Sin argumentos se usa la configuración global de settings.
+        # `tenant` (ver tenants.py) aporta token, location, pool de conexiones y rate limiter propios.
+        self.tenant = tenant
+        if tenant is not None:
+            private_token = private_token if private_token is not None else tenant.private_token
+            default_location_id = default_location_id if default_location_id is not None else tenant.location_id
+        self.base_url = base_url if base_url is not None else settings.GHL_BASE_URL
+        self.private_token = private_token if private_token is not None else settings.GHL_PRIVATE_TOKEN
+        self.default_location_id = (default_location_id if default_location_id is not None
+                                    else getattr(settings, 'GHL_DEFAULT_LOCATION_ID', None))
+        self.mock = mock if mock is not None else getattr(settings, 'GHL_MOCK', False)
         self.headers = {
             'Authorization': f'Bearer {self.private_token}' if self.private_token else '',
             'Content-Type': 'application/json',
@@ -29,8 +76,26 @@ class GHLService:
         # Algunos entornos requieren LocationId como header además del query param
         if self.default_location_id:
             self.headers['LocationId'] = self.default_location_id
+        # Namespace de caché: evita mezclar respuestas de cuentas/tokens distintos
+        self.cache_namespace = hashlib.sha1(
+            f"{self.base_url}|{self.private_token}|{self.mock}".encode()
+        ).hexdigest()[:12]
+        # Limitador local alimentado por los headers x-ratelimit-*: 'block' espera cupo, 'fail_fast' devuelve 429
+        self.rate_limit_mode = rate_limit_mode or getattr(settings, 'GHL_RATE_LIMIT_MODE', 'block')
+        if rate_limiter is not None:
+            self.rate_limiter = rate_limiter
+        else:
+            overrides = {'capacity': tenant.rate_limit_capacity} if tenant is not None and tenant.rate_limit_capacity else {}
+            self.rate_limiter = (TokenBucket.from_settings(**overrides)
+                                 if getattr(settings, 'GHL_RATE_LIMIT_ENABLED', True) else None)
+        # Reintentos ante 429/5xx/errores de red (solo métodos idempotentes salvo 429)
+        if retry_policy is not None:
+            self.retry_policy = retry_policy
+        else:
+            self.retry_policy = RetryPolicy.from_settings() if getattr(settings, 'GHL_RETRY_ENABLED', True) else None
     
-    def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
+    def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None,
+                      block: Optional[bool] = None) -> Dict:
         """
         Método privado para hacer peticiones HTTP a la API de GHL
         
@@ -38,6 +103,8 @@ class GHLService:
             method: Método HTTP (GET, POST, PUT, DELETE)
             endpoint: Endpoint de la API (sin el base URL)
             data: Datos para enviar en el body (opcional)
+            block: Si no hay cupo en el rate limiter, True espera y False falla con 429.
+                   Por defecto depende de GHL_RATE_LIMIT_MODE.
         
         Returns:
             Dict: Respuesta de la API
@@ -46,70 +113,206 @@ class GHLService:
 
         # Si está activado el modo mock, devolvemos datos simulados según el endpoint
         if self.mock:
-            return self._mock_response(method, endpoint, data)
+            return self._mock_request(method, endpoint, data)
         
+        # Llamadas idénticas concurrentes (mismo método, endpoint y location) comparten una sola petición
+        key = self._coalesce_key(method, endpoint)
+        with timed('ghl_call'):
+            if key is not None:
+                return singleflight.do(key, lambda: self._send_request(method, url, endpoint, data, block))
+            return self._send_request(method, url, endpoint, data, block)
+    
+    def _coalesce_key(self, method: str, endpoint: str) -> Optional[Tuple]:
+        """Clave single-flight de la petición, o None si no se debe coalescer"""
+        if method.upper() not in COALESCIBLE_METHODS or not getattr(settings, 'GHL_SINGLEFLIGHT_ENABLED', True):
+            return None
+        return (self.cache_namespace, self.default_location_id, method.upper(), endpoint)
+    
+    def _send_request(self, method: str, url: str, endpoint: str, data: Optional[Dict],
+                      block: Optional[bool]) -> Dict:
+        """Envía la petición a GHL reintentando según self.retry_policy"""
+        attempt = 1
+        result = self._attempt_request(method, url, endpoint, data, block)
+        while self.retry_policy is not None and self.retry_policy.should_retry(method, result, attempt):
+            delay = self.retry_policy.delay(attempt, result)
+            self._log_retry(method, endpoint, result, attempt, delay)
+            self.retry_policy.sleep(delay)
+            attempt += 1
+            result = self._attempt_request(method, url, endpoint, data, block)
+        return self._with_attempts(result, attempt)
+    
+    def _attempt_request(self, method: str, url: str, endpoint: str, data: Optional[Dict],
+                         block: Optional[bool]) -> Dict:
+        """Un intento: circuit breaker del endpoint, rate limiter local y petición HTTP"""
+        breaker = get_circuit_breaker()
+        circuit = circuit_key(self.cache_namespace, endpoint)
+        if breaker is not None:
+            try:
+                breaker.before_request(circuit)
+            except CircuitOpenError as e:
+                return self._circuit_open_result(method, endpoint, e)
+        
+        recorded = False
         try:
-            logger.info(f"Haciendo petición {method} a {url}")
-            logger.info(f"Headers: {self.headers}")
-            if data:
-                logger.info(f"Datos: {data}")
-            
-            response = requests.request(
-                method=method,
-                url=url,
-                headers=self.headers,
-                json=data,
-                timeout=30
-            )
-            
-            logger.info(f"Respuesta recibida: Status {response.status_code}")
-            logger.info(f"Respuesta headers: {dict(response.headers)}")
+            if self.rate_limiter is not None:
+                try:
+                    self.rate_limiter.acquire(block=self._should_block(block),
+                                              timeout=getattr(settings, 'GHL_RATE_LIMIT_MAX_WAIT', 30.0))
+                except RateLimitExceeded as e:
+                    return self._local_rate_limit_result(method, endpoint, e)
             
-            # ✨ NUEVO: Capturar y loggear rate limits
-            self._log_rate_limits(response.headers)
+            self._log_request(method, url, data)
+            response = None
+            # Solo se cronometra la espera HTTP, sin el logging ni el procesado de la respuesta
+            with track_upstream(method, endpoint) as call, timed('ghl'):
+                try:
+                    # Sesión compartida del proceso (o la del tenant): reutiliza conexiones keep-alive hacia GHL
+                    response = get_connection_pool(self.tenant).request(
+                        method=method,
+                        url=url,
+                        headers=self.headers,
+                        json=data,
+                    )
+                    call.status = str(response.status_code)
+                except requests.exceptions.RequestException as e:
+                    timeout = isinstance(e, requests.exceptions.Timeout)
+                    call.status = 'timeout' if timeout else 'error'
+                    result = self._connection_error_result(e, timeout=timeout)
+            if response is not None:
+                result = self._process_response(response, endpoint)
             
-            # Si la respuesta es exitosa, retornamos el JSON
-            if response.status_code in [200, 201]:
+            if breaker is not None:
+                breaker.record(circuit, result)
+                recorded = True
+            return result
+        finally:
+            # Rate limit local o cualquier excepción: sin resultado, la prueba half-open queda libre
+            if breaker is not None and not recorded:
+                breaker.release(circuit)
+    
+    def _log_retry(self, method: str, endpoint: str, result: Dict, attempt: int, delay: float):
+        logger.warning(f"🔁 {method} {endpoint} falló con {result.get('status_code')}; "
+                       f"intento {attempt + 1}/{self.retry_policy.max_attempts} en {delay:.2f}s")
+    
+    @staticmethod
+    def _with_attempts(result: Dict, attempt: int) -> Dict:
+        # Solo se anota cuando hubo reintentos, para no cambiar la forma de las respuestas normales
+        if attempt > 1:
+            result = {**result, 'attempts': attempt}
+        return result
+    
+    def _circuit_open_result(self, method: str, endpoint: str, error: CircuitOpenError) -> Dict:
+        logger.warning(f"🔌 {error} ({method} {endpoint})")
+        return {
+            'success': False,
+            'error': {'message': f'GHL no está disponible: {error}', 'retry_after': round(error.retry_after, 1)},
+            'status_code': 503,
+            'circuit': error.circuit,
+        }
+    
+    def _should_block(self, block: Optional[bool]) -> bool:
+        """Resuelve el modo del rate limiter: argumento explícito o GHL_RATE_LIMIT_MODE"""
+        return block if block is not None else self.rate_limit_mode != FAIL_FAST
+    
+    def _local_rate_limit_result(self, method: str, endpoint: str, error: RateLimitExceeded) -> Dict:
+        logger.warning(f"🚦 {error} ({method} {endpoint})")
+        return {
+            'success': False,
+            'error': {'message': str(error), 'retry_after': round(error.retry_after, 3)},
+            'status_code': 429,
+            'local_rate_limit': self.rate_limiter.state()
+        }
+    
+    def _log_request(self, method: str, url: str, data: Optional[Dict]):
+        logger.info(f"Haciendo petición {method} a {url}")
+        logger.info(f"Headers: {self.headers}")
+        if data:
+            logger.info(f"Datos: {data}")
+    
+    def _process_response(self, response, endpoint: Optional[str] = None) -> Dict:
+        """
+        Convierte la respuesta HTTP (requests o httpx) al dict estándar del servicio,
+        alimenta el rate limiter con sus headers y los guarda en la telemetría
+        """
+        logger.info(f"Respuesta recibida: Status {response.status_code}")
+        logger.info(f"Respuesta headers: {dict(response.headers)}")
+        
+        # ✨ NUEVO: Capturar y loggear rate limits (los headers se leen una sola vez)
+        rate_limit_info = self._extract_rate_limit_info(response.headers)
+        self._log_rate_limits(response.headers, rate_limit_info)
+        get_rate_limit_telemetry().record(rate_limit_info, response.status_code, endpoint,
+                                          namespace=self.cache_namespace)
+        if self.rate_limiter is not None:
+            self.rate_limiter.update_from_headers(rate_limit_info, response.status_code)
+        
+        # Si la respuesta es exitosa, retornamos el JSON
+        if response.status_code in [200, 201]:
+            try:
+                body = response.json()
+            except ValueError:
+                # p.ej. una página HTML de un proxy: GHL no dio una respuesta válida
+                logger.error(f"Respuesta {response.status_code} sin JSON válido de GHL ({endpoint})")
                 result_data = {
-                    'success': True,
-                    'data': response.json(),
-                    'status_code': response.status_code
+                    'success': False,
+                    'error': {'message': 'GHL devolvió una respuesta que no es JSON',
+                              'body': response.text[:500]},
+                    'status_code': 502
                 }
-                
-                # ✨ Incluir info de rate limits en la respuesta
-                rate_limit_info = self._extract_rate_limit_info(response.headers)
                 if rate_limit_info:
                     result_data['rate_limit'] = rate_limit_info
-                    
                 return result_data
-            else:
-                # Si hay error, retornamos información del error
-                error_data = {}
-                try:
-                    error_data = response.json()
-                except:
-                    error_data = {'message': response.text}
+            result_data = {
+                'success': True,
+                'data': body,
+                'status_code': response.status_code
+            }
+            
+            # ✨ Incluir info de rate limits en la respuesta
+            if rate_limit_info:
+                result_data['rate_limit'] = rate_limit_info
                 
-                result_data = {
-                    'success': False,
-                    'error': error_data,
-                    'status_code': response.status_code
-                }
+            return result_data
+        else:
+            # Si hay error, retornamos información del error
+            error_data = {}
+            try:
+                error_data = response.json()
+            except ValueError:
+                error_data = {'message': response.text}
+            
+            result_data = {
+                'success': False,
+                'error': error_data,
+                'status_code': response.status_code
+            }
+            
+            # ✨ NUEVO: Incluir info de rate limits incluso en errores (401, 429, etc.)
+            if rate_limit_info:
+                result_data['rate_limit'] = rate_limit_info
                 
-                # ✨ NUEVO: Incluir info de rate limits incluso en errores (401, 429, etc.)
-                rate_limit_info = self._extract_rate_limit_info(response.headers)
-                if rate_limit_info:
-                    result_data['rate_limit'] = rate_limit_info
-                    
-                return result_data
-        
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error en petición a GHL API: {str(e)}")
+            return result_data
+    
+    def _connection_error_result(self, error: Exception, timeout: bool = False) -> Dict:
+        """Error de red sin respuesta de GHL: 504 si fue un timeout, 502 en otro caso"""
+        logger.error(f"Error en petición a GHL API: {str(error)}")
+        if timeout:
             return {
                 'success': False,
-                'error': {'message': f'Error de conexión: {str(e)}'},
-                'status_code': 500
+                'error': {'message': f'Timeout esperando a GHL: {str(error)}'},
+                'status_code': 504
             }
+        return {
+            'success': False,
+            'error': {'message': f'Error de conexión: {str(error)}'},
+            'status_code': 502
+        }
+    
+    def _mock_request(self, method: str, endpoint: str, data: Optional[Dict]) -> Dict:
+        """Respuesta mock con sus rate limits simulados registrados en la telemetría"""
+        result = self._mock_response(method, endpoint, data)
+        get_rate_limit_telemetry().record(result.get('rate_limit'), result.get('status_code'), endpoint,
+                                          source='mock', namespace=self.cache_namespace)
+        return result
     
     def _mock_response(self, method: str, endpoint: str, data: Optional[Dict]) -> Dict:
         """Respuestas simuladas para desarrollo sin depender de GHL real"""
@@ -177,6 +380,33 @@ class GHLService:
                 'rate_limit': mock_rate_limit
             }
         
+        # Mock listar contactos
+        if method == 'GET' and endpoint.endswith('/contacts'):
+            return {
+                'success': True,
+                'data': {'contacts': MOCK_CONTACTS, 'meta': {'total': len(MOCK_CONTACTS)}},
+                'status_code': 200,
+                'rate_limit': mock_rate_limit
+            }
+        
+        # Mock listar citas
+        if method == 'GET' and endpoint.endswith('/calendars/events'):
+            events = [{
+                'id': 'apt_mock_001',
+                'calendarId': 'cal_mock_001',
+                'contactId': 'contact_mock_001',
+                'startTime': '2025-01-15T14:00:00Z',
+                'endTime': '2025-01-15T14:30:00Z',
+                'title': 'Cita de prueba (mock)',
+                'status': 'confirmed'
+            }]
+            return {
+                'success': True,
+                'data': {'events': events},
+                'status_code': 200,
+                'rate_limit': mock_rate_limit
+            }
+        
         # Mock crear contacto
         if method == 'POST' and endpoint.endswith('/contacts'):
             contact = {
@@ -212,6 +442,7 @@ class GHLService:
             'X-RateLimit-Remaining': 'remaining', 
             'X-RateLimit-Reset': 'reset',
             'X-RateLimit-Used': 'used',
+            'Retry-After': 'retry_after',
             'X-Rate-Limit-Limit': 'limit',  # Variante con guiones
             'X-Rate-Limit-Remaining': 'remaining',
             'X-Rate-Limit-Reset': 'reset',
@@ -247,15 +478,13 @@ class GHLService:
         
         return rate_limit_info if rate_limit_info else None
     
-    def _log_rate_limits(self, headers):
-        """Loggea información de rate limits en la consola de Django"""
+    def _log_rate_limits(self, headers, rate_info: Optional[Dict]):
+        """Loggea información de rate limits (ya extraída de los headers) en la consola de Django"""
         # 🔍 DEBUG: Mostrar todos los headers que empiecen con 'x-ratelimit' o similar
         rate_headers = {k: v for k, v in headers.items() if 'ratelimit' in k.lower() or 'rate-limit' in k.lower()}
         if rate_headers:
             logger.info(f"🔍 DEBUG HEADERS: {rate_headers}")
         
-        rate_info = self._extract_rate_limit_info(headers)
-        
         if rate_info:
             # Construir mensaje informativo
             msg_parts = ["🚦 RATE LIMIT INFO"]
@@ -317,56 +546,75 @@ class GHLService:
         # Primer intento: listar locations (puede requerir permisos específicos)
         locations_try = self._make_request('GET', '/locations/search')
         if locations_try['success']:
-            locations = locations_try['data'].get('locations', [])
-            result = {
-                'success': True,
-                'message': f'Conexión exitosa! Se encontraron {len(locations)} ubicaciones.',
-                'data': {
-                    'total_locations': len(locations),
-                    'locations': locations[:3]
-                }
-            }
-            # Incluir rate limits si están disponibles
-            if 'rate_limit' in locations_try:
-                result['rate_limit'] = locations_try['rate_limit']
-            return result
+            return self._connection_from_locations(locations_try)
         
         # Segundo intento: usar locationId por defecto (si está configurado)
         if self.default_location_id:
             calendars_try = self._make_request('GET', f'/calendars/?locationId={self.default_location_id}')
             if calendars_try['success']:
-                calendars = calendars_try['data'].get('calendars', [])
-                result = {
-                    'success': True,
-                    'message': f'Conexión exitosa usando locationId preconfigurado. {len(calendars)} calendarios disponibles.',
-                    'data': {
-                        'location_id': self.default_location_id,
-                        'total_calendars': len(calendars),
-                        'calendars_sample': calendars[:3]
-                    }
-                }
-                # ✨ NUEVO: Intentar preservar rate limits del primer intento o usar del segundo
-                if 'rate_limit' in calendars_try:
-                    result['rate_limit'] = calendars_try['rate_limit']
-                elif 'rate_limit' in locations_try:
-                    result['rate_limit'] = locations_try['rate_limit']
-                return result
+                return self._connection_from_calendars(calendars_try, locations_try)
         
+        return self._connection_failed(locations_try)
+    
+    def _connection_from_locations(self, locations_try: Dict) -> Dict:
+        locations = locations_try['data'].get('locations', [])
+        result = {
+            'success': True,
+            'message': f'Conexión exitosa! Se encontraron {len(locations)} ubicaciones.',
+            'data': {
+                'total_locations': len(locations),
+                'locations': locations[:3]
+            }
+        }
+        # Incluir rate limits si están disponibles
+        if 'rate_limit' in locations_try:
+            result['rate_limit'] = locations_try['rate_limit']
+        return result
+    
+    def _connection_from_calendars(self, calendars_try: Dict, locations_try: Dict) -> Dict:
+        calendars = calendars_try['data'].get('calendars', [])
+        result = {
+            'success': True,
+            'message': f'Conexión exitosa usando locationId preconfigurado. {len(calendars)} calendarios disponibles.',
+            'data': {
+                'location_id': self.default_location_id,
+                'total_calendars': len(calendars),
+                'calendars_sample': calendars[:3]
+            }
+        }
+        # ✨ NUEVO: Intentar preservar rate limits del primer intento o usar del segundo
+        if 'rate_limit' in calendars_try:
+            result['rate_limit'] = calendars_try['rate_limit']
+        elif 'rate_limit' in locations_try:
+            result['rate_limit'] = locations_try['rate_limit']
+        return result
+    
+    def _connection_failed(self, locations_try: Dict) -> Dict:
         return {
             'success': False,
             'message': 'Error al conectar con GHL API',
             'error': locations_try.get('error', {'message': 'Unknown error'})
         }
     
-    def get_locations(self) -> Dict:
+    def get_locations(self, fresh: bool = False) -> Dict:
         """
         Obtiene todas las ubicaciones (subcuentas) disponibles
         
+        Args:
+            fresh: Si es True ignora la caché y consulta GHL
+        
         Returns:
             Dict: Lista de ubicaciones
         """
-        result = self._make_request('GET', '/locations/search')
-        
+        return get_response_cache().get_or_fetch(
+            'locations', None, self._fetch_locations,
+            namespace=self.cache_namespace, fresh=fresh,
+        )
+    
+    def _fetch_locations(self) -> Dict:
+        return self._locations_result(self._make_request('GET', '/locations/search'))
+    
+    def _locations_result(self, result: Dict) -> Dict:
         if result['success']:
             return {
                 'success': True,
@@ -375,12 +623,13 @@ class GHLService:
         else:
             return result
     
-    def get_calendars(self, location_id: Optional[str] = None) -> Dict:
+    def get_calendars(self, location_id: Optional[str] = None, fresh: bool = False) -> Dict:
         """
-        Ejercicio 4: Obtiene los calendarios disponibles
+        Ejercicio 4: Obtiene los calendarios disponibles (cacheados por locationId)
         
         Args:
             location_id: ID de la ubicación. Si no se proporciona, se usa GHL_DEFAULT_LOCATION_ID.
+            fresh: Si es True ignora la caché y consulta GHL
         
         Returns:
             Dict: Lista de calendarios
@@ -388,31 +637,168 @@ class GHLService:
         # Resolver locationId: query param o .env
         effective_location_id = location_id or self.default_location_id
         if not effective_location_id:
-            return {
-                'success': False,
-                'error': {'message': 'Se requiere locationId. Proporciónalo en la query o configura GHL_DEFAULT_LOCATION_ID en .env'}
-            }
+            return self._location_required_error()
         
+        return get_response_cache().get_or_fetch(
+            'calendars', effective_location_id,
+            lambda: self._fetch_calendars(effective_location_id),
+            namespace=self.cache_namespace, fresh=fresh,
+        )
+    
+    def _location_required_error(self) -> Dict:
+        return {
+            'success': False,
+            'error': {'message': 'Se requiere locationId. Proporciónalo en la query o configura GHL_DEFAULT_LOCATION_ID en .env'}
+        }
+    
+    def _fetch_calendars(self, effective_location_id: str) -> Dict:
         # Obtener calendarios para la ubicación
         result = self._make_request('GET', f'/calendars/?locationId={effective_location_id}')
-        
+        return self._calendars_result(result, effective_location_id)
+    
+    def _calendars_result(self, result: Dict, effective_location_id: str) -> Dict:
         if result['success']:
             calendars = result['data'].get('calendars', [])
-            return {
+            response = {
                 'success': True,
                 'calendars': calendars,
                 'total_calendars': len(calendars),
                 'location_id': effective_location_id
             }
+            if result.get('rate_limit'):
+                response['rate_limit'] = result['rate_limit']
+            return response
         else:
             return result
     
-    def create_appointment(self, appointment_data: Dict) -> Dict:
+    def get_appointments(self, location_id: Optional[str] = None, calendar_id: Optional[str] = None,
+                         start_time: Optional[str] = None, end_time: Optional[str] = None) -> Dict:
+        """
+        Obtiene las citas (eventos) de una location, opcionalmente de un calendario y un rango
+        
+        Args:
+            location_id: ID de la ubicación. Si no se proporciona, se usa GHL_DEFAULT_LOCATION_ID.
+            calendar_id: Filtra por calendario (opcional)
+            start_time, end_time: Rango de fechas tal como lo acepta GHL (opcional)
+        """
+        effective_location_id = location_id or self.default_location_id
+        if not effective_location_id:
+            return self._location_required_error()
+        result = self._make_request('GET', self._appointments_endpoint(effective_location_id, calendar_id,
+                                                                       start_time, end_time))
+        return self._appointments_result(result, effective_location_id)
+    
+    @staticmethod
+    def _appointments_endpoint(location_id: str, calendar_id: Optional[str], start_time: Optional[str],
+                               end_time: Optional[str]) -> str:
+        params = {'locationId': location_id, 'calendarId': calendar_id,
+                  'startTime': start_time, 'endTime': end_time}
+        return f"/calendars/events?{urlencode({k: v for k, v in params.items() if v})}"
+    
+    def _appointments_result(self, result: Dict, effective_location_id: str) -> Dict:
+        if not result['success']:
+            return result
+        events = result['data'].get('events', [])
+        response = {
+            'success': True,
+            'appointments': events,
+            'total_appointments': len(events),
+            'location_id': effective_location_id,
+        }
+        if result.get('rate_limit'):
+            response['rate_limit'] = result['rate_limit']
+        return response
+    
+    def fan_out(self, location_ids: List[str], fetch: Callable[[str], Dict], items_key: str,
+                concurrency: Optional[int] = None) -> Dict:
+        """
+        Llama a `fetch(location_id)` para varias locations a la vez (como mucho `concurrency`
+        en vuelo, por defecto GHL_FANOUT_MAX_CONCURRENCY) y combina los resultados: la latencia
+        total se acerca a la de la location más lenta en lugar de a la suma.
+        
+        Returns:
+            Dict: `items_key` con los elementos de todas las locations (cada uno con su locationId),
+            `locations` con el resultado de cada una (éxito o error, rate limit, caché y tiempo) y
+            `failed_locations`. success es False solo si fallaron todas.
+        """
+        concurrency = concurrency or getattr(settings, 'GHL_FANOUT_MAX_CONCURRENCY', 10)
+        started = time.perf_counter()
+        
+        def timed_fetch(location_id: str) -> Dict:
+            call_started = time.perf_counter()
+            result = fetch(location_id)
+            return {**result, 'elapsed_ms': round((time.perf_counter() - call_started) * 1000, 2)}
+        
+        results: Dict[int, Dict] = {}
+        for index, _, result in run_concurrently(location_ids, timed_fetch, concurrency):
+            results[index] = result
+        return self._fan_out_result(location_ids, results, items_key, started)
+    
+    @staticmethod
+    def _fan_out_result(location_ids: List[str], results: Dict[int, Dict], items_key: str, started: float) -> Dict:
+        """Combina los resultados de cada location (por índice) en la respuesta de fan_out"""
+        items, locations, failed = [], {}, []
+        for index, location_id in enumerate(location_ids):
+            result = results[index]
+            summary = {key: result[key] for key in ('success', 'status_code', 'error', 'rate_limit', 'cached', 'elapsed_ms')
+                       if key in result}
+            if result.get('success'):
+                location_items = result.get(items_key, [])
+                summary['total'] = len(location_items)
+                items.extend(item if item.get('locationId') else {**item, 'locationId': location_id}
+                             for item in location_items)
+            else:
+                failed.append(location_id)
+            locations[location_id] = summary
+        
+        return {
+            'success': len(failed) < len(location_ids),
+            items_key: items,
+            f'total_{items_key}': len(items),
+            'location_ids': location_ids,
+            'locations': locations,
+            'failed_locations': failed,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+        }
+    
+    def _services_for_locations(self, location_ids: List[str]) -> Dict[str, 'GHLService']:
+        """
+        Servicio con el que se consulta cada location: el de su tenant si tiene token propio,
+        si no esta instancia. Se resuelve antes de repartir las llamadas entre hilos.
+        """
+        from .tenants import get_tenant
+        services = {}
+        for location_id in location_ids:
+            tenant = get_tenant(location_id)
+            services[location_id] = get_tenant_service(tenant, type(self)) if tenant is not None else self
+        return services
+    
+    def get_calendars_for_locations(self, location_ids: List[str], fresh: bool = False,
+                                    concurrency: Optional[int] = None) -> Dict:
+        """Calendarios de varias locations en paralelo (ver fan_out); cada location usa su caché y su tenant"""
+        services = self._services_for_locations(location_ids)
+        return self.fan_out(location_ids,
+                            lambda location_id: services[location_id].get_calendars(location_id, fresh=fresh),
+                            'calendars', concurrency)
+    
+    def get_appointments_for_locations(self, location_ids: List[str], calendar_id: Optional[str] = None,
+                                       start_time: Optional[str] = None, end_time: Optional[str] = None,
+                                       concurrency: Optional[int] = None) -> Dict:
+        """Citas de varias locations en paralelo (ver fan_out)"""
+        services = self._services_for_locations(location_ids)
+        return self.fan_out(
+            location_ids,
+            lambda location_id: services[location_id].get_appointments(location_id, calendar_id, start_time, end_time),
+            'appointments', concurrency,
+        )
+    
+    def create_appointment(self, appointment_data: Dict, block: Optional[bool] = None) -> Dict:
         """
         Ejercicio 5: Crea una nueva cita en GHL
         
         Args:
             appointment_data: Datos de la cita a crear
+            block: Modo del rate limiter para esta llamada (ver _make_request)
             
         Expected format:
         {
@@ -424,11 +810,30 @@ class GHLService:
             "appointmentStatus": "confirmed"
         }
         
+        Antes de llamar a GHL pasa el pre-flight (preflight.py): horarios parseables, inicio anterior
+        al fin y sin solape con otras citas del calendario; si falla devuelve el error sin gastar
+        una petición (status_code 400, o 409 si hay solape).
+        
         Returns:
             Dict: Resultado de la creación
         """
-        result = self._make_request('POST', '/calendars/events/appointments', appointment_data)
-        
+        # Import diferido: preflight usa sync.py, que importa este módulo
+        from .preflight import check_appointment
+        appointment_data, error, finish = check_appointment(appointment_data)
+        if error:
+            return error
+        result = {'success': False}
+        try:
+            result = self._make_request('POST', '/calendars/events/appointments', appointment_data, block=block)
+        finally:
+            if finish is not None:
+                finish(result)
+        if result['success'] and appointment_data.get('calendarId'):
+            # La nueva cita ocupa horario: los huecos libres cacheados del calendario ya no valen
+            get_response_cache().invalidate('free_slots', appointment_data['calendarId'])
+        return self._appointment_result(result)
+    
+    def _appointment_result(self, result: Dict) -> Dict:
         if result['success']:
             return {
                 'success': True,
@@ -436,18 +841,19 @@ class GHLService:
                 'appointment': result['data']
             }
         else:
-            return {
-                'success': False,
-                'message': 'Error al crear la cita',
-                'error': result['error']
-            }
+            # Conserva status_code, local_rate_limit y circuit: la idempotencia los usa para no
+            # guardar los rechazos que nunca llegaron a GHL (ver idempotency._should_store)
+            failure = {key: value for key, value in result.items() if key not in ('data', 'success')}
+            failure.update({'success': False, 'message': 'Error al crear la cita', 'error': result['error']})
+            return failure
     
-    def create_contact(self, contact_data: Dict) -> Dict:
+    def create_contact(self, contact_data: Dict, block: Optional[bool] = None) -> Dict:
         """
         Crea un nuevo contacto en GHL (útil para las citas)
         
         Args:
             contact_data: Datos del contacto
+            block: Modo del rate limiter para esta llamada (ver _make_request)
             
         Expected format:
         {
@@ -461,8 +867,10 @@ class GHLService:
         Returns:
             Dict: Resultado de la creación
         """
-        result = self._make_request('POST', '/contacts/', contact_data)
-        
+        result = self._make_request('POST', '/contacts/', contact_data, block=block)
+        return self._contact_result(result)
+    
+    def _contact_result(self, result: Dict) -> Dict:
         if result['success']:
             return {
                 'success': True,
@@ -471,3 +879,181 @@ class GHLService:
             }
         else:
             return result
+
+    
+    def _paginate(self, endpoint: str, params: Dict, items_key: str,
+                  page_size: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Recorre un listado de GHL página a página de forma perezosa: solo pide la siguiente
+        página cuando el consumidor terminó la anterior, así la memoria no crece con el total.
+        Sigue los cursores `meta.startAfterId` / `meta.startAfter` que devuelve GHL.
+        
+        Raises:
+            GHLRequestError: Si alguna página falla
+        """
+        params = self._page_params(params, page_size)
+        while True:
+            result = self._make_request('GET', f"{endpoint}?{urlencode(params)}")
+            if not result['success']:
+                raise GHLRequestError(result)
+            
+            body = result['data'] or {}
+            items = body.get(items_key) or []
+            yield from items
+            if not self._next_page(params, body, items, page_size):
+                break
+    
+    @staticmethod
+    def _page_params(params: Dict, page_size: Optional[int]) -> Dict:
+        params = {k: v for k, v in params.items() if v}
+        if page_size:
+            params['limit'] = min(page_size, GHL_MAX_PAGE_SIZE)
+        return params
+    
+    @staticmethod
+    def _next_page(params: Dict, body: Dict, items: List, page_size: Optional[int]) -> bool:
+        """Avanza `params` al cursor de la siguiente página; False si ya no hay más"""
+        meta = body.get('meta') or {}
+        cursor = {
+            'startAfterId': meta.get('startAfterId'),
+            'startAfter': meta.get('startAfter'),
+        }
+        if not items or not any(cursor.values()):
+            return False
+        if page_size and len(items) < params['limit']:
+            return False
+        # Protección ante un cursor que no avanza
+        if all(params.get(k) == v for k, v in cursor.items()):
+            return False
+        params.update({k: v for k, v in cursor.items() if v})
+        return True
+    
+    def iter_contacts(self, location_id: Optional[str] = None, page_size: int = GHL_MAX_PAGE_SIZE) -> Iterator[Dict]:
+        """
+        Itera todos los contactos de una location siguiendo la paginación de GHL
+        
+        Args:
+            location_id: ID de la ubicación. Si no se proporciona, se usa GHL_DEFAULT_LOCATION_ID.
+            page_size: Contactos por página (máximo 100)
+        """
+        return self._paginate('/contacts/', {'locationId': location_id or self.default_location_id},
+                              'contacts', page_size=page_size)
+    
+    def iter_appointments(self, location_id: Optional[str] = None, calendar_id: Optional[str] = None,
+                          start_time: Optional[str] = None, end_time: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Itera las citas (eventos) de una location/calendario siguiendo la paginación de GHL
+        
+        Args:
+            location_id: ID de la ubicación. Si no se proporciona, se usa GHL_DEFAULT_LOCATION_ID.
+            calendar_id: Filtra por calendario (opcional)
+            start_time, end_time: Rango de fechas tal como lo acepta GHL (opcional)
+        """
+        params = {
+            'locationId': location_id or self.default_location_id,
+            'calendarId': calendar_id,
+            'startTime': start_time,
+            'endTime': end_time,
+        }
+        return self._paginate('/calendars/events', params, 'events')
+
+
+# Registro de servicios por proceso: las vistas reutilizan la misma instancia entre peticiones
+# para conservar su estado en memoria (pools, cachés, contadores de rate limit).
+_services: Dict[Tuple, GHLService] = {}
+_services_lock = threading.Lock()
+
+
+def _service_key() -> Tuple:
+    """Clave del registro: (base_url, token, location, mock) según la configuración vigente"""
+    return (
+        settings.GHL_BASE_URL,
+        settings.GHL_PRIVATE_TOKEN,
+        getattr(settings, 'GHL_DEFAULT_LOCATION_ID', None),
+        getattr(settings, 'GHL_MOCK', False),
+    )
+
+
+def get_ghl_service(service_class: Optional[type] = None, location_id: Optional[str] = None) -> GHLService:
+    """
+    Devuelve la instancia de GHLService del proceso para la configuración actual.
+    Si los settings cambian (p.ej. override en tests), la clave cambia y se construye una nueva.
+    
+    Args:
+        service_class: Variante del servicio (p.ej. AsyncGHLService). Por defecto GHLService.
+        location_id: Si la location es un tenant con token propio (ver tenants.py), devuelve
+                     el servicio de ese tenant; si no, el global (GHL_PRIVATE_TOKEN).
+    """
+    if location_id:
+        from .tenants import get_tenant
+        tenant = get_tenant(location_id)
+        if tenant is not None:
+            return get_tenant_service(tenant, service_class)
+    service_class = service_class or GHLService
+    key = (service_class,) + _service_key()
+    service = _services.get(key)
+    if service is None:
+        extra = {}
+        if service_class is not GHLService:
+            # Las variantes comparten el rate limiter (y la política de reintentos) del servicio
+            # síncrono: consumen la misma cuota de GHL
+            sync_service = get_ghl_service()
+            extra['rate_limiter'] = sync_service.rate_limiter
+            extra['retry_policy'] = sync_service.retry_policy
+        with _services_lock:
+            service = _services.get(key)
+            if service is None:
+                base_url, private_token, location_id, mock = key[1:]
+                service = service_class(
+                    base_url=base_url,
+                    private_token=private_token,
+                    default_location_id=location_id,
+                    mock=mock,
+                    **extra,
+                )
+                _services[key] = service
+    return service
+
+
+def get_tenant_service(tenant, service_class: Optional[type] = None) -> GHLService:
+    """
+    Instancia del proceso para un tenant: su token y location, su pool de conexiones y su propio
+    rate limiter, aislados de los del resto de tenants y del servicio global.
+    """
+    service_class = service_class or GHLService
+    key = (service_class, 'tenant', settings.GHL_BASE_URL, getattr(settings, 'GHL_MOCK', False)) + tenant.key
+    service = _services.get(key)
+    if service is None:
+        extra = {}
+        if service_class is not GHLService:
+            # Igual que en get_ghl_service: la variante async consume la cuota del servicio síncrono
+            sync_service = get_tenant_service(tenant)
+            extra['rate_limiter'] = sync_service.rate_limiter
+            extra['retry_policy'] = sync_service.retry_policy
+        with _services_lock:
+            service = _services.get(key)
+            if service is None:
+                # Si el token o los límites del tenant cambiaron, descarta la instancia anterior
+                for stale in [k for k in _services if k[:2] == (service_class, 'tenant') and k[4] == tenant.location_id]:
+                    del _services[stale]
+                service = service_class(base_url=key[2], mock=key[3], tenant=tenant, **extra)
+                _services[key] = service
+    return service
+
+
+def tenant_services() -> List[GHLService]:
+    """Servicios de tenants (síncronos) creados en este proceso"""
+    return [service for key, service in list(_services.items()) if key[:2] == (GHLService, 'tenant')]
+
+
+def clear_ghl_services():
+    """Descarta todas las instancias registradas; la siguiente llamada las reconstruye"""
+    with _services_lock:
+        _services.clear()
+
+
+@receiver(setting_changed)
+def _clear_on_setting_change(setting, **kwargs):
+    # Evita conservar instancias obsoletas cuando un override cambia la configuración de GHL
+    if setting.startswith('GHL_'):
+        clear_ghl_services()
@@ -0,0 +1,276 @@
+"""
+Pool de conexiones HTTP reutilizables (keep-alive) para las llamadas a GHL
+"""
+import asyncio
+import socket
+import threading
+import logging
+import weakref
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from django.conf import settings
+from django.test.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+class RejectAllCookies(DefaultCookiePolicy):
+    """
+    GHL se autentica con el token del header, no con cookies. Como la sesión y los clientes se
+    comparten entre servicios, hilos y tenants, no se guarda ninguna cookie de las respuestas para
+    que no viaje en peticiones de otro token.
+    """
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+def _cookieless_jar() -> CookieJar:
+    return CookieJar(policy=RejectAllCookies())
+
+
+class GHLHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter que activa TCP keep-alive en los sockets del pool
+    """
+
+    def __init__(self, keepalive: bool = True, **kwargs):
+        # Debe asignarse antes de super().__init__, que llama a init_poolmanager
+        self.keepalive = keepalive
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.keepalive:
+            pool_kwargs['socket_options'] = HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+            ]
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+
+
+class GHLConnectionPool:
+    """
+    Sesión HTTP compartida por todas las instancias de GHLService del proceso.
+    Reutiliza conexiones TCP+TLS en lugar de abrir una nueva por cada petición; solo se
+    comparte el pool, la sesión no guarda cookies (ver RejectAllCookies).
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 20,
+                 connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 keepalive: bool = True, pool_block: bool = False):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.keepalive = keepalive
+
+        self.adapter = GHLHTTPAdapter(
+            keepalive=keepalive,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        self.session = requests.Session()
+        self.session.cookies.set_policy(RejectAllCookies())
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        if not keepalive:
+            self.session.headers['Connection'] = 'close'
+
+        self._lock = threading.Lock()
+        self._total_requests = 0
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Hace una petición usando la sesión compartida y el timeout (connect, read) configurado"""
+        kwargs.setdefault('timeout', self.timeout)
+        with self._lock:
+            self._total_requests += 1
+        return self.session.request(method=method, url=url, **kwargs)
+
+    def stats(self) -> Dict:
+        """
+        Estadísticas del pool: conexiones abiertas, ociosas y peticiones que reutilizaron conexión
+        """
+        hosts = []
+        totals = {'open': 0, 'idle': 0, 'in_use': 0, 'created': 0, 'requests': 0, 'reused': 0}
+
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            try:
+                host_pool = pools[key]
+            except KeyError:
+                # El pool pudo ser descartado entre keys() y la lectura
+                continue
+            queue = getattr(host_pool, 'pool', None)
+            if queue is None:
+                continue
+            # La cola se inicializa con None como marcadores de posición libres
+            idle = sum(1 for conn in list(queue.queue) if conn is not None)
+            in_use = max(0, queue.maxsize - queue.qsize())
+            created = host_pool.num_connections
+            served = host_pool.num_requests
+            host_stats = {
+                'host': f"{host_pool.scheme}://{host_pool.host}:{host_pool.port}",
+                'open': idle + in_use,
+                'idle': idle,
+                'in_use': in_use,
+                'created': created,
+                'requests': served,
+                'reused': max(0, served - created),
+            }
+            hosts.append(host_stats)
+            for field in totals:
+                totals[field] += host_stats[field]
+
+        return {
+            'config': {
+                'pool_connections': self.pool_connections,
+                'pool_maxsize': self.pool_maxsize,
+                'connect_timeout': self.timeout[0],
+                'read_timeout': self.timeout[1],
+                'keepalive': self.keepalive,
+            },
+            'total_requests': self._total_requests,
+            **totals,
+            'hosts': hosts,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_pool: Optional[GHLConnectionPool] = None
+_pool_lock = threading.Lock()
+_tenant_pools: Dict[str, GHLConnectionPool] = {}
+
+
+def get_connection_pool(tenant=None) -> GHLConnectionPool:
+    """
+    Devuelve el pool de conexiones del proceso, creándolo a partir de settings la primera vez.
+    Con `tenant` (ver tenants.py) devuelve el pool propio de ese tenant.
+    """
+    if tenant is not None:
+        return _get_tenant_pool(tenant)
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = GHLConnectionPool(
+                    pool_connections=getattr(settings, 'GHL_POOL_CONNECTIONS', 10),
+                    pool_maxsize=getattr(settings, 'GHL_POOL_MAXSIZE', 20),
+                    connect_timeout=getattr(settings, 'GHL_CONNECT_TIMEOUT', 5.0),
+                    read_timeout=getattr(settings, 'GHL_READ_TIMEOUT', 30.0),
+                    keepalive=getattr(settings, 'GHL_KEEPALIVE', True),
+                    pool_block=getattr(settings, 'GHL_POOL_BLOCK', False),
+                )
+                logger.info(f"Pool de conexiones GHL creado: {_pool.stats()['config']}")
+    return _pool
+
+
+def tenant_pool_maxsize(tenant) -> int:
+    return tenant.pool_maxsize or getattr(settings, 'GHL_TENANT_POOL_MAXSIZE', 5)
+
+
+def _get_tenant_pool(tenant) -> GHLConnectionPool:
+    """
+    Pool de un tenant: como mucho tenant_pool_maxsize() conexiones y, con GHL_TENANT_POOL_BLOCK,
+    espera a que se libere una en lugar de abrir más. Así un tenant con mucho tráfico hace
+    cola en su propio pool sin quitar conexiones a los demás.
+    """
+    maxsize = tenant_pool_maxsize(tenant)
+    pool = _tenant_pools.get(tenant.location_id)
+    if pool is not None and pool.pool_maxsize == maxsize:
+        return pool
+    with _pool_lock:
+        pool = _tenant_pools.get(tenant.location_id)
+        if pool is None or pool.pool_maxsize != maxsize:
+            if pool is not None:
+                pool.close()
+            pool = GHLConnectionPool(
+                pool_connections=1,  # Un único host: GHL_BASE_URL
+                pool_maxsize=maxsize,
+                connect_timeout=getattr(settings, 'GHL_CONNECT_TIMEOUT', 5.0),
+                read_timeout=getattr(settings, 'GHL_READ_TIMEOUT', 30.0),
+                keepalive=getattr(settings, 'GHL_KEEPALIVE', True),
+                pool_block=getattr(settings, 'GHL_TENANT_POOL_BLOCK', True),
+            )
+            _tenant_pools[tenant.location_id] = pool
+    return pool
+
+
+def tenant_pool_stats() -> Dict[str, Dict]:
+    """Estadísticas de los pools de tenants creados en este proceso, por locationId"""
+    return {location_id: pool.stats() for location_id, pool in list(_tenant_pools.items())}
+
+
+def connection_pools() -> Dict[str, GHLConnectionPool]:
+    """Todos los pools del proceso: 'default' (GHL_PRIVATE_TOKEN) y el de cada tenant por locationId"""
+    return {'default': get_connection_pool(), **dict(_tenant_pools)}
+
+
+def reset_connection_pool():
+    """Cierra los pools actuales; el siguiente get_connection_pool() los recrea con la configuración vigente"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = None
+        for pool in _tenant_pools.values():
+            pool.close()
+        _tenant_pools.clear()
+
+
+# Clientes httpx por event loop: sus conexiones quedan ligadas al loop que las abrió.
+# Bajo ASGI hay un único loop por worker, así que en la práctica es un cliente por proceso
+# (más uno por tenant, clave = locationId; None es el cliente global).
+_async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Optional[str], httpx.AsyncClient]]' = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_async_client(tenant=None) -> httpx.AsyncClient:
+    """
+    Devuelve el cliente HTTP asyncio (pool keep-alive) del event loop actual.
+    Usa los mismos timeouts que el pool síncrono; GHL_ASYNC_MAX_CONNECTIONS limita
+    cuántas peticiones pueden estar en vuelo a la vez. Con `tenant`, el cliente propio del
+    tenant, limitado a tenant_pool_maxsize() conexiones.
+    """
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    client_key = tenant.location_id if tenant is not None else None
+    client = clients.get(client_key)
+    if client is None:
+        keepalive = getattr(settings, 'GHL_KEEPALIVE', True)
+        if tenant is not None:
+            max_connections = max_keepalive = tenant_pool_maxsize(tenant)
+        else:
+            max_connections = getattr(settings, 'GHL_ASYNC_MAX_CONNECTIONS', 200)
+            max_keepalive = getattr(settings, 'GHL_POOL_MAXSIZE', 20)
+        client = httpx.AsyncClient(
+            cookies=_cookieless_jar(),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive if keepalive else 0,
+            ),
+            timeout=httpx.Timeout(
+                getattr(settings, 'GHL_READ_TIMEOUT', 30.0),
+                connect=getattr(settings, 'GHL_CONNECT_TIMEOUT', 5.0),
+            ),
+        )
+        clients[client_key] = client
+    return client
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    # Los overrides de settings en tests deben reflejarse en el pool
+    if setting in ('GHL_POOL_CONNECTIONS', 'GHL_POOL_MAXSIZE', 'GHL_CONNECT_TIMEOUT',
+                   'GHL_READ_TIMEOUT', 'GHL_KEEPALIVE', 'GHL_POOL_BLOCK', 'GHL_ASYNC_MAX_CONNECTIONS',
+                   'GHL_TENANT_POOL_MAXSIZE', 'GHL_TENANT_POOL_BLOCK'):
+        reset_connection_pool()
+        # Los clientes async se recrean en el siguiente uso; cerrarlos requiere su propio loop
+        _async_clients.clear()
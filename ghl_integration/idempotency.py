@@ -0,0 +1,342 @@
+"""
+Idempotency-Key en los endpoints de creación (citas y contactos).
+
+La primera petición con una clave se ejecuta y su respuesta se guarda en GHLIdempotencyKey durante
+GHL_IDEMPOTENCY_TTL segundos; las repeticiones reciben esa respuesta sin volver a llamar a GHL.
+Un duplicado que llega mientras la primera sigue en curso espera a que termine (en el mismo proceso
+con un Event, entre procesos consultando la tabla) en lugar de crear la cita otra vez.
+
+La fila "en curso" caduca a los GHL_IDEMPOTENCY_LOCK_SECONDS para que un proceso muerto no bloquee
+la clave, pero mientras la petición sigue viva un hilo la prorroga. Cada reserva lleva un token y
+solo quien la hizo puede guardar el resultado o borrarla.
+
+Las vistas async usan arun(): misma lógica, sin ocupar un hilo mientras se llama a GHL.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils import timezone
+
+from .models import GHLIdempotencyKey
+from .resilience import RETRY_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Longitud máxima aceptada del header (los clientes suelen mandar un UUID)
+MAX_KEY_LENGTH = 255
+
+# (status HTTP, body, repetida)
+Outcome = Tuple[int, Dict, bool]
+
+
+def _sha256(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def _request_hash(data) -> str:
+    return _sha256(json.dumps(data, sort_keys=True, default=str))
+
+
+def _should_store(body: Dict) -> bool:
+    """
+    Lo que no llegó a GHL (429, rate limit local, circuito abierto) no se guarda: repetir la petición
+    con la misma clave debe volver a intentarlo. Los 5xx y errores de red sí, salvo con
+    GHL_RETRY_NON_IDEMPOTENT, porque la cita o el contacto pudo haberse creado.
+    """
+    if 'local_rate_limit' in body or 'circuit' in body:
+        return False
+    status_code = body.get('status_code')
+    if status_code == 429:
+        return False
+    return not (status_code in RETRY_STATUSES and getattr(settings, 'GHL_RETRY_NON_IDEMPOTENT', False))
+
+
+class IdempotencyStore:
+    """Guarda y reutiliza respuestas por (endpoint, Idempotency-Key)"""
+
+    def __init__(self, ttl: float = 86400, wait_timeout: float = 30.0, lock_seconds: float = 120.0,
+                 poll_interval: float = 0.1, purge_interval: float = 60.0):
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.lock_seconds = lock_seconds
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, threading.Event] = {}
+        self._next_purge = 0.0
+        self._executed = 0
+        self._replayed = 0
+        self._waited = 0
+        self._mismatches = 0
+        self._purged = 0
+
+    def run(self, scope: str, key: str, data, fn: Callable[[], Tuple[int, Dict]]) -> Outcome:
+        """
+        Ejecuta fn() -> (status, body) la primera vez que se ve la clave en `scope` y devuelve la
+        respuesta guardada en las siguientes. 422 si la clave se reutiliza con otro body; 409 si la
+        primera petición sigue en curso tras esperar GHL_IDEMPOTENCY_WAIT segundos.
+        """
+        key_hash = _sha256(f'{scope}|{key}')
+        request_hash = _request_hash(data)
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        self._maybe_purge()
+        while True:
+            row = self._find(key_hash)
+            outcome = self._stored_outcome(row, request_hash, waited)
+            if outcome is not None:
+                return outcome
+
+            if row is None:
+                event, leader = self._join(key_hash)
+                if leader:
+                    try:
+                        token = self._reserve(key_hash, request_hash)
+                        if token is not None:
+                            return self._execute(key_hash, request_hash, token, fn)
+                    finally:
+                        self._leave(key_hash, event)
+                    # Otro proceso la reservó entre la consulta y el INSERT: esperar su resultado
+                    continue
+            else:
+                with self._lock:
+                    event = self._in_flight.get(key_hash)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return self._in_progress_outcome()
+            waited = True
+            # En este proceso se despierta al terminar el líder; si está en otro, consulta la tabla
+            if event is not None:
+                event.wait(remaining)
+            else:
+                time.sleep(min(self.poll_interval, remaining))
+
+    async def arun(self, scope: str, key: str, data, fn: Callable[[], Awaitable[Tuple[int, Dict]]]) -> Outcome:
+        """
+        Equivalente async de run(): fn es una corrutina y se ejecuta en el event loop. Las consultas
+        van por sync_to_async y un duplicado espera consultando la tabla cada poll_interval (sin
+        ocupar un hilo), también si el líder está en este proceso.
+        """
+        key_hash = _sha256(f'{scope}|{key}')
+        request_hash = _request_hash(data)
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        await sync_to_async(self._maybe_purge)()
+        while True:
+            row = await sync_to_async(self._find)(key_hash)
+            outcome = self._stored_outcome(row, request_hash, waited)
+            if outcome is not None:
+                return outcome
+
+            if row is None:
+                event, leader = self._join(key_hash)
+                if leader:
+                    try:
+                        token = await sync_to_async(self._reserve)(key_hash, request_hash)
+                        if token is not None:
+                            return await self._aexecute(key_hash, request_hash, token, fn)
+                    finally:
+                        self._leave(key_hash, event)
+                    continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return self._in_progress_outcome()
+            waited = True
+            await asyncio.sleep(min(self.poll_interval, remaining))
+
+    @staticmethod
+    def _find(key_hash: str) -> Optional[GHLIdempotencyKey]:
+        return GHLIdempotencyKey.objects.filter(key_hash=key_hash, expires_at__gt=timezone.now()).first()
+
+    def _stored_outcome(self, row: Optional[GHLIdempotencyKey], request_hash: str, waited: bool) -> Optional[Outcome]:
+        """Respuesta para una clave ya vista: 422 si el body cambió, la guardada si terminó; None si no"""
+        if row is not None and row.request_hash != request_hash:
+            with self._lock:
+                self._mismatches += 1
+            return 422, {
+                'success': False,
+                'message': 'La Idempotency-Key ya se usó con un body distinto',
+            }, False
+        if row is not None and row.status_code is not None:
+            with self._lock:
+                self._replayed += 1
+                self._waited += waited
+            return row.status_code, row.response, True
+        return None
+
+    @staticmethod
+    def _in_progress_outcome() -> Outcome:
+        return 409, {
+            'success': False,
+            'message': 'Hay una petición con la misma Idempotency-Key en curso; reintenta en unos segundos',
+        }, False
+
+    def _join(self, key_hash: str) -> Tuple[threading.Event, bool]:
+        with self._lock:
+            event = self._in_flight.get(key_hash)
+            if event is not None:
+                return event, False
+            event = self._in_flight[key_hash] = threading.Event()
+            return event, True
+
+    def _leave(self, key_hash: str, event: threading.Event):
+        with self._lock:
+            self._in_flight.pop(key_hash, None)
+        event.set()
+
+    def _reserve(self, key_hash: str, request_hash: str) -> Optional[str]:
+        """Inserta la fila 'en curso' y devuelve su token; None si otro proceso se adelantó"""
+        now = timezone.now()
+        # Una fila caducada (o 'en curso' de un proceso que murió) no debe bloquear la clave
+        GHLIdempotencyKey.objects.filter(key_hash=key_hash, expires_at__lte=now).delete()
+        token = uuid.uuid4().hex
+        try:
+            with transaction.atomic():
+                GHLIdempotencyKey.objects.create(
+                    key_hash=key_hash,
+                    request_hash=request_hash,
+                    token=token,
+                    expires_at=now + timedelta(seconds=self.lock_seconds),
+                )
+        except IntegrityError:
+            return None
+        return token
+
+    def _execute(self, key_hash: str, request_hash: str, token: str, fn: Callable[[], Tuple[int, Dict]]) -> Outcome:
+        # Solo la fila de esta reserva: si se perdió (caducó y otro la reservó) no se toca la ajena
+        reservation = GHLIdempotencyKey.objects.filter(key_hash=key_hash, request_hash=request_hash, token=token)
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(reservation, stop),
+                                     name='ghl-idempotency', daemon=True)
+        heartbeat.start()
+        try:
+            status_code, body = fn()
+        except BaseException:
+            reservation.delete()
+            raise
+        finally:
+            stop.set()
+            heartbeat.join()
+        return self._save(key_hash, reservation, status_code, body)
+
+    async def _aexecute(self, key_hash: str, request_hash: str, token: str,
+                        fn: Callable[[], Awaitable[Tuple[int, Dict]]]) -> Outcome:
+        reservation = GHLIdempotencyKey.objects.filter(key_hash=key_hash, request_hash=request_hash, token=token)
+        heartbeat = asyncio.ensure_future(self._aheartbeat(reservation))
+        try:
+            status_code, body = await fn()
+        except BaseException:
+            await sync_to_async(reservation.delete)()
+            raise
+        finally:
+            heartbeat.cancel()
+        return await sync_to_async(self._save)(key_hash, reservation, status_code, body)
+
+    def _save(self, key_hash: str, reservation, status_code: int, body: Dict) -> Outcome:
+        """Guarda la respuesta en la fila de la reserva, o la borra si no debe guardarse"""
+        with self._lock:
+            self._executed += 1
+        if _should_store(body):
+            stored = reservation.update(
+                status_code=status_code,
+                response=body,
+                expires_at=timezone.now() + timedelta(seconds=self.ttl),
+            )
+            if not stored:
+                logger.warning(f"Idempotency-Key {key_hash[:12]}: la reserva se perdió, no se guarda la respuesta")
+        else:
+            reservation.delete()
+        return status_code, body, False
+
+    def _heartbeat(self, reservation, stop: threading.Event):
+        """Prorroga la fila 'en curso' cada tercio de lock_seconds mientras fn() no termina"""
+        try:
+            while not stop.wait(self.lock_seconds / 3):
+                self._extend(reservation)
+        except Exception:
+            logger.exception("No se pudo prorrogar la reserva de una Idempotency-Key")
+        finally:
+            connection.close()
+
+    async def _aheartbeat(self, reservation):
+        """Igual que _heartbeat, como tarea del event loop"""
+        try:
+            while True:
+                await asyncio.sleep(self.lock_seconds / 3)
+                await sync_to_async(self._extend)(reservation)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("No se pudo prorrogar la reserva de una Idempotency-Key")
+
+    def _extend(self, reservation):
+        reservation.filter(status_code__isnull=True).update(
+            expires_at=timezone.now() + timedelta(seconds=self.lock_seconds))
+
+    def _maybe_purge(self):
+        """Borra las claves caducadas como mucho una vez por purge_interval"""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_purge:
+                return
+            self._next_purge = now + self.purge_interval
+        deleted, _ = GHLIdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+        if deleted:
+            with self._lock:
+                self._purged += deleted
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'executed': self._executed,
+                'replayed': self._replayed,
+                'waited_for_in_flight': self._waited,
+                'body_mismatches': self._mismatches,
+                'in_flight': len(self._in_flight),
+                'purged': self._purged,
+                'ttl': self.ttl,
+            }
+
+
+_store: Optional[IdempotencyStore] = None
+_store_lock = threading.Lock()
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """Almacén del proceso, creado a partir de settings la primera vez"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = IdempotencyStore(
+                    ttl=getattr(settings, 'GHL_IDEMPOTENCY_TTL', 86400),
+                    wait_timeout=getattr(settings, 'GHL_IDEMPOTENCY_WAIT', 30.0),
+                    lock_seconds=getattr(settings, 'GHL_IDEMPOTENCY_LOCK_SECONDS', 120.0),
+                )
+    return _store
+
+
+def reset_idempotency_store():
+    global _store
+    with _store_lock:
+        _store = None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    if setting.startswith('GHL_IDEMPOTENCY_'):
+        reset_idempotency_store()
@@ -0,0 +1,218 @@
+"""
+Importación masiva de contactos desde CSV o JSONL, fila a fila y con checkpoint reanudable
+"""
+import csv
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterator, Optional, Set, TextIO, Tuple
+
+from .bulk import run_concurrently
+from .contact_index import index_contact
+from .validation import CONTACT_REQUIRED_FIELDS, apply_default_location, missing_fields_error
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+# Estados por fila en el archivo de resultados
+CREATED = 'created'
+FAILED = 'failed'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+
+
+def detect_format(filename: str, explicit: Optional[str] = None) -> Optional[str]:
+    """Formato a partir del parámetro explícito o de la extensión (.csv, .jsonl, .ndjson)"""
+    if explicit:
+        explicit = explicit.lower()
+        return 'jsonl' if explicit == 'ndjson' else explicit if explicit in IMPORT_FORMATS else None
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+def iter_rows(stream: TextIO, fmt: str) -> Iterator[Dict]:
+    """
+    Lee filas una a una sin cargar el archivo completo. Las celdas vacías se descartan.
+    Una línea JSONL inválida se entrega como {'_error': ...} para reportarla sin cortar la importación.
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {k.strip(): v.strip() for k, v in row.items() if k and v and v.strip()}
+    else:
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield {'_error': f'JSON inválido: {e}'}
+                continue
+            if not isinstance(row, dict):
+                yield {'_error': 'Cada línea debe ser un objeto JSON'}
+                continue
+            yield {k: v for k, v in row.items() if v not in (None, '')}
+
+
+class ContactImporter:
+    """
+    Empuja contactos a GHL con concurrencia acotada mientras lee el archivo.
+
+    - Completa locationId igual que la vista create_contact (o con `location_id` si se indica)
+    - Deduplica por email (sin distinguir mayúsculas) dentro del archivo
+    - Escribe una línea JSON por fila en `results_path`
+    - Guarda en `checkpoint_path` la primera fila aún no terminada; al reanudar se saltan las
+      anteriores y las que ya figuran en el archivo de resultados
+    """
+
+    def __init__(self, service, location_id: Optional[str] = None, concurrency: int = 5,
+                 checkpoint_path: Optional[str] = None, results_path: Optional[str] = None,
+                 checkpoint_every: int = 50):
+        self.service = service
+        self.location_id = location_id
+        self.concurrency = concurrency
+        self.checkpoint_path = checkpoint_path
+        self.results_path = results_path
+        self.checkpoint_every = checkpoint_every
+
+        self.summary = {'processed': 0, CREATED: 0, FAILED: 0, DUPLICATE: 0, INVALID: 0, 'skipped': 0}
+        self._next_row = 0
+        self._finished: Set[int] = set()
+        self._already_done: Set[int] = set()
+        self._seen_emails: Set[str] = set()
+        self._results_file = None
+        self._since_checkpoint = 0
+
+    # --- checkpoint -----------------------------------------------------
+
+    def _load_checkpoint(self):
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                self._next_row = json.load(f).get('next_row', 0)
+            logger.info(f"Reanudando importación desde la fila {self._next_row}")
+        # Filas terminadas después del último checkpoint (p.ej. si el proceso se cortó)
+        if self.results_path and os.path.exists(self.results_path):
+            with open(self.results_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        row = json.loads(line).get('row')
+                    except ValueError:
+                        continue
+                    if isinstance(row, int) and row >= self._next_row:
+                        self._already_done.add(row)
+
+    def _save_checkpoint(self, force: bool = False):
+        if not self.checkpoint_path:
+            return
+        self._since_checkpoint += 1
+        if not force and self._since_checkpoint < self.checkpoint_every:
+            return
+        self._since_checkpoint = 0
+        if self._results_file:
+            self._results_file.flush()
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'next_row': self._next_row, 'summary': self.summary, 'updated_at': time.time()}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    # --- procesamiento --------------------------------------------------
+
+    def _record(self, row_number: int, status: str, **extra) -> Dict:
+        entry = {'row': row_number, 'status': status, **extra}
+        self.summary['processed'] += 1
+        self.summary[status] += 1
+        if self._results_file:
+            self._results_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+        # Avanza el checkpoint hasta la primera fila que sigue en vuelo
+        self._finished.add(row_number)
+        while self._next_row in self._finished or self._next_row in self._already_done:
+            self._finished.discard(self._next_row)
+            self._already_done.discard(self._next_row)
+            self._next_row += 1
+        self._save_checkpoint()
+        return entry
+
+    def _prepare(self, rows: Iterator[Dict]) -> Iterator[Tuple[int, Dict, Optional[Tuple[str, Dict]]]]:
+        """
+        Valida y deduplica en el hilo principal. Devuelve (fila, payload, resultado_local):
+        resultado_local es (estado, detalles) para filas que no se envían a GHL, o None.
+        """
+        for row_number, row in enumerate(rows):
+            email = str(row.get('email', '')).strip().lower()
+            if row_number < self._next_row or row_number in self._already_done:
+                # Ya procesada en una ejecución anterior: solo alimenta la deduplicación
+                if email:
+                    self._seen_emails.add(email)
+                self.summary['skipped'] += 1
+                continue
+
+            if '_error' in row:
+                yield row_number, row, (INVALID, {'error': row['_error']})
+                continue
+            error = missing_fields_error(row, CONTACT_REQUIRED_FIELDS)
+            if not error:
+                if self.location_id and 'locationId' not in row:
+                    row['locationId'] = self.location_id
+                error = apply_default_location(row, self.service)
+            if error:
+                yield row_number, row, (INVALID, {'email': email or None, 'error': error})
+                continue
+            if email in self._seen_emails:
+                yield row_number, row, (DUPLICATE, {'email': email})
+                continue
+            self._seen_emails.add(email)
+            yield row_number, row, None
+
+    def _push(self, entry) -> Dict:
+        _, payload, local = entry
+        if local is not None:
+            return {'local': local}
+        # En importaciones se espera cupo del rate limiter en lugar de fallar rápido
+        return self.service.create_contact(payload, block=True)
+
+    def iter_run(self, rows: Iterator[Dict]) -> Iterator[Dict]:
+        """Procesa las filas y va devolviendo la entrada de resultado de cada una"""
+        self._load_checkpoint()
+        if self.results_path:
+            self._results_file = open(self.results_path, 'a', encoding='utf-8')
+
+        try:
+            for _, (row_number, payload, _), result in run_concurrently(self._prepare(rows), self._push, self.concurrency):
+                if 'local' in result:
+                    status, details = result['local']
+                    yield self._record(row_number, status, **details)
+                elif result.get('success'):
+                    contact = result.get('contact') or {}
+                    contact = contact.get('contact', contact)
+                    if not self.service.mock:
+                        index_contact(contact, payload['locationId'])
+                    yield self._record(row_number, CREATED, email=payload.get('email'), contact_id=contact.get('id'))
+                else:
+                    yield self._record(row_number, FAILED, email=payload.get('email'),
+                                       error=result.get('error'), status_code=result.get('status_code'))
+        finally:
+            self._save_checkpoint(force=True)
+            if self._results_file:
+                self._results_file.close()
+                self._results_file = None
+
+    def run(self, rows: Iterator[Dict]) -> Dict:
+        """Procesa todas las filas y devuelve el resumen"""
+        for _ in self.iter_run(rows):
+            pass
+        return self.result_summary()
+
+    def result_summary(self) -> Dict:
+        return {
+            **self.summary,
+            'success': self.summary[FAILED] == 0 and self.summary[INVALID] == 0,
+            'checkpoint_path': self.checkpoint_path,
+            'results_path': self.results_path,
+        }
@@ -0,0 +1,260 @@
+"""
+Cola de escrituras hacia GHL en la base de datos (SQLite/Postgres, sin broker externo).
+
+Con `?async=1` (o `Prefer: respond-async`) las vistas de creación validan el payload, lo guardan
+como GHLJob y responden 202 con el id; `manage.py ghl_worker` procesa la cola y el resultado se
+consulta en GET /api/ghl/jobs/<id>/. Si GHL está lento el frontend no espera ni reenvía el formulario.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .contact_index import index_contact
+from .ghl_service import get_ghl_service
+from .models import GHLJob
+from .resilience import RETRY_STATUSES
+
+logger = logging.getLogger(__name__)
+
+
+def _create_appointment(service, payload: Dict) -> Dict:
+    return service.create_appointment(payload, block=True)
+
+
+def _create_contact(service, payload: Dict) -> Dict:
+    result = service.create_contact(payload, block=True)
+    if result.get('success') and not service.mock:
+        index_contact(result.get('contact'), payload.get('locationId') or service.default_location_id)
+    return result
+
+
+# Tipos de trabajo: kind -> función (servicio, payload) -> resultado del servicio
+JOB_KINDS: Dict[str, Callable[..., Dict]] = {
+    'create_appointment': _create_appointment,
+    'create_contact': _create_contact,
+}
+
+
+def enqueue_job(kind: str, payload: Dict, location_id: Optional[str] = None) -> GHLJob:
+    """Guarda un trabajo en la cola; el worker lo ejecuta con el servicio de su location (tenant)"""
+    if kind not in JOB_KINDS:
+        raise ValueError(f'Tipo de trabajo desconocido: {kind}')
+    return GHLJob.objects.create(
+        kind=kind,
+        payload=payload,
+        location_id=location_id or '',
+        max_attempts=getattr(settings, 'GHL_JOBS_MAX_ATTEMPTS', 5),
+    )
+
+
+def job_summary(job: GHLJob) -> Dict:
+    """Estado del trabajo tal como lo devuelve /jobs/<id>/"""
+    return {
+        'id': str(job.id),
+        'kind': job.kind,
+        'status': job.status,
+        'location_id': job.location_id or None,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'status_code': job.status_code,
+        'result': job.result,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'run_after': job.run_after.isoformat() if job.status == GHLJob.QUEUED else None,
+    }
+
+
+def queue_stats() -> Dict:
+    """Trabajos por estado (para /stats/)"""
+    counts = {status: 0 for status, _ in GHLJob.STATUS_CHOICES}
+    for row in GHLJob.objects.values('status').annotate(total=Count('id')):
+        counts[row['status']] = row['total']
+    return counts
+
+
+def claim_jobs(worker: str, limit: int) -> List[GHLJob]:
+    """
+    Reserva hasta `limit` trabajos listos para este worker; solo cuentan los que quedan marcados con
+    el token de esta reserva. Con Postgres usa SELECT ... FOR UPDATE SKIP LOCKED, así varios workers
+    reservan a la vez sin esperarse. SQLite no lo soporta y además falla con "database is locked" si
+    una transacción que ya leyó intenta escribir mientras otro escribe, así que ahí la reserva es un
+    único UPDATE con subconsulta (atómico por sí solo).
+    """
+    if limit <= 0:
+        return []
+    lease = uuid.uuid4().hex
+    now = timezone.now()
+    ready = GHLJob.objects.filter(status=GHLJob.QUEUED, run_after__lte=now).order_by('run_after', 'created_at')
+    claim = {'status': GHLJob.RUNNING, 'worker': worker, 'lease': lease, 'locked_at': now}
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(ready.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            if not ids:
+                return []
+            GHLJob.objects.filter(id__in=ids).update(**claim)
+    elif not GHLJob.objects.filter(id__in=ready.values('id')[:limit], status=GHLJob.QUEUED).update(**claim):
+        return []
+    return list(GHLJob.objects.filter(lease=lease, status=GHLJob.RUNNING).order_by('run_after', 'created_at'))
+
+
+def requeue_stale_jobs() -> int:
+    """
+    Devuelve a la cola los trabajos de workers que murieron a mitad (reservados hace más de
+    GHL_JOBS_LEASE_SECONDS). GHL pudo haber llegado a crear el recurso antes de la caída.
+    """
+    deadline = timezone.now() - timedelta(seconds=getattr(settings, 'GHL_JOBS_LEASE_SECONDS', 300))
+    requeued = GHLJob.objects.filter(status=GHLJob.RUNNING, locked_at__lt=deadline).update(
+        status=GHLJob.QUEUED, lease='', worker='', locked_at=None, run_after=timezone.now(),
+    )
+    if requeued:
+        logger.warning(f'{requeued} trabajos abandonados por un worker vuelven a la cola')
+    return requeued
+
+
+def purge_finished_jobs() -> int:
+    """Borra los trabajos terminados hace más de GHL_JOBS_RETENTION_DAYS días"""
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'GHL_JOBS_RETENTION_DAYS', 7))
+    deleted, _ = GHLJob.objects.filter(status__in=[GHLJob.SUCCEEDED, GHLJob.FAILED],
+                                       finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def _retry_delay(job: GHLJob, result: Dict) -> Optional[float]:
+    """
+    Segundos hasta el siguiente intento, o None si el fallo es definitivo. Se reintenta lo que no
+    llegó a GHL (rate limit local, circuito abierto, 429); los 5xx y errores de red solo con
+    GHL_RETRY_NON_IDEMPOTENT, porque la cita o el contacto pudo haberse creado.
+    """
+    if job.attempts >= job.max_attempts:
+        return None
+    status_code = result.get('status_code')
+    not_sent = 'local_rate_limit' in result or 'circuit' in result or status_code == 429
+    if not not_sent and not (status_code in RETRY_STATUSES and getattr(settings, 'GHL_RETRY_NON_IDEMPOTENT', False)):
+        return None
+    error = result.get('error')
+    retry_after = error.get('retry_after') if isinstance(error, dict) else None
+    backoff = getattr(settings, 'GHL_JOBS_RETRY_DELAY', 5.0) * 2 ** (job.attempts - 1)
+    return min(max(retry_after or 0.0, backoff), getattr(settings, 'GHL_JOBS_RETRY_MAX_DELAY', 300.0))
+
+
+def run_job(job: GHLJob) -> Dict:
+    """Ejecuta un trabajo reservado y guarda el resultado (o lo reprograma si se puede reintentar)"""
+    now = timezone.now()
+    job.attempts += 1
+    GHLJob.objects.filter(id=job.id).update(attempts=job.attempts, started_at=job.started_at or now)
+    job.started_at = job.started_at or now
+    try:
+        service = get_ghl_service(location_id=job.location_id or None)
+        result = JOB_KINDS[job.kind](service, job.payload)
+    except Exception as e:
+        logger.exception(f'Error inesperado ejecutando el trabajo {job.id}')
+        result = {'success': False, 'error': {'message': str(e)}}
+
+    delay = None if result.get('success') else _retry_delay(job, result)
+    fields = {'status_code': result.get('status_code'), 'result': result, 'lease': '', 'locked_at': None}
+    if delay is not None:
+        fields.update(status=GHLJob.QUEUED, run_after=timezone.now() + timedelta(seconds=delay))
+    else:
+        fields.update(status=GHLJob.SUCCEEDED if result.get('success') else GHLJob.FAILED,
+                      finished_at=timezone.now())
+    # Solo si la reserva sigue siendo nuestra (no se devolvió a la cola por caducada)
+    GHLJob.objects.filter(id=job.id, lease=job.lease).update(**fields)
+    for field, value in fields.items():
+        setattr(job, field, value)
+    return result
+
+
+class JobWorker:
+    """
+    Procesa la cola con como mucho `concurrency` trabajos en vuelo. La concurrencia se adapta al
+    rate limit: cada 429 (de GHL o del limitador local) la reduce a la mitad y cada éxito la
+    vuelve a subir de uno en uno (AIMD). Además cada llamada espera cupo en el rate limiter de su
+    tenant, así que el worker nunca gasta más cuota de la que GHL permite.
+    """
+
+    def __init__(self, concurrency: int = 4, poll_interval: float = 1.0, name: Optional[str] = None,
+                 on_result: Optional[Callable[[GHLJob, Dict], None]] = None):
+        self.concurrency = max(1, concurrency)
+        self.limit = self.concurrency
+        self.poll_interval = poll_interval
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.on_result = on_result
+        self.stop_event = threading.Event()
+        self.processed = 0
+        self.counts = {GHLJob.SUCCEEDED: 0, GHLJob.FAILED: 0, 'retried': 0}
+
+    def stop(self):
+        """Deja de reservar trabajos; los que están en vuelo terminan"""
+        self.stop_event.set()
+
+    def _execute(self, job: GHLJob) -> Dict:
+        try:
+            return run_job(job)
+        finally:
+            # Cada hilo tiene su conexión a la base de datos: no dejarla abierta indefinidamente
+            close_old_connections()
+
+    def _adapt(self, result: Dict):
+        if result.get('status_code') == 429:
+            self.limit = max(1, self.limit // 2)
+        elif result.get('success'):
+            self.limit = min(self.concurrency, self.limit + 1)
+
+    def run(self, once: bool = False, max_jobs: Optional[int] = None) -> Dict:
+        """
+        Procesa trabajos hasta stop(). Con `once` termina cuando la cola no tiene trabajos listos;
+        con `max_jobs`, tras reservar esa cantidad.
+        """
+        stale_check_every = getattr(settings, 'GHL_JOBS_LEASE_SECONDS', 300) / 2
+        next_maintenance = 0.0
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='ghl-worker') as executor:
+            while True:
+                if time.monotonic() >= next_maintenance:
+                    requeue_stale_jobs()
+                    purge_finished_jobs()
+                    next_maintenance = time.monotonic() + stale_check_every
+
+                claimed = []
+                if not self.stop_event.is_set() and (max_jobs is None or self.processed < max_jobs):
+                    free = self.limit - len(in_flight)
+                    if max_jobs is not None:
+                        free = min(free, max_jobs - self.processed)
+                    claimed = claim_jobs(self.name, free)
+                    for job in claimed:
+                        in_flight[executor.submit(self._execute, job)] = job
+                    self.processed += len(claimed)
+
+                if not in_flight:
+                    if self.stop_event.is_set() or (once and not claimed) or \
+                            (max_jobs is not None and self.processed >= max_jobs):
+                        break
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+
+                done, _ = wait(in_flight, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.exception(f'Error inesperado en el worker con el trabajo {job.id}')
+                        result = {'success': False, 'error': {'message': str(e)}}
+                    self._adapt(result)
+                    outcome = 'retried' if job.status == GHLJob.QUEUED else job.status
+                    self.counts[outcome] = self.counts.get(outcome, 0) + 1
+                    if self.on_result is not None:
+                        self.on_result(job, result)
+        return {'processed': self.processed, **self.counts}
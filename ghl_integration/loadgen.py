@@ -0,0 +1,229 @@
+"""
+Generador de carga concurrente (asyncio + httpx) contra un servidor en marcha del backend.
+Mezcla escenarios con pesos (ping, calendars, create_appointment, contacts) a una concurrencia fija
+(lazo cerrado) o a un ritmo objetivo de peticiones por segundo (lazo abierto). La usa `manage.py ghl_load`.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from .benchmark import summarize
+
+API_PREFIX = '/api/ghl'
+TELEMETRY_PATH = f'{API_PREFIX}/rate-limit/'
+
+# Las citas de carga usan horarios únicos a partir de esta fecha para no chocar con el pre-flight
+_SLOT_BASE = datetime(2031, 1, 6, 0, 0, tzinfo=dt_timezone.utc)
+
+
+class Scenario:
+    def __init__(self, name: str, method: str, path: str, body: Optional[Callable[[int], Dict]] = None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+
+
+def build_scenarios(calendar_id: str, contact_id: str, location_id: Optional[str] = None) -> Dict[str, Scenario]:
+    def appointment(sequence: int) -> Dict:
+        start = _SLOT_BASE + timedelta(minutes=30 * sequence)
+        body = {
+            'calendarId': calendar_id,
+            'contactId': contact_id,
+            'startTime': start.isoformat(),
+            'endTime': (start + timedelta(minutes=30)).isoformat(),
+            'title': 'Prueba de carga',
+        }
+        if location_id:
+            body['locationId'] = location_id
+        return body
+
+    query = f'?locationId={location_id}' if location_id else ''
+    return {
+        'ping': Scenario('ping', 'GET', f'{API_PREFIX}/ping/'),
+        'calendars': Scenario('calendars', 'GET', f'{API_PREFIX}/calendars/{query}'),
+        'create_appointment': Scenario('create_appointment', 'POST', f'{API_PREFIX}/appointments/create/', appointment),
+        'contacts': Scenario('contacts', 'GET', f'{API_PREFIX}/contacts/{query}'),
+    }
+
+
+def parse_mix(value: str, scenarios: Dict[str, Scenario]) -> List[Tuple[str, float]]:
+    """'ping=1,calendars=5' -> [('ping', 1.0), ('calendars', 5.0)]"""
+    mix = []
+    for part in filter(None, (p.strip() for p in value.split(','))):
+        name, _, weight = part.partition('=')
+        if name not in scenarios:
+            raise ValueError(f"Escenario desconocido: {name}. Disponibles: {', '.join(scenarios)}")
+        try:
+            mix.append((name, float(weight or 1)))
+        except ValueError:
+            raise ValueError(f'Peso inválido para {name}: {weight}')
+    if not mix or sum(weight for _, weight in mix) <= 0:
+        raise ValueError('La mezcla debe tener al menos un escenario con peso positivo')
+    return mix
+
+
+def _is_rate_limited(status_code: int, content: bytes) -> bool:
+    """429 de HTTP o de GHL/rate limiter local reportado dentro del JSON (las vistas responden 400)"""
+    if status_code == 429:
+        return True
+    if status_code < 400 or b'429' not in content:
+        return False
+    try:
+        body = json.loads(content)
+    except ValueError:
+        return False
+    return isinstance(body, dict) and (body.get('status_code') == 429 or 'local_rate_limit' in body)
+
+
+class LoadGenerator:
+    """
+    Lanza peticiones según `mix` durante `duration` segundos (o hasta `max_requests`).
+
+    - Lazo cerrado (`concurrency`): N trabajadores que encadenan peticiones; mide la capacidad.
+    - Lazo abierto (`rps`): las llegadas siguen el ritmo objetivo aunque el servidor se frene, que es
+      como se comporta el tráfico real; `max_in_flight` acota las peticiones simultáneas y las llegadas
+      que no caben se cuentan como descartadas.
+    """
+
+    def __init__(self, base_url: str, scenarios: Dict[str, Scenario], mix: List[Tuple[str, float]],
+                 concurrency: int = 10, rps: Optional[float] = None, duration: float = 30.0,
+                 max_requests: Optional[int] = None, timeout: float = 30.0, max_in_flight: int = 1000,
+                 seed: Optional[int] = None):
+        self.base_url = base_url.rstrip('/')
+        self.scenarios = scenarios
+        self.mix = mix
+        self.concurrency = concurrency
+        self.rps = rps
+        self.duration = duration
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self._random = random.Random(seed)
+        self._sequence = itertools.count()
+        self._issued = itertools.count()
+        self._records: List[Tuple[str, float, int, bool]] = []  # (escenario, ms, status, 429)
+        self._exceptions: Dict[str, int] = {}
+        self._dropped = 0
+
+    def _pick(self) -> Scenario:
+        names, weights = zip(*self.mix)
+        return self.scenarios[self._random.choices(names, weights)[0]]
+
+    def _budget_left(self, deadline: float) -> bool:
+        if self.max_requests is not None and next(self._issued) >= self.max_requests:
+            return False
+        return time.perf_counter() < deadline
+
+    async def _send(self, client: httpx.AsyncClient, scenario: Scenario):
+        body = scenario.body(next(self._sequence)) if scenario.body else None
+        started = time.perf_counter()
+        try:
+            response = await client.request(scenario.method, scenario.path, json=body)
+        except httpx.HTTPError as e:
+            name = type(e).__name__
+            self._exceptions[name] = self._exceptions.get(name, 0) + 1
+            self._records.append((scenario.name, (time.perf_counter() - started) * 1000, 0, False))
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        self._records.append((scenario.name, elapsed, response.status_code,
+                              _is_rate_limited(response.status_code, response.content)))
+
+    async def _closed_loop(self, client: httpx.AsyncClient, deadline: float):
+        async def worker():
+            while self._budget_left(deadline):
+                await self._send(client, self._pick())
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+    async def _open_loop(self, client: httpx.AsyncClient, deadline: float):
+        interval = 1.0 / self.rps
+        in_flight = set()
+        next_at = time.perf_counter()
+        while self._budget_left(deadline):
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_at += interval
+            if len(in_flight) >= self.max_in_flight:
+                self._dropped += 1
+                continue
+            task = asyncio.ensure_future(self._send(client, self._pick()))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+    async def _upstream_calls(self, client: httpx.AsyncClient) -> Optional[int]:
+        """Respuestas de GHL registradas por el servidor (telemetría de /rate-limit/, sin llamar a GHL)"""
+        try:
+            response = await client.get(TELEMETRY_PATH)
+            return response.json().get('samples_recorded')
+        except (httpx.HTTPError, ValueError):
+            return None
+
+    async def run(self) -> Dict:
+        limits = httpx.Limits(max_connections=self.max_in_flight if self.rps else self.concurrency,
+                              max_keepalive_connections=self.max_in_flight if self.rps else self.concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as client:
+            calls_before = await self._upstream_calls(client)
+            started = time.perf_counter()
+            deadline = started + self.duration
+            if self.rps:
+                await self._open_loop(client, deadline)
+            else:
+                await self._closed_loop(client, deadline)
+            elapsed = time.perf_counter() - started
+            calls_after = await self._upstream_calls(client)
+
+        upstream = calls_after - calls_before if None not in (calls_before, calls_after) else None
+        return self.report(elapsed, upstream)
+
+    def report(self, elapsed: float, upstream_calls: Optional[int]) -> Dict:
+        def section(records) -> Dict:
+            total = len(records)
+            errors = sum(1 for _, _, status, _ in records if status == 0 or status >= 400)
+            limited = sum(1 for *_, rate_limited in records if rate_limited)
+            statuses: Dict[str, int] = {}
+            for _, _, status, _ in records:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            return {
+                'requests': total,
+                'throughput_rps': round(total / elapsed, 2) if elapsed else None,
+                'error_rate': round(errors / total, 4) if total else None,
+                'rate_limited_rate': round(limited / total, 4) if total else None,
+                'status_codes': statuses,
+                'latency_ms': summarize([ms for _, ms, _, _ in records]) if records else None,
+            }
+
+        overall = section(self._records)
+        overall['upstream_calls'] = upstream_calls
+        overall['upstream_calls_per_request'] = (
+            round(upstream_calls / len(self._records), 3) if upstream_calls is not None and self._records else None
+        )
+        overall['exceptions'] = self._exceptions
+        overall['dropped'] = self._dropped
+        return {
+            'created_at': datetime.now(dt_timezone.utc).isoformat(),
+            'config': {
+                'base_url': self.base_url,
+                'mode': 'rps' if self.rps else 'concurrency',
+                'rps': self.rps,
+                'concurrency': None if self.rps else self.concurrency,
+                'duration': self.duration,
+                'max_requests': self.max_requests,
+                'mix': dict(self.mix),
+            },
+            'elapsed_s': round(elapsed, 3),
+            'overall': overall,
+            'scenarios': {
+                name: section([r for r in self._records if r[0] == name])
+                for name, _ in self.mix
+            },
+        }
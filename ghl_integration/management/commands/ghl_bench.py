@@ -0,0 +1,137 @@
+"""
+Benchmarks de los endpoints contra un stub local de GHL (sin red ni token real):
+
+    python manage.py ghl_bench                        # tabla de latencias, memoria y llamadas a GHL
+    python manage.py ghl_bench --save-baseline        # guarda benchmarks/ghl_baseline.json
+    python manage.py ghl_bench --compare              # falla si hay regresiones respecto a la baseline
+    python manage.py ghl_bench --only calendars contacts --iterations 300 --output resultados.json
+
+Usa una base de datos de test y settings temporales (GHL_BASE_URL apuntando al stub), así que no
+toca la base de datos ni la configuración reales.
+"""
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from ghl_integration.benchmark import compare, default_cases, run_benchmarks, uncovered_url_names
+from ghl_integration.ghl_service import get_ghl_service
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer
+from ghl_integration.sync import GHLSync
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'ghl_baseline.json')
+# Cupo holgado: los headers x-ratelimit-* llegan igual, pero el rate limiter local nunca frena el benchmark
+BENCH_RATE_LIMIT = 1_000_000
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks de los endpoints de ghl_integration contra un stub local de GHL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100, help='Peticiones cronometradas por escenario')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--alloc-iterations', type=int, default=20,
+                            help='Peticiones medidas con tracemalloc (0 para no medir memoria)')
+        parser.add_argument('--only', nargs='+', help='Solo escenarios cuyo nombre contenga alguno de estos textos')
+        parser.add_argument('--output', help='Guarda los resultados en este JSON')
+        parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE,
+                            help=f'Guarda los resultados como baseline (por defecto {DEFAULT_BASELINE})')
+        parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE,
+                            help='Compara con una baseline y falla si hay regresiones')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Empeoramiento relativo tolerado en p50 de latencia y memoria (0.25 = 25%%)')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"No se pudo leer la baseline {options['compare']}: {e}")
+
+        cases = default_cases()
+        missing = uncovered_url_names(cases)
+        if missing:
+            self.stdout.write(self.style.WARNING(f"Endpoints sin escenario de benchmark: {', '.join(missing)}"))
+        if options['only']:
+            cases = [case for case in cases if any(text in case.name for text in options['only'])]
+            if not cases:
+                raise CommandError('Ningún escenario coincide con --only')
+
+        report = self._run(cases, options)
+        self._print(report, baseline)
+
+        for path in filter(None, [options['output'], options['save_baseline']]):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f'Resultados guardados en {path}')
+
+        if baseline is not None:
+            regressions = compare(report, baseline, threshold=options['threshold'])
+            if regressions:
+                for regression in regressions:
+                    self.stdout.write(self.style.ERROR(
+                        f"REGRESIÓN {regression['case']} {regression['metric']}: "
+                        f"{regression['baseline']} -> {regression['current']}"
+                    ))
+                raise CommandError(f'{len(regressions)} regresiones respecto a {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS(f"Sin regresiones respecto a {options['compare']}"))
+
+    def _run(self, cases, options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with GHLStubServer(rate_limit=BENCH_RATE_LIMIT) as stub, tempfile.TemporaryDirectory() as import_dir, override_settings(
+                GHL_BASE_URL=stub.url,
+                GHL_PRIVATE_TOKEN=STUB_TOKEN,
+                GHL_DEFAULT_LOCATION_ID=STUB_LOCATION_ID,
+                GHL_MOCK=False,
+                GHL_WEBHOOK_ALLOW_UNSIGNED=True,
+                GHL_WEBHOOK_PUBLIC_KEY=None,
+                GHL_WEBHOOK_SECRET=None,
+                GHL_IMPORT_DIR=import_dir,
+                ALLOWED_HOSTS=['testserver'],
+                DEBUG=False,
+            ):
+                # Espejo local para los escenarios ?source=local
+                GHLSync(get_ghl_service(), full=True).run()
+
+                def progress(name, result):
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"{name}: p50 {result['latency_ms']['p50']} ms")
+
+                report = run_benchmarks(
+                    cases, lambda: stub.total_requests,
+                    iterations=options['iterations'],
+                    warmup=options['warmup'],
+                    alloc_iterations=options['alloc_iterations'],
+                    progress=progress,
+                )
+                report['stub'] = stub.stats()
+                return report
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def _print(self, report, baseline=None):
+        base_results = (baseline or {}).get('results', {})
+        header = f"{'escenario':<30} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'KiB p50':>9} {'GHL/req':>8}  status"
+        if baseline:
+            header += '   Δp50'
+        self.stdout.write(header)
+        for name, result in report['results'].items():
+            latency = result['latency_ms']
+            alloc = result['alloc_kib']['p50'] if result['alloc_kib'] else '-'
+            statuses = ','.join(f'{code}x{count}' for code, count in sorted(result['status_codes'].items()))
+            line = (f"{name:<30} {latency['p50']:>9} {latency['p95']:>9} {latency['p99']:>9} {alloc:>9} "
+                    f"{result['upstream_calls_per_request']:>8}  {statuses}")
+            base = base_results.get(name)
+            if base and base['latency_ms']['p50']:
+                line += f"   {latency['p50'] / base['latency_ms']['p50'] - 1:+.0%}"
+            self.stdout.write(line)
@@ -0,0 +1,58 @@
+"""
+Importa contactos a GHL desde un archivo CSV o JSONL:
+
+    python manage.py ghl_import_contacts pacientes.csv --concurrency 5
+
+Si se interrumpe, volver a ejecutar el mismo comando reanuda desde el checkpoint.
+"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ghl_integration.ghl_service import get_ghl_service
+from ghl_integration.importer import IMPORT_FORMATS, ContactImporter, detect_format, iter_rows
+
+
+class Command(BaseCommand):
+    help = 'Importa contactos a GHL desde un archivo CSV o JSONL con checkpoint reanudable'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo CSV (con cabecera) o JSONL')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Por defecto se deduce de la extensión')
+        parser.add_argument('--location-id', help='locationId para filas sin él (si no, GHL_DEFAULT_LOCATION_ID)')
+        parser.add_argument('--concurrency', type=int,
+                            default=getattr(settings, 'GHL_IMPORT_CONCURRENCY', 5))
+        parser.add_argument('--checkpoint', help='Por defecto <path>.checkpoint.json')
+        parser.add_argument('--results', help='Por defecto <path>.results.jsonl')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = detect_format(path, options['format'])
+        if fmt is None:
+            raise CommandError('Formato no soportado. Usa un archivo .csv o .jsonl (o --format)')
+
+        importer = ContactImporter(
+            get_ghl_service(location_id=options['location_id']),
+            location_id=options['location_id'],
+            concurrency=options['concurrency'],
+            checkpoint_path=options['checkpoint'] or f'{path}.checkpoint.json',
+            results_path=options['results'] or f'{path}.results.jsonl',
+        )
+
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                for entry in importer.iter_run(iter_rows(f, fmt)):
+                    if options['verbosity'] > 1 or entry['status'] != 'created':
+                        self.stdout.write(json.dumps(entry, ensure_ascii=False))
+        except OSError as e:
+            raise CommandError(f'No se pudo leer {path}: {e}')
+
+        summary = importer.result_summary()
+        style = self.style.SUCCESS if summary['success'] else self.style.WARNING
+        self.stdout.write(style(
+            f"Procesadas {summary['processed']} filas: {summary['created']} creadas, "
+            f"{summary['failed']} fallidas, {summary['duplicate']} duplicadas, "
+            f"{summary['invalid']} inválidas, {summary['skipped']} ya importadas"
+        ))
+        self.stdout.write(f"Resultados: {summary['results_path']}")
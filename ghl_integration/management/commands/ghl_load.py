@@ -0,0 +1,110 @@
+"""
+Prueba de carga contra un servidor en marcha (runserver, gunicorn o uvicorn):
+
+    python manage.py ghl_load --concurrency 20 --duration 30
+    python manage.py ghl_load --rps 50 --mix ping=1,calendars=5,contacts=2,create_appointment=1
+    python manage.py ghl_load --url http://localhost:8000 --requests 2000 --output carga.json
+
+Con `--compare` muestra la diferencia con un resultado anterior exportado con `--output`.
+"""
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ghl_integration.loadgen import LoadGenerator, build_scenarios, parse_mix
+
+DEFAULT_MIX = 'ping=1,calendars=4,contacts=2,create_appointment=1'
+
+
+class Command(BaseCommand):
+    help = 'Genera carga concurrente contra los endpoints de GHL y reporta latencias, errores y 429'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help='Servidor del backend')
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f'Escenarios con pesos (por defecto {DEFAULT_MIX})')
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument('--concurrency', type=int, default=10, help='Peticiones simultáneas (lazo cerrado)')
+        mode.add_argument('--rps', type=float, help='Peticiones por segundo objetivo (lazo abierto)')
+        parser.add_argument('--duration', type=float, default=30.0, help='Segundos de carga')
+        parser.add_argument('--requests', type=int, help='Detenerse tras N peticiones')
+        parser.add_argument('--max-in-flight', type=int, default=1000, help='Tope de peticiones simultáneas con --rps')
+        parser.add_argument('--timeout', type=float, default=30.0)
+        parser.add_argument('--calendar-id', default='cal_mock_001', help='calendarId para create_appointment')
+        parser.add_argument('--contact-id', default='contact_mock_001', help='contactId para create_appointment')
+        parser.add_argument('--location-id', default=getattr(settings, 'GHL_DEFAULT_LOCATION_ID', None))
+        parser.add_argument('--seed', type=int, help='Semilla para repetir la misma secuencia de escenarios')
+        parser.add_argument('--output', help='Exporta el resultado a este JSON')
+        parser.add_argument('--compare', help='JSON de una ejecución anterior para comparar')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or (options['rps'] is not None and options['rps'] <= 0):
+            raise CommandError('--concurrency y --rps deben ser mayores que 0')
+        scenarios = build_scenarios(options['calendar_id'], options['contact_id'], options['location_id'])
+        try:
+            mix = parse_mix(options['mix'], scenarios)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    previous = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"No se pudo leer {options['compare']}: {e}")
+
+        generator = LoadGenerator(
+            options['url'], scenarios, mix,
+            concurrency=options['concurrency'],
+            rps=options['rps'],
+            duration=options['duration'],
+            max_requests=options['requests'],
+            timeout=options['timeout'],
+            max_in_flight=options['max_in_flight'],
+            seed=options['seed'],
+        )
+        mode = f"{options['rps']} rps" if options['rps'] else f"concurrencia {options['concurrency']}"
+        self.stdout.write(f"Carga contra {options['url']} ({mode}, {options['duration']}s): {options['mix']}")
+        report = asyncio.run(generator.run())
+        if not report['overall']['requests']:
+            raise CommandError('No se completó ninguna petición')
+
+        self._print(report, previous)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Resultado exportado a {options['output']}")
+
+    def _print(self, report, previous=None):
+        self.stdout.write(f"{'escenario':<20} {'req':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+                          f"{'p99 ms':>9} {'errores':>8} {'429':>7}")
+        rows = list(report['scenarios'].items()) + [('TOTAL', report['overall'])]
+        for name, section in rows:
+            latency = section['latency_ms'] or {}
+            self.stdout.write(
+                f"{name:<20} {section['requests']:>7} {section['throughput_rps'] or 0:>8} "
+                f"{latency.get('p50', '-'):>9} {latency.get('p95', '-'):>9} {latency.get('p99', '-'):>9} "
+                f"{section['error_rate'] or 0:>8.1%} {section['rate_limited_rate'] or 0:>7.1%}"
+            )
+
+        overall = report['overall']
+        self.stdout.write(f"Llamadas a GHL por petición: {overall['upstream_calls_per_request']} "
+                          f"({overall['upstream_calls']} en total, según /rate-limit/ del proceso que respondió)")
+        if overall['exceptions']:
+            self.stdout.write(self.style.WARNING(f"Errores de conexión: {overall['exceptions']}"))
+        if overall['dropped']:
+            self.stdout.write(self.style.WARNING(
+                f"{overall['dropped']} llegadas descartadas por superar --max-in-flight"))
+
+        if previous:
+            before = previous['overall']
+            for label, key in (('throughput', 'throughput_rps'), ('error_rate', 'error_rate')):
+                self.stdout.write(f"{label}: {before.get(key)} -> {overall.get(key)}")
+            for percentile in ('p50', 'p95', 'p99'):
+                old = (before.get('latency_ms') or {}).get(percentile)
+                new = (overall.get('latency_ms') or {}).get(percentile)
+                change = f' ({new / old - 1:+.0%})' if old and new else ''
+                self.stdout.write(f"{percentile}: {old} -> {new} ms{change}")
@@ -0,0 +1,86 @@
+"""
+Levanta el stand-in local de GHL en primer plano para pruebas de carga sin salir a internet:
+
+    python manage.py ghl_stub --port 8900 --latency lognormal:80:400
+    python manage.py ghl_stub --rate-limit 100 --error-rate 0.02 --drop-rate 0.005 --seed 1
+    python manage.py ghl_stub --route-latency contacts=uniform:200-400 --route-latency events=fixed:150
+
+Después basta con arrancar el backend con las variables que imprime (GHL_BASE_URL, token y location)
+y lanzar `manage.py ghl_load` contra él. Las estadísticas del stub están en GET /_stub/stats.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from ghl_integration.stub_server import (
+    GHL_BURST_INTERVAL, GHL_BURST_LIMIT, GHL_DAILY_LIMIT, STATS_PATH, STUB_LOCATION_ID, STUB_TOKEN,
+    GHLStubServer, StubData,
+)
+
+
+class Command(BaseCommand):
+    help = 'Stand-in HTTP local de GHL con latencia, rate limit x-ratelimit-* e inyección de fallos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8900)
+        parser.add_argument('--latency', help='Latencia de todas las rutas: fixed:50, uniform:20-200, '
+                                              'normal:100:30, exponential:100 o lognormal:MEDIANA:P99')
+        parser.add_argument('--route-latency', action='append', default=[], metavar='RUTA=LATENCIA',
+                            help='Latencia de una ruta (locations, calendars, events, create_appointment, '
+                                 'contacts, create_contact); se puede repetir')
+        parser.add_argument('--rate-limit', type=int, default=GHL_BURST_LIMIT,
+                            help=f'Peticiones por ventana y token (por defecto {GHL_BURST_LIMIT}; 0 sin límite)')
+        parser.add_argument('--rate-interval', type=float, default=GHL_BURST_INTERVAL, help='Segundos por ventana')
+        parser.add_argument('--daily-limit', type=int, default=GHL_DAILY_LIMIT)
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Probabilidad de responder un 5xx')
+        parser.add_argument('--timeout-rate', type=float, default=0.0,
+                            help='Probabilidad de tardar --hang-seconds en responder')
+        parser.add_argument('--hang-seconds', type=float, default=60.0)
+        parser.add_argument('--drop-rate', type=float, default=0.0, help='Probabilidad de cortar la conexión')
+        parser.add_argument('--calendars', type=int, default=3)
+        parser.add_argument('--contacts', type=int, default=250)
+        parser.add_argument('--appointments', type=int, default=50, help='Citas por calendario')
+        parser.add_argument('--location-id', default=STUB_LOCATION_ID)
+        parser.add_argument('--seed', type=int, help='Semilla para repetir latencias y fallos')
+
+    def handle(self, *args, **options):
+        rates = [options['error_rate'], options['timeout_rate'], options['drop_rate']]
+        if any(rate < 0 for rate in rates) or sum(rates) > 1:
+            raise CommandError('--error-rate, --timeout-rate y --drop-rate deben estar entre 0 y 1 y sumar como mucho 1')
+        route_latency = {}
+        for value in options['route_latency']:
+            route, _, spec = value.partition('=')
+            if not spec:
+                raise CommandError(f'--route-latency espera RUTA=LATENCIA: {value}')
+            route_latency[route] = spec
+
+        data = StubData(options['location_id'], calendars=options['calendars'], contacts=options['contacts'],
+                        appointments_per_calendar=options['appointments'])
+        try:
+            stub = GHLStubServer(
+                options['host'], options['port'], data,
+                latency=options['latency'],
+                route_latency=route_latency,
+                rate_limit=options['rate_limit'] or None,
+                rate_interval=options['rate_interval'],
+                daily_limit=options['daily_limit'],
+                error_rate=options['error_rate'],
+                timeout_rate=options['timeout_rate'],
+                hang_seconds=options['hang_seconds'],
+                drop_rate=options['drop_rate'],
+                seed=options['seed'],
+            )
+        except (ValueError, OSError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f'Stub de GHL escuchando en {stub.url}'))
+        self.stdout.write('Arranca el backend con:')
+        self.stdout.write(f'  GHL_BASE_URL={stub.url} GHL_PRIVATE_TOKEN={STUB_TOKEN} '
+                          f'GHL_DEFAULT_LOCATION_ID={options["location_id"]} GHL_MOCK=False')
+        self.stdout.write(f'Estadísticas: {stub.url}{STATS_PATH}  (Ctrl+C para salir)')
+        try:
+            stub.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.stop()
+            self.stdout.write(f'Peticiones atendidas: {stub.stats()}')
@@ -0,0 +1,46 @@
+"""
+Sincroniza calendarios, contactos y citas de GHL al espejo local:
+
+    python manage.py ghl_sync                 # incremental (cursor por updatedAt)
+    python manage.py ghl_sync --full          # completa, borra lo que ya no existe en GHL
+    python manage.py ghl_sync --resources contacts --location-id LOCATION_ID
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from ghl_integration.ghl_service import GHLRequestError, get_ghl_service
+from ghl_integration.sync import SYNC_RESOURCES, GHLSync
+
+
+class Command(BaseCommand):
+    help = 'Sincroniza calendarios, contactos y citas de GHL a la base de datos local'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--location-id', help='Por defecto GHL_DEFAULT_LOCATION_ID')
+        parser.add_argument('--full', action='store_true',
+                            help='Sincronización completa en lugar de incremental')
+        parser.add_argument('--resources', nargs='+', choices=SYNC_RESOURCES, default=list(SYNC_RESOURCES))
+        parser.add_argument('--past-days', type=int, help='Citas desde hace N días (GHL_SYNC_PAST_DAYS)')
+        parser.add_argument('--future-days', type=int, help='Citas hasta dentro de N días (GHL_SYNC_FUTURE_DAYS)')
+
+    def handle(self, *args, **options):
+        sync = GHLSync(
+            get_ghl_service(location_id=options['location_id']),
+            location_id=options['location_id'],
+            full=options['full'],
+            past_days=options['past_days'],
+            future_days=options['future_days'],
+        )
+        # Los calendarios van primero: las citas se piden calendario a calendario
+        resources = [r for r in SYNC_RESOURCES if r in options['resources']]
+        try:
+            summary = sync.run(resources)
+        except ValueError as e:
+            raise CommandError(str(e))
+        except GHLRequestError as e:
+            raise CommandError(f"GHL devolvió un error ({e.result.get('status_code')}): {e}")
+
+        for resource, result in summary.items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{resource}: {result['fetched']} leídos, {result['written']} escritos, "
+                f"{result['unchanged']} sin cambios, {result['deleted']} borrados"
+            ))
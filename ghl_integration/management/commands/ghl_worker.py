@@ -0,0 +1,54 @@
+"""
+Procesa la cola de escrituras hacia GHL (citas y contactos creados con ?async=1):
+
+    python manage.py ghl_worker                   # en primer plano hasta Ctrl+C / SIGTERM
+    python manage.py ghl_worker --concurrency 8
+    python manage.py ghl_worker --once            # vacía los trabajos listos y termina (cron)
+
+Se pueden lanzar varios workers a la vez (en Postgres usan SKIP LOCKED). El estado de cada trabajo
+se consulta en GET /api/ghl/jobs/<id>/.
+"""
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ghl_integration.jobs import JobWorker
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de citas y contactos pendientes de crear en GHL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int,
+                            default=getattr(settings, 'GHL_JOBS_WORKER_CONCURRENCY', 4),
+                            help='Trabajos en vuelo como máximo (se reduce sola ante 429)')
+        parser.add_argument('--poll-interval', type=float,
+                            default=getattr(settings, 'GHL_JOBS_POLL_INTERVAL', 1.0),
+                            help='Segundos entre consultas a la cola cuando está vacía')
+        parser.add_argument('--once', action='store_true', help='Termina cuando no quedan trabajos listos')
+        parser.add_argument('--max-jobs', type=int, help='Termina tras procesar N trabajos')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['poll_interval'] <= 0:
+            raise CommandError('--concurrency y --poll-interval deben ser mayores que 0')
+
+        def report(job, result):
+            if job.status == job.QUEUED:
+                self.stdout.write(self.style.WARNING(
+                    f'{job.kind} {job.id}: intento {job.attempts} falló ({job.status_code}), '
+                    f'se reintenta a las {job.run_after:%H:%M:%S}'
+                ))
+            elif result.get('success'):
+                self.stdout.write(self.style.SUCCESS(f'{job.kind} {job.id}: completado'))
+            else:
+                self.stdout.write(self.style.ERROR(f'{job.kind} {job.id}: falló ({job.status_code})'))
+
+        worker = JobWorker(options['concurrency'], options['poll_interval'], on_result=report)
+        # Ctrl+C y SIGTERM (systemd, docker stop): deja de reservar y espera a los trabajos en vuelo
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda signum, frame: worker.stop())
+        self.stdout.write(f'Worker {worker.name} procesando la cola (concurrencia {worker.concurrency})')
+        summary = worker.run(once=options['once'], max_jobs=options['max_jobs'])
+        self.stdout.write(f"Procesados: {summary['processed']} (completados {summary['succeeded']}, "
+                          f"fallidos {summary['failed']}, reprogramados {summary['retried']})")
@@ -0,0 +1,596 @@
+"""
+Métricas en formato de exposición de Prometheus (texto 0.0.4) sin dependencias externas:
+latencia de las peticiones a GHL y de las vistas, peticiones en curso, reutilización del pool
+de conexiones, aciertos de la caché y el último estado de rate limit. Las sirve /metrics/.
+
+Registrar una muestra es un incremento bajo un lock, así que se puede dejar activado en
+producción. Con varios workers cada proceso vuelca sus métricas en GHL_METRICS_DIR y /metrics/
+suma las de todos, responda el worker que responda.
+"""
+import atexit
+import json
+import logging
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Segundos; cubren desde un acierto de caché hasta un timeout de GHL
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FILE_PREFIX = 'ghl_metrics_'
+
+Key = Tuple[str, ...]
+
+
+class _Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Key, object] = {}
+
+    def _key(self, labels: Dict) -> Key:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def describe(self) -> Dict:
+        return {'type': self.type, 'help': self.documentation, 'labels': list(self.labelnames)}
+
+    def samples(self) -> List:
+        """[[valores de las etiquetas], valor] serializables en JSON"""
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels):
+        """Para contadores que ya lleva otro objeto (p.ej. el pool de conexiones), desde un collector"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(_Metric):
+    """
+    Valor instantáneo. `aggregate` decide cómo se combinan los workers: 'sum' suma los procesos
+    vivos (peticiones en curso) y 'latest' se queda con el valor más reciente (rate limit de GHL).
+    """
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), aggregate: str = 'sum'):
+        super().__init__(name, documentation, labelnames)
+        self.aggregate = aggregate
+
+    def describe(self) -> Dict:
+        return {**super().describe(), 'aggregate': self.aggregate}
+
+    def set(self, value: float, timestamp: Optional[float] = None, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = [value, timestamp if timestamp is not None else time.time()]
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            current = self._values.get(key)
+            self._values[key] = [(current[0] if current else 0) + amount, time.time()]
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @staticmethod
+    def _copy(value):
+        return list(value)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def describe(self) -> Dict:
+        return {**super().describe(), 'buckets': list(self.buckets)}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # Primer bucket con límite >= value (le="..." es inclusivo); el último índice es +Inf
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @staticmethod
+    def _copy(value):
+        return [list(value[0]), value[1], value[2]]
+
+
+class MetricsRegistry:
+    """
+    Métricas del proceso. Los collectors se ejecutan al tomar cada snapshot para copiar
+    estadísticas que ya llevan otros objetos (pool, caché, telemetría) sin instrumentarlos.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (), aggregate: str = 'sum') -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, aggregate))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, function: Callable[[], None]) -> Callable[[], None]:
+        self._collectors.append(function)
+        return function
+
+    def snapshot(self) -> Dict:
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.warning(f"Collector de métricas {collect.__name__} falló: {e}")
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            'pid': os.getpid(),
+            'process': process_id(),
+            'timestamp': time.time(),
+            'metrics': {metric.name: {**metric.describe(), 'samples': metric.samples()} for metric in metrics},
+        }
+
+    def clear(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+_process = (None, None)
+
+
+def process_id() -> str:
+    """
+    Identificador único del proceso (host, pid y un token aleatorio): el pid solo no basta con
+    workers en varios contenedores que comparten GHL_METRICS_DIR ni cuando el sistema lo reutiliza.
+    Se regenera tras un fork.
+    """
+    global _process
+    pid, value = _process
+    if pid != os.getpid():
+        pid = os.getpid()
+        value = f'{socket.gethostname()}-{pid}-{uuid.uuid4().hex[:8]}'
+        _process = (pid, value)
+    return value
+
+
+def merge_snapshots(snapshots: List[Dict], live: Optional[set] = None) -> Dict:
+    """
+    Combina snapshots de varios procesos: suma contadores e histogramas (también de workers
+    que ya terminaron, para que no retrocedan mientras su volcado exista), suma los gauges 'sum'
+    de los procesos vivos (`live`, ids de process_id()) y toma el valor más reciente de los
+    gauges 'latest'.
+    """
+    merged: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        alive = live is None or snapshot.get('process', snapshot['pid']) in live
+        for name, metric in snapshot['metrics'].items():
+            target = merged.setdefault(name, {**{k: v for k, v in metric.items() if k != 'samples'}, 'values': {}})
+            values = target['values']
+            for labels, value in metric['samples']:
+                key = tuple(labels)
+                if metric['type'] == 'counter':
+                    values[key] = values.get(key, 0) + value
+                elif metric['type'] == 'histogram':
+                    if metric.get('buckets') != target.get('buckets'):
+                        continue
+                    current = values.setdefault(key, [[0] * len(value[0]), 0.0, 0])
+                    current[0] = [a + b for a, b in zip(current[0], value[0])]
+                    current[1] += value[1]
+                    current[2] += value[2]
+                elif metric.get('aggregate') == 'latest':
+                    if key not in values or value[1] >= values[key][1]:
+                        values[key] = list(value)
+                elif alive:
+                    current = values.setdefault(key, [0, 0])
+                    values[key] = [current[0] + value[0], max(current[1], value[1])]
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(merged: Dict) -> str:
+    """Texto de exposición de Prometheus a partir de merge_snapshots()"""
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        if not metric['values']:
+            continue
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        names = metric['labels']
+        for key, value in sorted(metric['values'].items()):
+            if metric['type'] == 'histogram':
+                cumulative = 0
+                for bound, count in zip(list(metric['buckets']) + [float('inf')], value[0]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(names, key, ('le', _number(bound)))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(names, key)} {_number(value[1])}")
+                lines.append(f"{name}_count{_labels(names, key)} {value[2]}")
+            else:
+                number = value[0] if metric['type'] == 'gauge' else value
+                lines.append(f"{name}{_labels(names, key)} {_number(number)}")
+    return '\n'.join(lines) + '\n'
+
+
+class MultiProcessStore:
+    """
+    Volcado de los snapshots de cada worker a `directory` (un JSON por proceso, escrito de forma
+    atómica) cada `interval` segundos desde un hilo en segundo plano, para que cualquier worker
+    pueda servir el total sin escribir ficheros mientras atiende peticiones.
+
+    La fecha de modificación de cada volcado hace de latido: un proceso cuyo fichero no se
+    actualizó en `3 * interval` segundos ya no cuenta como vivo (sus gauges dejan de sumarse) y
+    pasados `ttl` segundos el fichero se borra al servir /metrics/.
+    """
+
+    def __init__(self, directory: str, interval: float = 5.0, ttl: float = 3600.0):
+        self.directory = directory
+        self.interval = interval
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, process: str) -> str:
+        return os.path.join(self.directory, f'{FILE_PREFIX}{process}.json')
+
+    def start(self, registry: MetricsRegistry):
+        """Arranca (una vez por proceso) el hilo que vuelca las métricas cada `interval` segundos"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, args=(registry,), name='ghl-metrics', daemon=True)
+                self._thread.start()
+
+    def _run(self, registry: MetricsRegistry):
+        while True:
+            self.write(registry.snapshot())
+            if self._stopped.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stopped.set()
+
+    def write(self, snapshot: Dict):
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp_')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, self._path(snapshot['process']))
+        except OSError as e:
+            logger.warning(f"No se pudieron volcar las métricas en {self.directory}: {e}")
+
+    def collect(self, registry: MetricsRegistry) -> Tuple[List[Dict], set]:
+        """
+        Snapshot del proceso actual (fresco) más los volcados del resto de workers; borra los
+        que llevan más de `ttl` segundos sin actualizarse
+        """
+        own = registry.snapshot()
+        self.write(own)
+        snapshots, live = [own], {own['process']}
+        now = time.time()
+        for filename in os.listdir(self.directory):
+            if not filename.startswith(FILE_PREFIX) or not filename.endswith('.json'):
+                continue
+            process = filename[len(FILE_PREFIX):-len('.json')]
+            if process == own['process']:
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                age = now - os.path.getmtime(path)
+                if age > self.ttl:
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+            if age <= 3 * self.interval:
+                live.add(process)
+        return snapshots, live
+
+
+registry = MetricsRegistry()
+
+UPSTREAM_LATENCY = registry.histogram(
+    'ghl_upstream_request_duration_seconds', 'Duración de cada intento HTTP contra la API de GHL',
+    ('method', 'endpoint', 'status'))
+UPSTREAM_IN_FLIGHT = registry.gauge('ghl_upstream_requests_in_flight', 'Peticiones HTTP a GHL en curso')
+HTTP_LATENCY = registry.histogram(
+    'ghl_http_request_duration_seconds', 'Duración de las peticiones atendidas por el backend',
+    ('method', 'view', 'status'))
+HTTP_IN_FLIGHT = registry.gauge('ghl_http_requests_in_flight', 'Peticiones en curso en el backend')
+CACHE_LOOKUPS = registry.counter(
+    'ghl_cache_lookups_total', 'Consultas a la caché de respuestas de GHL (hit, miss o bypass con ?fresh=1)',
+    ('endpoint', 'result'))
+CACHE_HIT_RATIO = registry.gauge(
+    'ghl_cache_hit_ratio', 'Aciertos / (aciertos + fallos) de la caché de respuestas', ('endpoint',))
+CACHE_ENTRIES = registry.gauge('ghl_cache_entries', 'Entradas en la caché de respuestas')
+CACHE_BYTES = registry.gauge('ghl_cache_bytes', 'Tamaño aproximado de la caché de respuestas')
+# pool: 'default' o el locationId de un tenant con pool propio (ver tenants.py)
+POOL_REQUESTS = registry.counter(
+    'ghl_pool_requests_total', 'Peticiones enviadas por el pool de conexiones HTTP hacia GHL', ('pool', 'host'))
+POOL_CREATED = registry.counter(
+    'ghl_pool_connections_created_total', 'Conexiones TCP/TLS abiertas por el pool', ('pool', 'host'))
+POOL_REUSED = registry.counter(
+    'ghl_pool_connections_reused_total', 'Peticiones que reutilizaron una conexión keep-alive', ('pool', 'host'))
+POOL_OPEN = registry.gauge('ghl_pool_connections_open', 'Conexiones abiertas en el pool', ('pool', 'host', 'state'))
+RATE_LIMIT_REMAINING = registry.gauge(
+    'ghl_ratelimit_remaining', 'x-ratelimit-remaining de la última respuesta de GHL', ('namespace',),
+    aggregate='latest')
+RATE_LIMIT_LIMIT = registry.gauge(
+    'ghl_ratelimit_limit', 'x-ratelimit-max de la última respuesta de GHL', ('namespace',), aggregate='latest')
+RATE_LIMIT_DAILY_REMAINING = registry.gauge(
+    'ghl_ratelimit_daily_remaining', 'x-ratelimit-daily-remaining de la última respuesta de GHL', ('namespace',),
+    aggregate='latest')
+WORKERS = registry.gauge('ghl_metrics_workers', 'Procesos cuyas métricas incluye esta respuesta')
+
+
+def metrics_enabled() -> bool:
+    return getattr(settings, 'GHL_METRICS_ENABLED', True)
+
+
+# Segmentos de ruta con pinta de id (números, hex, ids de GHL) -> ':id', para acotar la cardinalidad
+_ID_SEGMENT = re.compile(r'^(?=[^/]*\d)[A-Za-z0-9_-]{8,}$')
+
+
+def endpoint_label(endpoint: str) -> str:
+    path = endpoint.split('?')[0].strip('/')
+    return '/' + '/'.join(':id' if _ID_SEGMENT.match(part) else part for part in path.split('/') if part)
+
+
+class _UpstreamCall:
+    __slots__ = ('status',)
+
+    def __init__(self):
+        self.status = 'error'
+
+
+@contextmanager
+def track_upstream(method: str, endpoint: str):
+    """Mide un intento HTTP contra GHL; quien llama asigna `.status` (código HTTP, 'timeout' o 'error')"""
+    if not metrics_enabled():
+        yield _UpstreamCall()
+        return
+    call = _UpstreamCall()
+    UPSTREAM_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    try:
+        yield call
+    finally:
+        UPSTREAM_IN_FLIGHT.dec()
+        UPSTREAM_LATENCY.observe(time.perf_counter() - started, method=method.upper(),
+                                 endpoint=endpoint_label(endpoint), status=call.status)
+
+
+def record_cache_lookup(endpoint: str, result: str):
+    if metrics_enabled():
+        CACHE_LOOKUPS.inc(endpoint=endpoint, result=result)
+
+
+@registry.collector
+def _collect_connection_pool():
+    from .http_pool import connection_pools
+
+    for pool_name, pool in connection_pools().items():
+        for host in pool.stats()['hosts']:
+            labels = {'pool': pool_name, 'host': host['host']}
+            POOL_REQUESTS.set_total(host['requests'], **labels)
+            POOL_CREATED.set_total(host['created'], **labels)
+            POOL_REUSED.set_total(host['reused'], **labels)
+            POOL_OPEN.set(host['idle'], state='idle', **labels)
+            POOL_OPEN.set(host['in_use'], state='in_use', **labels)
+
+
+@registry.collector
+def _collect_response_cache():
+    from .cache import get_response_cache
+
+    stats = get_response_cache().stats()
+    CACHE_ENTRIES.set(stats['entries'])
+    CACHE_BYTES.set(stats['bytes'])
+
+
+@registry.collector
+def _collect_rate_limit():
+    from .telemetry import get_rate_limit_telemetry
+
+    # Solo lo visto por este proceso: al combinar workers gana la muestra más reciente de cada cuenta
+    for namespace, latest in get_rate_limit_telemetry().local_latest().items():
+        for gauge, field in ((RATE_LIMIT_REMAINING, 'remaining'), (RATE_LIMIT_LIMIT, 'limit'),
+                             (RATE_LIMIT_DAILY_REMAINING, 'daily_remaining')):
+            if isinstance(latest.get(field), int):
+                gauge.set(latest[field], timestamp=latest['timestamp'], namespace=namespace)
+
+
+def _derive(merged: Dict, snapshots: List[Dict]):
+    """Métricas que solo tienen sentido sobre el total de workers"""
+    lookups = merged.get(CACHE_LOOKUPS.name, {}).get('values', {})
+    ratios = {}
+    for endpoint in {key[0] for key in lookups}:
+        hits, misses = lookups.get((endpoint, 'hit'), 0), lookups.get((endpoint, 'miss'), 0)
+        if hits + misses:
+            ratios[(endpoint,)] = [round(hits / (hits + misses), 4), 0]
+    merged[CACHE_HIT_RATIO.name] = {**CACHE_HIT_RATIO.describe(), 'values': ratios}
+    merged[WORKERS.name] = {**WORKERS.describe(), 'values': {(): [len(snapshots), 0]}}
+
+
+def render_metrics() -> str:
+    """Exposición de las métricas del proceso o, con GHL_METRICS_DIR, de todos los workers"""
+    store = get_metrics_store()
+    if store is not None:
+        snapshots, live = store.collect(registry)
+    else:
+        snapshots, live = [registry.snapshot()], None
+    merged = merge_snapshots(snapshots, live)
+    _derive(merged, snapshots)
+    return render(merged)
+
+
+class MetricsMiddleware:
+    """
+    Mide la duración de cada petición (por nombre de URL, método y status) y las peticiones en
+    curso. Va primero en MIDDLEWARE para incluir el resto de middlewares. En las respuestas en
+    streaming mide hasta que empieza el envío.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not metrics_enabled():
+            return self.get_response(request)
+        started = self._start()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self._finish(request, response, started)
+
+    async def __acall__(self, request):
+        if not metrics_enabled():
+            return await self.get_response(request)
+        started = self._start()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self._finish(request, response, started)
+
+    @staticmethod
+    def _start() -> float:
+        HTTP_IN_FLIGHT.inc()
+        return time.perf_counter()
+
+    @staticmethod
+    def _finish(request, response, started: float):
+        HTTP_IN_FLIGHT.dec()
+        match = getattr(request, 'resolver_match', None)
+        # Solo nombres de URL: las rutas sin resolver (404) irían con cardinalidad ilimitada
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        HTTP_LATENCY.observe(time.perf_counter() - started, method=request.method, view=view or 'unnamed',
+                             status=str(response.status_code) if response is not None else '500')
+        # Solo se asegura de que el hilo de volcado del worker esté en marcha (sin escribir aquí)
+        get_metrics_store()
+
+
+_store: Optional[MultiProcessStore] = None
+_store_lock = threading.Lock()
+
+
+def get_metrics_store() -> Optional[MultiProcessStore]:
+    """Volcado multi-proceso configurado con GHL_METRICS_DIR, o None si las métricas son por proceso"""
+    global _store
+    directory = getattr(settings, 'GHL_METRICS_DIR', None)
+    if not directory:
+        return None
+    store = _store
+    if store is None:
+        with _store_lock:
+            if _store is None:
+                _store = MultiProcessStore(directory, getattr(settings, 'GHL_METRICS_FLUSH_INTERVAL', 5.0),
+                                           getattr(settings, 'GHL_METRICS_FILE_TTL', 3600.0))
+                atexit.register(lambda store=_store: store.write(registry.snapshot()))
+            store = _store
+    # Tras un fork (gunicorn --preload) el hilo del padre no existe en el hijo
+    store.start(registry)
+    return store
+
+
+def reset_metrics_store():
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.stop()
+        _store = None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(setting, **kwargs):
+    if setting.startswith('GHL_METRICS_'):
+        reset_metrics_store()
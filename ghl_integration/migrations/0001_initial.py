@@ -0,0 +1,95 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GHLCalendar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ghl_id', models.CharField(max_length=64, unique=True)),
+                ('location_id', models.CharField(db_index=True, max_length=64)),
+                ('raw', models.JSONField(default=dict)),
+                ('ghl_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'verbose_name': 'calendario GHL',
+                'verbose_name_plural': 'calendarios GHL',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GHLSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(max_length=32)),
+                ('location_id', models.CharField(max_length=64)),
+                ('cursor', models.DateTimeField(blank=True, null=True)),
+                ('last_full_sync_at', models.DateTimeField(blank=True, null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_run_items', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'estado de sincronización GHL',
+                'verbose_name_plural': 'estados de sincronización GHL',
+            },
+        ),
+        migrations.CreateModel(
+            name='GHLAppointment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ghl_id', models.CharField(max_length=64, unique=True)),
+                ('location_id', models.CharField(db_index=True, max_length=64)),
+                ('raw', models.JSONField(default=dict)),
+                ('ghl_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+                ('calendar_id', models.CharField(db_index=True, max_length=64)),
+                ('contact_id', models.CharField(blank=True, max_length=64)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(blank=True, max_length=32)),
+                ('start_time', models.DateTimeField(db_index=True, null=True)),
+                ('end_time', models.DateTimeField(null=True)),
+            ],
+            options={
+                'verbose_name': 'cita GHL',
+                'verbose_name_plural': 'citas GHL',
+                'ordering': ['start_time'],
+                'indexes': [models.Index(fields=['calendar_id', 'start_time'], name='ghl_appt_cal_start_idx'), models.Index(fields=['location_id', 'start_time'], name='ghl_appt_loc_start_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='GHLContact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ghl_id', models.CharField(max_length=64, unique=True)),
+                ('location_id', models.CharField(db_index=True, max_length=64)),
+                ('raw', models.JSONField(default=dict)),
+                ('ghl_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+                ('first_name', models.CharField(blank=True, max_length=255)),
+                ('last_name', models.CharField(blank=True, max_length=255)),
+                ('email', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('phone', models.CharField(blank=True, max_length=64)),
+            ],
+            options={
+                'verbose_name': 'contacto GHL',
+                'verbose_name_plural': 'contactos GHL',
+                'ordering': ['last_name', 'first_name'],
+                'indexes': [models.Index(fields=['location_id', 'email'], name='ghl_contact_loc_email_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ghlsyncstate',
+            constraint=models.UniqueConstraint(fields=('resource', 'location_id'), name='ghl_sync_state_unique'),
+        ),
+    ]
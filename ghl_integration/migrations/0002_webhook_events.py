@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ghl_integration', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GHLWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=128, unique=True)),
+                ('event_type', models.CharField(db_index=True, max_length=64)),
+                ('location_id', models.CharField(blank=True, max_length=64)),
+                ('object_id', models.CharField(blank=True, max_length=64)),
+                ('occurred_at', models.DateTimeField(db_index=True)),
+                ('payload', models.JSONField(default=dict)),
+                ('received_at', models.DateTimeField()),
+                ('processed_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'evento de webhook GHL',
+                'verbose_name_plural': 'eventos de webhook GHL',
+                'ordering': ['occurred_at'],
+            },
+        ),
+    ]
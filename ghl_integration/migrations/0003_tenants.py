@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-17 11:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ghl_integration', '0002_webhook_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GHLTenant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location_id', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('private_token', models.CharField(max_length=255)),
+                ('active', models.BooleanField(default=True)),
+                ('rate_limit_capacity', models.PositiveIntegerField(blank=True, null=True)),
+                ('pool_maxsize', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'tenant GHL',
+                'verbose_name_plural': 'tenants GHL',
+                'ordering': ['name', 'location_id'],
+            },
+        ),
+    ]
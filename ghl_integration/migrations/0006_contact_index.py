@@ -0,0 +1,66 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:46
+
+from django.db import migrations, models
+
+
+def fill_search_keys(apps, schema_editor):
+    """Calcula las claves de búsqueda de los contactos que ya estaban en el espejo"""
+    from ghl_integration.sync import normalize_name, normalize_phone
+
+    GHLContact = apps.get_model('ghl_integration', 'GHLContact')
+    batch = []
+    for contact in GHLContact.objects.only('id', 'first_name', 'last_name', 'phone').iterator(chunk_size=500):
+        contact.phone_key = normalize_phone(contact.phone)[::-1]
+        contact.name_key = normalize_name(f'{contact.first_name} {contact.last_name}')
+        contact.surname_key = normalize_name(f'{contact.last_name} {contact.first_name}')
+        batch.append(contact)
+        if len(batch) >= 500:
+            GHLContact.objects.bulk_update(batch, ['phone_key', 'name_key', 'surname_key'])
+            batch = []
+    GHLContact.objects.bulk_update(batch, ['phone_key', 'name_key', 'surname_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ghl_integration', '0005_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ghlcontact',
+            name='ghl_contact_loc_email_idx',
+        ),
+        migrations.AddField(
+            model_name='ghlcontact',
+            name='name_key',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='ghlcontact',
+            name='phone_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='ghlcontact',
+            name='surname_key',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='ghlcontact',
+            index=models.Index(fields=['location_id', 'email'], name='ghl_contact_loc_email_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='ghlcontact',
+            index=models.Index(fields=['location_id', 'phone_key'], name='ghl_contact_loc_phone_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='ghlcontact',
+            index=models.Index(fields=['location_id', 'name_key'], name='ghl_contact_loc_name_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='ghlcontact',
+            index=models.Index(fields=['location_id', 'surname_key'], name='ghl_contact_loc_surname_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+    ]
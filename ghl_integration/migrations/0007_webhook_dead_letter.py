@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ghl_integration', '0006_contact_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ghlwebhookevent',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='ghlwebhookevent',
+            name='object_id',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
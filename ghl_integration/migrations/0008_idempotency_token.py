@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-17 04:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ghl_integration', '0007_webhook_dead_letter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ghlidempotencykey',
+            name='token',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -1,3 +1,214 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
+
+
+class GHLMirrorModel(models.Model):
+    """
+    Base de las copias locales de GHL (ver sync.py y `manage.py ghl_sync`).
+    `raw` guarda el objeto completo tal como lo devolvió GHL, para servirlo sin transformar.
+    """
+    ghl_id = models.CharField(max_length=64, unique=True)
+    location_id = models.CharField(max_length=64, db_index=True)
+    raw = models.JSONField(default=dict)
+    ghl_updated_at = models.DateTimeField(null=True, blank=True)
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class GHLCalendar(GHLMirrorModel):
+    name = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'calendario GHL'
+        verbose_name_plural = 'calendarios GHL'
+
+    def __str__(self):
+        return self.name or self.ghl_id
+
+
+class GHLContact(GHLMirrorModel):
+    first_name = models.CharField(max_length=255, blank=True)
+    last_name = models.CharField(max_length=255, blank=True)
+    email = models.CharField(max_length=255, blank=True, db_index=True)
+    phone = models.CharField(max_length=64, blank=True)
+    # Claves normalizadas para /contacts/search/ (ver sync.contact_fields y contact_index.py)
+    phone_key = models.CharField(max_length=64, blank=True)
+    name_key = models.CharField(max_length=255, blank=True)
+    surname_key = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['last_name', 'first_name']
+        # Las búsquedas son por prefijo (LIKE 'x%'); en Postgres el índice necesita varchar_pattern_ops
+        indexes = [
+            models.Index(fields=['location_id', 'email'], name='ghl_contact_loc_email_idx',
+                         opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']),
+            models.Index(fields=['location_id', 'phone_key'], name='ghl_contact_loc_phone_idx',
+                         opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']),
+            models.Index(fields=['location_id', 'name_key'], name='ghl_contact_loc_name_idx',
+                         opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']),
+            models.Index(fields=['location_id', 'surname_key'], name='ghl_contact_loc_surname_idx',
+                         opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']),
+        ]
+        verbose_name = 'contacto GHL'
+        verbose_name_plural = 'contactos GHL'
+
+    def __str__(self):
+        return f"{self.first_name} {self.last_name}".strip() or self.email or self.ghl_id
+
+
+class GHLAppointment(GHLMirrorModel):
+    calendar_id = models.CharField(max_length=64, db_index=True)
+    contact_id = models.CharField(max_length=64, blank=True)
+    title = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=32, blank=True)
+    start_time = models.DateTimeField(null=True, db_index=True)
+    end_time = models.DateTimeField(null=True)
+
+    class Meta:
+        ordering = ['start_time']
+        indexes = [
+            models.Index(fields=['calendar_id', 'start_time'], name='ghl_appt_cal_start_idx'),
+            models.Index(fields=['location_id', 'start_time'], name='ghl_appt_loc_start_idx'),
+        ]
+        verbose_name = 'cita GHL'
+        verbose_name_plural = 'citas GHL'
+
+    def __str__(self):
+        return f"{self.title or self.ghl_id} ({self.start_time})"
+
+
+class GHLSyncState(models.Model):
+    """Cursor de sincronización incremental por recurso y location"""
+    resource = models.CharField(max_length=32)
+    location_id = models.CharField(max_length=64)
+    cursor = models.DateTimeField(null=True, blank=True)  # Mayor updatedAt visto en GHL
+    last_full_sync_at = models.DateTimeField(null=True, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_run_items = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['resource', 'location_id'], name='ghl_sync_state_unique'),
+        ]
+        verbose_name = 'estado de sincronización GHL'
+        verbose_name_plural = 'estados de sincronización GHL'
+
+    def __str__(self):
+        return f"{self.resource} @ {self.location_id}"
+
+
+class GHLWebhookEvent(models.Model):
+    """Evento de webhook recibido de GHL; event_id único para descartar reenvíos"""
+    event_id = models.CharField(max_length=128, unique=True)
+    event_type = models.CharField(max_length=64, db_index=True)
+    location_id = models.CharField(max_length=64, blank=True)
+    object_id = models.CharField(max_length=64, blank=True, db_index=True)
+    occurred_at = models.DateTimeField(db_index=True)
+    payload = models.JSONField(default=dict)
+    received_at = models.DateTimeField()
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Error si no se pudo aplicar (dead letter): queda procesado para no bloquear a los siguientes
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['occurred_at']
+        verbose_name = 'evento de webhook GHL'
+        verbose_name_plural = 'eventos de webhook GHL'
+
+    def __str__(self):
+        return f"{self.event_type} {self.object_id} ({self.event_id})"
+
+
+class GHLTenant(models.Model):
+    """
+    Subcuenta (location) con su propio Private Integration Token. Sus peticiones usan su token,
+    su pool de conexiones y su rate limiter (ver tenants.py). GHL_TENANTS tiene prioridad.
+    """
+    location_id = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, blank=True)
+    private_token = models.CharField(max_length=255)
+    active = models.BooleanField(default=True)
+    # Vacíos = valores globales (GHL_RATE_LIMIT_CAPACITY, GHL_TENANT_POOL_MAXSIZE)
+    rate_limit_capacity = models.PositiveIntegerField(null=True, blank=True)
+    pool_maxsize = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name', 'location_id']
+        verbose_name = 'tenant GHL'
+        verbose_name_plural = 'tenants GHL'
+
+    def __str__(self):
+        return self.name or self.location_id
+
+
+class GHLJob(models.Model):
+    """
+    Escritura hacia GHL encolada en la base de datos (modo asíncrono de create_appointment y
+    create_contact). La procesa `manage.py ghl_worker`; ver jobs.py.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'En cola'),
+        (RUNNING, 'En curso'),
+        (SUCCEEDED, 'Completado'),
+        (FAILED, 'Fallido'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=32)
+    location_id = models.CharField(max_length=64, blank=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)  # No se reintenta antes (backoff)
+    worker = models.CharField(max_length=128, blank=True)
+    lease = models.CharField(max_length=32, blank=True)  # Token de la reserva del worker
+    locked_at = models.DateTimeField(null=True, blank=True)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='ghl_job_status_run_idx'),
+        ]
+        verbose_name = 'trabajo GHL'
+        verbose_name_plural = 'trabajos GHL'
+
+    def __str__(self):
+        return f"{self.kind} {self.id} ({self.status})"
+
+
+class GHLIdempotencyKey(models.Model):
+    """
+    Resultado de una creación con header Idempotency-Key (ver idempotency.py). Solo hashes y la
+    respuesta; status_code vacío = la primera petición sigue en curso.
+    """
+    key_hash = models.CharField(max_length=64, unique=True)  # sha256 de endpoint + Idempotency-Key
+    request_hash = models.CharField(max_length=64)  # sha256 del body, para detectar reutilizaciones
+    token = models.CharField(max_length=32, blank=True)  # Reserva de la petición que la ejecuta
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'clave de idempotencia GHL'
+        verbose_name_plural = 'claves de idempotencia GHL'
 
-# Create your models here.
+    def __str__(self):
+        return f"{self.key_hash[:12]} ({self.status_code or 'en curso'})"
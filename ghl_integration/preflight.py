@@ -0,0 +1,242 @@
+"""
+Pre-flight de citas: valida y normaliza los horarios y detecta solapes con un índice en memoria
+por calendario antes de llamar a GHL, así una cita inválida o en conflicto se rechaza en
+microsegundos sin gastar una petición ni cupo de rate limit.
+"""
+import threading
+import time
+import uuid
+from bisect import bisect_left, insort
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+from .availability import FREE_STATUSES
+from .models import GHLAppointment
+from .sync import parse_ghl_datetime
+
+Entry = Tuple[int, int, str]  # (inicio, fin, id de la cita o de la reserva) en segundos epoch
+
+
+def _error(message: str, status_code: int = 400, **extra) -> Dict:
+    return {'success': False, 'message': message, 'status_code': status_code, 'preflight': True, **extra}
+
+
+def normalize_appointment(data: Dict) -> Tuple[Dict, Optional[Dict]]:
+    """
+    Parsea startTime/endTime (ISO-8601 o epoch) y los normaliza a ISO-8601 con zona.
+
+    Returns:
+        (payload normalizado, payload_de_error); el error es None si la cita es válida
+    """
+    times = {}
+    for field in ('startTime', 'endTime'):
+        value = data.get(field)
+        try:
+            times[field] = parse_ghl_datetime(value)
+        except (TypeError, ValueError, OverflowError, OSError):
+            times[field] = None
+        if times[field] is None:
+            return data, _error(f'{field} no es una fecha ISO-8601 válida: {value!r}', field=field)
+    if times['startTime'] >= times['endTime']:
+        return data, _error('startTime debe ser anterior a endTime')
+    return {**data, **{field: value.isoformat() for field, value in times.items()}}, None
+
+
+class _CalendarIntervals:
+    """Intervalos ocupados de un calendario ordenados por inicio (sin fusionar, para poder quitarlos)"""
+
+    def __init__(self, entries: Iterable[Entry], loaded_at: float):
+        self.items: List[Entry] = sorted(entries)
+        self.spans: Dict[str, Entry] = {entry[2]: entry for entry in self.items}
+        self.max_length = max((end - start for start, end, _ in self.items), default=0)
+        self.loaded_at = loaded_at
+
+    def overlaps(self, start: int, end: int) -> List[str]:
+        # Solo pueden solapar los que empiezan en [start - duración máxima, end)
+        index = bisect_left(self.items, (start - self.max_length,))
+        conflicts = []
+        while index < len(self.items) and self.items[index][0] < end:
+            if self.items[index][1] > start:
+                conflicts.append(self.items[index][2])
+            index += 1
+        return conflicts
+
+    def add(self, entry: Entry):
+        self.discard(entry[2])
+        insort(self.items, entry)
+        self.spans[entry[2]] = entry
+        self.max_length = max(self.max_length, entry[1] - entry[0])
+
+    def discard(self, key: str):
+        entry = self.spans.pop(key, None)
+        if entry is not None:
+            del self.items[bisect_left(self.items, entry)]
+
+
+class AppointmentIndex:
+    """
+    Índice en memoria de citas por calendario para detectar solapes.
+
+    Cada calendario se carga la primera vez que se consulta con `loader` (por defecto el espejo
+    local, ver manage.py ghl_sync) y se recarga pasado `ttl` segundos o tras un webhook de sus citas.
+    Las citas que se están creando quedan reservadas en el índice mientras dura la llamada a GHL,
+    así dos peticiones simultáneas al mismo horario no pasan ambas el pre-flight.
+    """
+
+    def __init__(self, loader: Optional[Callable[[str], Iterable[Entry]]] = None, ttl: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self._loader = loader or load_mirror_intervals
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._calendars: Dict[str, _CalendarIntervals] = {}
+        self._stats = {'checks': 0, 'conflicts': 0, 'loads': 0, 'reserved': 0, 'confirmed': 0, 'released': 0}
+
+    def _calendar(self, calendar_id: str) -> _CalendarIntervals:
+        with self._lock:
+            calendar = self._calendars.get(calendar_id)
+            if calendar is not None and self._clock() - calendar.loaded_at < self.ttl:
+                return calendar
+        loaded = _CalendarIntervals(list(self._loader(calendar_id)), self._clock())
+        with self._lock:
+            self._stats['loads'] += 1
+            current = self._calendars.get(calendar_id)
+            if current is not None and self._clock() - current.loaded_at < self.ttl:
+                # Otro hilo lo recargó mientras tanto
+                return current
+            # Las reservas en curso sobreviven a la recarga
+            for entry in (current.items if current is not None else []):
+                if entry[2].startswith('pending:'):
+                    loaded.add(entry)
+            self._calendars[calendar_id] = loaded
+            return loaded
+
+    def reserve(self, calendar_id: str, start: int, end: int) -> Tuple[Optional[str], List[str]]:
+        """
+        Reserva [start, end) en el calendario si no se solapa con nada.
+
+        Returns:
+            (id de la reserva, []) o (None, ids de las citas en conflicto)
+        """
+        calendar = self._calendar(calendar_id)
+        with self._lock:
+            self._stats['checks'] += 1
+            conflicts = calendar.overlaps(start, end)
+            if conflicts:
+                self._stats['conflicts'] += 1
+                return None, conflicts
+            token = f'pending:{uuid.uuid4().hex}'
+            calendar.add((start, end, token))
+            self._stats['reserved'] += 1
+            return token, []
+
+    def confirm(self, calendar_id: str, token: str, appointment_id: Optional[str]):
+        """La cita se creó en GHL: la reserva pasa a ser la cita"""
+        with self._lock:
+            calendar = self._calendars.get(calendar_id)
+            entry = calendar.spans.get(token) if calendar else None
+            if entry is None:
+                return
+            calendar.discard(token)
+            calendar.add((entry[0], entry[1], appointment_id or token.replace('pending:', 'created:')))
+            self._stats['confirmed'] += 1
+
+    def release(self, calendar_id: str, token: str):
+        """GHL rechazó la cita (o no se llegó a enviar): se libera el horario reservado"""
+        with self._lock:
+            calendar = self._calendars.get(calendar_id)
+            if calendar is not None:
+                calendar.discard(token)
+            self._stats['released'] += 1
+
+    def invalidate(self, calendar_id: Optional[str] = None):
+        """Fuerza a recargar un calendario (o todos) en la siguiente consulta"""
+        with self._lock:
+            for key in ([calendar_id] if calendar_id else list(self._calendars)):
+                calendar = self._calendars.get(key)
+                if calendar is not None:
+                    calendar.loaded_at = float('-inf')
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self._stats,
+                'calendars': len(self._calendars),
+                'intervals': sum(len(calendar.items) for calendar in self._calendars.values()),
+                'ttl': self.ttl,
+            }
+
+
+def load_mirror_intervals(calendar_id: str) -> Iterable[Entry]:
+    """Citas activas del calendario en el espejo local"""
+    rows = (GHLAppointment.objects
+            .filter(calendar_id=calendar_id, start_time__isnull=False, end_time__isnull=False)
+            .values_list('start_time', 'end_time', 'ghl_id', 'status'))
+    for start, end, ghl_id, appointment_status in rows.iterator():
+        if appointment_status.lower() not in FREE_STATUSES:
+            yield int(start.timestamp()), int(end.timestamp()), ghl_id
+
+
+def check_appointment(data: Dict) -> Tuple[Dict, Optional[Dict], Optional[Callable[[Dict], None]]]:
+    """
+    Pre-flight completo de una cita antes de enviarla a GHL.
+
+    Returns:
+        (payload normalizado, payload_de_error, finish). Si no hay error, hay que llamar a
+        `finish(resultado)` tras la llamada a GHL para confirmar o liberar la reserva (None si
+        no se reservó nada: chequeo desactivado, cita cancelada o ignoreFreeSlotValidation).
+    """
+    data, error = normalize_appointment(data)
+    if error:
+        return data, error, None
+
+    index = get_appointment_index()
+    status = str(data.get('appointmentStatus') or '').lower()
+    if index is None or status in FREE_STATUSES or data.get('ignoreFreeSlotValidation'):
+        return data, None, None
+
+    calendar_id = str(data['calendarId'])
+    start = int(parse_ghl_datetime(data['startTime']).timestamp())
+    end = int(parse_ghl_datetime(data['endTime']).timestamp())
+    token, conflicts = index.reserve(calendar_id, start, end)
+    if token is None:
+        return data, _error('El horario se solapa con otra cita del calendario', 409, conflicts=conflicts), None
+
+    def finish(result: Dict):
+        if result.get('success'):
+            index.confirm(calendar_id, token, (result.get('data') or {}).get('id'))
+        else:
+            index.release(calendar_id, token)
+
+    return data, None, finish
+
+
+_index: Optional[AppointmentIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_appointment_index() -> Optional[AppointmentIndex]:
+    """Índice de citas del proceso, o None si GHL_PREFLIGHT_CONFLICTS es False"""
+    global _index
+    if not getattr(settings, 'GHL_PREFLIGHT_CONFLICTS', True):
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AppointmentIndex(ttl=getattr(settings, 'GHL_PREFLIGHT_INDEX_TTL', 300))
+    return _index
+
+
+def reset_appointment_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(setting, **kwargs):
+    if setting.startswith('GHL_PREFLIGHT_'):
+        reset_appointment_index()
@@ -0,0 +1,276 @@
+"""
+Desglose del tiempo de cada petición en el header Server-Timing (middlewares, vista, espera a GHL
+y serialización) y perfilado por muestreo (cProfile o pyinstrument) de 1 de cada N peticiones
+a GHL_PROFILE_DIR, para ver los puntos calientes en producción sin redesplegar.
+"""
+import contextvars
+import cProfile
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+try:
+    # Opcional: perfila bien las vistas async (cProfile mezcla las corrutinas del event loop)
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:
+    PyinstrumentProfiler = None
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimings:
+    """Tiempos acumulados (segundos) por fase dentro de una petición; varias llamadas a GHL se suman"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+            self.counts[phase] = self.counts.get(phase, 0) + 1
+
+
+# Se hereda en las corrutinas y en los hilos de sync_to_async/bulk (el objeto es el mismo, se muta)
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar('ghl_request_timings',
+                                                                                      default=None)
+
+
+@contextmanager
+def timed(phase: str):
+    """Suma la duración del bloque a `phase` de la petición en curso (no hace nada fuera de una petición)"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+
+def server_timing_enabled() -> bool:
+    return getattr(settings, 'GHL_SERVER_TIMING', True)
+
+
+def _entry(name: str, seconds: float, description: str) -> str:
+    return f'{name};dur={seconds * 1000:.2f};desc="{description}"'
+
+
+class _Profile:
+    """Un perfil en curso con cProfile o pyinstrument"""
+
+    def __init__(self, kind: str, is_async: bool):
+        self.kind = kind
+        if kind == 'pyinstrument':
+            self._profiler = PyinstrumentProfiler(async_mode='enabled' if is_async else 'disabled')
+        else:
+            self._profiler = cProfile.Profile()
+
+    def start(self):
+        if self.kind == 'pyinstrument':
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self):
+        if self.kind == 'pyinstrument':
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def filename(self, name: str) -> str:
+        return f"{name}.{'html' if self.kind == 'pyinstrument' else 'prof'}"
+
+    def save(self, path: str):
+        if self.kind == 'pyinstrument':
+            with open(path, 'w') as f:
+                f.write(self._profiler.output_html())
+        else:
+            self._profiler.dump_stats(path)
+
+
+class ServerTimingMiddleware:
+    """
+    Añade `Server-Timing` con el desglose de la petición:
+
+    - middleware: middlewares y resolución de la URL (total - vista - render)
+    - view: DRF y código de la vista, sin la espera a GHL
+    - ghl: peticiones HTTP a GHL (suma de todas las llamadas e intentos)
+    - ghl-wait: resto de las llamadas al servicio (rate limiter, backoff de reintentos, logging)
+    - render: serialización de las respuestas de DRF
+    - total
+
+    Con GHL_PROFILE_SAMPLE_RATE = N > 0 perfila 1 de cada N peticiones y guarda el perfil en
+    GHL_PROFILE_DIR (como mucho uno a la vez por proceso). Va justo después de MetricsMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            # Hooks async: uno sync obligaría al handler ASGI a saltar a un hilo en cada petición
+            self.process_view = self._aprocess_view
+            self.process_template_response = self._aprocess_template_response
+        self._sequence = itertools.count()
+        self._profiling = threading.Lock()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profile = self._start_profile(request)
+        token, started = self._start(request)
+        response = None
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+            self._stop_profile(profile, saved=response is not None)
+        return self._finish(request, response, started, profile)
+
+    async def __acall__(self, request):
+        profile = self._start_profile(request)
+        token, started = self._start(request)
+        response = None
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+            self._stop_profile(profile, saved=response is not None)
+        return self._finish(request, response, started, profile)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._ghl_view_started = time.perf_counter()
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        request._ghl_view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Se llama al volver la vista y justo antes de renderizar; el callback marca el final del render
+        request._ghl_view_finished = time.perf_counter()
+        response.add_post_render_callback(lambda rendered: setattr(request, '_ghl_rendered', time.perf_counter()))
+        return response
+
+    async def _aprocess_template_response(self, request, response):
+        return ServerTimingMiddleware.process_template_response(self, request, response)
+
+    @staticmethod
+    def _start(request):
+        request._ghl_timings = RequestTimings()
+        return _current.set(request._ghl_timings), time.perf_counter()
+
+    def _finish(self, request, response, started: float, profile: Optional[_Profile]):
+        finished = time.perf_counter()
+        if profile is not None:
+            self._save_profile(request, response, profile, finished - started)
+        if not server_timing_enabled():
+            return response
+
+        timings: RequestTimings = request._ghl_timings
+        total = finished - started
+        view_started = getattr(request, '_ghl_view_started', None)
+        view_finished = getattr(request, '_ghl_view_finished', None)
+        rendered = getattr(request, '_ghl_rendered', None)
+        view = ((view_finished or finished) - view_started) if view_started is not None else 0.0
+        render = rendered - view_finished if rendered is not None and view_finished is not None else 0.0
+        ghl_http = timings.phases.get('ghl', 0.0)
+        ghl_call = max(timings.phases.get('ghl_call', 0.0), ghl_http)
+        calls = timings.counts.get('ghl', 0)
+
+        entries = [
+            _entry('middleware', max(0.0, total - view - render), 'Middlewares y routing'),
+            _entry('view', max(0.0, view - ghl_call), 'DRF y vista'),
+            _entry('ghl', ghl_http, f'HTTP a GHL ({calls} llamadas)'),
+            _entry('ghl-wait', ghl_call - ghl_http, 'Rate limiter, reintentos y logging'),
+            _entry('render', render, 'Serialización'),
+            _entry('total', total, 'Total'),
+        ]
+        response['Server-Timing'] = ', '.join(entries)
+        origin = request.META.get('HTTP_ORIGIN')
+        if origin and origin in getattr(settings, 'CORS_ALLOWED_ORIGINS', []):
+            # Sin esto el navegador oculta Server-Timing a JS de otro origen (el frontend en :3000)
+            response['Timing-Allow-Origin'] = origin
+        return response
+
+    # Perfilado por muestreo
+
+    def _start_profile(self, request) -> Optional[_Profile]:
+        rate = getattr(settings, 'GHL_PROFILE_SAMPLE_RATE', 0)
+        if not rate or next(self._sequence) % rate:
+            return None
+        if not self._profiling.acquire(blocking=False):
+            return None
+        kind = getattr(settings, 'GHL_PROFILER', 'cprofile')
+        if kind == 'pyinstrument' and PyinstrumentProfiler is None:
+            logger.warning('GHL_PROFILER=pyinstrument requiere instalar el paquete pyinstrument; se usa cProfile')
+            kind = 'cprofile'
+        try:
+            profile = _Profile(kind, self.is_async)
+            profile.start()
+        except Exception as e:
+            self._profiling.release()
+            logger.warning(f'No se pudo iniciar el perfilado: {e}')
+            return None
+        return profile
+
+    def _stop_profile(self, profile: Optional[_Profile], saved: bool):
+        if profile is not None:
+            profile.stop()
+            if not saved:
+                # La petición terminó en excepción: no hay respuesta a la que asociar el perfil
+                self._profiling.release()
+
+    def _save_profile(self, request, response, profile: _Profile, total: float):
+        """
+        Pone el nombre del perfil en X-GHL-Profile y lo escribe en un hilo aparte: volcar el perfil
+        (y podar el directorio) es I/O bloqueante que no debe sumar a la respuesta ni frenar el
+        event loop con ASGI. El hilo libera el cupo de perfilado al terminar.
+        """
+        try:
+            directory = getattr(settings, 'GHL_PROFILE_DIR', None) or os.path.join(settings.BASE_DIR, 'profiles')
+            match = getattr(request, 'resolver_match', None)
+            view = re.sub(r'[^A-Za-z0-9_-]', '_', (match.url_name if match else None) or 'unmatched')
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}_{view}_{response.status_code}_{total * 1000:.0f}ms_{os.getpid()}"
+            filename = profile.filename(name)
+            threading.Thread(target=self._write_profile, name='ghl-profile', daemon=True,
+                             args=(profile, directory, filename)).start()
+        except Exception:
+            self._profiling.release()
+            raise
+        response['X-GHL-Profile'] = filename
+
+    def _write_profile(self, profile: _Profile, directory: str, filename: str):
+        try:
+            os.makedirs(directory, exist_ok=True)
+            profile.save(os.path.join(directory, filename))
+            _prune(directory, getattr(settings, 'GHL_PROFILE_MAX_FILES', 200))
+        except OSError as e:
+            logger.warning(f'No se pudo guardar el perfil: {e}')
+        finally:
+            self._profiling.release()
+
+
+def _prune(directory: str, keep: int):
+    """Borra los perfiles más antiguos para no llenar el disco"""
+    files = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(('.prof', '.html'))]
+    if len(files) <= keep:
+        return
+    files.sort(key=os.path.getmtime)
+    for path in files[:len(files) - keep]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,151 @@
+"""
+Limitador de peticiones del lado cliente (token bucket) que se ajusta con los
+headers x-ratelimit-* que devuelve GHL, para no llegar a los 429.
+"""
+import asyncio
+import threading
+import time
+import logging
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BLOCK = 'block'
+FAIL_FAST = 'fail_fast'
+
+
+class RateLimitExceeded(Exception):
+    """No hay cupo disponible y el llamador pidió no esperar (o la espera supera su timeout)"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f'Rate limit local alcanzado, reintenta en {retry_after:.2f}s')
+
+
+class TokenBucket:
+    """
+    Token bucket: `capacity` peticiones por ventana de `interval` segundos, recargado de forma continua.
+
+    Cada petición reserva un token. En modo bloqueante el token se reserva aunque el saldo quede
+    negativo y el llamador duerme el tiempo de espera calculado, así las peticiones concurrentes
+    quedan espaciadas en orden de llegada. `clock`, `sleep` y `async_sleep` son inyectables para
+    poder probarlo con un reloj falso.
+    """
+
+    def __init__(self, capacity: int = 100, interval: float = 10.0, safety_margin: int = 0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep,
+                 async_sleep: Callable = asyncio.sleep):
+        self.capacity = capacity
+        self.interval = interval
+        self.safety_margin = safety_margin
+        self._clock = clock
+        self._sleep = sleep
+        self._async_sleep = async_sleep
+
+        self._lock = threading.Lock()
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._waits = 0
+        self._rejections = 0
+        self._total_wait = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Tokens recargados por segundo"""
+        return self.capacity / self.interval if self.interval > 0 else float('inf')
+
+    def _refill(self, now: float):
+        # Debe llamarse con self._lock tomado
+        elapsed = max(0.0, now - self._updated)
+        self._tokens = min(float(self.capacity), self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def _reserve(self, block: bool, timeout: Optional[float]) -> float:
+        """Reserva un token y devuelve cuántos segundos hay que esperar antes de usarlo"""
+        with self._lock:
+            self._refill(self._clock())
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if wait > 0 and (not block or (timeout is not None and wait > timeout)):
+                self._rejections += 1
+                raise RateLimitExceeded(wait)
+            self._tokens -= 1
+            if wait > 0:
+                self._waits += 1
+                self._total_wait += wait
+            return wait
+
+    def acquire(self, block: bool = True, timeout: Optional[float] = None) -> float:
+        """
+        Obtiene permiso para hacer una petición.
+
+        Args:
+            block: True espera hasta que haya cupo; False falla de inmediato
+            timeout: Espera máxima en segundos (solo modo bloqueante)
+
+        Returns:
+            float: Segundos esperados
+
+        Raises:
+            RateLimitExceeded: Si no hay cupo y no se puede (o no se quiere) esperar
+        """
+        wait = self._reserve(block, timeout)
+        if wait > 0:
+            logger.info(f"⏳ Rate limiter: esperando {wait:.2f}s antes de llamar a GHL")
+            self._sleep(wait)
+        return wait
+
+    async def acquire_async(self, block: bool = True, timeout: Optional[float] = None) -> float:
+        """Versión asyncio de acquire(): espera sin bloquear el event loop"""
+        wait = self._reserve(block, timeout)
+        if wait > 0:
+            await self._async_sleep(wait)
+        return wait
+
+    def update_from_headers(self, rate_limit_info: Optional[Dict], status_code: Optional[int] = None):
+        """
+        Ajusta el bucket con la información de _extract_rate_limit_info:
+        'limit' (x-ratelimit-max), 'interval_ms' (x-ratelimit-interval-milliseconds)
+        y 'remaining' (x-ratelimit-remaining). Un 429 vacía el bucket.
+        """
+        info = rate_limit_info or {}
+        with self._lock:
+            self._refill(self._clock())
+            limit = info.get('limit')
+            if isinstance(limit, int) and limit > 0:
+                self.capacity = limit
+            interval_ms = info.get('interval_ms')
+            if isinstance(interval_ms, int) and interval_ms > 0:
+                self.interval = interval_ms / 1000
+            remaining = info.get('remaining')
+            if isinstance(remaining, int):
+                # Solo se reduce: GHL sabe de peticiones que este proceso no ve (otros workers)
+                self._tokens = min(self._tokens, float(remaining - self.safety_margin))
+            if status_code == 429:
+                self._tokens = min(self._tokens, 0.0)
+
+    def state(self) -> Dict:
+        with self._lock:
+            self._refill(self._clock())
+            return {
+                'capacity': self.capacity,
+                'interval_seconds': self.interval,
+                'safety_margin': self.safety_margin,
+                'available': round(self._tokens, 2),
+                'waits': self._waits,
+                'total_wait_seconds': round(self._total_wait, 3),
+                'rejections': self._rejections,
+            }
+
+    @classmethod
+    def from_settings(cls, **kwargs) -> 'TokenBucket':
+        """Bucket con la configuración de settings; los kwargs la sustituyen (p.ej. capacity de un tenant)"""
+        params = {
+            'capacity': getattr(settings, 'GHL_RATE_LIMIT_CAPACITY', 100),
+            'interval': getattr(settings, 'GHL_RATE_LIMIT_INTERVAL', 10.0),
+            'safety_margin': getattr(settings, 'GHL_RATE_LIMIT_SAFETY_MARGIN', 0),
+        }
+        params.update(kwargs)
+        return cls(**params)
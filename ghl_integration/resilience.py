@@ -0,0 +1,272 @@
+"""
+Reintentos con backoff y circuit breaker por endpoint para las llamadas a GHL
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+logger = logging.getLogger(__name__)
+
+# Métodos que se pueden repetir sin riesgo de duplicar efectos en GHL
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """El circuito del endpoint está abierto: GHL viene fallando y no se intenta la llamada"""
+
+    def __init__(self, circuit: str, retry_after: float):
+        self.circuit = circuit
+        self.retry_after = retry_after
+        super().__init__(f'Circuito abierto para {circuit}, reintenta en {retry_after:.1f}s')
+
+
+class RetryPolicy:
+    """
+    Decide si un resultado de _make_request se reintenta y cuánto esperar.
+
+    - Se reintentan 429, 5xx y errores de conexión/timeout
+    - Métodos no idempotentes (POST, PATCH) solo ante 429, que GHL rechaza sin procesar,
+      salvo que `retry_non_idempotent` sea True
+    - La espera respeta Retry-After o el reset de x-ratelimit-*; si no hay, backoff
+      exponencial con jitter completo, siempre acotado por `max_delay`
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 10.0,
+                 retry_non_idempotent: bool = False,
+                 rng: Callable[[float, float], float] = random.uniform,
+                 clock: Callable[[], float] = time.time,
+                 sleep: Callable[[float], None] = time.sleep,
+                 async_sleep: Callable = asyncio.sleep):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_non_idempotent = retry_non_idempotent
+        self._rng = rng
+        self._clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+
+        self._lock = threading.Lock()
+        self._retries = 0
+        self._exhausted = 0
+
+    def should_retry(self, method: str, result: Dict, attempt: int) -> bool:
+        if result.get('success') or 'local_rate_limit' in result or 'circuit' in result:
+            return False
+        status_code = result.get('status_code')
+        if status_code not in RETRY_STATUSES:
+            return False
+        if method.upper() not in IDEMPOTENT_METHODS and status_code != 429 and not self.retry_non_idempotent:
+            return False
+        if attempt >= self.max_attempts:
+            with self._lock:
+                self._exhausted += 1
+            return False
+        with self._lock:
+            self._retries += 1
+        return True
+
+    def delay(self, attempt: int, result: Dict) -> float:
+        """Segundos a esperar antes del intento `attempt + 1`"""
+        server_delay = self._server_delay(result)
+        if server_delay is not None:
+            return min(max(0.0, server_delay), self.max_delay)
+        return self._rng(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _server_delay(self, result: Dict) -> Optional[float]:
+        """Espera indicada por GHL: Retry-After (segundos o fecha HTTP) o reset de la ventana"""
+        info = result.get('rate_limit') or {}
+        retry_after = info.get('retry_after')
+        if isinstance(retry_after, int):
+            return float(retry_after)
+        if isinstance(retry_after, str):
+            try:
+                return parsedate_to_datetime(retry_after).timestamp() - self._clock()
+            except (TypeError, ValueError):
+                pass
+        if result.get('status_code') != 429:
+            return None
+        reset = info.get('reset')
+        if isinstance(reset, int):
+            # Timestamp Unix o segundos restantes, igual que en _log_rate_limits
+            return reset - self._clock() if reset > 1000000000 else float(reset)
+        interval_ms = info.get('interval_ms')
+        if isinstance(interval_ms, int) and interval_ms > 0:
+            # GHL no indica cuándo se reinicia la ventana: como mucho dura un intervalo
+            return self._rng(0.5, 1.0) * interval_ms / 1000
+        return None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'max_attempts': self.max_attempts,
+                'retries': self._retries,
+                'exhausted': self._exhausted,
+            }
+
+    @classmethod
+    def from_settings(cls, **kwargs) -> 'RetryPolicy':
+        return cls(
+            max_attempts=getattr(settings, 'GHL_RETRY_MAX_ATTEMPTS', 3),
+            base_delay=getattr(settings, 'GHL_RETRY_BASE_DELAY', 0.5),
+            max_delay=getattr(settings, 'GHL_RETRY_MAX_DELAY', 10.0),
+            retry_non_idempotent=getattr(settings, 'GHL_RETRY_NON_IDEMPOTENT', False),
+            **kwargs,
+        )
+
+
+class _Circuit:
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.times_opened = 0
+        self.rejected = 0
+
+
+class CircuitBreaker:
+    """
+    Un circuito por endpoint. Tras `failure_threshold` fallos seguidos (5xx, timeout o error de
+    conexión) se abre y las llamadas fallan al instante durante `recovery_timeout` segundos;
+    después se deja pasar una sola llamada de prueba (half-open) que lo cierra o lo reabre.
+    Los 4xx (incluido 429) no cuentan como fallo: GHL está respondiendo.
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._circuits: Dict[str, _Circuit] = {}
+
+    def before_request(self, key: str):
+        """Lanza CircuitOpenError si el circuito no admite la llamada"""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit.state == CLOSED:
+                return
+            remaining = circuit.opened_at + self.recovery_timeout - self._clock()
+            if circuit.state == OPEN and remaining <= 0:
+                circuit.state = HALF_OPEN
+                circuit.probing = False
+            if circuit.state == HALF_OPEN and not circuit.probing:
+                circuit.probing = True
+                logger.info(f"🔌 Circuito {key}: llamada de prueba a GHL")
+                return
+            circuit.rejected += 1
+            raise CircuitOpenError(key, max(0.0, remaining))
+
+    def record(self, key: str, result: Dict):
+        """Registra el resultado de una llamada que pasó por before_request"""
+        if result.get('success') or (result.get('status_code') or 0) < 500:
+            self._on_success(key)
+        else:
+            self._on_failure(key)
+
+    def release(self, key: str):
+        """
+        La llamada autorizada terminó sin resultado (rate limit local, excepción, cancelación):
+        libera la prueba half-open para que la siguiente llamada pueda hacerla
+        """
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is not None and circuit.state == HALF_OPEN:
+                circuit.probing = False
+
+    def _on_success(self, key: str):
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None:
+                return
+            if circuit.state != CLOSED:
+                logger.info(f"🔌 Circuito {key} cerrado: GHL responde de nuevo")
+            circuit.state = CLOSED
+            circuit.failures = 0
+            circuit.probing = False
+
+    def _on_failure(self, key: str):
+        with self._lock:
+            circuit = self._circuits.setdefault(key, _Circuit())
+            circuit.failures += 1
+            if circuit.state == HALF_OPEN or circuit.failures >= self.failure_threshold:
+                if circuit.state != OPEN:
+                    circuit.times_opened += 1
+                    logger.warning(f"🔌 Circuito {key} abierto tras {circuit.failures} fallos; "
+                                   f"se reintenta en {self.recovery_timeout}s")
+                circuit.state = OPEN
+                circuit.opened_at = self._clock()
+                circuit.probing = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'failure_threshold': self.failure_threshold,
+                'recovery_timeout': self.recovery_timeout,
+                'circuits': {
+                    key: {
+                        'state': circuit.state,
+                        'consecutive_failures': circuit.failures,
+                        'times_opened': circuit.times_opened,
+                        'rejected': circuit.rejected,
+                    }
+                    for key, circuit in self._circuits.items()
+                },
+            }
+
+    @classmethod
+    def from_settings(cls, **kwargs) -> 'CircuitBreaker':
+        return cls(
+            failure_threshold=getattr(settings, 'GHL_CIRCUIT_FAILURE_THRESHOLD', 5),
+            recovery_timeout=getattr(settings, 'GHL_CIRCUIT_RECOVERY_TIMEOUT', 30.0),
+            **kwargs,
+        )
+
+
+def circuit_key(namespace: str, endpoint: str) -> str:
+    """Circuito por cuenta y ruta del endpoint (sin query string)"""
+    path = '/' + endpoint.split('?')[0].strip('/')
+    return f"{namespace}:{path}"
+
+
+_breaker: Optional[CircuitBreaker] = None
+_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker() -> Optional[CircuitBreaker]:
+    """Circuit breaker del proceso, o None si GHL_CIRCUIT_BREAKER_ENABLED es False"""
+    global _breaker
+    if not getattr(settings, 'GHL_CIRCUIT_BREAKER_ENABLED', True):
+        return None
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker.from_settings()
+    return _breaker
+
+
+def reset_circuit_breaker():
+    global _breaker
+    with _breaker_lock:
+        _breaker = None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(setting, **kwargs):
+    if setting.startswith('GHL_CIRCUIT_'):
+        reset_circuit_breaker()
+
@@ -0,0 +1,121 @@
+"""
+Coalescencia de peticiones (single-flight): llamadas idénticas y concurrentes a GHL
+comparten una única petición en vuelo y todas reciben su resultado.
+"""
+import asyncio
+import threading
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """Petición en vuelo (hilos): los seguidores esperan el evento del líder"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+def _shared(result: Any) -> Any:
+    # Copia superficial para que un llamador no modifique el dict que reciben los demás
+    return dict(result) if isinstance(result, dict) else result
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas con la misma clave mientras hay una en vuelo. Funciona con hilos
+    (do) y con asyncio (do_async); en asyncio la agrupación es por event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Future] = {}
+        self._leaders = 0
+        self._coalesced = 0
+        self._async_leaders = 0
+        self._async_coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Ejecuta fn() salvo que ya haya una llamada con la misma clave en vuelo; en ese caso espera su resultado"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._leaders += 1
+                leader = True
+
+        if not leader:
+            logger.debug(f"Single-flight: reutilizando petición en vuelo {key}")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return _shared(call.result)
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Versión asyncio de do(): fn es una corrutina"""
+        loop = asyncio.get_running_loop()
+        loop_key = (loop, key)
+        with self._lock:
+            future = self._async_calls.get(loop_key)
+            if future is not None:
+                self._async_coalesced += 1
+            else:
+                self._async_calls[loop_key] = loop.create_future()
+                self._async_leaders += 1
+
+        if future is not None:
+            # shield: si este seguidor se cancela no cancela la petición compartida
+            return _shared(await asyncio.shield(future))
+
+        future = self._async_calls[loop_key]
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Marca la excepción como consultada aunque no haya seguidores esperando
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._async_calls.pop(loop_key, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            leaders = self._leaders + self._async_leaders
+            coalesced = self._coalesced + self._async_coalesced
+            return {
+                'upstream_calls': leaders,
+                'coalesced': coalesced,
+                'in_flight': len(self._calls) + len(self._async_calls),
+                'coalesced_ratio': round(coalesced / (leaders + coalesced), 4) if leaders + coalesced else None,
+                'threads': {'upstream_calls': self._leaders, 'coalesced': self._coalesced},
+                'asyncio': {'upstream_calls': self._async_leaders, 'coalesced': self._async_coalesced},
+            }
+
+
+# Instancia compartida por todos los servicios del proceso
+singleflight = SingleFlight()
@@ -0,0 +1,86 @@
+"""
+Respuestas HTTP en streaming (array JSON o NDJSON) para listados grandes de GHL
+"""
+import json
+import logging
+from itertools import chain
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+from .ghl_service import GHLRequestError
+
+logger = logging.getLogger(__name__)
+
+STREAM_FORMATS = ('json', 'ndjson')
+
+
+def _dumps(item) -> str:
+    return json.dumps(item, ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_json_array(items: Iterable) -> Iterator[str]:
+    """Serializa los elementos como un array JSON, uno a uno"""
+    yield '['
+    for index, item in enumerate(items):
+        yield (',' if index else '') + _dumps(item)
+    yield ']'
+
+
+def iter_ndjson(items: Iterable) -> Iterator[str]:
+    """Serializa los elementos como NDJSON (un objeto JSON por línea)"""
+    for item in items:
+        yield _dumps(item) + '\n'
+
+
+def _guard(items: Iterator, fmt: str) -> Iterator:
+    """
+    Si GHL falla a mitad del recorrido: en NDJSON se emite una última línea {"error": ...};
+    en JSON el array queda sin cerrar para que el cliente no lo tome como completo.
+    """
+    try:
+        yield from items
+    except GHLRequestError as e:
+        logger.error(f"Error de GHL a mitad del streaming: {e}")
+        if fmt == 'ndjson':
+            yield {'error': e.result.get('error'), 'status_code': e.result.get('status_code')}
+        else:
+            raise
+
+
+def _prime(items: Iterator) -> Tuple[Optional[Dict], Iterator]:
+    """
+    Obtiene el primer elemento antes de enviar cabeceras, así un fallo en la primera
+    página se responde como error normal (400) en lugar de un stream a medias.
+    """
+    try:
+        first = next(items)
+    except StopIteration:
+        return None, iter(())
+    except GHLRequestError as e:
+        return e.result, iter(())
+    return None, chain([first], items)
+
+
+def streaming_response(items: Iterator, fmt: str):
+    """
+    Construye un StreamingHttpResponse con los elementos del iterador.
+
+    Args:
+        items: Iterador perezoso de elementos (p.ej. GHLService.iter_contacts)
+        fmt: 'json' (array JSON) o 'ndjson'
+    """
+    error, items = _prime(items)
+    if error is not None:
+        return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+    items = _guard(items, fmt)
+    if fmt == 'ndjson':
+        response = StreamingHttpResponse(iter_ndjson(items), content_type='application/x-ndjson')
+    else:
+        response = StreamingHttpResponse(iter_json_array(items), content_type='application/json')
+    # Evita que proxies (nginx) acumulen la respuesta completa antes de enviarla
+    response['X-Accel-Buffering'] = 'no'
+    return response
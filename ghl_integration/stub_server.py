@@ -0,0 +1,453 @@
+"""
+Servidor HTTP local que imita los endpoints de GHL que usa GHLService, para apuntar
+GHL_BASE_URL a él y medir el stack HTTP completo (pool, caché, rate limiter, reintentos) sin salir
+a internet. Simula latencia, el presupuesto x-ratelimit-* de GHL (con 429 al agotarse), fallos y
+paginación. Se usa en `manage.py ghl_bench` y de forma independiente con `manage.py ghl_stub`.
+
+    with GHLStubServer(latency='lognormal:80:400', error_rate=0.01) as stub:
+        with override_settings(GHL_BASE_URL=stub.url, GHL_MOCK=False):
+            ...
+"""
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+STUB_LOCATION_ID = 'loc_stub_001'
+STUB_TOKEN = 'stub-token'
+
+# Límites de GHL por app y location: ráfaga de 100 peticiones cada 10 s y 200.000 al día
+GHL_BURST_LIMIT = 100
+GHL_BURST_INTERVAL = 10.0
+GHL_DAILY_LIMIT = 200000
+
+CONTACTS_DEFAULT_LIMIT = 20
+CONTACTS_MAX_LIMIT = 100
+
+STATS_PATH = '/_stub/stats'
+
+
+class Latency:
+    """
+    Distribución de latencia en milisegundos a partir de un texto:
+    fixed:50, uniform:20-200, normal:100:30 (media:desviación), exponential:100 (media),
+    lognormal:80:400 (mediana:p99, cola larga como la de una API real)
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, params = spec.partition(':')
+        try:
+            if kind == 'fixed':
+                value = float(params)
+                self._sample = lambda rng: value
+            elif kind == 'uniform':
+                low, high = (float(v) for v in params.split('-'))
+                self._sample = lambda rng: rng.uniform(low, high)
+            elif kind == 'normal':
+                mean, stdev = (float(v) for v in params.split(':'))
+                self._sample = lambda rng: rng.gauss(mean, stdev)
+            elif kind == 'exponential':
+                mean = float(params)
+                self._sample = lambda rng: rng.expovariate(1 / mean)
+            elif kind == 'lognormal':
+                median, p99 = (float(v) for v in params.split(':'))
+                sigma = math.log(p99 / median) / 2.326  # z del percentil 99
+                self._sample = lambda rng: rng.lognormvariate(math.log(median), sigma)
+            else:
+                raise ValueError(f'tipo desconocido: {kind}')
+        except (TypeError, ValueError, ZeroDivisionError) as e:
+            raise ValueError(f'Latencia inválida "{spec}": {e}. Ejemplos: fixed:50, uniform:20-200, '
+                             f'normal:100:30, exponential:100, lognormal:80:400')
+
+    def sample(self, rng: random.Random) -> float:
+        """Segundos a esperar (nunca negativo)"""
+        return max(0.0, self._sample(rng)) / 1000
+
+    def __repr__(self):
+        return self.spec
+
+
+class RateLimitBudget:
+    """
+    Contabilidad x-ratelimit-* por token como la de GHL: ventana fija de `limit` peticiones cada
+    `interval` segundos más un cupo diario. Al agotarse cualquiera de los dos responde 429.
+    """
+
+    def __init__(self, limit: int = GHL_BURST_LIMIT, interval: float = GHL_BURST_INTERVAL,
+                 daily_limit: int = GHL_DAILY_LIMIT, clock=time.monotonic):
+        self.limit = limit
+        self.interval = interval
+        self.daily_limit = daily_limit
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._windows: Dict[str, List[float]] = {}  # token -> [inicio ventana, usadas, inicio día, usadas día]
+        self.rejected = 0
+
+    def consume(self, key: str) -> Tuple[bool, Dict]:
+        """Cuenta una petición; devuelve (permitida, headers x-ratelimit-*)"""
+        now = self._clock()
+        with self._lock:
+            window = self._windows.setdefault(key, [now, 0, now, 0])
+            if now - window[0] >= self.interval:
+                window[0], window[1] = now, 0
+            if now - window[2] >= 86400:
+                window[2], window[3] = now, 0
+            allowed = window[1] < self.limit and window[3] < self.daily_limit
+            if allowed:
+                window[1] += 1
+                window[3] += 1
+            else:
+                self.rejected += 1
+            headers = {
+                'x-ratelimit-max': self.limit,
+                'x-ratelimit-remaining': self.limit - window[1],
+                'x-ratelimit-interval-milliseconds': int(self.interval * 1000),
+                'x-ratelimit-limit-daily': self.daily_limit,
+                'x-ratelimit-daily-remaining': self.daily_limit - window[3],
+            }
+            if not allowed:
+                headers['Retry-After'] = max(1, math.ceil(window[0] + self.interval - now))
+        return allowed, headers
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'limit': self.limit, 'interval': self.interval, 'daily_limit': self.daily_limit,
+                    'rejected': self.rejected, 'tokens': len(self._windows)}
+
+
+class StubData:
+    """Datos deterministas de una location: calendarios, contactos y citas (las creadas se añaden)"""
+
+    def __init__(self, location_id: str = STUB_LOCATION_ID, calendars: int = 3, contacts: int = 250,
+                 appointments_per_calendar: int = 50, start: Optional[float] = None):
+        self.location_id = location_id
+        self.lock = threading.Lock()
+        self._sequence = 0
+        start = start if start is not None else time.time() - time.time() % 3600
+        self.calendars = [
+            {'id': f'cal_stub_{i:03d}', 'name': f'Calendario {i}', 'status': 'active', 'locationId': location_id}
+            for i in range(1, calendars + 1)
+        ]
+        self.contacts = [
+            {
+                'id': f'contact_stub_{i:05d}',
+                'locationId': location_id,
+                'firstName': 'Contacto',
+                'lastName': str(i),
+                'email': f'contacto{i}@stub.example',
+                'phone': f'+1555{i:07d}',
+                'dateAdded': _iso(start - (contacts - i) * 60),
+                'dateUpdated': '2025-01-01T00:00:00Z',
+            }
+            for i in range(1, contacts + 1)
+        ]
+        self.contact_positions = {contact['id']: position for position, contact in enumerate(self.contacts)}
+        self.events = [
+            {
+                'id': f'apt_stub_{calendar["id"]}_{i:04d}',
+                'locationId': location_id,
+                'calendarId': calendar['id'],
+                'contactId': self.contacts[i % len(self.contacts)]['id'] if self.contacts else '',
+                'title': f'Cita {i}',
+                'appointmentStatus': 'confirmed',
+                # Una cita cada 3 horas desde `start`
+                'startTime': _iso(start + i * 3 * 3600),
+                'endTime': _iso(start + i * 3 * 3600 + 1800),
+                'dateUpdated': '2025-01-01T00:00:00Z',
+            }
+            for calendar in self.calendars
+            for i in range(appointments_per_calendar)
+        ]
+
+    def next_id(self, prefix: str) -> str:
+        with self.lock:
+            self._sequence += 1
+            return f'{prefix}_stub_new_{self._sequence:06d}'
+
+    def add_contact(self, contact: Dict):
+        with self.lock:
+            self.contact_positions[contact['id']] = len(self.contacts)
+            self.contacts.append(contact)
+
+    def add_event(self, event: Dict):
+        with self.lock:
+            self.events.append(event)
+
+
+def _iso(timestamp: float) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
+
+
+def _epoch(value: str) -> Optional[float]:
+    """Epoch en ms (como lo manda GHLService) o ISO-8601 -> segundos"""
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value) / 1000
+    try:
+        return time.mktime(time.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')) - time.timezone
+    except ValueError:
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers y body van en escrituras separadas: con Nagle + delayed ACK cada respuesta tardaría ~40 ms
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method: str):
+        stub: 'GHLStubServer' = self.server.stub
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            body = None
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        status, payload, headers = stub.handle(method, url.path.rstrip('/') or '/', query, body,
+                                               self.headers.get('Authorization'))
+        if status is None:
+            # Fallo inyectado: se corta la conexión sin responder
+            self.close_connection = True
+            return
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GHLStubServer:
+    """
+    Stand-in HTTP de GHL en un hilo del proceso: /locations/search, /calendars/, /calendars/events,
+    /calendars/events/appointments y /contacts/ (paginado con limit/startAfterId como GHL).
+
+    Args:
+        latency: Distribución de latencia de todas las rutas (ver Latency), p.ej. 'lognormal:80:400'
+        route_latency: Latencia por ruta ({'contacts': 'uniform:200-400'}), nombres en ROUTES
+        rate_limit, rate_interval, daily_limit: Presupuesto x-ratelimit-* por token (None: sin límite)
+        error_rate: Probabilidad de responder un 5xx de `error_statuses`
+        timeout_rate: Probabilidad de tardar `hang_seconds` en responder (timeouts del cliente)
+        drop_rate: Probabilidad de cerrar la conexión sin responder
+        seed: Semilla para repetir la misma secuencia de latencias y fallos
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, data: Optional[StubData] = None,
+                 latency: Optional[str] = None, route_latency: Optional[Dict[str, str]] = None,
+                 rate_limit: Optional[int] = GHL_BURST_LIMIT, rate_interval: float = GHL_BURST_INTERVAL,
+                 daily_limit: int = GHL_DAILY_LIMIT, error_rate: float = 0.0,
+                 error_statuses: Tuple[int, ...] = (500, 502, 503, 504), timeout_rate: float = 0.0,
+                 hang_seconds: float = 60.0, drop_rate: float = 0.0, seed: Optional[int] = None):
+        self.data = data or StubData()
+        self.latency = Latency(latency) if latency else None
+        self.route_latency = {route: Latency(spec) for route, spec in (route_latency or {}).items()}
+        unknown = set(self.route_latency) - {name for name, _ in ROUTES.values()}
+        if unknown:
+            raise ValueError(f"Rutas desconocidas en route_latency: {', '.join(sorted(unknown))}")
+        self.budget = RateLimitBudget(rate_limit, rate_interval, daily_limit) if rate_limit else None
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.drop_rate = drop_rate
+        self._rng = random.Random(seed)
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._requests: Counter = Counter()
+        self._injected: Counter = Counter()
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'GHLStubServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='ghl-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> 'GHLStubServer':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def total_requests(self) -> int:
+        with self._lock:
+            return sum(self._requests.values())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'requests': sum(self._requests.values()),
+                'by_route': dict(self._requests),
+                'injected': dict(self._injected),
+                'rate_limit': self.budget.stats() if self.budget else None,
+                'contacts': len(self.data.contacts),
+                'appointments': len(self.data.events),
+            }
+
+    def _random(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def _delay(self, route: Optional[str]) -> float:
+        latency = self.route_latency.get(route) or self.latency
+        if latency is None:
+            return 0.0
+        with self._lock:
+            return latency.sample(self._rng)
+
+    def handle(self, method: str, path: str, query: Dict, body,
+               authorization: Optional[str]) -> Tuple[Optional[int], Dict, Dict]:
+        """Atiende una petición; devuelve (status o None para cortar la conexión, payload, headers extra)"""
+        if path == STATS_PATH:
+            return 200, self.stats(), {}
+        name, route = ROUTES.get((method, path), (None, None))
+        with self._lock:
+            self._requests[f'{method} {path}'] += 1
+
+        time.sleep(self._delay(name))
+        if not authorization:
+            return 401, {'statusCode': 401, 'message': 'Invalid JWT'}, {}
+        headers = {}
+        if self.budget is not None:
+            allowed, headers = self.budget.consume(authorization)
+            if not allowed:
+                return 429, {'statusCode': 429, 'message': 'Too Many Requests'}, headers
+
+        failure = self._inject_failure()
+        if failure == 'drop':
+            return None, {}, {}
+        if failure == 'timeout':
+            time.sleep(self.hang_seconds)
+        elif failure is not None:
+            return failure, {'statusCode': failure, 'message': 'Error inyectado por el stub'}, headers
+
+        if body is None:
+            return 400, {'statusCode': 400, 'message': 'Invalid JSON body'}, headers
+        if route is None:
+            return 404, {'statusCode': 404, 'message': f'Cannot {method} {path}'}, headers
+        status, payload = route(self, query, body)
+        return status, payload, headers
+
+    def _inject_failure(self):
+        """None, 'drop', 'timeout' o un status 5xx según las probabilidades configuradas"""
+        roll = self._random()
+        for kind, rate in (('drop', self.drop_rate), ('timeout', self.timeout_rate), ('error', self.error_rate)):
+            if roll < rate:
+                with self._lock:
+                    self._injected[kind] += 1
+                    return self._rng.choice(self.error_statuses) if kind == 'error' else kind
+            roll -= rate
+        return None
+
+    # Rutas
+
+    def _locations(self, query: Dict, body: Dict):
+        return 200, {'locations': [{'id': self.data.location_id, 'name': 'Location stub', 'status': 'active'}]}
+
+    def _calendars(self, query: Dict, body: Dict):
+        if query.get('locationId') != self.data.location_id:
+            return 400, {'statusCode': 400, 'message': 'locationId inválido'}
+        return 200, {'calendars': self.data.calendars}
+
+    def _events(self, query: Dict, body: Dict):
+        """Citas filtradas por calendario y rango (startTime/endTime en ms); GHL no las pagina"""
+        if query.get('locationId') != self.data.location_id:
+            return 400, {'statusCode': 400, 'message': 'locationId inválido'}
+        calendar_id = query.get('calendarId')
+        start, end = _epoch(query.get('startTime', '')), _epoch(query.get('endTime', ''))
+        with self.data.lock:
+            events = list(self.data.events)
+        if calendar_id:
+            events = [e for e in events if e['calendarId'] == calendar_id]
+        if start is not None or end is not None:
+            events = [e for e in events
+                      if (end is None or _epoch(e['startTime']) < end)
+                      and (start is None or _epoch(e['endTime']) > start)]
+        return 200, {'events': events}
+
+    def _create_appointment(self, query: Dict, body: Dict):
+        missing = [f for f in ('calendarId', 'contactId', 'startTime', 'endTime') if not body.get(f)]
+        if missing:
+            return 422, {'statusCode': 422, 'message': f'Faltan campos: {", ".join(missing)}'}
+        event = {'id': self.data.next_id('apt'), 'locationId': self.data.location_id,
+                 'appointmentStatus': 'confirmed', **body}
+        self.data.add_event(event)
+        return 201, event
+
+    def _contacts(self, query: Dict, body: Dict):
+        """Paginación de GHL: limit (máx. 100) y cursor startAfterId/startAfter en meta"""
+        try:
+            limit = min(int(query.get('limit') or CONTACTS_DEFAULT_LIMIT), CONTACTS_MAX_LIMIT)
+        except ValueError:
+            return 422, {'statusCode': 422, 'message': 'limit debe ser un número'}
+        with self.data.lock:
+            offset = 0
+            if query.get('startAfterId'):
+                position = self.data.contact_positions.get(query['startAfterId'])
+                if position is None:
+                    return 400, {'statusCode': 400, 'message': 'startAfterId inválido'}
+                offset = position + 1
+            page = self.data.contacts[offset:offset + limit]
+            total = len(self.data.contacts)
+        has_more = offset + len(page) < total
+        last = page[-1] if page else None
+        return 200, {
+            'contacts': page,
+            'meta': {
+                'total': total,
+                'currentPage': offset // limit + 1 if limit else 1,
+                'startAfterId': last['id'] if has_more else None,
+                'startAfter': int(_epoch(last['dateAdded']) * 1000) if has_more else None,
+            },
+        }
+
+    def _create_contact(self, query: Dict, body: Dict):
+        if not body.get('email') and not body.get('phone'):
+            return 422, {'statusCode': 422, 'message': 'Se requiere email o phone'}
+        contact = {'id': self.data.next_id('contact'), 'dateAdded': _iso(time.time()), **body}
+        self.data.add_contact(contact)
+        return 201, {'contact': contact}
+
+
+# (método, ruta) -> (nombre para route_latency, manejador)
+ROUTES = {
+    ('GET', '/locations/search'): ('locations', GHLStubServer._locations),
+    ('GET', '/calendars'): ('calendars', GHLStubServer._calendars),
+    ('GET', '/calendars/events'): ('events', GHLStubServer._events),
+    ('POST', '/calendars/events/appointments'): ('create_appointment', GHLStubServer._create_appointment),
+    ('GET', '/contacts'): ('contacts', GHLStubServer._contacts),
+    ('POST', '/contacts'): ('create_contact', GHLStubServer._create_contact),
+}
@@ -0,0 +1,205 @@
+"""
+Sincronización de calendarios, contactos y citas de GHL a los modelos locales (espejo).
+La usa `manage.py ghl_sync`; las vistas leen del espejo con ?source=local.
+"""
+import logging
+import unicodedata
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .ghl_service import GHLRequestError
+from .models import GHLAppointment, GHLCalendar, GHLContact, GHLSyncState
+
+logger = logging.getLogger(__name__)
+
+CALENDARS = 'calendars'
+CONTACTS = 'contacts'
+APPOINTMENTS = 'appointments'
+SYNC_RESOURCES = (CALENDARS, CONTACTS, APPOINTMENTS)
+
+BATCH_SIZE = 500
+
+
+def parse_ghl_datetime(value) -> Optional[datetime]:
+    """Fechas de GHL: ISO-8601 (con o sin zona) o epoch en segundos/milisegundos"""
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+        seconds = float(value)
+        if seconds > 1e11:
+            seconds /= 1000
+        return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+    try:
+        parsed = parse_datetime(str(value).replace(' ', 'T'))
+    except ValueError:
+        parsed = None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def _updated_at(item: Dict) -> Optional[datetime]:
+    return parse_ghl_datetime(item.get('dateUpdated') or item.get('updatedAt'))
+
+
+def calendar_fields(item: Dict, location_id: str) -> Dict:
+    return {'name': item.get('name') or ''}
+
+
+def normalize_email(value) -> str:
+    return str(value or '').strip().lower()
+
+
+def normalize_phone(value) -> str:
+    """Solo los dígitos: '+34 600-12.34.56' -> '34600123456'"""
+    return ''.join(ch for ch in str(value or '') if ch.isdigit())
+
+
+def normalize_name(value) -> str:
+    """Minúsculas, sin tildes y con un solo espacio entre palabras: '  José  PÉREZ' -> 'jose perez'"""
+    decomposed = unicodedata.normalize('NFKD', str(value or ''))
+    return ' '.join(''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower().split())
+
+
+def contact_fields(item: Dict, location_id: str) -> Dict:
+    first_name = item.get('firstName') or ''
+    last_name = item.get('lastName') or ''
+    return {
+        'first_name': first_name,
+        'last_name': last_name,
+        'email': normalize_email(item.get('email')),
+        'phone': item.get('phone') or '',
+        # Claves del índice de búsqueda (contact_index.py); el teléfono al revés para buscar por sufijo
+        'phone_key': normalize_phone(item.get('phone'))[::-1],
+        'name_key': normalize_name(f'{first_name} {last_name}'),
+        'surname_key': normalize_name(f'{last_name} {first_name}'),
+    }
+
+
+def appointment_fields(item: Dict, location_id: str) -> Dict:
+    return {
+        'calendar_id': item.get('calendarId') or '',
+        'contact_id': item.get('contactId') or '',
+        'title': item.get('title') or '',
+        'status': item.get('appointmentStatus') or item.get('status') or '',
+        'start_time': parse_ghl_datetime(item.get('startTime')),
+        'end_time': parse_ghl_datetime(item.get('endTime')),
+    }
+
+
+class GHLSync:
+    """
+    Copia los recursos de una location de GHL a la base de datos local.
+
+    - Completa (`full=True`): recorre todo, actualiza cada fila y borra las que ya no existen en GHL
+    - Incremental: recorre igual (los listados de GHL no filtran por fecha de actualización) pero
+      solo escribe los objetos con updatedAt posterior al cursor guardado en GHLSyncState
+    """
+
+    def __init__(self, service, location_id: Optional[str] = None, full: bool = False,
+                 past_days: Optional[int] = None, future_days: Optional[int] = None):
+        self.service = service
+        self.location_id = location_id or service.default_location_id
+        self.full = full
+        self.past_days = past_days if past_days is not None else getattr(settings, 'GHL_SYNC_PAST_DAYS', 30)
+        self.future_days = future_days if future_days is not None else getattr(settings, 'GHL_SYNC_FUTURE_DAYS', 90)
+
+    def run(self, resources: Iterable[str] = SYNC_RESOURCES) -> Dict:
+        """Sincroniza los recursos pedidos y devuelve un resumen por recurso"""
+        if not self.location_id:
+            raise ValueError('Se requiere locationId o configurar GHL_DEFAULT_LOCATION_ID')
+        summary = {}
+        for resource in resources:
+            summary[resource] = getattr(self, f'sync_{resource}')()
+        return summary
+
+    def sync_calendars(self) -> Dict:
+        result = self.service.get_calendars(self.location_id, fresh=True)
+        if not result.get('success'):
+            raise GHLRequestError(result)
+        return self._sync(CALENDARS, GHLCalendar, iter(result.get('calendars') or []), calendar_fields)
+
+    def sync_contacts(self) -> Dict:
+        return self._sync(CONTACTS, GHLContact, self.service.iter_contacts(self.location_id), contact_fields)
+
+    def sync_appointments(self) -> Dict:
+        """Citas de cada calendario de la location en la ventana [hoy - past_days, hoy + future_days]"""
+        now = timezone.now()
+        window_start = now - timedelta(days=self.past_days)
+        window_end = now + timedelta(days=self.future_days)
+        calendar_ids = list(GHLCalendar.objects.filter(location_id=self.location_id).values_list('ghl_id', flat=True))
+        if not calendar_ids:
+            self.sync_calendars()
+            calendar_ids = list(GHLCalendar.objects.filter(location_id=self.location_id).values_list('ghl_id', flat=True))
+
+        def events() -> Iterator[Dict]:
+            for calendar_id in calendar_ids:
+                yield from self.service.iter_appointments(
+                    self.location_id,
+                    calendar_id=calendar_id,
+                    start_time=str(int(window_start.timestamp() * 1000)),
+                    end_time=str(int(window_end.timestamp() * 1000)),
+                )
+
+        return self._sync(APPOINTMENTS, GHLAppointment, events(), appointment_fields,
+                          stale_scope={'start_time__gte': window_start, 'start_time__lte': window_end})
+
+    def _sync(self, resource: str, model, items: Iterator[Dict], to_fields: Callable[[Dict, str], Dict],
+              stale_scope: Optional[Dict] = None) -> Dict:
+        state, _ = GHLSyncState.objects.get_or_create(resource=resource, location_id=self.location_id)
+        cursor = None if self.full else state.cursor
+        started_at = timezone.now()
+        summary = {'fetched': 0, 'written': 0, 'unchanged': 0, 'deleted': 0, 'full': self.full}
+        new_cursor = state.cursor
+        batch: List = []
+
+        for item in items:
+            if not item.get('id'):
+                continue
+            summary['fetched'] += 1
+            updated_at = _updated_at(item)
+            if updated_at is not None and (new_cursor is None or updated_at > new_cursor):
+                new_cursor = updated_at
+            if cursor is not None and updated_at is not None and updated_at <= cursor:
+                summary['unchanged'] += 1
+                continue
+            batch.append(model(
+                ghl_id=item['id'],
+                location_id=item.get('locationId') or self.location_id,
+                raw=item,
+                ghl_updated_at=updated_at,
+                **to_fields(item, self.location_id),
+            ))
+            if len(batch) >= BATCH_SIZE:
+                summary['written'] += self._write(model, batch)
+                batch = []
+        summary['written'] += self._write(model, batch)
+
+        with transaction.atomic():
+            if self.full:
+                # Lo que no se vio en esta pasada completa ya no existe en GHL
+                stale = model.objects.filter(location_id=self.location_id, synced_at__lt=started_at, **(stale_scope or {}))
+                summary['deleted'], _ = stale.delete()
+                state.last_full_sync_at = started_at
+            state.cursor = new_cursor
+            state.last_run_at = started_at
+            state.last_run_items = summary['written']
+            state.save()
+
+        logger.info(f"🔄 Sync {resource} ({self.location_id}): {summary}")
+        return summary
+
+    @staticmethod
+    def _write(model, batch: List) -> int:
+        """Upsert por ghl_id en una sola consulta por lote"""
+        if not batch:
+            return 0
+        update_fields = [f.name for f in model._meta.concrete_fields
+                         if f.name not in ('id', 'ghl_id')]
+        model.objects.bulk_create(batch, update_conflicts=True, unique_fields=['ghl_id'], update_fields=update_fields)
+        return len(batch)
@@ -0,0 +1,230 @@
+"""
+Telemetría de rate limits: guarda los headers x-ratelimit-* de cada respuesta de GHL en un
+buffer circular por cuenta (namespace del servicio, es decir token y base_url) para que
+/rate-limit/ los sirva sin hacer peticiones a GHL ni mezclar los límites de distintos tenants.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+logger = logging.getLogger(__name__)
+
+# Prefijo de las claves en la caché compartida (GHL_RATE_LIMIT_TELEMETRY_SHARED)
+SHARED_CACHE_KEY = 'ghl:ratelimit:telemetry'
+DEFAULT_NAMESPACE = 'default'
+
+
+class RateLimitTelemetry:
+    """
+    Buffer circular (tamaño fijo) por namespace con una muestra por respuesta de GHL que traiga
+    headers de rate limit. Es por proceso; con `shared_alias` las muestras se copian además a una
+    caché de Django (p.ej. Redis) para que cualquier worker vea el estado de todos.
+
+    La copia compartida no se hace en la petición: un hilo la envía en lotes cada
+    `flush_interval` segundos. En la caché cada namespace es un anillo de `max_samples` claves;
+    un incr atómico reserva las posiciones de cada lote, así dos workers no se pisan muestras.
+    """
+
+    def __init__(self, max_samples: int = 120, shared_alias: Optional[str] = None, clock=time.time,
+                 flush_interval: float = 1.0):
+        self.max_samples = max_samples
+        self.shared_alias = shared_alias
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=max_samples))
+        self._recorded: Dict[str, int] = defaultdict(int)
+        self._pending: Dict[str, List[Dict]] = defaultdict(list)
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def record(self, rate_limit_info: Optional[Dict], status_code: Optional[int] = None,
+               endpoint: Optional[str] = None, source: str = 'ghl', namespace: str = DEFAULT_NAMESPACE):
+        """Registra una muestra; sin headers de rate limit solo cuenta los 429"""
+        if not rate_limit_info and status_code != 429:
+            return
+        sample = {
+            **(rate_limit_info or {}),
+            'timestamp': self._clock(),
+            'status_code': status_code,
+            'endpoint': endpoint.split('?')[0] if endpoint else None,
+            'source': source,
+        }
+        with self._lock:
+            self._samples[namespace].append(sample)
+            self._recorded[namespace] += 1
+            if self.shared_alias:
+                self._pending[namespace].append(sample)
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='ghl-telemetry', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Envía a la caché compartida las muestras pendientes (un incr y un set_many por namespace)"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(list)
+            for namespace, samples in pending.items():
+                samples = samples[-self.max_samples:]
+                try:
+                    cache = caches[self.shared_alias]
+                    last = self._reserve_slots(cache, namespace, len(samples))
+                    first = last - len(samples) + 1
+                    cache.set_many({self._slot_key(namespace, seq): sample
+                                    for seq, sample in enumerate(samples, start=first)}, None)
+                except Exception as e:
+                    logger.warning(f"No se pudo compartir la telemetría de rate limits: {e}")
+
+    def _shared_key(self, namespace: str) -> str:
+        return f'{SHARED_CACHE_KEY}:{namespace}'
+
+    def _slot_key(self, namespace: str, seq: int) -> str:
+        return f'{self._shared_key(namespace)}:{seq % self.max_samples}'
+
+    def _reserve_slots(self, cache, namespace: str, count: int) -> int:
+        """Último número de secuencia reservado para `count` muestras"""
+        seq_key = f'{self._shared_key(namespace)}:seq'
+        try:
+            return cache.incr(seq_key, count)
+        except ValueError:
+            cache.add(seq_key, 0, None)
+            return cache.incr(seq_key, count)
+
+    def samples(self, namespace: str = DEFAULT_NAMESPACE) -> List[Dict]:
+        """Muestras de más antigua a más reciente (de la caché compartida si está activa)"""
+        if self.shared_alias:
+            # Las de este proceso que aún no se enviaron también cuentan
+            self.flush()
+            try:
+                keys = [self._slot_key(namespace, slot) for slot in range(self.max_samples)]
+                shared = caches[self.shared_alias].get_many(keys)
+                return sorted(shared.values(), key=lambda sample: sample['timestamp'])
+            except Exception as e:
+                logger.warning(f"No se pudo leer la telemetría compartida de rate limits: {e}")
+        with self._lock:
+            return list(self._samples.get(namespace, ()))
+
+    def latest(self, namespace: str = DEFAULT_NAMESPACE) -> Optional[Dict]:
+        samples = self.samples(namespace)
+        return samples[-1] if samples else None
+
+    def local_latest(self) -> Dict[str, Dict]:
+        """Última muestra de cada namespace vista por este proceso (sin leer la caché compartida)"""
+        with self._lock:
+            return {namespace: samples[-1] for namespace, samples in self._samples.items() if samples}
+
+    def trend(self, samples: Optional[List[Dict]] = None) -> Dict:
+        """
+        Tendencia sobre las muestras del buffer: consumo por segundo según `remaining`,
+        429 recibidos y tiempo estimado hasta agotar la ventana actual
+        """
+        samples = self.samples() if samples is None else samples
+        with_remaining = [s for s in samples if isinstance(s.get('remaining'), int)]
+        trend = {
+            'samples': len(samples),
+            'throttled': sum(1 for s in samples if s.get('status_code') == 429),
+            'direction': 'unknown',
+            'consumption_per_second': None,
+            'seconds_to_exhaustion': None,
+            'min_remaining': min((s['remaining'] for s in with_remaining), default=None),
+        }
+        if len(with_remaining) < 2:
+            return trend
+
+        first, last = with_remaining[0], with_remaining[-1]
+        elapsed = last['timestamp'] - first['timestamp']
+        delta = first['remaining'] - last['remaining']
+        if delta > 0:
+            trend['direction'] = 'down'
+        elif delta < 0:
+            trend['direction'] = 'up'
+        else:
+            trend['direction'] = 'stable'
+        # Solo cuentan las bajadas entre muestras consecutivas: las subidas son reinicios de ventana
+        consumed = sum(max(0, a['remaining'] - b['remaining']) for a, b in zip(with_remaining, with_remaining[1:]))
+        if elapsed > 0:
+            rate = consumed / elapsed
+            trend['consumption_per_second'] = round(rate, 3)
+            if rate > 0:
+                trend['seconds_to_exhaustion'] = round(last['remaining'] / rate, 1)
+        return trend
+
+    def snapshot(self, history_limit: Optional[int] = None, namespace: str = DEFAULT_NAMESPACE) -> Dict:
+        samples = self.samples(namespace)
+        history = samples[-history_limit:] if history_limit else samples
+        with self._lock:
+            recorded = self._recorded.get(namespace, 0)
+        return {
+            'latest': samples[-1] if samples else None,
+            'history': history,
+            'trend': self.trend(samples),
+            'recorded': recorded,
+            'max_samples': self.max_samples,
+            'shared': bool(self.shared_alias),
+        }
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+
+    def clear(self):
+        with self._lock:
+            namespaces = list(self._samples)
+            self._samples.clear()
+            self._recorded.clear()
+            self._pending.clear()
+        if self.shared_alias:
+            try:
+                caches[self.shared_alias].delete_many(
+                    [f'{self._shared_key(namespace)}:seq' for namespace in namespaces]
+                    + [self._slot_key(namespace, slot) for namespace in namespaces for slot in range(self.max_samples)])
+            except Exception:
+                pass
+
+
+_telemetry: Optional[RateLimitTelemetry] = None
+_telemetry_lock = threading.Lock()
+
+
+def get_rate_limit_telemetry() -> RateLimitTelemetry:
+    """Telemetría de rate limits del proceso, configurada desde settings"""
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                shared = getattr(settings, 'GHL_RATE_LIMIT_TELEMETRY_SHARED', False)
+                _telemetry = RateLimitTelemetry(
+                    max_samples=getattr(settings, 'GHL_RATE_LIMIT_HISTORY_SIZE', 120),
+                    shared_alias=getattr(settings, 'GHL_CACHE_ALIAS', 'default') if shared else None,
+                    flush_interval=getattr(settings, 'GHL_RATE_LIMIT_TELEMETRY_FLUSH_INTERVAL', 1.0),
+                )
+    return _telemetry
+
+
+def reset_rate_limit_telemetry():
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is not None:
+            _telemetry.stop()
+        _telemetry = None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(setting, **kwargs):
+    if setting.startswith('GHL_RATE_LIMIT_') or setting in ('GHL_CACHE_ALIAS', 'CACHES'):
+        reset_rate_limit_telemetry()
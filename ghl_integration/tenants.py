@@ -0,0 +1,183 @@
+"""
+Registro de tenants: subcuentas (locations) con su propio Private Integration Token.
+
+Cada tenant tiene su propio GHLService (token y headers), su pool de conexiones y su rate limiter,
+de modo que una clínica con mucho tráfico agota solo su cupo y sus conexiones, no las del resto.
+Los tenants se definen en GHL_TENANTS (settings) o en el modelo GHLTenant (admin); si una location
+está en ambos manda GHL_TENANTS. Las locations que no son tenant usan el servicio global
+(GHL_PRIVATE_TOKEN).
+
+    GHL_TENANTS='{"loc_norte": "pit-xxx", "loc_sur": {"token": "pit-yyy", "name": "Clínica Sur", "pool_maxsize": 4}}'
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+from .models import GHLTenant
+
+logger = logging.getLogger(__name__)
+
+
+class Tenant:
+    """Configuración resuelta de un tenant"""
+
+    def __init__(self, location_id: str, private_token: str, name: str = '',
+                 rate_limit_capacity: Optional[int] = None, pool_maxsize: Optional[int] = None,
+                 source: str = 'settings'):
+        self.location_id = location_id
+        self.private_token = private_token
+        self.name = name
+        self.rate_limit_capacity = rate_limit_capacity
+        self.pool_maxsize = pool_maxsize
+        self.source = source
+
+    @property
+    def key(self) -> Tuple:
+        """Cambia si cambia algo que obliga a reconstruir el servicio (p.ej. rotación del token)"""
+        return (self.location_id, self.private_token, self.rate_limit_capacity, self.pool_maxsize)
+
+    def summary(self) -> Dict:
+        """Datos del tenant sin el token completo (para /stats/)"""
+        return {
+            'location_id': self.location_id,
+            'name': self.name,
+            'source': self.source,
+            'token_suffix': f'...{self.private_token[-4:]}' if self.private_token else None,
+            'rate_limit_capacity': self.rate_limit_capacity,
+            'pool_maxsize': self.pool_maxsize,
+        }
+
+
+def _tenants_from_settings() -> Dict[str, Tenant]:
+    """Interpreta GHL_TENANTS: {locationId: token} o {locationId: {token, name, rate_limit_capacity, pool_maxsize}}"""
+    tenants = {}
+    for location_id, config in (getattr(settings, 'GHL_TENANTS', None) or {}).items():
+        if isinstance(config, str):
+            config = {'token': config}
+        if not isinstance(config, dict) or not config.get('token'):
+            logger.warning(f'GHL_TENANTS: se ignora {location_id} (falta el token)')
+            continue
+        tenants[location_id] = Tenant(
+            location_id,
+            config['token'],
+            name=config.get('name', ''),
+            rate_limit_capacity=config.get('rate_limit_capacity'),
+            pool_maxsize=config.get('pool_maxsize'),
+        )
+    return tenants
+
+
+def _tenant_from_model(row: GHLTenant) -> Tenant:
+    return Tenant(row.location_id, row.private_token, name=row.name,
+                  rate_limit_capacity=row.rate_limit_capacity, pool_maxsize=row.pool_maxsize, source='db')
+
+
+class TenantRegistry:
+    """
+    Resuelve el tenant de una location. Los de la base de datos se cachean `ttl` segundos
+    (también los "no es tenant") para no consultar la tabla en cada petición; guardar o borrar
+    un GHLTenant invalida su entrada en este proceso.
+    """
+
+    def __init__(self, ttl: float = 60.0, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._configured = _tenants_from_settings()
+        self._cache: Dict[str, Tuple[Optional[Tenant], float]] = {}
+        self._hits = 0
+        self._misses = 0
+
+    def peek(self, location_id: str) -> Tuple[bool, Optional[Tenant]]:
+        """(encontrado, tenant) sin consultar la base de datos; útil desde código async"""
+        if location_id in self._configured:
+            return True, self._configured[location_id]
+        with self._lock:
+            entry = self._cache.get(location_id)
+            if entry is not None and entry[1] > self._clock():
+                self._hits += 1
+                return True, entry[0]
+        return False, None
+
+    def get(self, location_id: Optional[str]) -> Optional[Tenant]:
+        """Tenant de la location, o None si no tiene token propio"""
+        if not location_id:
+            return None
+        found, tenant = self.peek(location_id)
+        if found:
+            return tenant
+        row = GHLTenant.objects.filter(location_id=location_id, active=True).first()
+        tenant = _tenant_from_model(row) if row is not None else None
+        with self._lock:
+            self._misses += 1
+            self._cache[location_id] = (tenant, self._clock() + self.ttl)
+        return tenant
+
+    def all(self) -> List[Tenant]:
+        """Todos los tenants activos (settings y base de datos)"""
+        tenants = dict(self._configured)
+        for row in GHLTenant.objects.filter(active=True).exclude(location_id__in=list(tenants)):
+            tenants[row.location_id] = _tenant_from_model(row)
+        return list(tenants.values())
+
+    def invalidate(self, location_id: Optional[str] = None):
+        with self._lock:
+            if location_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(location_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'configured': len(self._configured),
+                'cached': len(self._cache),
+                'cache_hits': self._hits,
+                'db_lookups': self._misses,
+                'ttl': self.ttl,
+            }
+
+
+_registry: Optional[TenantRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_tenant_registry() -> TenantRegistry:
+    """Registro de tenants del proceso, creado a partir de settings la primera vez"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = TenantRegistry(ttl=getattr(settings, 'GHL_TENANT_CACHE_TTL', 60))
+    return _registry
+
+
+def reset_tenant_registry():
+    global _registry
+    with _registry_lock:
+        _registry = None
+
+
+def get_tenant(location_id: Optional[str]) -> Optional[Tenant]:
+    """Tenant de la location o None (usa el servicio global)"""
+    return get_tenant_registry().get(location_id)
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    if setting in ('GHL_TENANTS', 'GHL_TENANT_CACHE_TTL'):
+        reset_tenant_registry()
+
+
+@receiver(post_save, sender=GHLTenant)
+@receiver(post_delete, sender=GHLTenant)
+def _invalidate_on_change(sender, instance, **kwargs):
+    # Solo afecta a este proceso; el resto de workers lo ve al caducar GHL_TENANT_CACHE_TTL
+    if _registry is not None:
+        _registry.invalidate(instance.location_id)
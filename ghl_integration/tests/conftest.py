@@ -0,0 +1,12 @@
+"""
+Configura Django cuando los tests se ejecutan con pytest sin pytest-django
+(pytest.ini usa la sección [tool:pytest], que pytest no lee)
+"""
+import os
+
+import django
+from django.apps import apps
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+if not apps.ready:
+    django.setup()
@@ -0,0 +1,24 @@
+"""
+Dobles de prueba compartidos por los tests
+"""
+
+
+class FakeClock:
+    """Reloj manual: `sleep` y `async_sleep` avanzan el tiempo en lugar de esperar"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.advance(seconds)
+
+    async def async_sleep(self, seconds: float):
+        self.sleep(seconds)
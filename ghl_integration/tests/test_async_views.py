@@ -0,0 +1,70 @@
+import asyncio
+
+from django.test import TestCase, override_settings
+
+from ghl_integration.async_service import AsyncGHLService
+from ghl_integration.models import GHLIdempotencyKey
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer, Latency
+
+APPOINTMENT = {
+    'calendarId': 'cal_stub_001',
+    'contactId': 'contact_stub_00001',
+    'startTime': '2030-01-15T10:00:00Z',
+    'endTime': '2030-01-15T11:00:00Z',
+    'title': 'Cita de prueba',
+}
+CONTACT = {'firstName': 'Ana', 'lastName': 'Ruiz', 'email': 'ana@example.com'}
+
+
+class AsyncIdempotencyTests(TestCase):
+    def setUp(self):
+        self.stub = GHLStubServer(rate_limit=None)
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        overrides = override_settings(
+            GHL_BASE_URL=self.stub.url, GHL_PRIVATE_TOKEN=STUB_TOKEN, GHL_DEFAULT_LOCATION_ID=STUB_LOCATION_ID,
+            GHL_MOCK=False, GHL_PREFLIGHT_CONFLICTS=False,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    async def post_twice(self, path, body):
+        post = lambda: self.async_client.post(path, body, content_type='application/json',  # noqa: E731
+                                              headers={'Idempotency-Key': 'clave-1'})
+        return await post(), await post()
+
+    async def test_duplicate_appointment_is_replayed(self):
+        first, second = await self.post_twice('/api/ghl/async/appointments/create/', APPOINTMENT)
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.stub.stats()['by_route'].get('POST /calendars/events/appointments'), 1)
+
+    async def test_duplicate_contact_is_replayed(self):
+        first, second = await self.post_twice('/api/ghl/async/contacts/create/', CONTACT)
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertEqual(first.json()['contact'], second.json()['contact'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.stub.stats()['contacts'], 251)
+
+    async def test_concurrent_duplicates_call_ghl_once(self):
+        self.stub.route_latency = {'create_appointment': Latency('fixed:200')}
+        post = lambda: self.async_client.post(  # noqa: E731
+            '/api/ghl/async/appointments/create/', APPOINTMENT, content_type='application/json',
+            headers={'Idempotency-Key': 'clave-2'})
+        responses = await asyncio.gather(post(), post(), post())
+        self.assertEqual([r.status_code for r in responses], [200, 200, 200])
+        self.assertEqual(sum(r.has_header('Idempotent-Replayed') for r in responses), 2)
+        self.assertEqual(await GHLIdempotencyKey.objects.acount(), 1)
+
+
+class AsyncServiceBlockTests(TestCase):
+    @override_settings(GHL_RATE_LIMIT_CAPACITY=1, GHL_RATE_LIMIT_INTERVAL=3600, GHL_RATE_LIMIT_SAFETY_MARGIN=0)
+    async def test_create_accepts_block_like_the_sync_service(self):
+        with GHLStubServer(rate_limit=None) as stub:
+            service = AsyncGHLService(base_url=stub.url, private_token=STUB_TOKEN, default_location_id=STUB_LOCATION_ID)
+            service.rate_limiter.acquire(block=False)
+            result = await service.create_appointment(dict(APPOINTMENT), block=False)
+        self.assertEqual(result['status_code'], 429)
+        self.assertIn('local_rate_limit', result)
+        self.assertEqual(stub.stats()['requests'], 0)
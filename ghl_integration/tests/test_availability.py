@@ -0,0 +1,53 @@
+from django.test import SimpleTestCase
+
+from ghl_integration.availability import busy_intervals, free_slots, merge_intervals
+
+
+class MergeIntervalsTests(SimpleTestCase):
+    def test_merges_overlapping_and_contiguous(self):
+        self.assertEqual(merge_intervals([(10, 20), (15, 25), (25, 30), (40, 50)]), [(10, 30), (40, 50)])
+
+    def test_sorts_input(self):
+        self.assertEqual(merge_intervals([(40, 50), (0, 5), (3, 8)]), [(0, 8), (40, 50)])
+
+    def test_keeps_outer_interval_when_nested(self):
+        self.assertEqual(merge_intervals([(0, 100), (10, 20)]), [(0, 100)])
+
+    def test_drops_empty_and_inverted_intervals(self):
+        self.assertEqual(merge_intervals([(5, 5), (9, 3)]), [])
+        self.assertEqual(merge_intervals([]), [])
+
+
+class FreeSlotsTests(SimpleTestCase):
+    def test_whole_window_when_nothing_is_busy(self):
+        self.assertEqual(free_slots([], [(0, 120)], 30), [(0, 30), (30, 60), (60, 90), (90, 120)])
+
+    def test_skips_busy_intervals(self):
+        self.assertEqual(free_slots([(30, 60)], [(0, 120)], 30), [(0, 30), (60, 90), (90, 120)])
+
+    def test_realigns_to_step_after_a_busy_interval(self):
+        # La cita termina en 40: el siguiente inicio alineado a 30 es 60
+        self.assertEqual(free_slots([(20, 40)], [(0, 120)], 30), [(60, 90), (90, 120)])
+
+    def test_step_smaller_than_duration(self):
+        self.assertEqual(free_slots([], [(0, 60)], 30, step=15), [(0, 30), (15, 45), (30, 60)])
+
+    def test_slot_must_fit_inside_the_window(self):
+        self.assertEqual(free_slots([], [(0, 50)], 30), [(0, 30)])
+
+    def test_multiple_windows_and_busy_across_them(self):
+        busy = merge_intervals([(50, 110), (200, 230)])
+        windows = [(0, 60), (100, 160), (200, 260)]
+        self.assertEqual(free_slots(busy, windows, 30), [(0, 30), (130, 160), (230, 260)])
+
+
+class BusyIntervalsTests(SimpleTestCase):
+    def test_ignores_cancelled_and_unparseable_appointments(self):
+        appointments = [
+            {'startTime': '2030-01-01T10:00:00Z', 'endTime': '2030-01-01T10:30:00Z'},
+            {'startTime': '2030-01-01T10:15:00Z', 'endTime': '2030-01-01T11:00:00Z'},
+            {'startTime': '2030-01-01T12:00:00Z', 'endTime': '2030-01-01T13:00:00Z', 'appointmentStatus': 'cancelled'},
+            {'startTime': None, 'endTime': '2030-01-01T13:00:00Z'},
+        ]
+        start = 1893492000  # 2030-01-01T10:00:00Z
+        self.assertEqual(busy_intervals(appointments), [(start, start + 3600)])
@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ghl_integration.bulk import run_concurrently
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer
+
+
+def appointment(hour: int) -> dict:
+    return {
+        'calendarId': 'cal_stub_001',
+        'contactId': 'contact_stub_00001',
+        'startTime': f'2030-01-15T{hour:02d}:00:00Z',
+        'endTime': f'2030-01-15T{hour:02d}:30:00Z',
+    }
+
+
+class RunConcurrentlyTests(SimpleTestCase):
+    def test_never_exceeds_the_concurrency(self):
+        lock = threading.Lock()
+        in_flight, peak = [0], [0]
+
+        def work(item):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+            return {'success': True, 'item': item}
+
+        results = list(run_concurrently(range(12), work, concurrency=3))
+        self.assertEqual(peak[0], 3)
+        self.assertEqual(sorted(index for index, _, _ in results), list(range(12)))
+
+    def test_consumes_the_input_lazily(self):
+        consumed = []
+
+        def items():
+            for i in range(100):
+                consumed.append(i)
+                yield i
+
+        results = run_concurrently(items(), lambda item: {'success': True}, concurrency=2)
+        next(results)
+        self.assertLessEqual(len(consumed), 3)
+
+    def test_exception_becomes_a_failed_result(self):
+        def work(item):
+            if item == 1:
+                raise ValueError('boom')
+            return {'success': True}
+
+        results = {index: result for index, _, result in run_concurrently([0, 1, 2], work, concurrency=2)}
+        self.assertEqual(results[1], {'success': False, 'error': {'message': 'boom'}})
+        self.assertTrue(results[2]['success'])
+
+
+class BulkAppointmentsViewTests(TestCase):
+    def setUp(self):
+        self.stub = GHLStubServer(rate_limit=None, route_latency={'create_appointment': 'fixed:100'})
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        overrides = override_settings(
+            GHL_BASE_URL=self.stub.url, GHL_PRIVATE_TOKEN=STUB_TOKEN, GHL_DEFAULT_LOCATION_ID=STUB_LOCATION_ID,
+            GHL_MOCK=False, GHL_PREFLIGHT_CONFLICTS=False, GHL_BULK_MAX_CONCURRENCY=5,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def post(self, body, **params):
+        path = '/api/ghl/appointments/bulk/' + (f"?{'&'.join(f'{k}={v}' for k, v in params.items())}" if params else '')
+        return self.client.post(path, body, content_type='application/json')
+
+    def test_creates_in_parallel_and_reports_invalid_items(self):
+        started = time.perf_counter()
+        response = self.post({'appointments': [appointment(h) for h in range(8, 13)] + [{'calendarId': 'x'}],
+                              'concurrency': 50})
+        elapsed = time.perf_counter() - started
+        body = response.json()
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((body['total'], body['created'], body['failed'], body['concurrency']), (6, 5, 1, 5))
+        self.assertEqual(body['results'][5]['index'], 5)
+        self.assertFalse(body['results'][5]['success'])
+        # 5 citas de 100 ms en paralelo, no 500 ms en serie
+        self.assertLess(elapsed, 0.45)
+        self.assertEqual(self.stub.stats()['by_route']['POST /calendars/events/appointments'], 5)
+
+    def test_ndjson_reports_progress_and_a_final_summary(self):
+        response = self.post([appointment(h) for h in range(8, 11)], stream='ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([line.get('completed') for line in lines[:-1]], [1, 2, 3])
+        self.assertTrue(all(line['total'] == 3 and line['success'] for line in lines[:-1]))
+        self.assertEqual(lines[-1]['summary']['created'], 3)
+
+    def test_rejects_an_empty_or_oversized_batch(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        with override_settings(GHL_BULK_MAX_ITEMS=2):
+            self.assertEqual(self.post([appointment(8)] * 3).status_code, 400)
+        self.assertEqual(self.stub.stats()['requests'], 0)
@@ -0,0 +1,101 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ghl_integration.cache import GHLResponseCache, get_response_cache, reset_response_cache
+
+from .fakes import FakeClock
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'cache-tests'}}
+
+
+@override_settings(CACHES=LOCMEM)
+class GHLResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        # El TTL lo aplica LocMemCache con time.time()
+        self.clock = FakeClock(now=1_700_000_000.0)
+        patcher = mock.patch('time.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(caches['default'].clear)
+        self.calls = []
+
+    def fetch(self, name):
+        def fetch():
+            self.calls.append(name)
+            return {'success': True, 'name': name}
+        return fetch
+
+    def test_serves_from_cache_until_the_ttl_expires(self):
+        cache = GHLResponseCache(ttls={'calendars': 300})
+        self.assertFalse(cache.get_or_fetch('calendars', 'loc', self.fetch('a'))['cached'])
+        self.assertTrue(cache.get_or_fetch('calendars', 'loc', self.fetch('a'))['cached'])
+        self.clock.advance(301)
+        self.assertFalse(cache.get_or_fetch('calendars', 'loc', self.fetch('a'))['cached'])
+        self.assertEqual(self.calls, ['a', 'a'])
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (1, 2))
+
+    def test_zero_ttl_and_failures_are_not_cached(self):
+        cache = GHLResponseCache(ttls={'calendars': 0})
+        cache.get_or_fetch('calendars', 'loc', self.fetch('a'))
+        cache.get_or_fetch('calendars', 'loc', self.fetch('a'))
+        failing = GHLResponseCache()
+        failing.get_or_fetch('locations', None, lambda: {'success': False})
+        self.assertEqual(self.calls, ['a', 'a'])
+        self.assertEqual(failing.stats()['entries'], 0)
+
+    def test_evicts_the_least_recently_used_entry(self):
+        cache = GHLResponseCache(max_entries=2)
+        cache.get_or_fetch('calendars', 'a', self.fetch('a'))
+        cache.get_or_fetch('calendars', 'b', self.fetch('b'))
+        cache.get_or_fetch('calendars', 'a', self.fetch('a'))  # 'a' pasa a ser la más reciente
+        cache.get_or_fetch('calendars', 'c', self.fetch('c'))
+        self.assertTrue(cache.get_or_fetch('calendars', 'a', self.fetch('a'))['cached'])
+        self.assertFalse(cache.get_or_fetch('calendars', 'b', self.fetch('b'))['cached'])
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_entries_over_max_bytes_are_not_cached(self):
+        cache = GHLResponseCache(max_bytes=64)
+        cache.get_or_fetch('calendars', 'a', lambda: {'success': True, 'data': 'x' * 100})
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_invalidation_reaches_other_processes_sharing_the_backend(self):
+        first, second = GHLResponseCache(), GHLResponseCache()
+        first.get_or_fetch('calendars', 'a', self.fetch('a'))
+        first.get_or_fetch('calendars', 'b', self.fetch('b'))
+        # `second` no conoce las entradas de `first`: invalida por generación en el backend
+        self.assertEqual(second.invalidate('calendars', 'a'), 0)
+        self.assertFalse(first.get_or_fetch('calendars', 'a', self.fetch('a'))['cached'])
+        self.assertTrue(first.get_or_fetch('calendars', 'b', self.fetch('b'))['cached'])
+        second.invalidate()
+        self.assertFalse(first.get_or_fetch('calendars', 'b', self.fetch('b'))['cached'])
+
+    def test_fetch_racing_an_invalidation_is_stored_stale(self):
+        cache = GHLResponseCache()
+
+        def fetch():
+            cache.invalidate('calendars', 'a')
+            return {'success': True}
+
+        cache.get_or_fetch('calendars', 'a', fetch)
+        self.assertFalse(cache.get_or_fetch('calendars', 'a', self.fetch('a'))['cached'])
+
+
+@override_settings(CACHES=LOCMEM)
+class ProcessLocalWarningTests(SimpleTestCase):
+    def tearDown(self):
+        reset_response_cache()
+
+    @override_settings(DEBUG=False)
+    def test_warns_when_the_backend_is_locmem_in_production(self):
+        reset_response_cache()
+        with self.assertLogs('ghl_integration.cache', 'WARNING') as logs:
+            get_response_cache()
+        self.assertIn('LocMemCache', logs.output[0])
+
+    @override_settings(DEBUG=True)
+    def test_silent_in_development(self):
+        reset_response_cache()
+        with self.assertNoLogs('ghl_integration.cache', 'WARNING'):
+            get_response_cache()
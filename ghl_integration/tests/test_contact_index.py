@@ -0,0 +1,93 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ghl_integration.contact_index import classify_query, index_contact, search_contact_index
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer
+
+CONTACTS = [
+    {'id': 'c1', 'firstName': 'José', 'lastName': 'Núñez', 'email': 'Jose.Nunez@Example.com', 'phone': '+34 600 12 34 56'},
+    {'id': 'c2', 'firstName': 'Ana', 'lastName': 'Jiménez', 'email': 'ana@example.com', 'phone': '611223344'},
+    {'id': 'c3', 'firstName': 'Josefa', 'lastName': 'Ruiz', 'email': 'josefa@example.com', 'phone': ''},
+]
+
+
+class ClassifyQueryTests(SimpleTestCase):
+    def test_kinds(self):
+        self.assertEqual(classify_query(' Ana@EXAMPLE '), ('email', 'ana@example'))
+        self.assertEqual(classify_query('600 12 34 56'), ('phone', '654321006'))
+        self.assertEqual(classify_query('Núñez'), ('name', 'nunez'))
+        self.assertIsNone(classify_query('12')[0])
+        self.assertIsNone(classify_query('J')[0])
+
+
+class ContactIndexTests(TestCase):
+    def setUp(self):
+        for contact in CONTACTS:
+            self.assertTrue(index_contact({'contact': contact}, 'loc_a'))
+        index_contact({'id': 'c4', 'firstName': 'José', 'lastName': 'Otro', 'email': 'jose@otra.com'}, 'loc_b')
+
+    def ids(self, query, location_id='loc_a', **kwargs):
+        result = search_contact_index(query, location_id, **kwargs)
+        return [contact['id'] for contact in result['contacts']]
+
+    def test_email_prefix_is_case_insensitive(self):
+        self.assertEqual(self.ids('JOSE'), ['c1', 'c3'])
+        self.assertEqual(self.ids('jose.nunez@'), ['c1'])
+
+    def test_phone_matches_with_or_without_country_code(self):
+        self.assertEqual(self.ids('600123456'), ['c1'])
+        self.assertEqual(self.ids('+34600123456'), ['c1'])
+        self.assertEqual(self.ids('3344'), ['c2'])
+
+    def test_name_ignores_accents_and_matches_surname(self):
+        self.assertEqual(self.ids('jimenez'), ['c2'])
+        self.assertEqual(self.ids('nunez jose'), ['c1'])
+        self.assertEqual(self.ids('jose', limit=1), ['c1'])
+
+    def test_results_are_scoped_to_the_location(self):
+        self.assertEqual(self.ids('jose', 'loc_b'), ['c4'])
+
+    def test_reindexing_updates_the_keys(self):
+        index_contact({**CONTACTS[1], 'phone': '+34 699 000 111'}, 'loc_a')
+        self.assertEqual(self.ids('611223344'), [])
+        self.assertEqual(self.ids('699000111'), ['c2'])
+
+    def test_contact_without_id_is_not_indexed(self):
+        self.assertFalse(index_contact({'contact': {'email': 'x@example.com'}}, 'loc_a'))
+
+
+class ContactSearchViewTests(TestCase):
+    def setUp(self):
+        self.stub = GHLStubServer(rate_limit=None)
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        overrides = override_settings(
+            GHL_BASE_URL=self.stub.url, GHL_PRIVATE_TOKEN=STUB_TOKEN, GHL_DEFAULT_LOCATION_ID=STUB_LOCATION_ID,
+            GHL_MOCK=False,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def create(self, query=''):
+        contact = {'firstName': 'Lucía', 'lastName': 'Pérez', 'email': 'lucia@example.com', 'phone': '+34 622 33 44 55'}
+        return self.client.post(f'/api/ghl/contacts/create/{query}', contact, content_type='application/json')
+
+    def test_created_contacts_are_searchable_without_calling_ghl(self):
+        self.assertEqual(self.create().status_code, 201)
+        requests_before = self.stub.stats()['requests']
+        for query in ('lucia@', '622334455', 'perez'):
+            response = self.client.get('/api/ghl/contacts/search/', {'q': query})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([c['email'] for c in response.json()['contacts']], ['lucia@example.com'])
+        self.assertEqual(self.stub.stats()['requests'], requests_before)
+
+    def test_upsert_reuses_the_indexed_contact(self):
+        created = self.create().json()
+        response = self.create('?upsert=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['reused'])
+        self.assertEqual(response.json()['contact']['contact']['id'], created['contact']['contact']['id'])
+        self.assertEqual(self.stub.stats()['contacts'], 251)
+
+    def test_invalid_queries(self):
+        self.assertEqual(self.client.get('/api/ghl/contacts/search/', {'q': 'a'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/ghl/contacts/search/', {'q': 'ana', 'limit': 'x'}).status_code, 400)
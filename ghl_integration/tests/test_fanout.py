@@ -0,0 +1,73 @@
+import time
+
+from django.test import TestCase, override_settings
+
+from ghl_integration.async_service import AsyncGHLService
+from ghl_integration.ghl_service import GHLService
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer
+
+OTHER_LOCATIONS = ['loc_otra_1', 'loc_otra_2']
+
+
+class FanOutTests(TestCase):
+    """La stub solo conoce STUB_LOCATION_ID: el resto de locations responden 400"""
+
+    def setUp(self):
+        self.stub = GHLStubServer(rate_limit=None, route_latency={'calendars': 'fixed:200'})
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        overrides = override_settings(
+            GHL_BASE_URL=self.stub.url, GHL_PRIVATE_TOKEN=STUB_TOKEN, GHL_DEFAULT_LOCATION_ID=STUB_LOCATION_ID,
+            GHL_MOCK=False, GHL_RETRY_ENABLED=False, GHL_FANOUT_MAX_LOCATIONS=3,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def service_kwargs(self):
+        return {'base_url': self.stub.url, 'private_token': STUB_TOKEN, 'default_location_id': STUB_LOCATION_ID}
+
+    def assert_partial_result(self, result):
+        self.assertTrue(result['success'])
+        self.assertEqual(result['location_ids'], [STUB_LOCATION_ID, *OTHER_LOCATIONS])
+        self.assertEqual(result['failed_locations'], OTHER_LOCATIONS)
+        self.assertEqual(result['locations'][STUB_LOCATION_ID]['total'], 3)
+        self.assertEqual(result['locations']['loc_otra_1']['status_code'], 400)
+        self.assertEqual({calendar['locationId'] for calendar in result['calendars']}, {STUB_LOCATION_ID})
+
+    def test_locations_are_fetched_in_parallel(self):
+        started = time.perf_counter()
+        result = GHLService(**self.service_kwargs()).get_calendars_for_locations(
+            [STUB_LOCATION_ID, *OTHER_LOCATIONS], fresh=True)
+        # Tres llamadas de 200 ms: en serie serían 600 ms
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assert_partial_result(result)
+        self.assertEqual(self.stub.stats()['by_route']['GET /calendars'], 3)
+
+    def test_concurrency_limit_serializes_the_calls(self):
+        started = time.perf_counter()
+        GHLService(**self.service_kwargs()).get_calendars_for_locations(
+            [STUB_LOCATION_ID, *OTHER_LOCATIONS], fresh=True, concurrency=1)
+        self.assertGreaterEqual(time.perf_counter() - started, 0.6)
+
+    async def test_async_fan_out(self):
+        started = time.perf_counter()
+        result = await AsyncGHLService(**self.service_kwargs()).get_calendars_for_locations(
+            [STUB_LOCATION_ID, *OTHER_LOCATIONS], fresh=True)
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assert_partial_result(result)
+
+    def test_view_returns_each_location_result(self):
+        response = self.client.get('/api/ghl/calendars/', {'locationIds': f'{STUB_LOCATION_ID},loc_otra_1,loc_otra_2,loc_otra_1'})
+        self.assertEqual(response.status_code, 200)
+        self.assert_partial_result(response.json())
+
+    def test_view_returns_400_when_every_location_fails(self):
+        response = self.client.get('/api/ghl/appointments/', {'locationIds': ','.join(OTHER_LOCATIONS)})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['failed_locations'], OTHER_LOCATIONS)
+
+    def test_view_validates_location_ids(self):
+        for value in (' , ', 'a,b,c,d'):
+            response = self.client.get('/api/ghl/calendars/', {'locationIds': value})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stub.stats()['requests'], 0)
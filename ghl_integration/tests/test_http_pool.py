@@ -0,0 +1,60 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import SimpleTestCase
+
+from ghl_integration.http_pool import GHLConnectionPool, get_async_client
+
+
+class _CookieHandler(BaseHTTPRequestHandler):
+    """Responde con Set-Cookie y devuelve en el body el header Cookie que recibió"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = json.dumps({'cookie': self.headers.get('Cookie')}).encode()
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'session=abc; Path=/')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _CookieHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/'
+
+    def test_keeps_the_connection_alive_between_requests(self):
+        pool = GHLConnectionPool()
+        self.addCleanup(pool.close)
+        for _ in range(3):
+            pool.request('GET', self.url).raise_for_status()
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['reused'], stats['total_requests']), (1, 2, 3))
+
+    def test_cookies_from_responses_are_not_sent_back(self):
+        pool = GHLConnectionPool()
+        self.addCleanup(pool.close)
+        pool.request('GET', self.url)
+        self.assertIsNone(pool.request('GET', self.url).json()['cookie'])
+        self.assertEqual(len(pool.session.cookies), 0)
+
+    def test_async_client_does_not_keep_cookies_either(self):
+        async def fetch_twice():
+            client = get_async_client()
+            try:
+                await client.get(self.url)
+                return (await client.get(self.url)).json()['cookie']
+            finally:
+                await client.aclose()
+
+        self.assertIsNone(asyncio.run(fetch_twice()))
@@ -0,0 +1,122 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ghl_integration.ghl_service import clear_ghl_services, get_ghl_service
+from ghl_integration.idempotency import IdempotencyStore
+from ghl_integration.models import GHLIdempotencyKey
+from ghl_integration.resilience import reset_circuit_breaker
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer, RateLimitBudget
+
+APPOINTMENT = {
+    'calendarId': 'cal_stub_001',
+    'contactId': 'contact_stub_00001',
+    'startTime': '2030-01-15T10:00:00Z',
+    'endTime': '2030-01-15T11:00:00Z',
+    'title': 'Cita de prueba',
+}
+
+
+class IdempotencyStoreTests(TestCase):
+    def setUp(self):
+        self.store = IdempotencyStore(wait_timeout=0)
+        self.calls = 0
+
+    def create(self):
+        self.calls += 1
+        return 201, {'success': True, 'id': self.calls}
+
+    def test_replays_the_stored_response(self):
+        self.assertEqual(self.store.run('contacts', 'k', {'a': 1}, self.create), (201, {'success': True, 'id': 1}, False))
+        self.assertEqual(self.store.run('contacts', 'k', {'a': 1}, self.create), (201, {'success': True, 'id': 1}, True))
+        self.assertEqual(self.calls, 1)
+
+    def test_rejects_reused_key_with_other_body(self):
+        self.store.run('contacts', 'k', {'a': 1}, self.create)
+        self.assertEqual(self.store.run('contacts', 'k', {'a': 2}, self.create)[0], 422)
+
+    def test_reservation_row_carries_a_token(self):
+        rows = []
+
+        def create():
+            rows.extend(GHLIdempotencyKey.objects.values_list('token', 'status_code'))
+            return self.create()
+
+        self.store.run('contacts', 'k', {'a': 1}, create)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(len(rows[0][0]), 32)
+        self.assertIsNone(rows[0][1])
+
+    def test_lost_reservation_does_not_overwrite_the_new_one(self):
+        def create():
+            # La reserva caducó y otra petición tomó la clave mientras GHL respondía
+            GHLIdempotencyKey.objects.update(token='other', expires_at=timezone.now() + timedelta(minutes=1))
+            return self.create()
+
+        self.assertEqual(self.store.run('contacts', 'k', {'a': 1}, create)[0], 201)
+        row = GHLIdempotencyKey.objects.get()
+        self.assertEqual((row.token, row.status_code), ('other', None))
+
+    def test_unstored_result_only_deletes_its_own_reservation(self):
+        def throttled():
+            GHLIdempotencyKey.objects.update(token='other')
+            return 429, {'success': False, 'status_code': 429}
+
+        self.store.run('contacts', 'k', {'a': 1}, throttled)
+        self.assertEqual(GHLIdempotencyKey.objects.get().token, 'other')
+
+
+class IdempotentAppointmentViewTests(TestCase):
+    """Los rechazos que no llegaron a GHL no se guardan: repetir la clave vuelve a llamar a GHL"""
+
+    def setUp(self):
+        self.stub = GHLStubServer(rate_limit=None)
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        overrides = override_settings(
+            GHL_BASE_URL=self.stub.url, GHL_PRIVATE_TOKEN=STUB_TOKEN, GHL_DEFAULT_LOCATION_ID=STUB_LOCATION_ID,
+            GHL_MOCK=False, GHL_PREFLIGHT_CONFLICTS=False, GHL_RETRY_ENABLED=False,
+            GHL_CIRCUIT_FAILURE_THRESHOLD=1, GHL_CIRCUIT_RECOVERY_TIMEOUT=3600,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(reset_circuit_breaker)
+
+    def post(self):
+        return self.client.post('/api/ghl/appointments/create/', APPOINTMENT, content_type='application/json',
+                                HTTP_IDEMPOTENCY_KEY='cita-1')
+
+    def assert_retry_reaches_ghl(self):
+        self.assertFalse(GHLIdempotencyKey.objects.exists())
+        created = self.stub.stats()['appointments']
+        response = self.post()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stub.stats()['appointments'], created + 1)
+
+    def test_ghl_429_is_not_stored(self):
+        self.stub.budget = RateLimitBudget(limit=1, interval=3600)
+        self.client.post('/api/ghl/appointments/create/', APPOINTMENT, content_type='application/json')
+        with override_settings(GHL_RATE_LIMIT_ENABLED=False):
+            response = self.post()
+            self.assertEqual(response.json()['status_code'], 429)
+            self.stub.budget = None
+            self.assert_retry_reaches_ghl()
+
+    @override_settings(GHL_RATE_LIMIT_MODE='fail_fast', GHL_RATE_LIMIT_CAPACITY=1, GHL_RATE_LIMIT_INTERVAL=3600)
+    def test_local_rate_limit_is_not_stored(self):
+        get_ghl_service().rate_limiter.acquire(block=False)
+        response = self.post()
+        self.assertIn('local_rate_limit', response.json())
+        self.assertEqual(self.stub.stats()['requests'], 0)
+        clear_ghl_services()
+        self.assert_retry_reaches_ghl()
+
+    def test_open_circuit_is_not_stored(self):
+        self.stub.error_rate = 1.0
+        self.client.post('/api/ghl/appointments/create/', APPOINTMENT, content_type='application/json')
+        self.stub.error_rate = 0.0
+        response = self.post()
+        self.assertIn('circuit', response.json())
+        reset_circuit_breaker()
+        self.assert_retry_reaches_ghl()
@@ -0,0 +1,89 @@
+import io
+import json
+import os
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ghl_integration.ghl_service import GHLService
+from ghl_integration.importer import ContactImporter, detect_format, iter_rows
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer
+
+CSV = (
+    'firstName,lastName,email\n'
+    'Ana,Ruiz,ana@example.com\n'
+    'Luis,Gómez,luis@example.com\n'
+    'Ana,Ruiz,ANA@example.com\n'
+    'Sin,Email,\n'
+)
+
+
+class RowParsingTests(SimpleTestCase):
+    def test_detects_the_format(self):
+        self.assertEqual(detect_format('contactos.CSV'), 'csv')
+        self.assertEqual(detect_format('contactos.ndjson'), 'jsonl')
+        self.assertEqual(detect_format('contactos.txt', 'ndjson'), 'jsonl')
+        self.assertIsNone(detect_format('contactos.xlsx'))
+
+    def test_csv_drops_empty_cells(self):
+        rows = list(iter_rows(io.StringIO(CSV), 'csv'))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[3], {'firstName': 'Sin', 'lastName': 'Email'})
+
+    def test_invalid_jsonl_lines_are_reported_not_raised(self):
+        rows = list(iter_rows(io.StringIO('{"email": "a@b.c"}\n\nno-json\n[1]\n'), 'jsonl'))
+        self.assertEqual(rows[0], {'email': 'a@b.c'})
+        self.assertIn('_error', rows[1])
+        self.assertIn('_error', rows[2])
+
+
+class ContactImportTests(TestCase):
+    def setUp(self):
+        self.stub = GHLStubServer(rate_limit=None)
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        overrides = override_settings(
+            GHL_BASE_URL=self.stub.url, GHL_PRIVATE_TOKEN=STUB_TOKEN, GHL_DEFAULT_LOCATION_ID=STUB_LOCATION_ID,
+            GHL_MOCK=False, GHL_IMPORT_DIR=self.directory,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def created(self) -> int:
+        return self.stub.stats()['by_route'].get('POST /contacts', 0)
+
+    def importer(self) -> ContactImporter:
+        return ContactImporter(
+            GHLService(), concurrency=3,
+            checkpoint_path=os.path.join(self.directory, 'i.checkpoint.json'),
+            results_path=os.path.join(self.directory, 'i.results.jsonl'),
+        )
+
+    def test_creates_deduplicates_and_resumes_from_the_checkpoint(self):
+        summary = self.importer().run(iter_rows(io.StringIO(CSV), 'csv'))
+        self.assertEqual((summary['created'], summary['duplicate'], summary['invalid']), (2, 1, 1))
+        self.assertEqual(self.created(), 2)
+        with open(os.path.join(self.directory, 'i.results.jsonl')) as f:
+            self.assertEqual(sorted(json.loads(line)['row'] for line in f), [0, 1, 2, 3])
+
+        # Repetir con el mismo checkpoint no vuelve a crear nada
+        summary = self.importer().run(iter_rows(io.StringIO(CSV), 'csv'))
+        self.assertEqual((summary['skipped'], summary['created']), (4, 0))
+        self.assertEqual(self.created(), 2)
+
+    def test_view_streams_one_ndjson_line_per_row(self):
+        upload = SimpleUploadedFile('contactos.csv', CSV.encode())
+        response = self.client.post('/api/ghl/contacts/import/?stream=ndjson', {'file': upload, 'importId': 'prueba'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(sorted(line['status'] for line in lines[:-1]), ['created', 'created', 'duplicate', 'invalid'])
+        self.assertEqual(lines[-1]['summary']['importId'], 'prueba')
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'prueba.checkpoint.json')))
+
+    def test_view_rejects_unknown_formats(self):
+        upload = SimpleUploadedFile('contactos.xlsx', b'...')
+        self.assertEqual(self.client.post('/api/ghl/contacts/import/', {'file': upload}).status_code, 400)
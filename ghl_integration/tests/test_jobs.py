@@ -0,0 +1,136 @@
+import uuid
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from ghl_integration.jobs import JobWorker, claim_jobs, enqueue_job, requeue_stale_jobs, run_job
+from ghl_integration.models import GHLJob
+from ghl_integration.resilience import reset_circuit_breaker
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer
+
+APPOINTMENT = {
+    'calendarId': 'cal_stub_001',
+    'contactId': 'contact_stub_00001',
+    'startTime': '2030-01-15T10:00:00Z',
+    'endTime': '2030-01-15T11:00:00Z',
+    'title': 'Cita de prueba',
+}
+
+
+class StubMixin:
+    def setUp(self):
+        super().setUp()
+        self.stub = GHLStubServer(rate_limit=None)
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        overrides = override_settings(
+            GHL_BASE_URL=self.stub.url, GHL_PRIVATE_TOKEN=STUB_TOKEN, GHL_DEFAULT_LOCATION_ID=STUB_LOCATION_ID,
+            GHL_MOCK=False, GHL_PREFLIGHT_CONFLICTS=False, GHL_RETRY_ENABLED=False,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(reset_circuit_breaker)
+
+    def appointments_created(self):
+        return self.stub.stats()['by_route'].get('POST /calendars/events/appointments', 0)
+
+
+class JobViewTests(StubMixin, TestCase):
+    def test_async_create_is_queued_without_calling_ghl(self):
+        response = self.client.post('/api/ghl/appointments/create/?async=1', APPOINTMENT,
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['job_id']
+        self.assertTrue(response['Location'].endswith(f'/api/ghl/jobs/{job_id}/'))
+        self.assertEqual(self.stub.stats()['requests'], 0)
+
+        job = self.client.get(f'/api/ghl/jobs/{job_id}/').json()['job']
+        self.assertEqual((job['kind'], job['status'], job['attempts']), ('create_appointment', 'queued', 0))
+
+    def test_prefer_header_and_validation(self):
+        contact = {'firstName': 'Ana', 'lastName': 'Ruiz', 'email': 'ana@example.com'}
+        response = self.client.post('/api/ghl/contacts/create/', contact,
+                                    content_type='application/json', HTTP_PREFER='respond-async')
+        self.assertEqual(response.status_code, 202)
+        response = self.client.post('/api/ghl/appointments/create/?async=1', {'calendarId': 'cal_stub_001'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(GHLJob.objects.count(), 1)
+
+    def test_unknown_job_is_404(self):
+        self.assertEqual(self.client.get(f'/api/ghl/jobs/{uuid.uuid4()}/').status_code, 404)
+
+
+class JobLeaseTests(StubMixin, TestCase):
+    def test_claimed_jobs_are_not_claimed_twice(self):
+        for _ in range(3):
+            enqueue_job('create_appointment', APPOINTMENT)
+        first = claim_jobs('worker-a', 2)
+        second = claim_jobs('worker-b', 5)
+        self.assertEqual((len(first), len(second)), (2, 1))
+        self.assertEqual(claim_jobs('worker-c', 5), [])
+        self.assertEqual({job.worker for job in GHLJob.objects.all()}, {'worker-a', 'worker-b'})
+
+    @override_settings(GHL_JOBS_LEASE_SECONDS=60)
+    def test_stale_leases_go_back_to_the_queue(self):
+        enqueue_job('create_appointment', APPOINTMENT)
+        [job] = claim_jobs('worker-a', 1)
+        self.assertEqual(requeue_stale_jobs(), 0)
+        GHLJob.objects.update(locked_at=timezone.now() - timedelta(seconds=61))
+        self.assertEqual(requeue_stale_jobs(), 1)
+        [again] = claim_jobs('worker-b', 1)
+        self.assertNotEqual(again.lease, job.lease)
+
+        # El worker original termina tarde: su resultado no pisa la reserva nueva
+        run_job(job)
+        again.refresh_from_db()
+        self.assertEqual((again.status, again.worker, again.result), (GHLJob.RUNNING, 'worker-b', None))
+
+    def test_429_is_rescheduled_with_backoff(self):
+        self.stub.error_rate, self.stub.error_statuses = 1.0, (429,)
+        enqueue_job('create_appointment', APPOINTMENT)
+        [job] = claim_jobs('worker-a', 1)
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.status_code), (GHLJob.QUEUED, 1, 429))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(claim_jobs('worker-a', 1), [])
+
+    def test_5xx_is_not_retried_by_default(self):
+        self.stub.error_rate, self.stub.error_statuses = 1.0, (502,)
+        enqueue_job('create_appointment', APPOINTMENT)
+        [job] = claim_jobs('worker-a', 1)
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.status_code), (GHLJob.FAILED, 502))
+        self.assertIsNotNone(job.finished_at)
+
+
+class JobWorkerTests(StubMixin, TransactionTestCase):
+    def test_worker_drains_the_queue(self):
+        jobs = [enqueue_job('create_appointment', {**APPOINTMENT, 'title': f'Cita {i}'}) for i in range(5)]
+        # La base de datos de tests es SQLite en memoria (caché compartida): las escrituras desde
+        # varios hilos a la vez fallan con "table is locked" en lugar de esperar, así que un trabajo en vuelo
+        summary = JobWorker(concurrency=1, poll_interval=0.05).run(once=True)
+        self.assertEqual((summary['processed'], summary['succeeded']), (5, 5))
+        self.assertEqual(self.appointments_created(), 5)
+        job = self.client.get(f'/api/ghl/jobs/{jobs[0].id}/').json()['job']
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertTrue(job['result']['success'])
+
+    def test_concurrency_halves_on_429_and_recovers_one_by_one(self):
+        worker = JobWorker(concurrency=8)
+        worker._adapt({'success': False, 'status_code': 429})
+        worker._adapt({'success': False, 'status_code': 429})
+        self.assertEqual(worker.limit, 2)
+        worker._adapt({'success': True})
+        self.assertEqual(worker.limit, 3)
+
+    def test_command_once(self):
+        enqueue_job('create_appointment', APPOINTMENT)
+        out = StringIO()
+        call_command('ghl_worker', '--once', '--poll-interval', '0.05', stdout=out)
+        self.assertIn('Procesados: 1 (completados 1', out.getvalue())
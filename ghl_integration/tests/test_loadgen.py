@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+from django.test import LiveServerTestCase, SimpleTestCase, override_settings
+
+from ghl_integration.loadgen import LoadGenerator, _is_rate_limited, build_scenarios, parse_mix
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer
+
+SCENARIOS = build_scenarios('cal_stub_001', 'contact_stub_00001', STUB_LOCATION_ID)
+
+
+class LoadgenHelpersTests(SimpleTestCase):
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('ping=1, calendars=5,contacts', SCENARIOS),
+                         [('ping', 1.0), ('calendars', 5.0), ('contacts', 1.0)])
+        for invalid in ('otro=1', 'ping=x', 'ping=0', ''):
+            with self.assertRaises(ValueError):
+                parse_mix(invalid, SCENARIOS)
+
+    def test_rate_limited_responses(self):
+        self.assertTrue(_is_rate_limited(429, b''))
+        # Las vistas responden 400 con el 429 de GHL o del rate limiter local en el body
+        self.assertTrue(_is_rate_limited(400, json.dumps({'status_code': 429}).encode()))
+        self.assertTrue(_is_rate_limited(400, json.dumps({'local_rate_limit': {}, 'retry': 429}).encode()))
+        self.assertFalse(_is_rate_limited(400, json.dumps({'status_code': 422, 'id': 429}).encode()))
+        self.assertFalse(_is_rate_limited(200, b'429'))
+
+    def test_appointments_get_distinct_slots(self):
+        body = SCENARIOS['create_appointment'].body
+        self.assertNotEqual(body(0)['startTime'], body(1)['startTime'])
+        self.assertEqual(body(1)['startTime'], body(0)['endTime'])
+
+
+class LoadGeneratorTests(LiveServerTestCase):
+    def setUp(self):
+        self.stub = GHLStubServer(rate_limit=None)
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        overrides = override_settings(
+            GHL_BASE_URL=self.stub.url, GHL_PRIVATE_TOKEN=STUB_TOKEN, GHL_DEFAULT_LOCATION_ID=STUB_LOCATION_ID,
+            GHL_MOCK=False,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def run_load(self, **kwargs):
+        mix = parse_mix('ping=1,calendars=3', SCENARIOS)
+        generator = LoadGenerator(self.live_server_url, SCENARIOS, mix, duration=30, seed=1, **kwargs)
+        return asyncio.run(generator.run())
+
+    def test_closed_loop_stops_at_max_requests(self):
+        report = self.run_load(concurrency=3, max_requests=12)
+        overall = report['overall']
+        self.assertEqual(report['config']['mode'], 'concurrency')
+        self.assertEqual(overall['requests'], 12)
+        self.assertEqual(overall['status_codes'], {'200': 12})
+        self.assertEqual(overall['error_rate'], 0)
+        self.assertEqual(sum(s['requests'] for s in report['scenarios'].values()), 12)
+        # Los calendarios salen de la caché: muchas menos llamadas a GHL que peticiones
+        self.assertLess(overall['upstream_calls'], 12)
+
+    def test_open_loop_follows_the_target_rate(self):
+        report = self.run_load(rps=100, max_requests=10)
+        self.assertEqual(report['config']['mode'], 'rps')
+        self.assertEqual(report['overall']['requests'], 10)
+        self.assertEqual(report['overall']['dropped'], 0)
+        self.assertGreaterEqual(report['elapsed_s'], 0.09)
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from ghl_integration.ghl_service import get_ghl_service, get_tenant_service
+from ghl_integration.http_pool import reset_connection_pool
+from ghl_integration.metrics import MetricsRegistry, MultiProcessStore, merge_snapshots, registry, render
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer
+from ghl_integration.tenants import Tenant
+
+
+class MultiProcessStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = MultiProcessStore(directory.name, interval=5, ttl=60)
+        self.registry = MetricsRegistry()
+        self.requests = self.registry.counter('requests_total', 'Peticiones')
+        self.in_flight = self.registry.gauge('in_flight', 'En curso')
+
+    def dump_other_worker(self, process: str, requests: int, age: float):
+        """Volcado de otro worker cuyo fichero se actualizó hace `age` segundos"""
+        snapshot = self.registry.snapshot()
+        snapshot['process'] = process
+        snapshot['metrics']['requests_total']['samples'] = [[[], requests]]
+        snapshot['metrics']['in_flight']['samples'] = [[[], [1, time.time()]]]
+        self.store.write(snapshot)
+        path = os.path.join(self.store.directory, f'ghl_metrics_{process}.json')
+        self.assertTrue(os.path.exists(path))
+        os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+    def test_sums_counters_of_all_workers_and_gauges_of_live_ones(self):
+        self.requests.inc(2)
+        self.in_flight.inc()
+        self.dump_other_worker('live', requests=3, age=1)
+        self.dump_other_worker('stalled', requests=4, age=30)
+        merged = merge_snapshots(*self.store.collect(self.registry))
+        self.assertEqual(merged['requests_total']['values'][()], 9)
+        self.assertEqual(merged['in_flight']['values'][()][0], 2)
+
+    def test_prunes_dumps_older_than_ttl(self):
+        old = self.dump_other_worker('gone', requests=5, age=61)
+        snapshots, live = self.store.collect(self.registry)
+        self.assertFalse(os.path.exists(old))
+        self.assertEqual(len(snapshots), 1)
+        self.assertNotIn('gone', live)
+
+    def test_background_thread_dumps_the_process_snapshot(self):
+        self.store.start(self.registry)
+        self.addCleanup(self.store.stop)
+        deadline = time.monotonic() + 5
+        while not os.listdir(self.store.directory) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len([f for f in os.listdir(self.store.directory) if f.endswith('.json')]), 1)
+
+
+class ConnectionPoolMetricsTests(SimpleTestCase):
+    databases = {'default'}
+
+    def test_pool_gauges_cover_tenant_pools(self):
+        with GHLStubServer(rate_limit=None) as stub, override_settings(
+                GHL_BASE_URL=stub.url, GHL_PRIVATE_TOKEN=STUB_TOKEN, GHL_DEFAULT_LOCATION_ID=STUB_LOCATION_ID,
+                GHL_MOCK=False):
+            self.addCleanup(reset_connection_pool)
+            get_ghl_service().get_locations()
+            tenant = Tenant(STUB_LOCATION_ID, STUB_TOKEN)
+            get_tenant_service(tenant).get_calendars(STUB_LOCATION_ID)
+            get_tenant_service(tenant).get_calendars(STUB_LOCATION_ID, fresh=True)
+            text = render(merge_snapshots([registry.snapshot()]))
+        host = stub.url
+        self.assertIn(f'ghl_pool_requests_total{{pool="default",host="{host}"}} 1', text)
+        self.assertIn(f'ghl_pool_requests_total{{pool="{STUB_LOCATION_ID}",host="{host}"}} 2', text)
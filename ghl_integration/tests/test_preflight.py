@@ -0,0 +1,78 @@
+from django.test import SimpleTestCase
+
+from ghl_integration.preflight import AppointmentIndex, normalize_appointment
+
+from .fakes import FakeClock
+
+
+class AppointmentIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.loads = []
+        self.calendar = [(100, 200, 'a1'), (300, 400, 'a2')]
+        self.index = AppointmentIndex(loader=self.load, ttl=60, clock=self.clock)
+
+    def load(self, calendar_id):
+        self.loads.append(calendar_id)
+        return list(self.calendar)
+
+    def test_reserves_free_slot(self):
+        token, conflicts = self.index.reserve('cal', 200, 300)
+        self.assertTrue(token.startswith('pending:'))
+        self.assertEqual(conflicts, [])
+
+    def test_reports_overlapping_appointments(self):
+        self.assertEqual(self.index.reserve('cal', 150, 350), (None, ['a1', 'a2']))
+        self.assertEqual(self.index.reserve('cal', 399, 500), (None, ['a2']))
+
+    def test_long_appointment_is_found_from_later_start(self):
+        self.calendar = [(0, 1000, 'long'), (100, 110, 'short')]
+        self.assertEqual(self.index.reserve('cal', 900, 950), (None, ['long']))
+
+    def test_concurrent_reservations_conflict(self):
+        token, _ = self.index.reserve('cal', 200, 300)
+        self.assertEqual(self.index.reserve('cal', 250, 280), (None, [token]))
+
+    def test_release_frees_the_slot(self):
+        token, _ = self.index.reserve('cal', 200, 300)
+        self.index.release('cal', token)
+        self.assertIsNotNone(self.index.reserve('cal', 200, 300)[0])
+
+    def test_confirm_replaces_reservation_with_appointment(self):
+        token, _ = self.index.reserve('cal', 200, 300)
+        self.index.confirm('cal', token, 'new')
+        self.assertEqual(self.index.reserve('cal', 250, 260), (None, ['new']))
+        self.assertEqual(self.index.stats()['confirmed'], 1)
+
+    def test_reloads_after_ttl_keeping_pending_reservations(self):
+        token, _ = self.index.reserve('cal', 200, 300)
+        self.calendar = [(500, 600, 'a3')]
+        self.clock.advance(61)
+        self.assertEqual(self.index.reserve('cal', 150, 550), (None, [token, 'a3']))
+        self.assertEqual(self.loads, ['cal', 'cal'])
+
+    def test_loads_each_calendar_once_within_ttl(self):
+        self.index.reserve('cal', 0, 10)
+        self.index.reserve('cal', 20, 30)
+        self.index.reserve('other', 0, 10)
+        self.assertEqual(self.loads, ['cal', 'other'])
+
+    def test_invalidate_forces_reload(self):
+        self.index.reserve('cal', 0, 10)
+        self.index.invalidate('cal')
+        self.index.reserve('cal', 20, 30)
+        self.assertEqual(self.loads, ['cal', 'cal'])
+
+
+class NormalizeAppointmentTests(SimpleTestCase):
+    def test_normalizes_times_to_iso(self):
+        data, error = normalize_appointment({'startTime': 1893492000000, 'endTime': '2030-01-01T11:00:00Z'})
+        self.assertIsNone(error)
+        self.assertEqual((data['startTime'], data['endTime']),
+                         ('2030-01-01T10:00:00+00:00', '2030-01-01T11:00:00+00:00'))
+
+    def test_rejects_invalid_or_inverted_times(self):
+        _, error = normalize_appointment({'startTime': 'mañana', 'endTime': '2030-01-01T11:00:00Z'})
+        self.assertEqual((error['status_code'], error['field']), (400, 'startTime'))
+        _, error = normalize_appointment({'startTime': '2030-01-01T11:00:00Z', 'endTime': '2030-01-01T10:00:00Z'})
+        self.assertEqual(error['message'], 'startTime debe ser anterior a endTime')
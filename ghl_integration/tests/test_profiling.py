@@ -0,0 +1,52 @@
+import os
+import pstats
+import re
+import tempfile
+import time
+
+from django.test import TestCase, override_settings
+
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer
+
+
+def server_timing(response) -> dict:
+    """{'ghl': (dur, desc), ...} a partir del header Server-Timing"""
+    entries = re.findall(r'([\w-]+);dur=([\d.]+);desc="([^"]*)"', response['Server-Timing'])
+    return {name: (float(dur), desc) for name, dur, desc in entries}
+
+
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        self.stub = GHLStubServer(rate_limit=None, route_latency={'calendars': 'fixed:50'})
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        overrides = override_settings(
+            GHL_BASE_URL=self.stub.url, GHL_PRIVATE_TOKEN=STUB_TOKEN, GHL_DEFAULT_LOCATION_ID=STUB_LOCATION_ID,
+            GHL_MOCK=False, GHL_CACHE_TTLS={},
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_breakdown_includes_the_time_waiting_for_ghl(self):
+        response = self.client.get('/api/ghl/calendars/', {'locationId': STUB_LOCATION_ID, 'fresh': 1})
+        timings = server_timing(response)
+        self.assertEqual(set(timings), {'middleware', 'view', 'ghl', 'ghl-wait', 'render', 'total'})
+        self.assertGreaterEqual(timings['ghl'][0], 50)
+        self.assertEqual(timings['ghl'][1], 'HTTP a GHL (1 llamadas)')
+        self.assertLessEqual(timings['ghl'][0], timings['total'][0])
+
+    def test_sampled_profile_is_written_off_the_request(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(GHL_PROFILE_SAMPLE_RATE=1, GHL_PROFILE_DIR=directory):
+            response = self.client.get('/api/ghl/calendars/', {'locationId': STUB_LOCATION_ID})
+            path = os.path.join(directory, response['X-GHL-Profile'])
+            deadline = time.monotonic() + 5
+            while not (os.path.exists(path) and os.path.getsize(path)) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertIn('calendars', str(pstats.Stats(path).stats))
+            self.assertRegex(response['X-GHL-Profile'], r'_ghl_calendars_200_\d+ms_\d+\.prof$')
+
+    @override_settings(GHL_SERVER_TIMING=False)
+    def test_can_be_disabled(self):
+        response = self.client.get('/api/ghl/calendars/', {'locationId': STUB_LOCATION_ID})
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -0,0 +1,103 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from ghl_integration.rate_limiter import RateLimitExceeded, TokenBucket
+
+from .fakes import FakeClock
+
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def bucket(self, **kwargs) -> TokenBucket:
+        params = {'capacity': 10, 'interval': 10.0}
+        params.update(kwargs)
+        return TokenBucket(clock=self.clock, sleep=self.clock.sleep, async_sleep=self.clock.async_sleep, **params)
+
+    def test_acquire_without_wait_while_tokens_left(self):
+        bucket = self.bucket()
+        for _ in range(10):
+            self.assertEqual(bucket.acquire(), 0.0)
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertEqual(bucket.state()['available'], 0)
+
+    def test_fail_fast_raises_with_retry_after(self):
+        bucket = self.bucket()
+        for _ in range(10):
+            bucket.acquire(block=False)
+        with self.assertRaises(RateLimitExceeded) as ctx:
+            bucket.acquire(block=False)
+        # 1 token por segundo: falta un segundo para el siguiente
+        self.assertAlmostEqual(ctx.exception.retry_after, 1.0)
+        self.assertEqual(bucket.state()['rejections'], 1)
+
+    def test_block_sleeps_and_spaces_concurrent_callers(self):
+        bucket = self.bucket(capacity=2, interval=2.0)
+        bucket.acquire()
+        bucket.acquire()
+        # Sin avanzar el reloj entre reservas, como peticiones que llegan a la vez
+        waits = [bucket._reserve(block=True, timeout=None) for _ in range(3)]
+        self.assertEqual(waits, [1.0, 2.0, 3.0])
+        state = bucket.state()
+        self.assertEqual(state['waits'], 3)
+        self.assertAlmostEqual(state['total_wait_seconds'], 6.0)
+
+    def test_acquire_sleeps_the_computed_wait(self):
+        bucket = self.bucket(capacity=1, interval=4.0)
+        bucket.acquire()
+        self.assertAlmostEqual(bucket.acquire(), 4.0)
+        self.assertEqual(self.clock.sleeps, [4.0])
+
+    def test_block_with_timeout_shorter_than_wait_raises(self):
+        bucket = self.bucket(capacity=1, interval=10.0)
+        bucket.acquire()
+        with self.assertRaises(RateLimitExceeded):
+            bucket.acquire(timeout=5)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_refill_is_continuous_and_capped(self):
+        bucket = self.bucket()
+        for _ in range(10):
+            bucket.acquire()
+        self.clock.advance(2.5)
+        self.assertAlmostEqual(bucket.state()['available'], 2.5)
+        self.clock.advance(3600)
+        self.assertEqual(bucket.state()['available'], 10)
+
+    def test_acquire_async_uses_async_sleep(self):
+        bucket = self.bucket(capacity=1, interval=3.0)
+        asyncio.run(bucket.acquire_async())
+        self.assertAlmostEqual(asyncio.run(bucket.acquire_async()), 3.0)
+        self.assertEqual(self.clock.sleeps, [3.0])
+
+    def test_update_from_headers_resizes_bucket(self):
+        bucket = self.bucket()
+        bucket.update_from_headers({'limit': 100, 'interval_ms': 20000})
+        self.assertEqual(bucket.capacity, 100)
+        self.assertEqual(bucket.interval, 20.0)
+        self.assertAlmostEqual(bucket.rate, 5.0)
+
+    def test_update_from_headers_ignores_invalid_values(self):
+        bucket = self.bucket()
+        bucket.update_from_headers({'limit': 0, 'interval_ms': 'x', 'remaining': None})
+        self.assertEqual((bucket.capacity, bucket.interval), (10, 10.0))
+        self.assertEqual(bucket.state()['available'], 10)
+
+    def test_remaining_only_lowers_tokens_and_keeps_margin(self):
+        bucket = self.bucket(safety_margin=2)
+        bucket.update_from_headers({'remaining': 5})
+        self.assertEqual(bucket.state()['available'], 3)
+        # Un remaining mayor no devuelve tokens: otros workers también consumen
+        bucket.update_from_headers({'remaining': 50})
+        self.assertEqual(bucket.state()['available'], 3)
+
+    def test_429_drains_the_bucket(self):
+        bucket = self.bucket()
+        bucket.update_from_headers(None, status_code=429)
+        self.assertEqual(bucket.state()['available'], 0)
+        with self.assertRaises(RateLimitExceeded):
+            bucket.acquire(block=False)
+        self.clock.advance(1)
+        self.assertEqual(bucket.acquire(block=False), 0.0)
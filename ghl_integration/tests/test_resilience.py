@@ -0,0 +1,129 @@
+from django.test import SimpleTestCase
+
+from ghl_integration.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, RetryPolicy
+
+from .fakes import FakeClock
+
+
+def failure(status_code=503, **extra):
+    return {'success': False, 'status_code': status_code, **extra}
+
+
+class RetryPolicyTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock(now=1_700_000_000.0)
+        # rng determinista: siempre el extremo superior del rango
+        self.policy = RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=10.0,
+                                  rng=lambda low, high: high, clock=self.clock)
+
+    def test_retries_idempotent_methods_on_5xx_and_429(self):
+        self.assertTrue(self.policy.should_retry('GET', failure(503), 1))
+        self.assertTrue(self.policy.should_retry('GET', failure(429), 1))
+        self.assertTrue(self.policy.should_retry('DELETE', failure(502), 1))
+
+    def test_post_only_retries_429(self):
+        self.assertFalse(self.policy.should_retry('POST', failure(503), 1))
+        self.assertTrue(self.policy.should_retry('POST', failure(429), 1))
+        policy = RetryPolicy(retry_non_idempotent=True)
+        self.assertTrue(policy.should_retry('POST', failure(503), 1))
+
+    def test_does_not_retry_success_client_errors_or_local_results(self):
+        self.assertFalse(self.policy.should_retry('GET', {'success': True, 'status_code': 200}, 1))
+        self.assertFalse(self.policy.should_retry('GET', failure(404), 1))
+        self.assertFalse(self.policy.should_retry('GET', failure(429, local_rate_limit=True), 1))
+        self.assertFalse(self.policy.should_retry('GET', failure(503, circuit='x'), 1))
+
+    def test_stops_after_max_attempts(self):
+        self.assertTrue(self.policy.should_retry('GET', failure(), 2))
+        self.assertFalse(self.policy.should_retry('GET', failure(), 3))
+        self.assertEqual(self.policy.stats(), {'max_attempts': 3, 'retries': 1, 'exhausted': 1})
+
+    def test_exponential_backoff_is_capped(self):
+        self.assertEqual([self.policy.delay(attempt, failure()) for attempt in (1, 2, 3, 6)],
+                         [0.5, 1.0, 2.0, 10.0])
+
+    def test_retry_after_seconds_and_http_date(self):
+        self.assertEqual(self.policy.delay(1, failure(429, rate_limit={'retry_after': 4})), 4.0)
+        self.assertEqual(self.policy.delay(1, failure(429, rate_limit={'retry_after': 60})), 10.0)
+        date = 'Tue, 14 Nov 2023 22:13:23 GMT'  # 3 s después del reloj falso
+        self.assertAlmostEqual(self.policy.delay(1, failure(503, rate_limit={'retry_after': date})), 3.0)
+
+    def test_429_waits_for_window_reset(self):
+        reset_at = int(self.clock.now) + 7
+        self.assertEqual(self.policy.delay(1, failure(429, rate_limit={'reset': reset_at})), 7.0)
+        self.assertEqual(self.policy.delay(1, failure(429, rate_limit={'reset': 2})), 2.0)
+        self.assertEqual(self.policy.delay(1, failure(429, rate_limit={'interval_ms': 8000})), 8.0)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30.0, clock=self.clock)
+
+    def state(self, key='c'):
+        return self.breaker._circuits[key].state
+
+    def trip(self, key='c'):
+        for _ in range(3):
+            self.breaker.before_request(key)
+            self.breaker.record(key, failure())
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            self.breaker.before_request('c')
+            self.breaker.record('c', failure())
+        self.assertEqual(self.state(), CLOSED)
+        self.breaker.record('c', failure())
+        self.assertEqual(self.state(), OPEN)
+        with self.assertRaises(CircuitOpenError) as ctx:
+            self.breaker.before_request('c')
+        self.assertAlmostEqual(ctx.exception.retry_after, 30.0)
+
+    def test_success_resets_failure_count(self):
+        self.breaker.record('c', failure())
+        self.breaker.record('c', failure())
+        self.breaker.record('c', {'success': True, 'status_code': 200})
+        self.breaker.record('c', failure())
+        self.assertEqual(self.state(), CLOSED)
+
+    def test_client_errors_do_not_count(self):
+        for _ in range(5):
+            self.breaker.record('c', failure(429))
+        self.breaker.before_request('c')
+        self.assertNotIn('c', self.breaker.stats()['circuits'])
+
+    def test_half_open_allows_a_single_probe(self):
+        self.trip()
+        self.clock.advance(30)
+        self.breaker.before_request('c')
+        self.assertEqual(self.state(), HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_request('c')
+
+    def test_probe_success_closes_and_failure_reopens(self):
+        self.trip()
+        self.clock.advance(30)
+        self.breaker.before_request('c')
+        self.breaker.record('c', failure())
+        self.assertEqual(self.state(), OPEN)
+        self.assertEqual(self.breaker.stats()['circuits']['c']['times_opened'], 2)
+
+        self.clock.advance(30)
+        self.breaker.before_request('c')
+        self.breaker.record('c', {'success': True})
+        self.assertEqual(self.state(), CLOSED)
+        self.breaker.before_request('c')
+
+    def test_release_frees_the_probe(self):
+        self.trip()
+        self.clock.advance(30)
+        self.breaker.before_request('c')
+        self.breaker.release('c')
+        self.breaker.before_request('c')
+        self.assertEqual(self.state(), HALF_OPEN)
+
+    def test_circuits_are_independent(self):
+        self.trip('a')
+        self.breaker.before_request('b')
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_request('a')
@@ -0,0 +1,41 @@
+from django.test import SimpleTestCase, override_settings
+
+from ghl_integration import ghl_service
+from ghl_integration.async_service import AsyncGHLService
+from ghl_integration.ghl_service import GHLService, clear_ghl_services, get_ghl_service
+
+
+@override_settings(GHL_BASE_URL='https://ghl.test', GHL_PRIVATE_TOKEN='pit-a', GHL_DEFAULT_LOCATION_ID='LOC',
+                   GHL_MOCK=True)
+class ServiceRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(clear_ghl_services)
+
+    def test_returns_the_same_instance_while_settings_do_not_change(self):
+        service = get_ghl_service()
+        self.assertIs(get_ghl_service(), service)
+        self.assertIsInstance(service, GHLService)
+        self.assertEqual((service.base_url, service.default_location_id), ('https://ghl.test', 'LOC'))
+
+    def test_setting_override_builds_a_new_instance(self):
+        service = get_ghl_service()
+        with override_settings(GHL_PRIVATE_TOKEN='pit-b'):
+            other = get_ghl_service()
+            self.assertIsNot(other, service)
+            self.assertEqual(other.private_token, 'pit-b')
+        self.assertIsNot(get_ghl_service(), other)
+
+    def test_async_variant_shares_the_rate_limiter_and_retry_policy(self):
+        service = get_ghl_service()
+        async_service = get_ghl_service(AsyncGHLService)
+        self.assertIsInstance(async_service, AsyncGHLService)
+        self.assertIs(get_ghl_service(AsyncGHLService), async_service)
+        self.assertIs(async_service.rate_limiter, service.rate_limiter)
+        self.assertIs(async_service.retry_policy, service.retry_policy)
+
+    def test_views_reuse_the_registered_instance(self):
+        service = get_ghl_service()
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/ghl/calendars/').status_code, 200)
+        self.assertIs(get_ghl_service(), service)
+        self.assertEqual(list(ghl_service._services.values()), [service])
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+
+from django.test import SimpleTestCase
+
+from ghl_integration.singleflight import SingleFlight
+
+
+class SingleFlightThreadTests(SimpleTestCase):
+    def run_concurrently(self, flight, key, fn, callers=5):
+        """Lanza `callers` hilos con la misma clave; fn debe bloquear hasta que todos esperen"""
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(flight.do(key, fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def wait_for_followers(self, flight, expected):
+        for _ in range(500):
+            if flight.stats()['threads']['coalesced'] >= expected:
+                return
+            threading.Event().wait(0.01)
+        self.fail('Los seguidores no llegaron a esperar la llamada en vuelo')
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return {'success': True}
+
+        threads, results, errors = self.run_concurrently(flight, 'k', fn)
+        self.wait_for_followers(flight, 4)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(errors, [])
+        self.assertEqual(results, [{'success': True}] * 5)
+        # Cada llamador recibe su propia copia del dict
+        self.assertEqual(len({id(result) for result in results}), 5)
+        stats = flight.stats()
+        self.assertEqual((stats['upstream_calls'], stats['coalesced'], stats['in_flight']), (1, 4, 0))
+
+    def test_error_is_raised_to_every_caller(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fn():
+            release.wait(5)
+            raise ValueError('GHL caído')
+
+        threads, results, errors = self.run_concurrently(flight, 'k', fn, callers=3)
+        self.wait_for_followers(flight, 2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results, [])
+        self.assertEqual([str(error) for error in errors], ['GHL caído'] * 3)
+
+    def test_sequential_and_distinct_keys_are_not_coalesced(self):
+        flight = SingleFlight()
+        calls = []
+        flight.do('a', lambda: calls.append('a'))
+        flight.do('a', lambda: calls.append('a'))
+        flight.do('b', lambda: calls.append('b'))
+        self.assertEqual(calls, ['a', 'a', 'b'])
+        self.assertEqual(flight.stats()['coalesced'], 0)
+
+
+class SingleFlightAsyncTests(SimpleTestCase):
+    def test_concurrent_coroutines_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {'success': True}
+
+        async def main():
+            return await asyncio.gather(*(flight.do_async('k', fn) for _ in range(5)))
+
+        results = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'success': True}] * 5)
+        self.assertEqual(flight.stats()['asyncio'], {'upstream_calls': 1, 'coalesced': 4})
+
+    def test_error_is_raised_to_every_coroutine(self):
+        flight = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.01)
+            raise ValueError('GHL caído')
+
+        async def main():
+            return await asyncio.gather(*(flight.do_async('k', fn) for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(main())
+        self.assertEqual([str(result) for result in results], ['GHL caído'] * 3)
+        self.assertEqual(flight.stats()['in_flight'], 0)
+
+    def test_cancelled_follower_does_not_cancel_the_leader(self):
+        flight = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.05)
+            return {'success': True}
+
+        async def main():
+            leader = asyncio.create_task(flight.do_async('k', fn))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(flight.do_async('k', fn))
+            await asyncio.sleep(0)
+            follower.cancel()
+            return await leader, follower
+
+        result, follower = asyncio.run(main())
+        self.assertEqual(result, {'success': True})
+        self.assertTrue(follower.cancelled())
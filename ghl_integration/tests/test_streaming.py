@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+from django.test import TestCase, override_settings
+
+from ghl_integration.async_service import AsyncGHLService
+from ghl_integration.ghl_service import GHLRequestError, GHLService
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer
+
+
+class StreamingPaginationTests(TestCase):
+    """El stub tiene 250 contactos y pagina con limit/startAfterId como GHL"""
+
+    def setUp(self):
+        self.stub = GHLStubServer(rate_limit=None)
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        overrides = override_settings(
+            GHL_BASE_URL=self.stub.url, GHL_PRIVATE_TOKEN=STUB_TOKEN, GHL_DEFAULT_LOCATION_ID=STUB_LOCATION_ID,
+            GHL_MOCK=False, GHL_RETRY_ENABLED=False,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def pages_requested(self) -> int:
+        return self.stub.stats()['by_route'].get('GET /contacts', 0)
+
+    def test_pages_are_requested_only_as_they_are_consumed(self):
+        contacts = GHLService().iter_contacts(page_size=100)
+        first = [next(contacts) for _ in range(100)]
+        self.assertEqual(self.pages_requested(), 1)
+        rest = list(contacts)
+        self.assertEqual(self.pages_requested(), 3)
+        ids = [contact['id'] for contact in first + rest]
+        self.assertEqual((len(ids), len(set(ids))), (250, 250))
+
+    def test_failed_page_raises(self):
+        contacts = GHLService().iter_contacts(page_size=100)
+        next(contacts)
+        self.stub.error_rate = 1.0
+        with self.assertRaises(GHLRequestError):
+            list(contacts)
+
+    def test_async_iterator_follows_the_same_cursor(self):
+        async def collect():
+            return [contact['id'] async for contact in AsyncGHLService().iter_contacts(page_size=60)]
+
+        ids = asyncio.run(collect())
+        self.assertEqual((len(ids), len(set(ids))), (250, 250))
+        self.assertEqual(self.pages_requested(), 5)
+
+    def test_view_streams_ndjson_and_json(self):
+        response = self.client.get('/api/ghl/contacts/', {'stream': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 250)
+        self.assertEqual(json.loads(lines[0])['id'], 'contact_stub_00001')
+
+        response = self.client.get('/api/ghl/contacts/', {'stream': 'json', 'limit': 50})
+        self.assertEqual(len(json.loads(b''.join(response.streaming_content))), 250)
+
+    def test_ndjson_ends_with_an_error_line_when_ghl_fails_midway(self):
+        response = self.client.get('/api/ghl/contacts/', {'stream': 'ndjson'})
+        chunks = iter(response.streaming_content)
+        lines = [next(chunks)]
+        self.stub.error_rate = 1.0
+        lines.extend(chunks)
+        self.assertEqual(len(lines), 101)
+        self.assertIn('error', json.loads(lines[-1]))
+
+    def test_failure_on_the_first_page_is_a_normal_error(self):
+        self.stub.error_rate = 1.0
+        response = self.client.get('/api/ghl/contacts/', {'stream': 'ndjson'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.streaming)
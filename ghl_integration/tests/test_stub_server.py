@@ -0,0 +1,96 @@
+import random
+
+import requests
+from django.test import SimpleTestCase
+
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer, Latency, RateLimitBudget
+
+from .fakes import FakeClock
+
+AUTH = {'Authorization': f'Bearer {STUB_TOKEN}'}
+
+
+class LatencyTests(SimpleTestCase):
+    def test_distributions_are_reproducible_with_a_seed(self):
+        self.assertEqual(Latency('fixed:50').sample(random.Random()), 0.05)
+        for spec in ('uniform:20-200', 'normal:100:30', 'exponential:100', 'lognormal:80:400'):
+            latency = Latency(spec)
+            first = [latency.sample(random.Random(7)) for _ in range(3)]
+            self.assertEqual(first, [latency.sample(random.Random(7)) for _ in range(3)])
+            self.assertTrue(all(value >= 0 for value in first))
+
+    def test_invalid_specs_raise(self):
+        for spec in ('fixed', 'uniform:20', 'poisson:3', 'normal:a:b'):
+            with self.assertRaises(ValueError):
+                Latency(spec)
+
+
+class RateLimitBudgetTests(SimpleTestCase):
+    def test_fixed_window_per_token(self):
+        clock = FakeClock()
+        budget = RateLimitBudget(limit=2, interval=10, daily_limit=100, clock=clock)
+        self.assertTrue(budget.consume('a')[0])
+        allowed, headers = budget.consume('a')
+        self.assertTrue(allowed)
+        self.assertEqual(headers['x-ratelimit-remaining'], 0)
+        allowed, headers = budget.consume('a')
+        self.assertFalse(allowed)
+        self.assertEqual(headers['Retry-After'], 10)
+        self.assertTrue(budget.consume('b')[0])
+        clock.advance(10)
+        self.assertTrue(budget.consume('a')[0])
+
+    def test_daily_limit(self):
+        clock = FakeClock()
+        budget = RateLimitBudget(limit=10, interval=1, daily_limit=3, clock=clock)
+        for _ in range(3):
+            clock.advance(1)
+            self.assertTrue(budget.consume('a')[0])
+        clock.advance(1)
+        allowed, headers = budget.consume('a')
+        self.assertFalse(allowed)
+        self.assertEqual(headers['x-ratelimit-daily-remaining'], 0)
+
+
+class GHLStubServerTests(SimpleTestCase):
+    def get(self, stub, path, **params):
+        return requests.get(f'{stub.url}{path}', params=params, headers=AUTH, timeout=5)
+
+    def test_requires_a_token_and_enforces_the_budget(self):
+        with GHLStubServer(rate_limit=2) as stub:
+            self.assertEqual(requests.get(f'{stub.url}/locations/search', timeout=5).status_code, 401)
+            self.assertEqual(self.get(stub, '/locations/search').status_code, 200)
+            self.assertEqual(self.get(stub, '/locations/search').headers['x-ratelimit-remaining'], '0')
+            response = self.get(stub, '/locations/search')
+            self.assertEqual(response.status_code, 429)
+            self.assertIn('Retry-After', response.headers)
+            self.assertEqual(stub.stats()['rate_limit']['rejected'], 1)
+
+    def test_contacts_paginate_with_start_after_id(self):
+        with GHLStubServer(rate_limit=None) as stub:
+            first = self.get(stub, '/contacts/', locationId=STUB_LOCATION_ID, limit=100).json()
+            second = self.get(stub, '/contacts/', locationId=STUB_LOCATION_ID, limit=100,
+                              startAfterId=first['meta']['startAfterId']).json()
+            last = self.get(stub, '/contacts/', locationId=STUB_LOCATION_ID, limit=100,
+                            startAfterId=second['meta']['startAfterId']).json()
+        self.assertEqual([len(page['contacts']) for page in (first, second, last)], [100, 100, 50])
+        self.assertIsNone(last['meta']['startAfterId'])
+        self.assertEqual(first['meta']['total'], 250)
+
+    def test_created_appointments_show_up_in_events(self):
+        with GHLStubServer(rate_limit=None) as stub:
+            body = {'calendarId': 'cal_stub_002', 'contactId': 'contact_stub_00001',
+                    'startTime': '2031-01-01T10:00:00Z', 'endTime': '2031-01-01T10:30:00Z'}
+            created = requests.post(f'{stub.url}/calendars/events/appointments', json=body, headers=AUTH, timeout=5)
+            self.assertEqual(created.status_code, 201)
+            events = self.get(stub, '/calendars/events', locationId=STUB_LOCATION_ID, calendarId='cal_stub_002',
+                              startTime='1925024400000', endTime='1925035200000').json()['events']
+        self.assertEqual([event['id'] for event in events], [created.json()['id']])
+
+    def test_injected_failures(self):
+        with GHLStubServer(rate_limit=None, error_rate=1.0, error_statuses=(503,)) as stub:
+            self.assertEqual(self.get(stub, '/locations/search').status_code, 503)
+            self.assertEqual(stub.stats()['injected'], {'error': 1})
+        with GHLStubServer(rate_limit=None, drop_rate=1.0) as stub:
+            with self.assertRaises(requests.ConnectionError):
+                self.get(stub, '/locations/search')
@@ -0,0 +1,74 @@
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ghl_integration.models import GHLAppointment, GHLCalendar, GHLContact, GHLSyncState
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer
+from ghl_integration.sync import parse_ghl_datetime
+
+
+class ParseDatetimeTests(SimpleTestCase):
+    def test_accepts_iso_and_epoch_seconds_or_milliseconds(self):
+        expected = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(parse_ghl_datetime('2025-01-01T00:00:00Z'), expected)
+        self.assertEqual(parse_ghl_datetime('2025-01-01 00:00:00'), expected)
+        self.assertEqual(parse_ghl_datetime(1735689600), expected)
+        self.assertEqual(parse_ghl_datetime('1735689600000'), expected)
+        self.assertIsNone(parse_ghl_datetime(''))
+
+
+class GHLSyncCommandTests(TestCase):
+    def setUp(self):
+        self.stub = GHLStubServer(rate_limit=None)
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        overrides = override_settings(
+            GHL_BASE_URL=self.stub.url, GHL_PRIVATE_TOKEN=STUB_TOKEN, GHL_DEFAULT_LOCATION_ID=STUB_LOCATION_ID,
+            GHL_MOCK=False,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def sync(self, *args) -> str:
+        out = StringIO()
+        call_command('ghl_sync', *args, stdout=out)
+        return out.getvalue()
+
+    def cursor(self, resource: str):
+        return GHLSyncState.objects.get(resource=resource, location_id=STUB_LOCATION_ID).cursor
+
+    def test_first_run_mirrors_every_resource(self):
+        output = self.sync()
+        self.assertEqual(GHLCalendar.objects.count(), 3)
+        self.assertEqual(GHLContact.objects.count(), 250)
+        self.assertTrue(GHLAppointment.objects.exists())
+        self.assertIn('contacts: 250 leídos, 250 escritos', output)
+        self.assertEqual(self.cursor('contacts'), datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+
+    def test_incremental_run_writes_only_what_changed_and_advances_the_cursor(self):
+        self.sync('--resources', 'contacts')
+        changed = self.stub.data.contacts[7]
+        changed.update({'firstName': 'Cambiado', 'dateUpdated': '2026-03-01T12:00:00Z'})
+
+        output = self.sync('--resources', 'contacts')
+        self.assertIn('250 leídos, 1 escritos, 249 sin cambios', output)
+        self.assertEqual(GHLContact.objects.get(ghl_id=changed['id']).first_name, 'Cambiado')
+        self.assertEqual(self.cursor('contacts'), datetime(2026, 3, 1, 12, tzinfo=dt_timezone.utc))
+
+        self.assertIn('0 escritos, 250 sin cambios', self.sync('--resources', 'contacts'))
+
+    def test_full_run_deletes_what_no_longer_exists_in_ghl(self):
+        GHLContact.objects.create(ghl_id='borrado_en_ghl', location_id=STUB_LOCATION_ID)
+        output = self.sync('--full', '--resources', 'contacts')
+        self.assertIn('250 escritos, 0 sin cambios, 1 borrados', output)
+        self.assertFalse(GHLContact.objects.filter(ghl_id='borrado_en_ghl').exists())
+
+    def test_views_serve_the_mirror_with_source_local(self):
+        self.sync('--resources', 'calendars', 'contacts')
+        requests_before = self.stub.stats()['requests']
+        response = self.client.get('/api/ghl/contacts/', {'source': 'local', 'email': 'CONTACTO7@stub.example'})
+        self.assertEqual(response.json()['source'], 'local')
+        self.assertEqual([c['email'] for c in response.json()['contacts']], ['contacto7@stub.example'])
+        self.assertEqual(self.stub.stats()['requests'], requests_before)
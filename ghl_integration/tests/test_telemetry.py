@@ -0,0 +1,75 @@
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ghl_integration.telemetry import RateLimitTelemetry
+
+from .fakes import FakeClock
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'telemetry-tests'}}
+
+
+def record(telemetry, namespace, *remaining):
+    for value in remaining:
+        telemetry.clock.advance(1)
+        telemetry.record({'remaining': value, 'limit': 100}, 200, '/calendars/?x=1', namespace=namespace)
+
+
+class RateLimitTelemetryTests(SimpleTestCase):
+    def telemetry(self, **kwargs) -> RateLimitTelemetry:
+        clock = FakeClock()
+        telemetry = RateLimitTelemetry(clock=clock, flush_interval=3600, **kwargs)
+        telemetry.clock = clock
+        return telemetry
+
+    def test_samples_are_kept_per_namespace(self):
+        telemetry = self.telemetry(max_samples=3)
+        record(telemetry, 'tenant-a', 90, 80, 70, 60)
+        record(telemetry, 'tenant-b', 10)
+        self.assertEqual([s['remaining'] for s in telemetry.samples('tenant-a')], [80, 70, 60])
+        self.assertEqual(telemetry.latest('tenant-b')['remaining'], 10)
+        self.assertIsNone(telemetry.latest())
+        self.assertEqual(telemetry.snapshot(namespace='tenant-a')['recorded'], 4)
+        self.assertEqual(telemetry.latest('tenant-a')['endpoint'], '/calendars/')
+
+    def test_ignores_responses_without_rate_limit_headers(self):
+        telemetry = self.telemetry()
+        telemetry.record(None, 200, '/x')
+        telemetry.record(None, 429, '/x')
+        self.assertEqual([s['status_code'] for s in telemetry.samples()], [429])
+
+    def test_trend_counts_only_consumption(self):
+        telemetry = self.telemetry()
+        record(telemetry, 'a', 100, 90, 80, 100, 95)
+        trend = telemetry.trend(telemetry.samples('a'))
+        self.assertEqual((trend['direction'], trend['min_remaining']), ('down', 80))
+        self.assertEqual(trend['consumption_per_second'], 6.25)
+
+
+@override_settings(CACHES=LOCMEM)
+class SharedTelemetryTests(SimpleTestCase):
+    def tearDown(self):
+        caches['default'].clear()
+
+    def shared(self, clock: FakeClock, max_samples: int = 10) -> RateLimitTelemetry:
+        return RateLimitTelemetry(max_samples=max_samples, shared_alias='default', clock=clock, flush_interval=3600)
+
+    def test_workers_share_samples_without_losing_any(self):
+        clock = FakeClock()
+        first, second = self.shared(clock), self.shared(clock)
+        for value in (9, 8, 7):
+            clock.advance(1)
+            first.record({'remaining': value}, 200, '/x', namespace='a')
+            clock.advance(1)
+            second.record({'remaining': value * 10}, 200, '/x', namespace='a')
+        first.flush()
+        second.flush()
+        self.assertEqual([s['remaining'] for s in first.samples('a')], [9, 90, 8, 80, 7, 70])
+        self.assertEqual(second.samples('b'), [])
+
+    def test_shared_ring_keeps_the_last_max_samples(self):
+        clock = FakeClock()
+        telemetry = self.shared(clock, max_samples=4)
+        for value in range(10):
+            clock.advance(1)
+            telemetry.record({'remaining': value}, 200, '/x', namespace='a')
+        self.assertEqual([s['remaining'] for s in telemetry.samples('a')], [6, 7, 8, 9])
@@ -0,0 +1,93 @@
+from django.test import TestCase, override_settings
+
+from ghl_integration.ghl_service import get_ghl_service
+from ghl_integration.http_pool import connection_pools, get_connection_pool
+from ghl_integration.models import GHLTenant
+from ghl_integration.stub_server import STUB_LOCATION_ID, STUB_TOKEN, GHLStubServer
+from ghl_integration.tenants import TenantRegistry, get_tenant_registry
+
+from .fakes import FakeClock
+
+TENANT_TOKEN = 'pit-tenant-0001'
+
+
+class TenantRegistryTests(TestCase):
+    @override_settings(GHL_TENANTS={'loc_a': 'pit-a', 'loc_b': {'token': 'pit-b', 'name': 'B', 'pool_maxsize': 2},
+                                    'loc_c': {'name': 'sin token'}})
+    def test_settings_formats(self):
+        registry = TenantRegistry()
+        self.assertEqual(registry.get('loc_a').private_token, 'pit-a')
+        self.assertEqual((registry.get('loc_b').name, registry.get('loc_b').pool_maxsize), ('B', 2))
+        self.assertIsNone(registry.get('loc_c'))
+        self.assertEqual(registry.get('loc_b').summary()['token_suffix'], '...it-b')
+
+    @override_settings(GHL_TENANTS={'loc_a': 'pit-settings'})
+    def test_settings_win_over_the_model(self):
+        GHLTenant.objects.create(location_id='loc_a', private_token='pit-db')
+        GHLTenant.objects.create(location_id='loc_b', private_token='pit-db-b')
+        registry = TenantRegistry()
+        self.assertEqual(registry.get('loc_a').private_token, 'pit-settings')
+        self.assertEqual({tenant.private_token for tenant in registry.all()}, {'pit-settings', 'pit-db-b'})
+
+    def test_model_lookups_are_cached_for_ttl(self):
+        GHLTenant.objects.create(location_id='loc_db', private_token='pit-db')
+        clock = FakeClock()
+        registry = TenantRegistry(ttl=60, clock=clock)
+        with self.assertNumQueries(1):
+            self.assertEqual(registry.get('loc_db').source, 'db')
+            self.assertEqual(registry.peek('loc_otra'), (False, None))
+            registry.get('loc_db')
+        clock.advance(61)
+        with self.assertNumQueries(1):
+            registry.get('loc_db')
+        self.assertEqual(registry.stats()['db_lookups'], 2)
+
+    def test_saving_a_tenant_invalidates_its_entry(self):
+        registry = get_tenant_registry()
+        self.assertIsNone(registry.get('loc_nueva'))
+        GHLTenant.objects.create(location_id='loc_nueva', private_token='pit-nuevo')
+        self.assertEqual(registry.get('loc_nueva').private_token, 'pit-nuevo')
+        GHLTenant.objects.filter(location_id='loc_nueva').delete()
+        self.assertIsNone(registry.get('loc_nueva'))
+
+
+class TenantIsolationTests(TestCase):
+    """La stub limita a 2 peticiones por token: el tenant agota su cupo sin afectar al token global"""
+
+    def setUp(self):
+        self.stub = GHLStubServer(rate_limit=2, rate_interval=3600)
+        self.stub.start()
+        self.addCleanup(self.stub.stop)
+        overrides = override_settings(
+            GHL_BASE_URL=self.stub.url, GHL_PRIVATE_TOKEN=STUB_TOKEN, GHL_DEFAULT_LOCATION_ID=STUB_LOCATION_ID,
+            GHL_MOCK=False, GHL_RETRY_ENABLED=False, GHL_RATE_LIMIT_MODE='fail_fast', GHL_RATE_LIMIT_SAFETY_MARGIN=0,
+            GHL_TENANTS={STUB_LOCATION_ID: {'token': TENANT_TOKEN, 'pool_maxsize': 2}},
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_tenant_has_its_own_token_pool_and_rate_limiter(self):
+        tenant_service = get_ghl_service(location_id=STUB_LOCATION_ID)
+        global_service = get_ghl_service()
+        self.assertEqual(tenant_service.private_token, TENANT_TOKEN)
+        self.assertIs(get_ghl_service(location_id=STUB_LOCATION_ID), tenant_service)
+        self.assertIsNot(tenant_service.rate_limiter, global_service.rate_limiter)
+        self.assertIsNot(get_connection_pool(tenant_service.tenant), get_connection_pool())
+        self.assertEqual(get_connection_pool(tenant_service.tenant).pool_maxsize, 2)
+
+    def test_exhausted_tenant_does_not_throttle_the_rest(self):
+        tenant_service = get_ghl_service(location_id=STUB_LOCATION_ID)
+        results = [tenant_service.get_calendars(STUB_LOCATION_ID, fresh=True) for _ in range(3)]
+        self.assertEqual([result['success'] for result in results], [True, True, False])
+        self.assertEqual(results[2]['status_code'], 429)
+
+        result = get_ghl_service().get_calendars(STUB_LOCATION_ID, fresh=True)
+        self.assertTrue(result['success'])
+        self.assertEqual(self.stub.stats()['rate_limit']['tokens'], 2)
+        self.assertEqual(set(connection_pools()), {'default', STUB_LOCATION_ID})
+
+    def test_token_rotation_rebuilds_the_service(self):
+        first = get_ghl_service(location_id=STUB_LOCATION_ID)
+        with override_settings(GHL_TENANTS={STUB_LOCATION_ID: 'pit-rotado'}):
+            self.assertEqual(get_ghl_service(location_id=STUB_LOCATION_ID).private_token, 'pit-rotado')
+        self.assertIsNot(get_ghl_service(location_id=STUB_LOCATION_ID), first)
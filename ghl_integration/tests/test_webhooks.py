@@ -0,0 +1,133 @@
+import hashlib
+import hmac
+import json
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from ghl_integration import webhooks
+from ghl_integration.models import GHLContact, GHLWebhookEvent
+from ghl_integration.webhooks import (
+    InvalidWebhook,
+    apply_pending_events,
+    get_webhook_applier,
+    parse_event,
+    verify_signature,
+)
+
+SECRET = 'secreto-de-prueba'
+
+
+def contact_event(event_id: str, event_type: str, contact_id: str, timestamp: str, **fields) -> bytes:
+    return json.dumps({'webhookId': event_id, 'type': event_type, 'locationId': 'LOC', 'id': contact_id,
+                       'timestamp': timestamp, **fields}).encode()
+
+
+def signature(body: bytes) -> str:
+    return hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+class SignatureTests(SimpleTestCase):
+    body = b'{"type": "ContactCreate"}'
+
+    @override_settings(GHL_WEBHOOK_SECRET=SECRET, GHL_WEBHOOK_PUBLIC_KEY=None)
+    def test_hmac_signature(self):
+        verify_signature(self.body, {'HTTP_X_GHL_SIGNATURE': f'sha256={signature(self.body)}'})
+        with self.assertRaises(InvalidWebhook):
+            verify_signature(self.body + b' ', {'HTTP_X_GHL_SIGNATURE': signature(self.body)})
+        with self.assertRaises(InvalidWebhook):
+            verify_signature(self.body, {})
+
+    @override_settings(GHL_WEBHOOK_SECRET=None, GHL_WEBHOOK_PUBLIC_KEY=None, GHL_WEBHOOK_ALLOW_UNSIGNED=False)
+    def test_unsigned_events_need_an_explicit_opt_in(self):
+        with self.assertRaises(InvalidWebhook):
+            verify_signature(self.body, {})
+        with override_settings(GHL_WEBHOOK_ALLOW_UNSIGNED=True):
+            verify_signature(self.body, {})
+
+    def test_parse_event_uses_the_payload_timestamp(self):
+        event = parse_event(contact_event('w1', 'ContactUpdate', 'c1', '2026-01-01T10:00:00Z'))
+        self.assertEqual((event['event_id'], event['object_id'], event['location_id']), ('w1', 'c1', 'LOC'))
+        self.assertEqual(event['occurred_at'], datetime(2026, 1, 1, 10, tzinfo=dt_timezone.utc))
+        with self.assertRaises(InvalidWebhook) as ctx:
+            parse_event(b'[]')
+        self.assertEqual(ctx.exception.status_code, 400)
+
+
+class ApplyEventsTests(TestCase):
+    def store(self, *bodies: bytes):
+        for body in bodies:
+            GHLWebhookEvent.objects.create(**parse_event(body))
+
+    def test_only_the_latest_change_per_object_is_applied(self):
+        self.store(
+            contact_event('w1', 'ContactCreate', 'c1', '2026-01-01T10:00:00Z', firstName='Ana'),
+            contact_event('w2', 'ContactUpdate', 'c1', '2026-01-01T11:00:00Z', firstName='Ana María'),
+        )
+        self.assertEqual(apply_pending_events()['applied'], 1)
+        self.assertEqual(GHLContact.objects.get(ghl_id='c1').first_name, 'Ana María')
+
+        # Un reenvío viejo que llega tarde no pisa lo guardado
+        self.store(contact_event('w0', 'ContactUpdate', 'c1', '2026-01-01T09:00:00Z', firstName='Vieja'))
+        self.assertEqual(apply_pending_events()['stale'], 1)
+        self.assertEqual(GHLContact.objects.get(ghl_id='c1').first_name, 'Ana María')
+        self.assertFalse(GHLWebhookEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_delete_leaves_a_tombstone_for_older_updates(self):
+        self.store(contact_event('w1', 'ContactCreate', 'c1', '2026-01-01T10:00:00Z'))
+        apply_pending_events()
+        self.store(contact_event('w2', 'ContactDelete', 'c1', '2026-01-01T12:00:00Z'))
+        apply_pending_events()
+        self.store(contact_event('w3', 'ContactUpdate', 'c1', '2026-01-01T11:00:00Z'))
+        self.assertEqual(apply_pending_events()['stale'], 1)
+        self.assertFalse(GHLContact.objects.filter(ghl_id='c1').exists())
+
+    def test_failing_event_is_dead_lettered_without_blocking_the_rest(self):
+        original = webhooks.contact_fields
+
+        def contact_fields(item, location_id):
+            if item.get('id') == 'roto':
+                raise ValueError('payload inesperado')
+            return original(item, location_id)
+
+        self.store(
+            contact_event('w1', 'ContactCreate', 'c1', '2026-01-01T10:00:00Z'),
+            contact_event('w2', 'ContactCreate', 'roto', '2026-01-01T10:01:00Z'),
+            contact_event('w3', 'ContactCreate', 'c2', '2026-01-01T10:02:00Z'),
+        )
+        with mock.patch('ghl_integration.webhooks.contact_fields', contact_fields):
+            counts = apply_pending_events()
+        self.assertEqual((counts['applied'], counts['dead_lettered']), (2, 1))
+        self.assertEqual(set(GHLContact.objects.values_list('ghl_id', flat=True)), {'c1', 'c2'})
+        dead = GHLWebhookEvent.objects.get(event_id='w2')
+        self.assertIsNotNone(dead.processed_at)
+        self.assertIn('payload inesperado', dead.error)
+
+
+@override_settings(GHL_WEBHOOK_SECRET=SECRET, GHL_WEBHOOK_PUBLIC_KEY=None, GHL_WEBHOOK_FLUSH_INTERVAL=3600)
+class WebhookViewTests(TransactionTestCase):
+    """TransactionTestCase: el hilo del aplicador usa su propia conexión"""
+
+    def post(self, body: bytes, sign: bool = True):
+        headers = {'HTTP_X_GHL_SIGNATURE': signature(body)} if sign else {}
+        return self.client.post('/api/ghl/webhooks/', body, content_type='application/json', **headers)
+
+    def tearDown(self):
+        get_webhook_applier().stop()
+
+    def test_redelivered_event_is_stored_and_applied_once(self):
+        body = contact_event('w1', 'ContactCreate', 'c1', '2026-01-01T10:00:00Z', email='ANA@example.com')
+        first, second = self.post(body), self.post(body)
+        self.assertEqual((first.status_code, second.status_code), (202, 202))
+        self.assertEqual((first.json()['duplicate'], second.json()['duplicate']), (False, True))
+        self.assertEqual(GHLWebhookEvent.objects.count(), 1)
+
+        get_webhook_applier().flush()
+        self.assertEqual(GHLContact.objects.get(ghl_id='c1').email, 'ana@example.com')
+        self.assertEqual(get_webhook_applier().stats()['duplicates'], 1)
+
+    def test_rejects_bad_signatures(self):
+        body = contact_event('w1', 'ContactCreate', 'c1', '2026-01-01T10:00:00Z')
+        self.assertEqual(self.post(body, sign=False).status_code, 401)
+        self.assertFalse(GHLWebhookEvent.objects.exists())
@@ -2,7 +2,7 @@
 URLs para la aplicación ghl_integration
 """
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     # Debug endpoint
@@ -11,18 +11,40 @@ urlpatterns = [
     # ✨ NUEVO: Rate limit monitoring
     path('rate-limit/', views.rate_limit_status, name='rate_limit_status'),
     
+    # Estadísticas internas (pool de conexiones, etc.)
+    path('stats/', views.ghl_stats, name='ghl_stats'),
+    path('cache/', views.response_cache, name='response_cache'),
+    path('metrics/', views.metrics, name='ghl_metrics'),
+    
     # Ejercicio 3: Ping/Test de conexión con GHL
     path('ping/', views.ghl_ping, name='ghl_ping'),
     
     # Ejercicio 4: Discovery de calendarios
     path('calendars/', views.ghl_calendars, name='ghl_calendars'),
+    path('calendars/<str:calendar_id>/free-slots/', views.calendar_free_slots, name='calendar_free_slots'),
     
     # Ejercicio 5: Crear citas
     path('appointments/create/', views.create_appointment, name='create_appointment'),
+    path('appointments/bulk/', views.bulk_create_appointments, name='bulk_create_appointments'),
     path('appointments/', views.get_appointments, name='get_appointments'),
     
     # Endpoints adicionales útiles
     path('locations/', views.ghl_locations, name='ghl_locations'),
     path('contacts/create/', views.create_contact, name='create_contact'),
+    path('contacts/import/', views.import_contacts, name='import_contacts'),
+    path('contacts/search/', views.search_contacts, name='search_contacts'),
     path('contacts/', views.get_contacts, name='get_contacts'),
+    
+    # Trabajos encolados con ?async=1 (los procesa manage.py ghl_worker)
+    path('jobs/<uuid:job_id>/', views.job_status, name='ghl_job_status'),
+    
+    # Webhooks de GHL (citas y contactos) hacia el espejo local
+    path('webhooks/', views.ghl_webhook, name='ghl_webhook'),
+    
+    # Versiones async (servir con ASGI: backend/asgi.py)
+    path('async/ping/', async_views.ghl_ping, name='async_ghl_ping'),
+    path('async/calendars/', async_views.ghl_calendars, name='async_ghl_calendars'),
+    path('async/locations/', async_views.ghl_locations, name='async_ghl_locations'),
+    path('async/appointments/create/', async_views.create_appointment, name='async_create_appointment'),
+    path('async/contacts/create/', async_views.create_contact, name='async_create_contact'),
 ]
@@ -0,0 +1,31 @@
+"""
+Validaciones locales de payloads antes de llamar a GHL
+"""
+from typing import Dict, Iterable, Optional
+
+APPOINTMENT_REQUIRED_FIELDS = ["calendarId", "contactId", "startTime", "endTime"]
+CONTACT_REQUIRED_FIELDS = ["firstName", "lastName", "email"]
+
+
+def missing_fields_error(data: Dict, required_fields: Iterable[str]) -> Optional[Dict]:
+    """Devuelve el payload de error si faltan campos requeridos, o None si están todos"""
+    missing = [f for f in required_fields if f not in data]
+    if missing:
+        return {
+            'success': False,
+            'message': 'Faltan campos requeridos',
+            'missing_fields': missing
+        }
+    return None
+
+
+def apply_default_location(data: Dict, service) -> Optional[Dict]:
+    """Completa locationId con GHL_DEFAULT_LOCATION_ID; devuelve payload de error si no hay ninguno"""
+    if 'locationId' not in data and service.default_location_id:
+        data['locationId'] = service.default_location_id
+    elif 'locationId' not in data:
+        return {
+            'success': False,
+            'message': 'Se requiere locationId o configurar GHL_DEFAULT_LOCATION_ID'
+        }
+    return None
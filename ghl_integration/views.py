@@ -1,7 +1,110 @@
+import io
+import os
+import re
+import uuid
+from datetime import timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from .ghl_service import GHLService
+from .ghl_service import get_ghl_service, tenant_services, MOCK_CONTACTS, GHL_MAX_PAGE_SIZE
+from .http_pool import get_connection_pool, tenant_pool_stats
+from .cache import get_response_cache
+from .singleflight import singleflight
+from .telemetry import get_rate_limit_telemetry
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics_enabled, render_metrics
+from .resilience import get_circuit_breaker
+from .tenants import get_tenant_registry
+from .models import GHLAppointment, GHLCalendar, GHLContact, GHLJob
+from .jobs import enqueue_job, job_summary, queue_stats
+from .idempotency import MAX_KEY_LENGTH, get_idempotency_store
+from .sync import parse_ghl_datetime
+from .availability import get_free_slots, parse_day_time
+from .preflight import get_appointment_index
+from .webhooks import InvalidWebhook, get_webhook_applier, parse_event, verify_signature
+from .contact_index import (
+    SEARCH_DEFAULT_LIMIT,
+    find_existing_contact,
+    index_contact,
+    reused_contact_result,
+    search_contact_index,
+)
+from .streaming import STREAM_FORMATS, streaming_response, iter_ndjson
+from .bulk import run_concurrently
+from .importer import ContactImporter, detect_format, iter_rows
+from .validation import (
+    APPOINTMENT_REQUIRED_FIELDS,
+    CONTACT_REQUIRED_FIELDS,
+    apply_default_location,
+    missing_fields_error,
+)
+
+
+def _wants_fresh(request) -> bool:
+    """?fresh=1 fuerza a saltarse la caché de respuestas y consultar GHL"""
+    return request.query_params.get('fresh', '').lower() in ['1', 'true', 'yes']
+
+
+def _wants_local(request) -> bool:
+    """?source=local sirve desde el espejo local (manage.py ghl_sync) en lugar de llamar a GHL"""
+    return request.query_params.get('source', '').lower() == 'local'
+
+
+def _local_location_error():
+    return Response({
+        'success': False,
+        'error': {'message': 'Se requiere locationId o configurar GHL_DEFAULT_LOCATION_ID'}
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _local_items(queryset):
+    """Objetos de GHL tal como se sincronizaron, leídos por lotes"""
+    return (raw for raw in queryset.values_list('raw', flat=True).iterator(chunk_size=500))
+
+
+def _location_ids(request):
+    """
+    Locations pedidas con ?locationIds=a,b,c (sin duplicados, en orden).
+    Devuelve (lista, payload_de_error); lista None si no se usó el parámetro.
+    """
+    raw = request.query_params.get('locationIds')
+    if raw is None:
+        return None, None
+    location_ids = list(dict.fromkeys(part.strip() for part in raw.split(',') if part.strip()))
+    max_locations = getattr(settings, 'GHL_FANOUT_MAX_LOCATIONS', 100)
+    if not location_ids:
+        return None, {'success': False, 'message': 'locationIds no puede estar vacío'}
+    if len(location_ids) > max_locations:
+        return None, {'success': False, 'message': f'Como máximo {max_locations} locationIds por petición'}
+    return location_ids, None
+
+
+def _fan_out_response(result):
+    """200 si respondió al menos una location (las fallidas van en failed_locations), 400 si ninguna"""
+    return Response(result, status=status.HTTP_200_OK if result.get('success') else status.HTTP_400_BAD_REQUEST)
+
+
+def _stream_format(request):
+    """
+    Formato de streaming pedido con ?stream=json|ndjson.
+    Devuelve (formato, payload_de_error); formato None si no se pidió streaming.
+    """
+    fmt = request.query_params.get('stream')
+    if not fmt:
+        return None, None
+    fmt = fmt.lower()
+    if fmt not in STREAM_FORMATS:
+        return None, {
+            'success': False,
+            'message': f"Formato de streaming no soportado: {fmt}. Usa {' o '.join(STREAM_FORMATS)}"
+        }
+    return fmt, None
 
 
 @api_view(['GET'])
@@ -12,12 +115,11 @@ def ghl_ping(request):
     - Si se pasa ?locationId=, intenta listar calendarios de esa location (para mostrar JSON real inmediatamente).
     - Si no, intenta /locations/search y, si falla, usa GHL_DEFAULT_LOCATION_ID para listar calendarios.
     """
-    service = GHLService()
-
     # Priorizar locationId de la query si está presente para devolver JSON real de calendarios
     q_location_id = request.query_params.get('locationId')
+    service = get_ghl_service(location_id=q_location_id)
     if q_location_id:
-        calendars_result = service.get_calendars(q_location_id)
+        calendars_result = service.get_calendars(q_location_id, fresh=_wants_fresh(request))
         return Response(calendars_result, status=status.HTTP_200_OK if calendars_result.get('success') else status.HTTP_400_BAD_REQUEST)
 
     # Fallback a prueba general de conexión
@@ -29,9 +131,10 @@ def ghl_ping(request):
 def ghl_locations(request):
     """
     Endpoint auxiliar: obtener todas las ubicaciones (locations) disponibles
+    Query param opcional: fresh=1 para ignorar la caché
     """
-    service = GHLService()
-    result = service.get_locations()
+    service = get_ghl_service()
+    result = service.get_locations(fresh=_wants_fresh(request))
     return Response(result, status=status.HTTP_200_OK if result.get('success') else status.HTTP_400_BAD_REQUEST)
 
 
@@ -39,11 +142,42 @@ def ghl_locations(request):
 def ghl_calendars(request):
     """
     Ejercicio 4: Endpoint para listar calendarios de una location
-    Query param opcional: locationId
+    Query params opcionales: locationId, fresh=1 para ignorar la caché,
+    source=local para leer del espejo local en lugar de GHL,
+    locationIds=a,b,c para varias locations a la vez (en paralelo, resultado por location)
     """
     location_id = request.query_params.get('locationId')
-    service = GHLService()
-    result = service.get_calendars(location_id)
+    service = get_ghl_service(location_id=location_id)
+    location_ids, error = _location_ids(request)
+    if error:
+        return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+    if location_ids and _wants_local(request):
+        calendars = list(_local_items(GHLCalendar.objects.filter(location_id__in=location_ids)))
+        return Response({
+            'success': True,
+            'calendars': calendars,
+            'total_calendars': len(calendars),
+            'location_ids': location_ids,
+            'source': 'local',
+        })
+    if location_ids:
+        return _fan_out_response(service.get_calendars_for_locations(location_ids, fresh=_wants_fresh(request)))
+
+    if _wants_local(request):
+        effective_location_id = location_id or service.default_location_id
+        if not effective_location_id:
+            return _local_location_error()
+        calendars = list(_local_items(GHLCalendar.objects.filter(location_id=effective_location_id)))
+        return Response({
+            'success': True,
+            'calendars': calendars,
+            'total_calendars': len(calendars),
+            'location_id': effective_location_id,
+            'source': 'local',
+        })
+
+    result = service.get_calendars(location_id, fresh=_wants_fresh(request))
     return Response(result, status=status.HTTP_200_OK if result.get('success') else status.HTTP_400_BAD_REQUEST)
 
 
@@ -64,40 +198,232 @@ def debug_config(request):
     })
 
 
+@api_view(['GET'])
+def ghl_stats(request):
+    """
+    Estadísticas internas del proceso: pool de conexiones HTTP hacia GHL
+    (conexiones abiertas, ociosas y reutilizadas), caché de respuestas, rate limiter local
+    y coalescencia de peticiones idénticas (single-flight), reintentos, circuit breaker y
+    el índice de citas del pre-flight, la cola de trabajos, las claves de idempotencia, y por cada tenant usado en este proceso su rate limiter
+    y su pool de conexiones.
+    No hace llamadas a GHL.
+    """
+    service = get_ghl_service()
+    breaker = get_circuit_breaker()
+    preflight_index = get_appointment_index()
+    return Response({
+        'success': True,
+        'connection_pool': get_connection_pool().stats(),
+        'response_cache': get_response_cache().stats(),
+        'singleflight': singleflight.stats(),
+        'rate_limiter': {
+            'mode': service.rate_limit_mode,
+            **service.rate_limiter.state(),
+        } if service.rate_limiter is not None else None,
+        'retries': service.retry_policy.stats() if service.retry_policy is not None else None,
+        'circuit_breaker': breaker.stats() if breaker is not None else None,
+        'webhooks': get_webhook_applier().stats(),
+        'appointment_preflight': preflight_index.stats() if preflight_index is not None else None,
+        'tenants': _tenant_stats(),
+        'jobs': queue_stats(),
+        'idempotency': get_idempotency_store().stats(),
+    })
+
+
+def _tenant_stats():
+    pools = tenant_pool_stats()
+    return {
+        'registry': get_tenant_registry().stats(),
+        'active': [
+            {
+                **tenant_service.tenant.summary(),
+                'rate_limiter': tenant_service.rate_limiter.state() if tenant_service.rate_limiter is not None else None,
+                'connection_pool': pools.get(tenant_service.tenant.location_id),
+            }
+            for tenant_service in tenant_services()
+        ],
+    }
+
+
+@require_GET
+def metrics(request):
+    """
+    Métricas en formato de exposición de Prometheus (para scrapear): latencia de GHL por endpoint
+    y status, latencia de las vistas, peticiones en curso, pool de conexiones, caché y rate limit.
+    Vista de Django sin DRF para no pasar por la negociación de contenido JSON.
+    No hace llamadas a GHL. 404 si GHL_METRICS_ENABLED es False.
+    """
+    if not metrics_enabled():
+        return HttpResponse('Métricas desactivadas (GHL_METRICS_ENABLED)\n', status=404, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+
+@api_view(['GET', 'DELETE'])
+def response_cache(request):
+    """
+    Caché de respuestas (calendarios, ubicaciones)
+    - GET: contadores de hit/miss, entradas y memoria usada
+    - DELETE: invalida entradas. Query params opcionales: endpoint (calendars|locations), locationId
+    """
+    cache = get_response_cache()
+    if request.method == 'DELETE':
+        invalidated = cache.invalidate(
+            endpoint=request.query_params.get('endpoint'),
+            location_id=request.query_params.get('locationId'),
+        )
+        return Response({
+            'success': True,
+            'message': f'{invalidated} entradas invalidadas',
+            'invalidated': invalidated,
+        })
+    return Response({'success': True, 'response_cache': cache.stats()})
+
+
 @api_view(['GET'])
 def rate_limit_status(request):
     """
-    ✨ NUEVO: Endpoint para probar rate limits haciendo una petición a GHL
-    y mostrar la información de rate limiting capturada
+    ✨ NUEVO: Estado de rate limits a partir de la telemetría en memoria (sin peticiones a GHL).
+    Cada respuesta de GHL deja sus headers x-ratelimit-* en un buffer circular; aquí se
+    devuelve la última muestra, el historial y la tendencia.
+    Query params opcionales: history=N para limitar el historial a las últimas N muestras y
+    locationId para ver los límites del token de ese tenant (por defecto el global)
     """
-    service = GHLService()
-    
-    # Hacer una petición simple para obtener headers de rate limit
-    result = service.test_connection()
-    
+    try:
+        history_limit = int(request.query_params.get('history', 0)) or None
+    except ValueError:
+        history_limit = None
+
+    service = get_ghl_service(location_id=request.query_params.get('locationId'))
+    telemetry = get_rate_limit_telemetry().snapshot(history_limit, namespace=service.cache_namespace)
+    latest = telemetry['latest']
+    rate_limit_info = ({k: v for k, v in latest.items() if k not in ('timestamp', 'status_code', 'endpoint', 'source')}
+                       if latest else None)
+
     response_data = {
-        'success': result.get('success', False),
-        'message': 'Petición realizada para obtener rate limit info',
-        'rate_limit_info': result.get('rate_limit'),
-        'note': 'Revisa la consola de Django para ver los logs detallados de rate limits'
+        'success': True,
+        'message': 'Rate limits de la última respuesta de GHL (sin peticiones adicionales)',
+        'rate_limit': rate_limit_info,
+        'rate_limit_info': rate_limit_info,
+        'last_seen_at': latest['timestamp'] if latest else None,
+        'history': telemetry['history'],
+        'trend': telemetry['trend'],
+        'samples_recorded': telemetry['recorded'],
+        'local_rate_limiter': service.rate_limiter.state() if service.rate_limiter is not None else None,
     }
-    
-    # Si no hay información de rate limit en la respuesta
-    if not result.get('rate_limit'):
-        if service.mock:
-            response_data['rate_limit_info'] = {
-                'limit': 1000,
-                'remaining': 856,
-                'used': 144,
-                'reset': 'En 45 minutos',
-                'note': 'Datos simulados - modo mock activado'
-            }
-        else:
-            response_data['warning'] = 'GHL no devolvió headers de rate limit, o la API no los incluye'
-    
+
+    # Si todavía no se ha hecho ninguna petición a GHL en este proceso
+    if not latest:
+        response_data['warning'] = ('Aún no hay respuestas de GHL con headers de rate limit; '
+                                    'se mostrarán tras la primera petición')
+
     return Response(response_data, status=status.HTTP_200_OK)
 
 
+def _bad_request(message):
+    return Response({'success': False, 'error': {'message': message}}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _wants_upsert(request) -> bool:
+    """?upsert=1: si el contacto ya está en el índice local se reutiliza en lugar de crearlo en GHL"""
+    return request.query_params.get('upsert', '').lower() in ['1', 'true', 'yes']
+
+
+def _wants_job(request) -> bool:
+    """?async=1 o Prefer: respond-async: encolar la escritura en lugar de esperar a GHL"""
+    return (request.query_params.get('async', '').lower() in ['1', 'true', 'yes']
+            or 'respond-async' in request.headers.get('Prefer', ''))
+
+
+def _job_accepted(request, job):
+    """202 con el id del trabajo y la URL donde consultar su resultado"""
+    status_url = request.build_absolute_uri(reverse('ghl_job_status', args=[job.id]))
+    response = Response({
+        'success': True,
+        'message': 'Petición encolada; consulta el resultado en status_url',
+        'job_id': str(job.id),
+        'status': job.status,
+        'status_url': status_url,
+    }, status=status.HTTP_202_ACCEPTED)
+    response['Location'] = status_url
+    return response
+
+
+def _idempotent(request, scope, handler):
+    """
+    Aplica el header Idempotency-Key (si viene) a una vista de creación: la primera petición
+    ejecuta handler() y las repeticiones reciben la misma respuesta sin llamar a GHL
+    (con el header Idempotent-Replayed: true). Ver idempotency.py.
+    """
+    key = request.headers.get('Idempotency-Key')
+    if key is None:
+        return handler()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return _bad_request(f'Idempotency-Key debe tener entre 1 y {MAX_KEY_LENGTH} caracteres')
+
+    def run():
+        response = handler()
+        return response.status_code, response.data
+
+    status_code, body, replayed = get_idempotency_store().run(scope, key, request.data, run)
+    response = Response(body, status=status_code)
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    if status_code == status.HTTP_202_ACCEPTED and body.get('status_url'):
+        response['Location'] = body['status_url']
+    return response
+
+
+@api_view(['GET'])
+def calendar_free_slots(request, calendar_id):
+    """
+    Horarios libres de un calendario, calculados a partir de sus citas
+    Query params opcionales:
+    - from, to: rango ISO-8601 o epoch (por defecto: ahora y 7 días después)
+    - duration: minutos de cada hueco (30); step: minutos entre inicios (= duration)
+    - timezone, dayStart, dayEnd, weekdays: horario laboral (por defecto GHL_AVAILABILITY_*)
+    - locationId, source=local para usar el espejo local, fresh=1 para ignorar la caché
+    """
+    params = request.query_params
+    service = get_ghl_service(location_id=params.get('locationId'))
+    now = timezone.now()
+    try:
+        tz = ZoneInfo(params.get('timezone') or getattr(settings, 'GHL_AVAILABILITY_TIMEZONE', settings.TIME_ZONE))
+        day_start = parse_day_time(params.get('dayStart') or getattr(settings, 'GHL_AVAILABILITY_DAY_START', '09:00'))
+        day_end = parse_day_time(params.get('dayEnd') or getattr(settings, 'GHL_AVAILABILITY_DAY_END', '18:00'))
+        weekdays = sorted({int(day) for day in
+                           (params.get('weekdays') or getattr(settings, 'GHL_AVAILABILITY_WEEKDAYS', '0,1,2,3,4')).split(',')
+                           if day.strip()})
+        duration = int(params.get('duration') or 30)
+        step = int(params['step']) if params.get('step') else None
+    except (ValueError, ZoneInfoNotFoundError) as e:
+        return _bad_request(f'Parámetros de disponibilidad inválidos: {e}')
+
+    start = parse_ghl_datetime(params.get('from')) if params.get('from') else now
+    end = parse_ghl_datetime(params.get('to')) if params.get('to') else start + timedelta(days=7)
+    max_days = getattr(settings, 'GHL_AVAILABILITY_MAX_DAYS', 62)
+    if start is None or end is None:
+        return _bad_request('from y to deben ser fechas ISO-8601 o epoch')
+    if end <= start:
+        return _bad_request('to debe ser posterior a from')
+    if end - start > timedelta(days=max_days):
+        return _bad_request(f'El rango no puede superar {max_days} días')
+    if duration <= 0 or (step is not None and step <= 0):
+        return _bad_request('duration y step deben ser mayores que 0')
+    if day_end <= day_start or any(day not in range(7) for day in weekdays):
+        return _bad_request('Horario laboral inválido: dayEnd debe ser posterior a dayStart y weekdays estar entre 0 y 6')
+
+    location_id = params.get('locationId') or service.default_location_id
+    local = _wants_local(request)
+    if not location_id and not (service.mock and not local):
+        return _local_location_error()
+
+    result = get_free_slots(
+        service, calendar_id, start, end, duration, step, tz, day_start, day_end, weekdays,
+        location_id=location_id, local=local, fresh=_wants_fresh(request),
+    )
+    return Response(result, status=status.HTTP_200_OK if result.get('success') else status.HTTP_400_BAD_REQUEST)
+
+
 @api_view(['POST'])
 def create_appointment(request):
     """
@@ -111,20 +437,129 @@ def create_appointment(request):
         "title": "Cita médica",
         "appointmentStatus": "confirmed"
     }
+    Con ?async=1 (o el header Prefer: respond-async) responde 202 con el id de un trabajo
+    que crea la cita en segundo plano (manage.py ghl_worker); ver /jobs/<id>/.
+    Con el header Idempotency-Key, repetir la petición devuelve la respuesta de la primera.
     """
+    return _idempotent(request, 'create_appointment', lambda: _create_appointment(request))
+
+
+def _create_appointment(request):
     data = request.data
-    required_fields = ["calendarId", "contactId", "startTime", "endTime"]
-    missing = [f for f in required_fields if f not in data]
-    if missing:
+    error = missing_fields_error(data, APPOINTMENT_REQUIRED_FIELDS)
+    if error:
+        return Response(error, status=status.HTTP_400_BAD_REQUEST)
+    if _wants_job(request):
+        return _job_accepted(request, enqueue_job('create_appointment', dict(data), data.get('locationId')))
+
+    service = get_ghl_service(location_id=data.get('locationId'))
+    result = service.create_appointment(data)
+    if result.get('preflight'):
+        # Rechazada localmente sin llamar a GHL: 400 si es inválida, 409 si se solapa
+        return Response(result, status=result['status_code'])
+    return Response(result, status=status.HTTP_200_OK if result.get('success') else status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+def bulk_create_appointments(request):
+    """
+    Crear citas en lote con concurrencia acotada
+    Body esperado (JSON): una lista de citas (mismo formato que /appointments/create/) o
+    {
+        "appointments": [...],
+        "concurrency": 5   // opcional, máximo GHL_BULK_MAX_CONCURRENCY
+    }
+    Query param opcional: stream=ndjson para recibir una línea por cita a medida que se crean
+    (con el progreso completed/total) y una línea final con el resumen.
+    """
+    payload = request.data
+    if isinstance(payload, dict):
+        appointments = payload.get('appointments')
+        requested_concurrency = payload.get('concurrency')
+    else:
+        appointments = payload
+        requested_concurrency = None
+
+    if not isinstance(appointments, list) or not appointments:
         return Response({
             'success': False,
-            'message': 'Faltan campos requeridos',
-            'missing_fields': missing
+            'message': 'Se espera una lista de citas no vacía (o {"appointments": [...]})'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-    service = GHLService()
-    result = service.create_appointment(data)
-    return Response(result, status=status.HTTP_200_OK if result.get('success') else status.HTTP_400_BAD_REQUEST)
+    max_items = getattr(settings, 'GHL_BULK_MAX_ITEMS', 1000)
+    if len(appointments) > max_items:
+        return Response({
+            'success': False,
+            'message': f'El lote supera el máximo de {max_items} citas'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    max_concurrency = getattr(settings, 'GHL_BULK_MAX_CONCURRENCY', 10)
+    try:
+        concurrency = min(int(requested_concurrency or max_concurrency), max_concurrency)
+    except (TypeError, ValueError):
+        concurrency = max_concurrency
+
+    # Validación local: las citas inválidas se reportan sin gastar llamadas a GHL
+    results = [None] * len(appointments)
+    valid = []
+    for index, item in enumerate(appointments):
+        if not isinstance(item, dict):
+            error = {'success': False, 'message': 'Cada cita debe ser un objeto JSON'}
+        else:
+            error = missing_fields_error(item, APPOINTMENT_REQUIRED_FIELDS)
+        if error:
+            results[index] = {'index': index, **error}
+        else:
+            valid.append((index, item))
+
+    # Cada cita va con el servicio de su location (tenant); se resuelven antes de repartir entre hilos
+    services = {location_id: get_ghl_service(location_id=location_id)
+                for location_id in {item.get('locationId') for _, item in valid}}
+
+    def create(entry):
+        # En lote siempre se espera cupo del rate limiter en lugar de fallar rápido
+        return services[entry[1].get('locationId')].create_appointment(entry[1], block=True)
+
+    def iter_results():
+        completed = 0
+        for index, result in enumerate(results):
+            if result is not None:
+                completed += 1
+                yield {**result, 'completed': completed, 'total': len(appointments)}
+        for _, (index, _item), result in run_concurrently(valid, create, concurrency):
+            completed += 1
+            results[index] = {'index': index, **result}
+            yield {**results[index], 'completed': completed, 'total': len(appointments)}
+
+    def summary():
+        created = sum(1 for r in results if r and r.get('success'))
+        return {
+            'success': created == len(appointments),
+            'total': len(appointments),
+            'created': created,
+            'failed': len(appointments) - created,
+            'concurrency': concurrency,
+        }
+
+    if request.query_params.get('stream') == 'ndjson':
+        def lines():
+            yield from iter_results()
+            yield {'summary': summary()}
+        response = StreamingHttpResponse(iter_ndjson(lines()), content_type='application/x-ndjson')
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    for _ in iter_results():
+        pass
+    result = summary()
+    result['results'] = results
+    if result['created'] == result['total']:
+        response_status = status.HTTP_200_OK
+    elif result['created']:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response(result, status=response_status)
 
 
 @api_view(['POST'])
@@ -139,46 +574,217 @@ def create_contact(request):
         "phone": "+1234567890",
         "locationId": "..." // opcional, usará GHL_DEFAULT_LOCATION_ID si no se especifica
     }
+    Con ?upsert=1, si ya existe un contacto con ese email en el índice local se
+    devuelve con 200 y reused: true sin llamar a GHL (ver /contacts/search/).
+    Con ?async=1 (o Prefer: respond-async) responde 202 con el id de un trabajo (ver /jobs/<id>/).
+    Con el header Idempotency-Key, repetir la petición devuelve la respuesta de la primera.
     """
+    return _idempotent(request, 'create_contact', lambda: _create_contact(request))
+
+
+def _create_contact(request):
     data = request.data.copy()
-    required_fields = ["firstName", "lastName", "email"]
-    missing = [f for f in required_fields if f not in data]
-    if missing:
+    error = missing_fields_error(data, CONTACT_REQUIRED_FIELDS)
+    if error:
+        return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+    # Si no se especifica locationId, usar el por defecto (el token depende de la location)
+    service = get_ghl_service(location_id=data.get('locationId'))
+    error = apply_default_location(data, service)
+    if error:
+        return Response(error, status=status.HTTP_400_BAD_REQUEST)
+    if _wants_upsert(request):
+        existing = find_existing_contact(data, data['locationId'])
+        if existing is not None:
+            return Response(reused_contact_result(existing), status=status.HTTP_200_OK)
+    if _wants_job(request):
+        return _job_accepted(request, enqueue_job('create_contact', dict(data), data['locationId']))
+
+    result = service.create_contact(data)
+    if result.get('success') and not service.mock:
+        index_contact(result.get('contact'), data['locationId'])
+    return Response(result, status=status.HTTP_201_CREATED if result.get('success') else status.HTTP_400_BAD_REQUEST)
+
+
+def _import_summary(summary, import_id):
+    # Las rutas del servidor no se exponen; el importId basta para reanudar
+    summary = {k: v for k, v in summary.items() if not k.endswith('_path')}
+    return {**summary, 'importId': import_id}
+
+
+@api_view(['POST'])
+def import_contacts(request):
+    """
+    Importación masiva de contactos desde un archivo CSV o JSONL (multipart/form-data)
+    Campos:
+    - file: archivo CSV (con cabecera) o JSONL (un contacto por línea)
+    - format: csv | jsonl (opcional, se deduce de la extensión)
+    - locationId: opcional, para filas sin locationId (si no, GHL_DEFAULT_LOCATION_ID)
+    - concurrency: opcional, máximo GHL_BULK_MAX_CONCURRENCY
+    - importId: opcional, para reanudar una importación anterior desde su checkpoint
+    Query param opcional: stream=ndjson para recibir una línea por fila y el resumen al final.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
         return Response({
             'success': False,
-            'message': 'Faltan campos requeridos',
-            'missing_fields': missing
+            'message': 'Falta el archivo en el campo "file"'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-    # Si no se especifica locationId, usar el por defecto
-    service = GHLService()
-    if 'locationId' not in data and service.default_location_id:
-        data['locationId'] = service.default_location_id
-    elif 'locationId' not in data:
+    fmt = detect_format(upload.name, request.data.get('format'))
+    if fmt is None:
         return Response({
             'success': False,
-            'message': 'Se requiere locationId o configurar GHL_DEFAULT_LOCATION_ID'
+            'message': 'Formato no soportado. Usa un archivo .csv o .jsonl (o el campo format)'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-    result = service.create_contact(data)
-    return Response(result, status=status.HTTP_201_CREATED if result.get('success') else status.HTTP_400_BAD_REQUEST)
+    import_id = request.data.get('importId') or uuid.uuid4().hex
+    if not re.fullmatch(r'[A-Za-z0-9_-]{1,64}', import_id):
+        return Response({
+            'success': False,
+            'message': 'importId inválido'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    max_concurrency = getattr(settings, 'GHL_BULK_MAX_CONCURRENCY', 10)
+    try:
+        concurrency = min(int(request.data.get('concurrency') or getattr(settings, 'GHL_IMPORT_CONCURRENCY', 5)),
+                          max_concurrency)
+    except (TypeError, ValueError):
+        concurrency = max_concurrency
+
+    import_dir = getattr(settings, 'GHL_IMPORT_DIR', None) or os.path.join(settings.BASE_DIR, 'imports')
+    os.makedirs(import_dir, exist_ok=True)
+    importer = ContactImporter(
+        get_ghl_service(location_id=request.data.get('locationId')),
+        location_id=request.data.get('locationId'),
+        concurrency=concurrency,
+        checkpoint_path=os.path.join(import_dir, f'{import_id}.checkpoint.json'),
+        results_path=os.path.join(import_dir, f'{import_id}.results.jsonl'),
+    )
+    # Lectura fila a fila sobre el archivo subido (Django lo guarda en disco si es grande)
+    rows = iter_rows(io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''), fmt)
+
+    if request.query_params.get('stream') == 'ndjson':
+        def lines():
+            yield from importer.iter_run(rows)
+            yield {'summary': _import_summary(importer.result_summary(), import_id)}
+        response = StreamingHttpResponse(iter_ndjson(lines()), content_type='application/x-ndjson')
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    result = _import_summary(importer.run(rows), import_id)
+    if result['success']:
+        response_status = status.HTTP_200_OK
+    elif result['created']:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response(result, status=response_status)
+
+
+@api_view(['POST'])
+def ghl_webhook(request):
+    """
+    Receptor de webhooks de GHL (AppointmentCreate/Update/Delete, ContactCreate/Update/Delete...)
+    Verifica la firma, guarda el evento en la base de datos y responde; un hilo lo aplica al
+    espejo local en lotes (ver webhooks.py). Los reenvíos (mismo id de evento) no se aplican dos veces.
+    """
+    body = request.body
+    try:
+        verify_signature(body, request.META)
+        event = parse_event(body)
+    except InvalidWebhook as e:
+        return Response({'success': False, 'message': str(e)}, status=e.status_code)
+
+    created = get_webhook_applier().record(event)
+    return Response({'success': True, 'received': event['event_id'], 'duplicate': not created},
+                    status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def job_status(request, job_id):
+    """
+    Estado de un trabajo encolado con ?async=1: queued, running, succeeded o failed.
+    En `result` va la misma respuesta que habría devuelto el endpoint síncrono (o la del último
+    intento fallido); `status_code` es el de GHL.
+    """
+    job = GHLJob.objects.filter(id=job_id).first()
+    if job is None:
+        return Response({'success': False, 'message': 'Trabajo no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'success': True, 'job': job_summary(job)})
+
+
+@api_view(['GET'])
+def search_contacts(request):
+    """
+    Busca contactos en el índice local (sin llamar a GHL) para saber si un paciente ya existe
+    Query params:
+    - q: email (o su comienzo), teléfono (con o sin prefijo de país) o comienzo del nombre/apellido
+    - locationId: opcional, usará GHL_DEFAULT_LOCATION_ID si no se especifica
+    - limit: máximo de resultados (20 por defecto, máximo 100)
+    El índice se alimenta con manage.py ghl_sync, los webhooks y los contactos creados por la API.
+    """
+    location_id = request.query_params.get('locationId')
+    effective_location_id = location_id or get_ghl_service(location_id=location_id).default_location_id
+    if not effective_location_id:
+        return _local_location_error()
+    try:
+        limit = int(request.query_params.get('limit', SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        return _bad_request('limit debe ser un número entero')
+    result = search_contact_index(request.query_params.get('q', ''), effective_location_id, limit)
+    return Response(result, status=status.HTTP_200_OK if result.get('success') else status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['GET'])
 def get_contacts(request):
     """
     Endpoint auxiliar: obtener contactos de GHL (útil para debugging)
-    Query param opcional: locationId
+    Query params opcionales:
+    - locationId
+    - stream=json|ndjson: recorre todas las páginas de GHL y las envía en streaming
+      (array JSON o un contacto por línea) sin cargar el listado completo en memoria
+    - limit: contactos por página al recorrer GHL (máximo 100)
+    - source=local: lee del espejo local (manage.py ghl_sync); admite email= y stream
     """
     location_id = request.query_params.get('locationId')
-    service = GHLService()
+    service = get_ghl_service(location_id=location_id)
+    
+    stream_format, error = _stream_format(request)
+    if error:
+        return Response(error, status=status.HTTP_400_BAD_REQUEST)
+    if _wants_local(request):
+        effective_location_id = location_id or service.default_location_id
+        if not effective_location_id:
+            return _local_location_error()
+        queryset = GHLContact.objects.filter(location_id=effective_location_id)
+        email = request.query_params.get('email')
+        if email:
+            queryset = queryset.filter(email=email.strip().lower())
+        if stream_format:
+            return streaming_response(_local_items(queryset), stream_format)
+        contacts = list(_local_items(queryset))
+        return Response({
+            'success': True,
+            'contacts': contacts,
+            'total_contacts': len(contacts),
+            'source': 'local',
+        })
+    if stream_format:
+        if not (location_id or service.default_location_id or service.mock):
+            return Response({
+                'success': False,
+                'error': {'message': 'Se requiere locationId o configurar GHL_DEFAULT_LOCATION_ID'}
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page_size = int(request.query_params.get('limit', GHL_MAX_PAGE_SIZE))
+        except ValueError:
+            page_size = GHL_MAX_PAGE_SIZE
+        return streaming_response(service.iter_contacts(location_id, page_size=page_size), stream_format)
     
     # Para modo mock, devolvemos contactos simulados
     if service.mock:
-        contacts = [
-            {'id': 'contact_mock_001', 'firstName': 'Juan', 'lastName': 'Pérez', 'email': 'juan@demo.com', 'phone': '+1234567890'},
-            {'id': 'contact_mock_002', 'firstName': 'María', 'lastName': 'García', 'email': 'maria@demo.com', 'phone': '+1234567891'},
-        ]
+        contacts = MOCK_CONTACTS
         return Response({
             'success': True,
             'contacts': contacts,
@@ -201,11 +807,73 @@ def get_contacts(request):
 def get_appointments(request):
     """
     Endpoint auxiliar: obtener citas de GHL (útil para debugging)
-    Query params opcionales: locationId, calendarId
+    Query params opcionales:
+    - locationId, calendarId
+    - stream=json|ndjson: recorre todas las páginas de GHL y las envía en streaming
+    - startTime, endTime: rango de fechas (con stream, source=local o locationIds)
+    - source=local: lee del espejo local (manage.py ghl_sync)
+    - locationIds=a,b,c: varias locations a la vez (en paralelo, resultado por location)
     """
     location_id = request.query_params.get('locationId')
     calendar_id = request.query_params.get('calendarId')
-    service = GHLService()
+    service = get_ghl_service(location_id=location_id)
+    
+    stream_format, error = _stream_format(request)
+    if error:
+        return Response(error, status=status.HTTP_400_BAD_REQUEST)
+    location_ids, error = _location_ids(request)
+    if error:
+        return Response(error, status=status.HTTP_400_BAD_REQUEST)
+    if location_ids and not _wants_local(request):
+        if stream_format:
+            return Response({
+                'success': False,
+                'message': 'stream con locationIds solo está disponible con source=local'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return _fan_out_response(service.get_appointments_for_locations(
+            location_ids,
+            calendar_id=calendar_id,
+            start_time=request.query_params.get('startTime'),
+            end_time=request.query_params.get('endTime'),
+        ))
+    if _wants_local(request):
+        effective_location_id = location_id or service.default_location_id
+        if not (effective_location_id or location_ids):
+            return _local_location_error()
+        if location_ids:
+            queryset = GHLAppointment.objects.filter(location_id__in=location_ids)
+        else:
+            queryset = GHLAppointment.objects.filter(location_id=effective_location_id)
+        if calendar_id:
+            queryset = queryset.filter(calendar_id=calendar_id)
+        start_time = parse_ghl_datetime(request.query_params.get('startTime'))
+        end_time = parse_ghl_datetime(request.query_params.get('endTime'))
+        if start_time:
+            queryset = queryset.filter(start_time__gte=start_time)
+        if end_time:
+            queryset = queryset.filter(start_time__lt=end_time)
+        if stream_format:
+            return streaming_response(_local_items(queryset), stream_format)
+        appointments = list(_local_items(queryset))
+        return Response({
+            'success': True,
+            'appointments': appointments,
+            'total_appointments': len(appointments),
+            'source': 'local',
+        })
+    if stream_format:
+        if not (location_id or service.default_location_id or service.mock):
+            return Response({
+                'success': False,
+                'error': {'message': 'Se requiere locationId o configurar GHL_DEFAULT_LOCATION_ID'}
+            }, status=status.HTTP_400_BAD_REQUEST)
+        appointments = service.iter_appointments(
+            location_id,
+            calendar_id=calendar_id,
+            start_time=request.query_params.get('startTime'),
+            end_time=request.query_params.get('endTime'),
+        )
+        return streaming_response(appointments, stream_format)
     
     # Para modo mock, devolvemos citas simuladas
     if service.mock:
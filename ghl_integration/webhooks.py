@@ -0,0 +1,358 @@
+"""
+Recepción de webhooks de GHL (citas y contactos): verificación de firma, registro del evento en
+la base de datos y aplicación por lotes al espejo local, para mantenerlo al día sin hacer polling a GHL.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Max
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils import timezone
+
+from .cache import get_response_cache
+from .models import GHLAppointment, GHLContact, GHLWebhookEvent
+from .preflight import get_appointment_index
+from .sync import appointment_fields, contact_fields, parse_ghl_datetime
+
+try:
+    # Opcional: solo hace falta para verificar la firma RSA (x-wh-signature) de GHL
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import padding
+except ImportError:
+    serialization = None
+
+logger = logging.getLogger(__name__)
+
+# Headers de firma: RSA de GHL (x-wh-signature) o HMAC-SHA256 con secreto compartido
+RSA_SIGNATURE_HEADER = 'HTTP_X_WH_SIGNATURE'
+HMAC_SIGNATURE_HEADER = 'HTTP_X_GHL_SIGNATURE'
+
+APPOINTMENT_EVENTS = ('AppointmentCreate', 'AppointmentUpdate', 'AppointmentDelete')
+CONTACT_EVENTS = ('ContactCreate', 'ContactUpdate', 'ContactDelete', 'ContactDndUpdate', 'ContactTagUpdate')
+
+
+class InvalidWebhook(Exception):
+    """Firma ausente o inválida (401), o payload que no es un evento de GHL (400)"""
+
+    def __init__(self, message: str, status_code: int = 401):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def verify_signature(body: bytes, meta: Dict) -> None:
+    """
+    Verifica la firma del webhook:
+    - GHL_WEBHOOK_PUBLIC_KEY (PEM): firma RSA-SHA256 en base64 del header x-wh-signature
+      (la que envía GHL en los webhooks de apps; requiere el paquete `cryptography`)
+    - GHL_WEBHOOK_SECRET: HMAC-SHA256 en hex del header X-GHL-Signature (webhooks de workflows
+      o proxies propios)
+    Sin ninguno configurado solo se aceptan eventos si GHL_WEBHOOK_ALLOW_UNSIGNED es True.
+
+    Raises:
+        InvalidWebhook: Si la firma no es válida
+    """
+    public_key = getattr(settings, 'GHL_WEBHOOK_PUBLIC_KEY', None)
+    secret = getattr(settings, 'GHL_WEBHOOK_SECRET', None)
+
+    if public_key and meta.get(RSA_SIGNATURE_HEADER):
+        if serialization is None:
+            raise InvalidWebhook('GHL_WEBHOOK_PUBLIC_KEY requiere instalar el paquete cryptography')
+        try:
+            key = serialization.load_pem_public_key(public_key.encode())
+            key.verify(base64.b64decode(meta[RSA_SIGNATURE_HEADER]), body, padding.PKCS1v15(), hashes.SHA256())
+            return
+        except (InvalidSignature, ValueError) as e:
+            raise InvalidWebhook(f'Firma RSA inválida: {e}')
+
+    if secret and meta.get(HMAC_SIGNATURE_HEADER):
+        expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        received = meta[HMAC_SIGNATURE_HEADER].split('=', 1)[-1].strip()
+        if hmac.compare_digest(expected, received.lower()):
+            return
+        raise InvalidWebhook('Firma HMAC inválida')
+
+    if public_key or secret:
+        raise InvalidWebhook('Falta el header de firma')
+    if not getattr(settings, 'GHL_WEBHOOK_ALLOW_UNSIGNED', False):
+        raise InvalidWebhook('No hay GHL_WEBHOOK_PUBLIC_KEY ni GHL_WEBHOOK_SECRET configurados')
+
+
+def parse_event(body: bytes, received_at=None) -> Dict:
+    """
+    Normaliza un webhook de GHL: id del evento (webhookId o hash del body), tipo, objeto afectado
+    y momento del cambio (timestamp/dateUpdated del payload, o la hora de recepción).
+    """
+    try:
+        payload = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidWebhook('El body debe ser JSON válido', status_code=400)
+    if not isinstance(payload, dict) or not payload.get('type'):
+        raise InvalidWebhook('El evento debe ser un objeto JSON con "type"', status_code=400)
+
+    received_at = received_at or timezone.now()
+    event_type = payload['type']
+    obj = payload.get('appointment') if event_type in APPOINTMENT_EVENTS else payload
+    obj = obj if isinstance(obj, dict) else {}
+    occurred_at = (parse_ghl_datetime(payload.get('timestamp'))
+                   or parse_ghl_datetime(obj.get('dateUpdated'))
+                   or parse_ghl_datetime(obj.get('dateAdded'))
+                   or received_at)
+    return {
+        'event_id': str(payload.get('webhookId') or payload.get('eventId') or hashlib.sha256(body).hexdigest()),
+        'event_type': event_type,
+        'location_id': payload.get('locationId') or obj.get('locationId') or '',
+        'object_id': str(obj.get('id') or ''),
+        'occurred_at': occurred_at,
+        'payload': payload,
+        'received_at': received_at,
+    }
+
+
+class WebhookApplier:
+    """
+    Aplica al espejo local los eventos guardados en GHLWebhookEvent que aún no se procesaron.
+    La vista guarda cada evento antes de responder 202 (un reinicio no pierde nada) y despierta
+    este hilo, que los aplica en lotes de `batch_size` como mucho cada `flush_interval` segundos.
+    Si un lote falla se reintenta evento a evento y el que sigue fallando queda apartado con su
+    error (dead letter) para que no bloquee a los siguientes.
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._stats = {'received': 0, 'applied': 0, 'duplicates': 0, 'stale': 0, 'ignored': 0,
+                       'dead_lettered': 0, 'batches': 0, 'errors': 0, 'last_flush_ms': None}
+
+    def record(self, event: Dict) -> bool:
+        """Guarda el evento (False si su event_id ya estaba) y despierta el hilo que lo aplica"""
+        try:
+            with transaction.atomic():
+                GHLWebhookEvent.objects.create(**event)
+            created = True
+        except IntegrityError:
+            created = False
+        with self._lock:
+            self._stats['received'] += 1
+            self._stats['duplicates'] += not created
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='ghl-webhooks', daemon=True)
+                self._thread.start()
+        if created:
+            self._wakeup.set()
+        return created
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                with self._lock:
+                    self._stats['errors'] += 1
+                logger.exception("Error aplicando lote de webhooks de GHL")
+            finally:
+                close_old_connections()
+
+    def flush(self) -> int:
+        """Aplica los eventos pendientes de la base de datos; devuelve cuántos procesó"""
+        processed = 0
+        with self._flush_lock:
+            while True:
+                started = time.perf_counter()
+                counts = apply_pending_events(self.batch_size)
+                total = sum(counts.values())
+                if not total:
+                    return processed
+                processed += total
+                with self._lock:
+                    for key, value in counts.items():
+                        self._stats[key] += value
+                    self._stats['batches'] += 1
+                    self._stats['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 2)
+                if total < self.batch_size:
+                    return processed
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+
+    def stats(self) -> Dict:
+        pending = GHLWebhookEvent.objects.filter(processed_at__isnull=True).count()
+        with self._lock:
+            return {**self._stats, 'pending': pending,
+                    'batch_size': self.batch_size, 'flush_interval': self.flush_interval}
+
+
+def _lock_pending(limit: int, pks: Optional[List[int]] = None) -> List[GHLWebhookEvent]:
+    """Eventos sin procesar en orden de occurred_at, bloqueados (SKIP LOCKED si hay varios procesos)"""
+    queryset = GHLWebhookEvent.objects.filter(processed_at__isnull=True)
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    return list(queryset.select_for_update(skip_locked=skip_locked).order_by('occurred_at', 'id')[:limit])
+
+
+def apply_pending_events(limit: int = 200) -> Dict:
+    """
+    Aplica hasta `limit` eventos pendientes en una transacción. Si el lote falla se aplican de uno
+    en uno; el evento que falla solo se marca como procesado con el error (dead letter).
+    """
+    events: List[GHLWebhookEvent] = []
+    try:
+        with transaction.atomic():
+            events = _lock_pending(limit)
+            return apply_events(events)
+    except Exception:
+        if not events:
+            raise
+        logger.exception(f"Falló un lote de {len(events)} webhooks; se aplican de uno en uno")
+
+    counts = {'applied': 0, 'stale': 0, 'ignored': 0, 'dead_lettered': 0}
+    for pk in [event.pk for event in events]:
+        try:
+            with transaction.atomic():
+                for key, value in apply_events(_lock_pending(1, pks=[pk])).items():
+                    counts[key] += value
+        except Exception as e:
+            logger.exception(f"Webhook {pk} apartado (dead letter)")
+            GHLWebhookEvent.objects.filter(pk=pk, processed_at__isnull=True).update(
+                processed_at=timezone.now(), error=f'{type(e).__name__}: {e}'[:2000],
+            )
+            counts['dead_lettered'] += 1
+    return counts
+
+
+def apply_events(events: List[GHLWebhookEvent]) -> Dict:
+    """Aplica al espejo local eventos ya guardados y bloqueados, y los marca como procesados"""
+    counts = {'applied': 0, 'stale': 0, 'ignored': 0}
+    if not events:
+        return counts
+
+    # Por objeto solo importa el último evento; el resto del lote queda como procesado
+    latest: Dict = {}
+    for event in events:
+        if not event.object_id:
+            counts['ignored'] += 1
+        elif event.event_type in APPOINTMENT_EVENTS:
+            latest[(GHLAppointment, event.object_id)] = event
+        elif event.event_type in CONTACT_EVENTS:
+            latest[(GHLContact, event.object_id)] = event
+        else:
+            counts['ignored'] += 1
+    for model in (GHLAppointment, GHLContact):
+        applied, stale = _apply_latest(model, [e for (m, _), e in latest.items() if m is model])
+        counts['applied'] += applied
+        counts['stale'] += stale
+
+    GHLWebhookEvent.objects.filter(pk__in=[e.pk for e in events]).update(processed_at=timezone.now())
+    return counts
+
+
+def _tombstones(model, object_ids: List[str]) -> Dict:
+    """
+    Momento del último borrado ya aplicado de cada objeto. Los eventos *Delete procesados quedan en
+    GHLWebhookEvent y hacen de lápida: un Update más viejo que llega tarde no resucita el objeto.
+    """
+    if not object_ids:
+        return {}
+    delete_type = 'AppointmentDelete' if model is GHLAppointment else 'ContactDelete'
+    return dict(GHLWebhookEvent.objects
+                .filter(object_id__in=object_ids, event_type=delete_type, processed_at__isnull=False, error='')
+                .values('object_id').annotate(deleted_at=Max('occurred_at'))
+                .values_list('object_id', 'deleted_at'))
+
+
+def _apply_latest(model, events: List[GHLWebhookEvent]):
+    """Upsert o borrado por objeto, descartando eventos más viejos que lo que ya hay guardado o borrado"""
+    if not events:
+        return 0, 0
+    current = dict(model.objects.filter(ghl_id__in=[e.object_id for e in events])
+                   .values_list('ghl_id', 'ghl_updated_at'))
+    deleted = _tombstones(model, [e.object_id for e in events if e.object_id not in current])
+    to_fields = appointment_fields if model is GHLAppointment else contact_fields
+    upserts, deletes, stale = [], [], 0
+    for event in events:
+        known = current.get(event.object_id) or deleted.get(event.object_id)
+        if known is not None and event.occurred_at < known:
+            stale += 1
+            continue
+        if event.event_type.endswith('Delete'):
+            deletes.append(event.object_id)
+            continue
+        obj = (event.payload.get('appointment') if model is GHLAppointment else event.payload) or {}
+        obj = {k: v for k, v in obj.items() if k != 'type'}
+        upserts.append(model(
+            ghl_id=event.object_id,
+            location_id=event.location_id,
+            raw=obj,
+            ghl_updated_at=event.occurred_at,
+            **to_fields(obj, event.location_id),
+        ))
+    if model is GHLAppointment:
+        _invalidate_calendars(upserts, deletes)
+    if upserts:
+        update_fields = [f.name for f in model._meta.concrete_fields if f.name not in ('id', 'ghl_id')]
+        model.objects.bulk_create(upserts, update_conflicts=True, unique_fields=['ghl_id'], update_fields=update_fields)
+    if deletes:
+        model.objects.filter(ghl_id__in=deletes).delete()
+    return len(upserts) + len(deletes), stale
+
+
+def _invalidate_calendars(upserts: List[GHLAppointment], deletes: List[str]):
+    """
+    Las citas nuevas, movidas o borradas cambian los huecos libres cacheados de sus calendarios
+    y el índice de solapes del pre-flight
+    """
+    changed_ids = [appointment.ghl_id for appointment in upserts] + deletes
+    # Calendario anterior (antes de aplicar el lote) y, para los upserts, el nuevo
+    calendar_ids = set(GHLAppointment.objects.filter(ghl_id__in=changed_ids).values_list('calendar_id', flat=True))
+    calendar_ids.update(appointment.calendar_id for appointment in upserts)
+    cache = get_response_cache()
+    index = get_appointment_index()
+    for calendar_id in calendar_ids - {''}:
+        cache.invalidate('free_slots', calendar_id)
+        if index is not None:
+            index.invalidate(calendar_id)
+
+
+_applier: Optional[WebhookApplier] = None
+_applier_lock = threading.Lock()
+
+
+def get_webhook_applier() -> WebhookApplier:
+    """Aplicador de webhooks del proceso"""
+    global _applier
+    if _applier is None:
+        with _applier_lock:
+            if _applier is None:
+                _applier = WebhookApplier(
+                    batch_size=getattr(settings, 'GHL_WEBHOOK_BATCH_SIZE', 200),
+                    flush_interval=getattr(settings, 'GHL_WEBHOOK_FLUSH_INTERVAL', 1.0),
+                )
+    return _applier
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(setting, **kwargs):
+    global _applier
+    if setting.startswith('GHL_WEBHOOK_'):
+        with _applier_lock:
+            if _applier is not None:
+                _applier.stop()
+            _applier = None